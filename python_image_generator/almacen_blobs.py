@@ -0,0 +1,159 @@
+"""
+Almacén de blobs direccionado por contenido para el Generador de Imágenes con IA
+
+Los bytes de cada imagen entregada en base64 o en bytes crudos se guardan una sola
+vez bajo su hash SHA-256 (blobs/ab/abcdef....png). Los archivos de metadata de las
+sesiones solo guardan el descriptor (clave, ruta, tamaño), así se mantienen chicos
+y rápidos de leer, y una imagen repetida no se vuelve a escribir.
+
+Con max_bytes el tamaño total en disco se limita expulsando los blobs guardados o
+leídos hace más tiempo; el descriptor de una imagen expulsada queda en su sesión pero
+la ruta ya no existe (obtener() devuelve None y el servidor responde 404).
+
+guardar() se llama desde los hilos de post-proceso del generador: la contabilidad del
+tamaño y la expulsión se hacen bajo un lock.
+"""
+
+import os
+import uuid
+import threading
+import hashlib
+from pathlib import Path
+
+
+class AlmacenBlobs:
+    def __init__(self, directorio="blobs", max_bytes=None):
+        """
+        Inicializa el almacén de blobs
+
+        Args:
+            directorio (str): Carpeta raíz del almacén
+            max_bytes (int): Tamaño máximo total del almacén en disco (None = sin límite)
+        """
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        # Total en disco, para no recorrer el almacén en cada escritura (solo con límite)
+        self.ocupado = sum(tamano for _, tamano, _ in self._entradas()) if max_bytes is not None else 0
+
+    def _entradas(self):
+        """
+        Lista los blobs del almacén
+
+        Returns:
+            list: (fecha de último uso, tamaño, ruta) de cada blob
+        """
+        entradas = []
+        for ruta in self.directorio.glob("*/*"):
+            if ruta.suffix == ".tmp":
+                continue
+            try:
+                info = ruta.stat()
+            except OSError:
+                continue
+            entradas.append((info.st_mtime, info.st_size, ruta))
+        return entradas
+
+    def _usar(self, ruta):
+        """
+        Marca un blob como usado recientemente para la expulsión LRU
+        """
+        try:
+            os.utime(ruta)
+        except OSError:
+            pass
+
+    def ruta(self, clave, extension):
+        """
+        Retorna la ruta de un blob (los dos primeros caracteres de la clave forman la subcarpeta)
+
+        Args:
+            clave (str): Hash SHA-256 completo de los bytes
+            extension (str): Extensión del formato de la imagen
+
+        Returns:
+            Path: Ruta del blob dentro del almacén
+        """
+        return self.directorio / clave[:2] / f"{clave}.{extension}"
+
+    def guardar(self, datos, extension, clave=None):
+        """
+        Guarda unos bytes en el almacén si todavía no están
+
+        Args:
+            datos (bytes): Contenido a guardar
+            extension (str): Extensión del formato de la imagen
+            clave (str): Hash SHA-256 completo ya calculado (None = calcularlo)
+
+        Returns:
+            dict: Descriptor del blob (tipo, clave, ruta y tamaño)
+        """
+        if clave is None:
+            clave = hashlib.sha256(datos).hexdigest()
+
+        ruta = self.ruta(clave, extension)
+        if ruta.exists():
+            self._usar(ruta)
+        else:
+            ruta.parent.mkdir(exist_ok=True)
+            temporal = ruta.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+            temporal.write_bytes(datos)
+            with self._lock:
+                # Otro hilo pudo guardar el mismo contenido mientras se escribía el temporal
+                nuevo = not ruta.exists()
+                os.replace(temporal, ruta)
+                if nuevo and self.max_bytes is not None:
+                    self.ocupado += len(datos)
+                    self._expulsar(conservar=ruta)
+
+        return {
+            "tipo": "blob",
+            "clave": clave,
+            "ruta": str(ruta.absolute()),
+            "tamano_bytes": len(datos)
+        }
+
+    def obtener(self, clave, extension):
+        """
+        Lee un blob del almacén
+
+        Args:
+            clave (str): Hash SHA-256 completo de los bytes
+            extension (str): Extensión del formato de la imagen
+
+        Returns:
+            bytes: Contenido del blob o None si no existe
+        """
+        ruta = self.ruta(clave, extension)
+        try:
+            datos = ruta.read_bytes()
+        except OSError:
+            return None
+        self._usar(ruta)
+        return datos
+
+    def _expulsar(self, conservar=None):
+        """
+        Elimina los blobs usados hace más tiempo hasta quedar dentro de max_bytes (con el lock tomado)
+
+        Args:
+            conservar (Path): Blob que no se expulsa (el que se acaba de guardar)
+        """
+        if self.ocupado <= self.max_bytes:
+            return
+
+        # Recalcular desde el disco: otros procesos (lotes en paralelo) también escriben
+        entradas = self._entradas()
+        self.ocupado = sum(tamano for _, tamano, _ in entradas)
+        for _, tamano, ruta in sorted(entradas):
+            if self.ocupado <= self.max_bytes:
+                break
+            if ruta == conservar:
+                continue
+            try:
+                ruta.unlink()
+                self.ocupado -= tamano
+            except OSError:
+                continue
@@ -0,0 +1,230 @@
+"""
+Almacén indexado de metadata (SQLite) para el Generador de Imágenes con IA
+
+Cada sesión y cada imagen se registran en metadata/metadata.db con índices por
+session_id, producto, estilo y fecha, de modo que listar o buscar imágenes no
+depende de cuántas sesiones se hayan generado (antes había que leer y parsear
+todos los sesion_<id>.json en cada página). Los JSON por sesión se siguen
+escribiendo como registro legible; importar_json() carga los existentes.
+"""
+
+import json
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS sesiones (
+    session_id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    producto TEXT NOT NULL,
+    estilo TEXT,
+    modelo TEXT,
+    metadata TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS imagenes (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    variacion INTEGER NOT NULL,
+    exito INTEGER NOT NULL,
+    producto TEXT NOT NULL,
+    estilo TEXT,
+    timestamp TEXT NOT NULL,
+    nombre_archivo TEXT,
+    hash_sha256 TEXT,
+    metadata TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_sesiones_timestamp ON sesiones (timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_imagenes_session ON imagenes (session_id, variacion);
+CREATE INDEX IF NOT EXISTS idx_imagenes_timestamp ON imagenes (exito, timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_imagenes_producto ON imagenes (producto, exito, timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_imagenes_estilo ON imagenes (estilo, exito, timestamp DESC);
+"""
+
+
+class AlmacenMetadata:
+    def __init__(self, ruta="metadata/metadata.db"):
+        """
+        Inicializa el almacén y crea el esquema si no existe
+
+        Args:
+            ruta (str): Archivo de la base de datos SQLite
+        """
+        self.ruta = Path(ruta)
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self.nueva = not self.ruta.exists()
+
+        with self._conectar() as conexion:
+            # WAL: el servidor Node puede leer mientras Python escribe
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.executescript(ESQUEMA)
+
+    @contextmanager
+    def _conectar(self):
+        """
+        Abre una conexión por operación, confirma la transacción al salir y la cierra
+        (el generador escribe desde un solo hilo y los lectores externos abren las suyas)
+        """
+        conexion = sqlite3.connect(self.ruta, timeout=30)
+        conexion.row_factory = sqlite3.Row
+        try:
+            with conexion:
+                yield conexion
+        finally:
+            conexion.close()
+
+    def registrar_sesion(self, metadata_sesion):
+        """
+        Guarda (o reemplaza) una sesión y todas sus imágenes
+
+        Args:
+            metadata_sesion (dict): Metadata de la sesión sin los bytes de las imágenes
+        """
+        with self._conectar() as conexion:
+            self._insertar_sesion(conexion, metadata_sesion)
+
+    def registrar_sesiones(self, sesiones):
+        """
+        Guarda (o reemplaza) varias sesiones en una sola transacción
+
+        Args:
+            sesiones (list): Metadata de cada sesión sin los bytes de las imágenes
+        """
+        with self._conectar() as conexion:
+            for metadata_sesion in sesiones:
+                self._insertar_sesion(conexion, metadata_sesion)
+
+    def _insertar_sesion(self, conexion, metadata_sesion):
+        """
+        Escribe una sesión y sus imágenes dentro de la transacción de `conexion`
+        """
+        session_id = metadata_sesion["session_id"]
+        producto = metadata_sesion["producto"]["nombre"]
+        estilo = metadata_sesion.get("parametros", {}).get("estilo")
+        sesion = {campo: valor for campo, valor in metadata_sesion.items() if campo != "imagenes"}
+
+        filas_imagenes = [
+            (
+                f"{session_id}_{img['variacion']:02d}",
+                session_id,
+                img["variacion"],
+                1 if img.get("exito") else 0,
+                producto,
+                estilo,
+                img.get("timestamp_generacion") or img.get("timestamp_error") or metadata_sesion["timestamp"],
+                img.get("nombre_archivo"),
+                img.get("hash_sha256"),
+                json.dumps(img, ensure_ascii=False)
+            )
+            for img in metadata_sesion.get("imagenes", [])
+        ]
+
+        conexion.execute(
+            "INSERT OR REPLACE INTO sesiones (session_id, timestamp, producto, estilo, modelo, metadata) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (session_id, metadata_sesion["timestamp"], producto, estilo,
+             metadata_sesion.get("modelo"), json.dumps(sesion, ensure_ascii=False))
+        )
+        conexion.execute("DELETE FROM imagenes WHERE session_id = ?", (session_id,))
+        conexion.executemany(
+            "INSERT INTO imagenes (id, session_id, variacion, exito, producto, estilo, timestamp, "
+            "nombre_archivo, hash_sha256, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            filas_imagenes
+        )
+
+    def importar_json(self, directorio):
+        """
+        Importa los archivos sesion_<id>.json existentes de un directorio
+
+        Args:
+            directorio (str): Carpeta con los JSON de las sesiones
+
+        Returns:
+            dict: Sesiones importadas y archivos que no se pudieron leer
+        """
+        importadas = 0
+        errores = []
+        # Una sola transacción para todo el directorio
+        with self._conectar() as conexion:
+            for archivo in sorted(Path(directorio).glob("sesion_*.json")):
+                try:
+                    with open(archivo, "r", encoding="utf-8") as f:
+                        metadata_sesion = json.load(f)
+                    # Los JSON antiguos pueden tener base64 completo: no se copia al índice
+                    metadata_sesion["imagenes"] = [
+                        {campo: valor for campo, valor in img.items() if campo not in ("base64_data", "datos")}
+                        for img in metadata_sesion.get("imagenes", [])
+                    ]
+                    self._insertar_sesion(conexion, metadata_sesion)
+                    importadas += 1
+                except Exception as e:
+                    errores.append({"archivo": archivo.name, "error": str(e)})
+
+        return {"importadas": importadas, "errores": errores}
+
+    def listar_imagenes(self, pagina=1, por_pagina=10, session_id=None, producto=None, estilo=None):
+        """
+        Lista las imágenes exitosas más recientes primero, con filtros opcionales
+
+        Args:
+            pagina (int): Página (desde 1)
+            por_pagina (int): Imágenes por página
+            session_id (str): Filtrar por sesión
+            producto (str): Filtrar por nombre exacto de producto
+            estilo (str): Filtrar por estilo
+
+        Returns:
+            dict: Imágenes de la página (con datos de su sesión) y total de coincidencias
+        """
+        condiciones = ["i.exito = 1"]
+        parametros = []
+        for columna, valor in (("i.session_id", session_id), ("i.producto", producto), ("i.estilo", estilo)):
+            if valor:
+                condiciones.append(f"{columna} = ?")
+                parametros.append(valor)
+        donde = " AND ".join(condiciones)
+
+        with self._conectar() as conexion:
+            total = conexion.execute(f"SELECT COUNT(*) FROM imagenes i WHERE {donde}", parametros).fetchone()[0]
+            filas = conexion.execute(
+                f"SELECT i.id, i.session_id, i.producto, i.estilo, i.metadata FROM imagenes i "
+                f"WHERE {donde} ORDER BY i.timestamp DESC LIMIT ? OFFSET ?",
+                parametros + [por_pagina, (pagina - 1) * por_pagina]
+            ).fetchall()
+
+        return {
+            "imagenes": [
+                {
+                    "id": fila["id"],
+                    "session_id": fila["session_id"],
+                    "producto": fila["producto"],
+                    "estilo": fila["estilo"],
+                    **json.loads(fila["metadata"])
+                }
+                for fila in filas
+            ],
+            "total": total
+        }
+
+    def obtener_imagen(self, image_id):
+        """
+        Busca una imagen por su id (<session_id>_<variacion>)
+
+        Args:
+            image_id (str): Identificador de la imagen
+
+        Returns:
+            dict: Metadata de la imagen y de su sesión, o None si no existe
+        """
+        with self._conectar() as conexion:
+            fila = conexion.execute(
+                "SELECT i.metadata AS imagen, s.metadata AS sesion FROM imagenes i "
+                "JOIN sesiones s ON s.session_id = i.session_id WHERE i.id = ?",
+                (image_id,)
+            ).fetchone()
+
+        if fila is None:
+            return None
+        return {"imagen": json.loads(fila["imagen"]), "sesion": json.loads(fila["sesion"])}
@@ -0,0 +1,142 @@
+"""
+Backends de inferencia optimizados para CPU (ONNX Runtime y OpenVINO vía optimum)
+
+En CPU, los pipelines de PyTorch en float32 son la opción más lenta. Estos
+backends exportan una sola vez el text encoder, la UNet y el VAE del modelo al
+formato del runtime, guardan el resultado en <cache_dir>/<backend>/<modelo> y lo
+cargan desde ahí en las ejecuciones siguientes. El pipeline resultante se usa
+igual que uno de diffusers (misma llamada, scheduler y `.images`).
+
+La aleatoriedad se entrega como latentes iniciales ya generados (ver
+argumentos_aleatorios): según la versión, los pipelines de optimum esperan un
+np.random.RandomState o aceptan un solo torch.Generator, pero todos aceptan latents.
+
+Dependencias opcionales (versiones en requirements.txt):
+    pip install "optimum[onnxruntime]<2.0"   # backend onnx
+    pip install "optimum[openvino]<2.0"      # backend openvino
+"""
+
+from pathlib import Path
+
+BACKENDS = ["pytorch", "onnx", "openvino"]
+
+
+def directorio_exportacion(cache_dir, backend, modelo_id):
+    """
+    Retorna la carpeta donde se guarda el modelo exportado para un backend
+
+    Args:
+        cache_dir (str): Directorio de modelos del generador
+        backend (str): 'onnx' u 'openvino'
+        modelo_id (str): ID del modelo en Hugging Face o ruta local
+
+    Returns:
+        Path: Carpeta del modelo exportado
+    """
+    return Path(cache_dir) / backend / modelo_id.replace("/", "--")
+
+
+def clases_pipeline(backend):
+    """
+    Importa las clases de pipeline del backend (solo se importan al usarlo)
+
+    Returns:
+        tuple: (clase para SD 1.5/2.x, clase para SDXL)
+    """
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTStableDiffusionPipeline, ORTStableDiffusionXLPipeline
+        return ORTStableDiffusionPipeline, ORTStableDiffusionXLPipeline
+    if backend == "openvino":
+        from optimum.intel import OVStableDiffusionPipeline, OVStableDiffusionXLPipeline
+        return OVStableDiffusionPipeline, OVStableDiffusionXLPipeline
+    raise ValueError(f"Backend no soportado: {backend}. Opciones: {', '.join(BACKENDS[1:])}")
+
+
+def backend_disponible(backend):
+    """
+    Indica si las dependencias de un backend están instaladas
+    """
+    if backend == "pytorch":
+        return True
+    try:
+        clases_pipeline(backend)
+        return True
+    except ImportError:
+        return False
+
+
+def argumentos_aleatorios(pipeline, backend, semillas, width, height):
+    """
+    Construye la aleatoriedad de una llamada al pipeline con una semilla por imagen
+
+    Con PyTorch se pasa un torch.Generator por imagen. A los pipelines de optimum se les
+    pasan los latentes iniciales generados con esos mismos generadores (el ruido que
+    diffusers habría sacado de ellos): así cada imagen sigue siendo reproducible por su
+    semilla aunque se genere en lote, en cualquier versión de optimum.
+
+    Args:
+        pipeline: Pipeline de diffusers u optimum
+        backend (str): 'pytorch', 'onnx' u 'openvino'
+        semillas (list): Una semilla por imagen de la llamada
+        width (int): Ancho de imagen
+        height (int): Alto de imagen
+
+    Returns:
+        dict: {"generator": [...]} o {"latents": ...} para la llamada al pipeline
+    """
+    import torch
+
+    generadores = [torch.Generator(device="cpu").manual_seed(semilla) for semilla in semillas]
+    if backend == "pytorch":
+        return {"generator": generadores}
+
+    # SD 1.x/2.x y SDXL: 4 canales latentes y un VAE que reduce 8x
+    config = getattr(pipeline.unet, "config", None) or {}
+    canales = config.get("in_channels", 4) if isinstance(config, dict) else getattr(config, "in_channels", 4)
+    escala = getattr(pipeline, "vae_scale_factor", 8)
+    latentes = torch.cat([
+        torch.randn((1, canales, height // escala, width // escala), generator=generador)
+        for generador in generadores
+    ])
+
+    # Los pipelines de optimum anteriores a la reescritura sobre diffusers trabajan con numpy
+    from diffusers import DiffusionPipeline
+    if not isinstance(pipeline, DiffusionPipeline):
+        latentes = latentes.numpy()
+    return {"latents": latentes}
+
+
+def cargar_pipeline(backend, modelo_id, cache_dir):
+    """
+    Carga un pipeline exportado al backend, exportándolo primero si no está en disco
+
+    Args:
+        backend (str): 'onnx' u 'openvino'
+        modelo_id (str): ID del modelo en Hugging Face o ruta local
+        cache_dir (str): Directorio de modelos del generador
+
+    Returns:
+        Pipeline del backend listo para generar
+    """
+    clase_sd, clase_sdxl = clases_pipeline(backend)
+    pipeline_class = clase_sdxl if "xl" in modelo_id.lower() else clase_sd
+
+    opciones = {}
+    if backend == "onnx":
+        opciones["provider"] = "CPUExecutionProvider"
+
+    destino = directorio_exportacion(cache_dir, backend, modelo_id)
+    if (destino / "model_index.json").exists():
+        print(f"Cargando modelo exportado ({backend}): {destino}")
+        return pipeline_class.from_pretrained(destino, **opciones)
+
+    # La exportación tarda minutos y ocupa varios GB: se hace una sola vez por modelo
+    print(f"Exportando modelo a {backend} (solo la primera vez): {modelo_id}")
+    pipeline = pipeline_class.from_pretrained(modelo_id, export=True, cache_dir=cache_dir, **opciones)
+    try:
+        pipeline.save_pretrained(destino)
+        print(f"Modelo exportado guardado en: {destino}")
+    except Exception as e:
+        print(f"WARNING: No se pudo guardar el modelo exportado, se exportará de nuevo la próxima vez: {e}")
+
+    return pipeline
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Benchmarks del generador: backends de inferencia y matriz de parámetros
+
+Comparación de backends (modo por defecto): para cada backend genera la misma imagen
+(mismo prompt y semilla) con N y 2N pasos; la diferencia de tiempo dividida por N es
+la latencia de un paso de denoising, sin el costo fijo del text encoder y del VAE.
+Se informan medianas de varias repeticiones y la aceleración respecto a PyTorch.
+
+Matriz (--matriz): corre generar_imagenes completo (sin caches) para cada combinación
+de resolución, pasos y variaciones, y toma del perfil de tiempos de cada sesión la
+latencia por paso, la decodificación del VAE y la codificación de las imágenes, junto
+con el pico de memoria (RSS) y las imágenes por minuto.
+
+Con --tiny se usa un pipeline con la arquitectura de SD 1.5 reducida y pesos
+aleatorios, creado localmente: corre sin red ni modelos descargados y en segundos,
+para comparar el código entre commits (las imágenes son ruido). Las salidas del
+generador (imágenes, metadata, caches) van a un directorio de trabajo temporal.
+
+Uso:
+python benchmark.py --backends pytorch onnx openvino --width 512 --height 512 --pasos 10
+python benchmark.py --matriz --tiny --resoluciones 256x256,512x512 --pasos-matriz 4 8 --variaciones 1 2 --salida base.json
+python benchmark.py --matriz --tiny --referencia base.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from backend_inferencia import BACKENDS, argumentos_aleatorios, backend_disponible
+from generar_cli import parsear_resoluciones
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROMPT = "professional product photography of a chocolate bar, studio lighting, white background"
+
+# Carpeta (dentro de --cache-dir) del pipeline de pesos aleatorios de --tiny
+MODELO_TINY = "benchmark/sd-aleatorio-mini"
+
+
+def crear_modelo_tiny(destino):
+    """
+    Crea (una sola vez) un pipeline de SD 1.5 reducido con pesos aleatorios, sin descargas
+
+    Mantiene la estructura del modelo real (UNet con bloques de atención cruzada, VAE con
+    factor de escala 8, text encoder CLIP y scheduler PNDM) con pocos canales y capas.
+
+    Args:
+        destino (Path): Carpeta donde guardar el pipeline
+
+    Returns:
+        Path: Carpeta del pipeline, cargable con from_pretrained
+    """
+    if (destino / "model_index.json").exists():
+        return destino
+
+    import torch
+    from diffusers import AutoencoderKL, PNDMScheduler, StableDiffusionPipeline, UNet2DConditionModel
+    from transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
+
+    print(f"Creando pipeline de pesos aleatorios en: {destino}", file=sys.stderr)
+    torch.manual_seed(0)
+
+    unet = UNet2DConditionModel(
+        sample_size=64,
+        block_out_channels=(32, 64),
+        layers_per_block=2,
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+        up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+        cross_attention_dim=32,
+        attention_head_dim=8
+    )
+    vae = AutoencoderKL(
+        block_out_channels=(32, 32, 64, 64),
+        down_block_types=("DownEncoderBlock2D",) * 4,
+        up_block_types=("UpDecoderBlock2D",) * 4,
+        latent_channels=4,
+        norm_num_groups=16
+    )
+    text_encoder = CLIPTextModel(CLIPTextConfig(
+        vocab_size=1000,
+        hidden_size=32,
+        intermediate_size=37,
+        num_attention_heads=4,
+        num_hidden_layers=5,
+        max_position_embeddings=77,
+        bos_token_id=0,
+        eos_token_id=2,
+        pad_token_id=1
+    ))
+
+    # Tokenizer BPE sin merges: un token por carácter, suficiente para medir
+    carpeta_tokenizer = Path(tempfile.mkdtemp(prefix="tokenizer_"))
+    # Los 256 bytes como caracteres visibles, igual que el BPE a nivel de bytes de CLIP/GPT-2
+    visibles = [*range(ord("!"), ord("~") + 1), *range(ord("¡"), ord("¬") + 1), *range(ord("®"), ord("ÿ") + 1)]
+    resto = [byte for byte in range(256) if byte not in visibles]
+    caracteres = [chr(byte) for byte in visibles] + [chr(256 + n) for n in range(len(resto))]
+    vocabulario = {"<|startoftext|>": 0, "<|padding|>": 1, "<|endoftext|>": 2}
+    for token in caracteres + [f"{caracter}</w>" for caracter in caracteres]:
+        vocabulario[token] = len(vocabulario)
+    (carpeta_tokenizer / "vocab.json").write_text(json.dumps(vocabulario), encoding="utf-8")
+    (carpeta_tokenizer / "merges.txt").write_text("#version: 0.2\n", encoding="utf-8")
+    tokenizer = CLIPTokenizer(
+        str(carpeta_tokenizer / "vocab.json"), str(carpeta_tokenizer / "merges.txt"),
+        pad_token="<|padding|>", model_max_length=77
+    )
+
+    scheduler = PNDMScheduler(
+        beta_start=0.00085, beta_end=0.012, beta_schedule="scaled_linear", skip_prk_steps=True
+    )
+
+    pipeline = StableDiffusionPipeline(
+        vae=vae, text_encoder=text_encoder, tokenizer=tokenizer, unet=unet, scheduler=scheduler,
+        safety_checker=None, feature_extractor=None, requires_safety_checker=False
+    )
+    pipeline.save_pretrained(destino, safe_serialization=True)
+    return destino
+
+
+def memoria_pico_mb():
+    """
+    Retorna el pico de memoria residente del proceso hasta ahora (None si no se puede medir)
+    """
+    if resource is not None:
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux informa KB, macOS bytes
+        return round(pico / 1024**2 if sys.platform == "darwin" else pico / 1024, 1)
+    try:
+        import psutil
+        memoria = psutil.Process().memory_info()
+        return round(getattr(memoria, "peak_wset", memoria.rss) / 1024**2, 1)
+    except ImportError:
+        return None
+
+
+def commit_actual():
+    """
+    Retorna el commit de git del código medido (None fuera de un repositorio)
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def medir(generador, pasos, width, height, semilla):
+    """
+    Genera una imagen llamando directamente al pipeline (sin caches) y mide su duración
+
+    Returns:
+        float: Segundos de la llamada al pipeline
+    """
+    inicio = time.perf_counter()
+    generador.pipeline(
+        prompt=PROMPT,
+        width=width,
+        height=height,
+        num_inference_steps=pasos,
+        guidance_scale=7.5,
+        num_images_per_prompt=1,
+        **argumentos_aleatorios(generador.pipeline, generador.backend, [semilla], width, height)
+    )
+    return time.perf_counter() - inicio
+
+
+def cargar_generador(args, backend="pytorch"):
+    """
+    Crea el generador del benchmark y mide cuánto tarda en cargar el modelo
+
+    Returns:
+        tuple: (generador, segundos de carga)
+    """
+    from image_generator import GeneradorImagenesConsumibles
+
+    inicio = time.perf_counter()
+    generador = GeneradorImagenesConsumibles(modelo=args.modelo, cache_dir=args.cache_dir, backend=backend)
+    return generador, time.perf_counter() - inicio
+
+
+def medir_backend(backend, args):
+    """
+    Carga el modelo con un backend y mide carga, latencia total y latencia por paso
+
+    Returns:
+        dict: Resultados del backend
+    """
+    generador, tiempo_carga = cargar_generador(args, backend)
+
+    # Calentamiento: la primera llamada inicializa kernels y memoria del runtime
+    medir(generador, 2, args.width, args.height, args.semilla)
+
+    tiempos_n, tiempos_2n = [], []
+    for _ in range(args.repeticiones):
+        tiempos_n.append(medir(generador, args.pasos, args.width, args.height, args.semilla))
+        tiempos_2n.append(medir(generador, args.pasos * 2, args.width, args.height, args.semilla))
+
+    mediana_n = statistics.median(tiempos_n)
+    mediana_2n = statistics.median(tiempos_2n)
+
+    resultado = {
+        "backend": generador.backend,
+        "dispositivo": generador.device,
+        "tiempo_carga_s": round(tiempo_carga, 2),
+        "latencia_total_s": round(mediana_n, 3),
+        "latencia_por_paso_ms": round((mediana_2n - mediana_n) / args.pasos * 1000, 1),
+        "repeticiones": args.repeticiones
+    }
+
+    del generador
+    return resultado
+
+
+def comparar_backends(args):
+    """
+    Mide cada backend pedido y calcula la aceleración de cada uno respecto a PyTorch
+
+    Returns:
+        list: Resultados por backend
+    """
+    resultados = []
+    for backend in args.backends:
+        if not backend_disponible(backend):
+            print(f"WARNING: Backend {backend} no instalado, se omite", file=sys.stderr)
+            continue
+
+        print(f"\n=== Backend: {backend} ===", file=sys.stderr)
+        try:
+            resultados.append(medir_backend(backend, args))
+        except Exception as e:
+            print(f"ERROR: Falló el benchmark de {backend}: {e}", file=sys.stderr)
+            resultados.append({"backend": backend, "error": str(e)})
+
+    # Aceleración respecto a PyTorch
+    referencia = next((r for r in resultados if r.get("backend") == "pytorch" and "error" not in r), None)
+    if referencia:
+        for resultado in resultados:
+            if "error" not in resultado and resultado["latencia_por_paso_ms"] > 0:
+                resultado["aceleracion_vs_pytorch"] = round(
+                    referencia["latencia_por_paso_ms"] / resultado["latencia_por_paso_ms"], 2
+                )
+
+    print("\nRESULTADOS:", file=sys.stderr)
+    for resultado in resultados:
+        if "error" in resultado:
+            print(f"   {resultado['backend']:>9}: error ({resultado['error']})", file=sys.stderr)
+        else:
+            aceleracion = resultado.get("aceleracion_vs_pytorch")
+            print(
+                f"   {resultado['backend']:>9}: {resultado['latencia_por_paso_ms']} ms/paso, "
+                f"{resultado['latencia_total_s']} s/imagen ({args.pasos} pasos)"
+                + (f", x{aceleracion} vs pytorch" if aceleracion else ""),
+                file=sys.stderr
+            )
+
+    return resultados
+
+
+def medir_combinacion(generador, width, height, pasos, variaciones, args):
+    """
+    Corre generar_imagenes sin caches para una combinación y resume su perfil de tiempos
+
+    Returns:
+        dict: Medianas de las repeticiones de la combinación
+    """
+    sesiones = []
+    for repeticion in range(args.repeticiones):
+        inicio = time.perf_counter()
+        sesion = generador.generar_imagenes(
+            nombre_producto="Barra de chocolate",
+            descripcion="barra de chocolate amargo con envoltorio dorado",
+            num_variaciones=variaciones,
+            width=width,
+            height=height,
+            pasos_inferencia=pasos,
+            semillas=[args.semilla + repeticion * variaciones + i for i in range(variaciones)],
+            usar_cache=False
+        )
+        sesiones.append((time.perf_counter() - inicio, sesion))
+
+    def mediana(valores):
+        valores = [valor for valor in valores if valor is not None]
+        return round(statistics.median(valores), 1) if valores else None
+
+    imagenes = [img for _, sesion in sesiones for img in sesion["imagenes"] if img.get("exito")]
+    perfiles = [img.get("perfil_tiempos", {}) for img in imagenes]
+    segundos = statistics.median(duracion for duracion, _ in sesiones)
+    exitosas = statistics.median(sesion["resultados"]["exitosas"] for _, sesion in sesiones)
+
+    return {
+        "width": width,
+        "height": height,
+        "pasos": pasos,
+        "variaciones": variaciones,
+        "tamano_lote": sesiones[0][1]["parametros"]["tamano_lote"],
+        "exitosas": exitosas,
+        "tiempo_total_s": round(segundos, 3),
+        "imagenes_por_minuto": round(exitosas / segundos * 60, 2) if segundos else None,
+        "paso_ms": mediana(perfil.get("paso_ms", {}).get("media") for perfil in perfiles),
+        "decodificacion_vae_ms": mediana(perfil.get("decodificacion_vae_ms") for perfil in perfiles),
+        "codificacion_imagen_ms": mediana(perfil.get("codificacion_ms") for perfil in perfiles),
+        "guardado_ms": mediana(perfil.get("guardado_ms") for perfil in perfiles),
+        "codificacion_prompt_ms": mediana(sesion["perfil_tiempos"]["codificacion_prompt_ms"] for _, sesion in sesiones),
+        "rss_pico_mb": memoria_pico_mb(),
+        "repeticiones": args.repeticiones
+    }
+
+
+def medir_matriz(args):
+    """
+    Carga el modelo una vez y mide cada combinación de resolución, pasos y variaciones
+
+    Returns:
+        dict: Carga del modelo y resultados por combinación
+    """
+    generador, tiempo_carga = cargar_generador(args)
+    carga = {
+        "tiempo_carga_s": round(tiempo_carga, 2),
+        "rss_pico_mb": memoria_pico_mb(),
+        "dispositivo": generador.device,
+        "precision": generador.precision
+    }
+
+    # Calentamiento: la primera llamada inicializa kernels y asignadores de memoria
+    generador.calentar(args.resoluciones[:1], pasos=1)
+
+    resultados = []
+    for width, height in args.resoluciones:
+        for pasos in args.pasos_matriz:
+            for variaciones in args.variaciones:
+                print(f"\n=== {width}x{height}, {pasos} pasos, {variaciones} variaciones ===", file=sys.stderr)
+                try:
+                    resultados.append(medir_combinacion(generador, width, height, pasos, variaciones, args))
+                except Exception as e:
+                    print(f"ERROR: Falló la combinación: {e}", file=sys.stderr)
+                    resultados.append({
+                        "width": width, "height": height, "pasos": pasos, "variaciones": variaciones,
+                        "error": str(e)
+                    })
+
+    generador.pool_postproceso.shutdown()
+    return {"carga": carga, "resultados": resultados}
+
+
+def comparar_con_referencia(resultados, archivo_referencia):
+    """
+    Agrega a cada combinación el cambio porcentual respecto a un informe anterior de --matriz
+
+    Args:
+        resultados (list): Resultados de la matriz actual
+        archivo_referencia (str): Informe JSON guardado con --salida
+    """
+    with open(archivo_referencia, encoding="utf-8") as f:
+        referencia = json.load(f)
+
+    clave = lambda r: (r["width"], r["height"], r["pasos"], r["variaciones"])
+    anteriores = {clave(r): r for r in referencia.get("resultados", []) if "error" not in r}
+
+    for resultado in resultados:
+        anterior = anteriores.get(clave(resultado))
+        if "error" in resultado or anterior is None:
+            continue
+        resultado["vs_referencia"] = {
+            metrica: round((resultado[metrica] - anterior[metrica]) / anterior[metrica] * 100, 1)
+            for metrica in ("imagenes_por_minuto", "paso_ms", "decodificacion_vae_ms", "codificacion_imagen_ms")
+            if resultado.get(metrica) is not None and anterior.get(metrica)
+        }
+
+
+def mostrar_matriz(informe):
+    """
+    Imprime en stderr una tabla con los resultados de la matriz
+    """
+    print(f"\nRESULTADOS (carga: {informe['carga']['tiempo_carga_s']} s):", file=sys.stderr)
+    for resultado in informe["resultados"]:
+        combinacion = f"{resultado['width']}x{resultado['height']} {resultado['pasos']:>3}p {resultado['variaciones']}v"
+        if "error" in resultado:
+            print(f"   {combinacion}: error ({resultado['error']})", file=sys.stderr)
+            continue
+        cambio = resultado.get("vs_referencia", {}).get("imagenes_por_minuto")
+        print(
+            f"   {combinacion}: {resultado['imagenes_por_minuto']} img/min, {resultado['paso_ms']} ms/paso, "
+            f"VAE {resultado['decodificacion_vae_ms']} ms, codificación {resultado['codificacion_imagen_ms']} ms, "
+            f"RSS pico {resultado['rss_pico_mb']} MB"
+            + (f" ({cambio:+}% img/min vs referencia)" if cambio is not None else ""),
+            file=sys.stderr
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del generador: backends de inferencia y matriz de parámetros")
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=BACKENDS,
+                        help='Backends a comparar (default: todos los instalados)')
+    parser.add_argument('--modelo', type=str, default="runwayml/stable-diffusion-v1-5",
+                        help='Modelo de Stable Diffusion (ID de Hugging Face o alias)')
+    parser.add_argument('--tiny', action='store_true',
+                        help='Usar un pipeline de SD reducido con pesos aleatorios (sin red ni descargas)')
+    parser.add_argument('--cache-dir', type=str, default="./modelos",
+                        help='Directorio de modelos (default: ./modelos)')
+    parser.add_argument('--width', type=int, default=512, help='Ancho de imagen (default: 512)')
+    parser.add_argument('--height', type=int, default=512, help='Alto de imagen (default: 512)')
+    parser.add_argument('--pasos', type=int, default=10, help='Pasos N (se mide N y 2N, default: 10)')
+    parser.add_argument('--matriz', action='store_true',
+                        help='Medir generar_imagenes para cada combinación de resolución, pasos y variaciones')
+    parser.add_argument('--resoluciones', type=str, default="512x512",
+                        help='Resoluciones de la matriz, ANCHOxALTO separadas por comas (default: 512x512)')
+    parser.add_argument('--pasos-matriz', nargs='+', type=int, default=[10, 20],
+                        help='Pasos de la matriz (default: 10 20)')
+    parser.add_argument('--variaciones', nargs='+', type=int, default=[1, 4],
+                        help='Variaciones por sesión de la matriz (default: 1 4)')
+    parser.add_argument('--repeticiones', type=int, default=3, help='Repeticiones por medición (default: 3)')
+    parser.add_argument('--semilla', type=int, default=42, help='Semilla fija (default: 42)')
+    parser.add_argument('--directorio-trabajo', type=str, default=None,
+                        help='Carpeta para imágenes, metadata y caches del generador (default: una temporal)')
+    parser.add_argument('--referencia', type=str, default=None,
+                        help='Informe JSON anterior de --matriz contra el que comparar')
+    parser.add_argument('--salida', type=str, default=None, help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    try:
+        args.resoluciones = parsear_resoluciones(args.resoluciones) or [(args.width, args.height)]
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Rutas del llamador antes de cambiar al directorio de trabajo
+    args.cache_dir = str(Path(args.cache_dir).absolute())
+    if args.salida:
+        args.salida = str(Path(args.salida).absolute())
+    if args.referencia:
+        args.referencia = str(Path(args.referencia).absolute())
+
+    if args.tiny:
+        # Todo es local: que ninguna librería intente consultar el Hub
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        args.modelo = str(crear_modelo_tiny(Path(args.cache_dir) / MODELO_TINY))
+
+    # El generador escribe imágenes, metadata y caches en el directorio actual
+    directorio_trabajo = Path(args.directorio_trabajo or tempfile.mkdtemp(prefix="benchmark_"))
+    directorio_trabajo.mkdir(parents=True, exist_ok=True)
+    os.chdir(directorio_trabajo)
+    print(f"Directorio de trabajo: {directorio_trabajo.absolute()}", file=sys.stderr)
+
+    informe = {
+        "timestamp": datetime.now().isoformat(),
+        "commit": commit_actual(),
+        "modelo": "tiny" if args.tiny else args.modelo,
+        "nucleos": os.cpu_count()
+    }
+
+    if args.matriz:
+        informe.update(medir_matriz(args))
+        if args.referencia:
+            comparar_con_referencia(informe["resultados"], args.referencia)
+        mostrar_matriz(informe)
+    else:
+        informe["dimensiones"] = {"width": args.width, "height": args.height}
+        informe["pasos"] = args.pasos
+        informe["resultados"] = comparar_backends(args)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+
+    print(json.dumps(informe, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
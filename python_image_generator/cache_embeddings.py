@@ -0,0 +1,142 @@
+"""
+Cache LRU de embeddings de prompts para el Generador de Imágenes con IA
+
+Los text encoders se ejecutan una sola vez por (modelo, prompt): el prompt positivo
+se repite en todas las variaciones de una sesión y el negativo es constante entre
+solicitudes. Opcionalmente la cache se persiste en disco para sobrevivir reinicios
+del worker. torch se importa solo al leer o escribir la cache en disco.
+"""
+
+import os
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+
+
+class CacheEmbeddings:
+    def __init__(self, max_entradas=64, directorio=None, max_archivos=512):
+        """
+        Inicializa la cache de embeddings
+
+        Args:
+            max_entradas (int): Máximo de prompts guardados en memoria
+            directorio (str): Carpeta para persistir embeddings en disco (None = solo memoria)
+            max_archivos (int): Máximo de archivos conservados en disco
+        """
+        self.max_entradas = max_entradas
+        self.max_archivos = max_archivos
+        self.entradas = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+
+        self.directorio = Path(directorio) if directorio else None
+        if self.directorio:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+
+    def _clave(self, modelo_id, prompt):
+        """
+        Calcula la clave de la cache para un modelo y un prompt
+
+        Returns:
+            str: Hash SHA-256 de modelo + prompt
+        """
+        return hashlib.sha256(f"{modelo_id}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def obtener(self, modelo_id, prompt):
+        """
+        Busca los embeddings de un prompt en memoria y, si no están, en disco
+
+        Args:
+            modelo_id (str): Modelo cuyos text encoders produjeron los embeddings
+            prompt (str): Texto del prompt
+
+        Returns:
+            dict: Tensores de embeddings o None si no están en cache
+        """
+        clave = self._clave(modelo_id, prompt)
+
+        if clave in self.entradas:
+            self.entradas.move_to_end(clave)
+            self.aciertos += 1
+            return self.entradas[clave]
+
+        if self.directorio:
+            archivo = self.directorio / f"{clave}.pt"
+            if archivo.exists():
+                try:
+                    import torch
+
+                    embeddings = torch.load(archivo, map_location="cpu", weights_only=True)
+                    os.utime(archivo)
+                    self._insertar(clave, embeddings)
+                    self.aciertos += 1
+                    return embeddings
+                except Exception as e:
+                    print(f"WARNING: No se pudo leer embedding en cache {archivo.name}: {e}")
+
+        self.fallos += 1
+        return None
+
+    def guardar(self, modelo_id, prompt, embeddings):
+        """
+        Guarda los embeddings de un prompt en memoria (y en disco si está habilitado)
+
+        Args:
+            modelo_id (str): Modelo cuyos text encoders produjeron los embeddings
+            prompt (str): Texto del prompt
+            embeddings (dict): Tensores de embeddings
+        """
+        clave = self._clave(modelo_id, prompt)
+        self._insertar(clave, embeddings)
+
+        if self.directorio:
+            archivo = self.directorio / f"{clave}.pt"
+            temporal = archivo.with_suffix(".tmp")
+            try:
+                import torch
+
+                torch.save({nombre: tensor.detach().cpu() for nombre, tensor in embeddings.items()}, temporal)
+                os.replace(temporal, archivo)
+                self._podar_disco()
+            except Exception as e:
+                print(f"WARNING: No se pudo persistir embedding en cache: {e}")
+
+    def _insertar(self, clave, embeddings):
+        """
+        Inserta una entrada en memoria expulsando la menos usada si se supera el límite
+        """
+        self.entradas[clave] = embeddings
+        self.entradas.move_to_end(clave)
+        while len(self.entradas) > self.max_entradas:
+            self.entradas.popitem(last=False)
+
+    def _podar_disco(self):
+        """
+        Elimina los archivos usados hace más tiempo si se supera el límite en disco
+        """
+        archivos = sorted(self.directorio.glob("*.pt"), key=lambda archivo: archivo.stat().st_mtime)
+        for archivo in archivos[:max(0, len(archivos) - self.max_archivos)]:
+            try:
+                archivo.unlink()
+            except OSError:
+                pass
+
+    def estadisticas(self):
+        """
+        Retorna los contadores de uso de la cache
+
+        Returns:
+            dict: Aciertos, fallos y entradas en memoria
+        """
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "entradas": len(self.entradas),
+            "persistente": self.directorio is not None
+        }
+
+    def limpiar(self):
+        """
+        Vacía la cache en memoria (los archivos en disco se conservan)
+        """
+        self.entradas.clear()
@@ -0,0 +1,152 @@
+"""
+Cache de resultados direccionada por contenido para el Generador de Imágenes con IA
+
+Cada imagen generada se guarda bajo el hash de todo lo que determina su contenido
+(modelo, prompts, semilla, dimensiones, pasos, guidance y scheduler). Una solicitud
+repetida con los mismos parámetros devuelve los bytes guardados sin ejecutar la
+difusión. El tamaño total en disco se limita expulsando las entradas usadas hace más tiempo.
+
+guardar() se llama desde los hilos de post-proceso del generador: los contadores, la
+contabilidad del tamaño y la expulsión se hacen bajo un lock.
+"""
+
+import os
+import json
+import uuid
+import threading
+import hashlib
+from pathlib import Path
+
+
+class CacheResultados:
+    def __init__(self, directorio="cache_resultados", max_bytes=2 * 1024**3):
+        """
+        Inicializa la cache de resultados
+
+        Args:
+            directorio (str): Carpeta donde se guardan las imágenes en cache
+            max_bytes (int): Tamaño máximo total de la cache en disco
+        """
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+
+        # Total en disco, para no recorrer la cache en cada escritura
+        self.ocupado = sum(tamano for _, tamano, _ in self._entradas())
+
+    def clave(self, **parametros):
+        """
+        Calcula la clave de contenido para un conjunto de parámetros de generación
+
+        Args:
+            **parametros: Todo lo que determina la imagen resultante
+
+        Returns:
+            str: Hash SHA-256 de los parámetros serializados de forma canónica
+        """
+        canonico = json.dumps(parametros, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+
+    def _ruta(self, clave):
+        return self.directorio / f"{clave}.bin"
+
+    def _entradas(self):
+        """
+        Lista las entradas de la cache
+
+        Returns:
+            list: (fecha de último uso, tamaño, ruta) de cada entrada
+        """
+        entradas = []
+        for ruta in self.directorio.glob("*.bin"):
+            try:
+                info = ruta.stat()
+            except OSError:
+                continue
+            entradas.append((info.st_mtime, info.st_size, ruta))
+        return entradas
+
+    def obtener(self, clave):
+        """
+        Busca una imagen en la cache
+
+        Args:
+            clave (str): Clave calculada con clave()
+
+        Returns:
+            bytes: Imagen codificada o None si no está en cache
+        """
+        ruta = self._ruta(clave)
+        try:
+            datos = ruta.read_bytes()
+        except OSError:
+            with self._lock:
+                self.fallos += 1
+            return None
+
+        # Marcar como usada recientemente para la expulsión LRU
+        try:
+            os.utime(ruta)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.aciertos += 1
+        return datos
+
+    def guardar(self, clave, datos):
+        """
+        Guarda una imagen codificada en la cache
+
+        Args:
+            clave (str): Clave calculada con clave()
+            datos (bytes): Imagen codificada
+        """
+        ruta = self._ruta(clave)
+        # Temporal único: otro hilo o proceso puede estar guardando la misma clave
+        temporal = ruta.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            temporal.write_bytes(datos)
+            with self._lock:
+                try:
+                    anterior = ruta.stat().st_size
+                except OSError:
+                    anterior = 0
+                os.replace(temporal, ruta)
+                self.ocupado += len(datos) - anterior
+                self._expulsar()
+        except OSError as e:
+            print(f"WARNING: No se pudo guardar el resultado en cache: {e}")
+            temporal.unlink(missing_ok=True)
+
+    def _expulsar(self):
+        """
+        Elimina las entradas usadas hace más tiempo hasta quedar dentro de max_bytes (con el lock tomado)
+        """
+        if self.ocupado <= self.max_bytes:
+            return
+
+        # Recalcular desde el disco: otros procesos (lotes en paralelo) también escriben
+        entradas = self._entradas()
+        self.ocupado = sum(tamano for _, tamano, _ in entradas)
+        for _, tamano, ruta in sorted(entradas):
+            if self.ocupado <= self.max_bytes:
+                break
+            try:
+                ruta.unlink()
+                self.ocupado -= tamano
+            except OSError:
+                continue
+
+    def estadisticas(self):
+        """
+        Retorna los contadores de uso de la cache
+
+        Returns:
+            dict: Aciertos y fallos acumulados
+        """
+        with self._lock:
+            return {"aciertos": self.aciertos, "fallos": self.fallos}
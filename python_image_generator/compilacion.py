@@ -0,0 +1,112 @@
+"""
+Modo compilado: torch.compile, channels-last y atención SDPA para la UNet y el VAE
+
+Compilar la UNet y el decodificador del VAE con torch.compile (inductor) elimina
+el overhead de Python por operación y fusiona kernels; con channels-last las
+convoluciones usan el layout que prefieren oneDNN y cuDNN. La primera llamada con
+cada resolución paga la compilación, por eso el worker hace un calentamiento con
+las resoluciones habituales antes de anunciarse listo.
+
+Los artefactos de inductor se guardan en <cache_dir>/compilacion (cache de grafos
+FX y, con torch >= 2.7, un archivo con todos los artefactos) para que el siguiente
+arranque los reutilice en lugar de volver a compilar.
+
+torch se importa dentro de las funciones, después de fijar las variables de
+entorno de inductor en configurar_cache().
+"""
+
+import os
+from pathlib import Path
+
+# Resoluciones que se compilan en el calentamiento si no se indican otras
+RESOLUCIONES_CALENTAMIENTO = [(768, 768), (512, 512)]
+
+ARCHIVO_ARTEFACTOS = "artefactos.bin"
+
+
+def configurar_cache(directorio):
+    """
+    Apunta la cache de inductor a un directorio persistente y carga los artefactos guardados
+
+    Debe llamarse antes de la primera compilación.
+
+    Args:
+        directorio (str): Carpeta de la cache de compilación
+    """
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(directorio.absolute() / "inductor"))
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+    os.environ.setdefault("TORCHINDUCTOR_AUTOGRAD_CACHE", "1")
+
+    import torch
+
+    # Una recompilación por resolución y tamaño de lote: el límite por defecto (8) se queda corto
+    torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit, 32)
+
+    archivo = directorio / ARCHIVO_ARTEFACTOS
+    if archivo.exists() and hasattr(torch.compiler, "load_cache_artifacts"):
+        try:
+            torch.compiler.load_cache_artifacts(archivo.read_bytes())
+            print(f"Artefactos de compilación cargados: {archivo}")
+        except Exception as e:
+            print(f"WARNING: No se pudieron cargar los artefactos de compilación: {e}")
+
+
+def guardar_artefactos(directorio):
+    """
+    Guarda en un solo archivo los artefactos compilados hasta ahora (torch >= 2.7)
+
+    Args:
+        directorio (str): Carpeta de la cache de compilación
+    """
+    import torch
+
+    if not hasattr(torch.compiler, "save_cache_artifacts"):
+        return
+    try:
+        artefactos = torch.compiler.save_cache_artifacts()
+        if artefactos is None:
+            return
+        archivo = Path(directorio) / ARCHIVO_ARTEFACTOS
+        temporal = archivo.with_suffix(".tmp")
+        temporal.write_bytes(artefactos[0])
+        os.replace(temporal, archivo)
+        print(f"Artefactos de compilación guardados: {archivo}")
+    except Exception as e:
+        print(f"WARNING: No se pudieron guardar los artefactos de compilación: {e}")
+
+
+def optimizar_pipeline(pipeline, compilar=True):
+    """
+    Aplica channels-last, atención SDPA y (opcionalmente) torch.compile a la UNet y al VAE
+
+    Args:
+        pipeline: Pipeline de diffusers con PyTorch
+        compilar (bool): Si False, solo aplica channels-last y SDPA
+
+    Returns:
+        Pipeline optimizado (la compilación ocurre en la primera llamada)
+    """
+    import torch
+    from diffusers.models.attention_processor import AttnProcessor2_0
+
+    pipeline.unet.to(memory_format=torch.channels_last)
+    pipeline.vae.to(memory_format=torch.channels_last)
+    print("Channels-last habilitado (UNet y VAE)")
+
+    # Atención fusionada de PyTorch (scaled_dot_product_attention)
+    try:
+        pipeline.unet.set_attn_processor(AttnProcessor2_0())
+        pipeline.vae.set_attn_processor(AttnProcessor2_0())
+        print("Atención SDPA habilitada")
+    except Exception as e:
+        print(f"WARNING: No se pudo activar la atención SDPA: {e}")
+
+    if compilar:
+        pipeline.unet = torch.compile(pipeline.unet)
+        pipeline.vae.decode = torch.compile(pipeline.vae.decode)
+        print("UNet y decodificador VAE marcados para compilación (torch.compile)")
+
+    return pipeline
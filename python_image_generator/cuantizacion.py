@@ -0,0 +1,157 @@
+"""
+Cuantización int8 dinámica de los pipelines en CPU
+
+Las capas lineales de la UNet (proyecciones de atención y feed-forward) y de los
+text encoders pasan a int8 con torch.ao.quantization.quantize_dynamic: los pesos
+ocupan ~4x menos y los matmuls usan los kernels int8 de la CPU. Las convoluciones
+y el VAE siguen en float32.
+
+Los state_dict de los componentes cuantizados se guardan en <cache_dir>/int8/<modelo>/
+para que los arranques siguientes no lean los pesos float32 del modelo: la estructura
+se reconstruye desde su configuración, se cuantiza con pesos aleatorios y recibe los
+pesos int8 con torch.load(weights_only=True), sin ejecutar código del archivo. El
+nombre incluye las versiones de torch y diffusers: el formato de los pesos empaquetados
+puede cambiar entre versiones.
+
+torch y diffusers se importan dentro de las funciones: el CLI usa CUANTIZACIONES
+para validar argumentos sin cargarlos.
+"""
+
+import importlib
+import os
+import uuid
+from pathlib import Path
+
+CUANTIZACIONES = ["int8"]
+
+
+def componentes_cuantizables(es_sdxl):
+    """
+    Retorna los componentes del pipeline que se cuantizan
+    """
+    return ("unet", "text_encoder", "text_encoder_2") if es_sdxl else ("unet", "text_encoder")
+
+
+def ruta_componente(cache_dir, modelo_id, componente):
+    """
+    Retorna el archivo de un componente cuantizado
+
+    Args:
+        cache_dir (str): Directorio de modelos del generador
+        modelo_id (str): ID del modelo en Hugging Face o ruta local
+        componente (str): Nombre del componente en el pipeline (unet, text_encoder, ...)
+
+    Returns:
+        Path: Ruta del state_dict del componente cuantizado
+    """
+    import diffusers
+    import torch
+
+    return (Path(cache_dir) / "int8" / modelo_id.replace("/", "--") /
+            f"{componente}-torch{torch.__version__}-diffusers{diffusers.__version__}.pt")
+
+
+def cuantizar_modulo(modulo):
+    """
+    Cuantiza a int8 (en el lugar) las capas lineales de un módulo
+    """
+    import torch
+
+    # inplace: evita tener a la vez la copia float32 y la int8
+    return torch.ao.quantization.quantize_dynamic(
+        modulo, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+
+
+def estructura_componente(cache_dir, modelo_id, componente, dtype):
+    """
+    Construye un componente del modelo desde su configuración, sin leer sus pesos
+
+    Args:
+        cache_dir (str): Directorio de modelos del generador
+        modelo_id (str): ID del modelo
+        componente (str): Nombre del componente en el pipeline
+        dtype (torch.dtype): Precisión del resto del pipeline
+
+    Returns:
+        Módulo con pesos aleatorios y la misma estructura que el del modelo
+    """
+    from diffusers import DiffusionPipeline
+
+    # model_index.json: componente -> [biblioteca, clase]
+    biblioteca, nombre_clase = DiffusionPipeline.load_config(modelo_id, cache_dir=cache_dir)[componente]
+    clase = getattr(importlib.import_module(biblioteca), nombre_clase)
+    if biblioteca == "diffusers":
+        modulo = clase.from_config(clase.load_config(modelo_id, subfolder=componente, cache_dir=cache_dir))
+    else:
+        modulo = clase(clase.config_class.from_pretrained(modelo_id, subfolder=componente, cache_dir=cache_dir))
+    return modulo.to(dtype).eval()
+
+
+def cargar_componentes(cache_dir, modelo_id, es_sdxl, dtype):
+    """
+    Carga los componentes ya cuantizados de un modelo
+
+    Args:
+        cache_dir (str): Directorio de modelos del generador
+        modelo_id (str): ID del modelo
+        es_sdxl (bool): Si el pipeline es SDXL (tiene un segundo text encoder)
+        dtype (torch.dtype): Precisión con la que se carga el resto del pipeline
+
+    Returns:
+        dict: Nombre del componente -> módulo cuantizado (solo los que están en disco)
+    """
+    import torch
+
+    componentes = {}
+    for componente in componentes_cuantizables(es_sdxl):
+        ruta = ruta_componente(cache_dir, modelo_id, componente)
+        if not ruta.exists():
+            continue
+        try:
+            # Solo tensores: el archivo no puede ejecutar código al cargarse
+            pesos = torch.load(ruta, weights_only=True)
+            modulo = cuantizar_modulo(estructura_componente(cache_dir, modelo_id, componente, dtype))
+            modulo.load_state_dict(pesos)
+            componentes[componente] = modulo
+            print(f"Componente int8 cargado de la cache: {componente}")
+        except Exception as e:
+            print(f"WARNING: No se pudo cargar {componente} cuantizado, se cuantiza de nuevo: {e}")
+    return componentes
+
+
+def cuantizar_pipeline(pipeline, cache_dir, modelo_id, es_sdxl, ya_cuantizados=()):
+    """
+    Cuantiza a int8 los componentes del pipeline que todavía están en float32 y los guarda en disco
+
+    Args:
+        pipeline: Pipeline de diffusers en CPU
+        cache_dir (str): Directorio de modelos del generador
+        modelo_id (str): ID del modelo
+        es_sdxl (bool): Si el pipeline es SDXL (tiene un segundo text encoder)
+        ya_cuantizados (iterable): Componentes que vinieron de la cache
+
+    Returns:
+        Pipeline con los componentes cuantizados
+    """
+    import torch
+
+    for componente in componentes_cuantizables(es_sdxl):
+        modulo = getattr(pipeline, componente, None)
+        if modulo is None or componente in ya_cuantizados:
+            continue
+
+        print(f"Cuantizando {componente} a int8...")
+        cuantizado = cuantizar_modulo(modulo)
+        setattr(pipeline, componente, cuantizado)
+
+        ruta = ruta_componente(cache_dir, modelo_id, componente)
+        try:
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            temporal = ruta.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+            torch.save(cuantizado.state_dict(), temporal)
+            os.replace(temporal, ruta)
+        except Exception as e:
+            print(f"WARNING: No se pudo guardar {componente} cuantizado: {e}")
+
+    return pipeline
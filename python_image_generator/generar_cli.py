@@ -13,27 +13,104 @@ import argparse
 import json
 import sys
 import os
+import queue
+import threading
 from pathlib import Path
 import traceback
 from datetime import datetime
 
+from transporte import MODOS_TRANSPORTE, TransporteSalida
+from backend_inferencia import BACKENDS
+from schedulers import SCHEDULERS, PRESETS_CALIDAD
+from memoria import POLITICAS_MEMORIA, POLITICAS_OFFLOAD
+from cuantizacion import CUANTIZACIONES
+
 # Configurar codificación para Windows
 if sys.platform.startswith('win'):
     sys.stdout.reconfigure(encoding='utf-8')
 
-# Importar nuestro generador
-try:
-    from image_generator import GeneradorImagenesConsumibles
-except ImportError as e:
-    # Error de importación - devolver JSON con error
-    error_response = {
-        "exito": False,
-        "error": "ImportError",
-        "mensaje": f"No se pudo importar el generador: {str(e)}",
-        "timestamp": datetime.now().isoformat()
-    }
-    print(json.dumps(error_response, ensure_ascii=False))
-    sys.exit(1)
+# El generador (torch, diffusers) se importa solo cuando hace falta un pipeline:
+# --help, --version, --status y los errores de validación no pagan esa importación
+MODELO_POR_DEFECTO = "runwayml/stable-diffusion-v1-5"
+CACHE_DIR_POR_DEFECTO = "./modelos"
+
+ESTILOS_DISPONIBLES = ['profesional', 'artistico', 'minimalista', 'natural', 'premium', 'divertido', 'promocional', 'banner', 'catalogo', 'instagram', 'editorial', 'ecommerce']
+
+# Formatos de salida (ver FORMATOS_IMAGEN en image_generator.py)
+FORMATOS_DISPONIBLES = ['png', 'webp', 'jpeg', 'avif']
+
+# Precisiones en CPU (ver PRECISIONES_CPU en image_generator.py)
+PRECISIONES_CPU = ['float32', 'bfloat16', 'auto']
+
+# Derivados de --derivados sin valor (ver DERIVADOS_POR_DEFECTO en image_generator.py)
+DERIVADOS_POR_DEFECTO = "miniatura:256,mediano:768"
+
+# Campos que una solicitud del modo worker puede sobrescribir
+CAMPOS_SOLICITUD = ['producto', 'descripcion', 'estilo', 'variaciones', 'width', 'height', 'pasos', 'guidance', 'base64', 'save_files', 'output_dir', 'tamano_lote', 'semilla', 'sin_cache', 'modelo', 'stream', 'formato', 'calidad', 'derivados', 'scheduler', 'preset', 'eventos_paso']
+
+def parsear_derivados(derivados):
+    """
+    Convierte la especificación de derivados en un diccionario nombre -> lado mayor
+    
+    Args:
+        derivados: Texto "nombre:lado,nombre:lado", diccionario ya armado o None
+        
+    Returns:
+        dict: Derivados a generar (None si no se pidió ninguno)
+        
+    Raises:
+        ValueError: Si la especificación no es válida
+    """
+    if not derivados:
+        return None
+    
+    if isinstance(derivados, str):
+        pares = {}
+        for parte in derivados.split(','):
+            nombre, _, lado = parte.strip().partition(':')
+            if not nombre or not lado.strip().isdigit():
+                raise ValueError(f"Derivado inválido '{parte.strip()}', se esperaba nombre:lado (por ejemplo miniatura:256)")
+            pares[nombre] = int(lado)
+        derivados = pares
+    
+    if not isinstance(derivados, dict):
+        raise ValueError("Los derivados deben ser un objeto nombre -> lado o un texto nombre:lado,...")
+    
+    for nombre, lado in derivados.items():
+        # El nombre forma parte del nombre de archivo
+        if not nombre.replace('_', '').replace('-', '').isalnum():
+            raise ValueError(f"El nombre del derivado '{nombre}' solo puede tener letras, números, '_' y '-'")
+        if not isinstance(lado, int) or lado < 16 or lado > 2048:
+            raise ValueError(f"El lado del derivado '{nombre}' debe estar entre 16 y 2048 píxeles")
+    
+    return derivados
+
+def parsear_resoluciones(resoluciones):
+    """
+    Convierte una lista de resoluciones "768x768,512x512" en pares (width, height)
+    
+    Args:
+        resoluciones (str): Resoluciones separadas por comas (None o vacío = las por defecto)
+        
+    Returns:
+        list: Pares (width, height), o None para usar las resoluciones por defecto
+        
+    Raises:
+        ValueError: Si alguna resolución no es válida
+    """
+    if not resoluciones:
+        return None
+    
+    pares = []
+    for parte in resoluciones.split(','):
+        width, _, height = parte.strip().lower().partition('x')
+        if not width.isdigit() or not height.isdigit():
+            raise ValueError(f"Resolución inválida '{parte.strip()}', se esperaba ANCHOxALTO (por ejemplo 768x768)")
+        width, height = int(width), int(height)
+        if not (256 <= width <= 2048 and 256 <= height <= 2048) or width % 8 or height % 8:
+            raise ValueError(f"La resolución '{parte.strip()}' debe estar entre 256 y 2048 píxeles y ser múltiplo de 8")
+        pares.append((width, height))
+    return pares
 
 def validar_argumentos(args):
     """
@@ -54,6 +131,9 @@ def validar_argumentos(args):
     if not args.descripcion or len(args.descripcion.strip()) == 0:
         errores["descripcion"] = "La descripción es requerida y no puede estar vacía"
     
+    if args.estilo not in ESTILOS_DISPONIBLES:
+        errores["estilo"] = f"El estilo debe ser uno de: {', '.join(ESTILOS_DISPONIBLES)}"
+    
     # Validar rango de valores numéricos
     if args.variaciones < 1 or args.variaciones > 20:
         errores["variaciones"] = "El número de variaciones debe estar entre 1 y 20"
@@ -64,14 +144,823 @@ def validar_argumentos(args):
     if args.height < 256 or args.height > 2048:
         errores["height"] = "El alto debe estar entre 256 y 2048 píxeles"
         
-    if args.pasos < 10 or args.pasos > 100:
-        errores["pasos"] = "Los pasos de inferencia deben estar entre 10 y 100"
+    # LCM genera en 4-8 pasos; el resto de los schedulers necesita al menos 10
+    pasos_minimos = 1 if args.scheduler == 'lcm' else 10
+    if args.pasos < pasos_minimos or args.pasos > 100:
+        errores["pasos"] = f"Los pasos de inferencia deben estar entre {pasos_minimos} y 100"
+    
+    if args.scheduler is not None and args.scheduler not in SCHEDULERS:
+        errores["scheduler"] = f"El scheduler debe ser uno de: {', '.join(SCHEDULERS)}"
+    
+    if args.preset is not None and args.preset not in PRESETS_CALIDAD:
+        errores["preset"] = f"El preset de calidad debe ser uno de: {', '.join(PRESETS_CALIDAD)}"
         
     if args.guidance < 1.0 or args.guidance > 20.0:
         errores["guidance"] = "El guidance scale debe estar entre 1.0 y 20.0"
     
+    if args.tamano_lote is not None and args.tamano_lote < 1:
+        errores["tamano_lote"] = "El tamaño de lote debe ser al menos 1"
+    
+    if args.semilla is not None and (args.semilla < 0 or args.semilla > 2**32 - 1):
+        errores["semilla"] = "La semilla debe estar entre 0 y 4294967295"
+    
+    if args.formato not in FORMATOS_DISPONIBLES:
+        errores["formato"] = f"El formato debe ser uno de: {', '.join(FORMATOS_DISPONIBLES)}"
+    elif args.calidad is not None:
+        if args.formato == 'png' and not 0 <= args.calidad <= 9:
+            errores["calidad"] = "En PNG la calidad es el nivel de compresión y debe estar entre 0 y 9"
+        elif args.formato != 'png' and not 1 <= args.calidad <= 100:
+            errores["calidad"] = "La calidad debe estar entre 1 y 100"
+    
+    try:
+        parsear_derivados(args.derivados)
+    except ValueError as e:
+        errores["derivados"] = str(e)
+    
     return errores
 
+def crear_generador(quiet=False, **kwargs_generador):
+    """
+    Crea el generador con la salida redirigida para no ensuciar el JSON de stdout
+    
+    Args:
+        quiet (bool): Si True, suprime todos los mensajes del generador
+        **kwargs_generador: Argumentos para GeneradorImagenesConsumibles
+        
+    Returns:
+        GeneradorImagenesConsumibles: Instancia con el pipeline cargado
+    """
+    try:
+        from image_generator import GeneradorImagenesConsumibles
+    except ImportError as e:
+        raise ImportError(f"No se pudo importar el generador: {str(e)}") from e
+    
+    # Crear una versión del generador que controle los emojis
+    class GeneradorLimpio(GeneradorImagenesConsumibles):
+        def __init__(self, *init_args, **init_kwargs):
+            # Redirigir completamente la inicialización para evitar prints en stdout
+            if quiet:
+                import contextlib
+                import io
+                f = io.StringIO()
+                with contextlib.redirect_stdout(f), contextlib.redirect_stderr(f):
+                    super().__init__(*init_args, **init_kwargs)
+            else:
+                # Capturar y redirigir a stderr
+                import contextlib
+                import io
+                
+                old_stdout = sys.stdout
+                stdout_buffer = io.StringIO()
+                
+                try:
+                    sys.stdout = stdout_buffer
+                    super().__init__(*init_args, **init_kwargs)
+                    
+                    # Todo lo capturado va a stderr
+                    captured_output = stdout_buffer.getvalue().strip()
+                    if captured_output:
+                        print(captured_output, file=sys.stderr)
+                        
+                finally:
+                    sys.stdout = old_stdout
+        
+        def _detectar_dispositivo(self):
+            if hasattr(self, '_device_cached'):
+                return self._device_cached
+            
+            import torch
+            if torch.cuda.is_available():
+                self._device_cached = "cuda"
+                if not quiet:
+                    gpu_name = torch.cuda.get_device_name(0)
+                    print(f"GPU detectada: {gpu_name}", file=sys.stderr)
+                    print(f"VRAM disponible: {torch.cuda.get_device_properties(0).total_memory // 1024**3} GB", file=sys.stderr)
+            else:
+                self._device_cached = "cpu"
+                if not quiet:
+                    print("GPU no disponible, usando CPU (sera mas lento)", file=sys.stderr)
+            return self._device_cached
+        
+        def _cargar_pipeline(self):
+            if not quiet:
+                print(f"Cargando modelo: {self.modelo_id}", file=sys.stderr)
+                print(f"Tipo: {'SDXL' if self.es_sdxl else 'SD 1.5/2.x'}", file=sys.stderr)
+                
+            # Llamar al método padre pero redirigir prints
+            import contextlib
+            import io
+            
+            if quiet:
+                # Suprimir completamente los prints en modo quiet
+                f = io.StringIO()
+                with contextlib.redirect_stdout(f), contextlib.redirect_stderr(f):
+                    super()._cargar_pipeline()
+            else:
+                # Capturar y filtrar emojis
+                import re
+                from io import StringIO
+                
+                old_stdout = sys.stdout
+                old_stderr = sys.stderr
+                stdout_buffer = StringIO()
+                stderr_buffer = StringIO()
+                
+                try:
+                    sys.stdout = stdout_buffer
+                    sys.stderr = stderr_buffer
+                    super()._cargar_pipeline()
+                    
+                    # Filtrar emojis y mostrar output limpio
+                    stdout_content = stdout_buffer.getvalue()
+                    stderr_content = stderr_buffer.getvalue()
+                    
+                    # Remover emojis usando regex
+                    emoji_pattern = re.compile("["
+                        u"\U0001F600-\U0001F64F"  # emoticons
+                        u"\U0001F300-\U0001F5FF"  # symbols & pictographs
+                        u"\U0001F680-\U0001F6FF"  # transport & map
+                        u"\U0001F1E0-\U0001F1FF"  # flags
+                        u"\U00002700-\U000027BF"  # dingbats
+                        u"\U0001F900-\U0001F9FF"  # supplemental symbols
+                        "]+", flags=re.UNICODE)
+                    
+                    clean_stdout = emoji_pattern.sub('', stdout_content).strip()
+                    clean_stderr = emoji_pattern.sub('', stderr_content).strip()
+                    
+                    if clean_stdout:
+                        print(clean_stdout, file=old_stderr)
+                    if clean_stderr:
+                        print(clean_stderr, file=old_stderr)
+                        
+                finally:
+                    sys.stdout = old_stdout
+                    sys.stderr = old_stderr
+        
+        def generar_imagenes(self, *args_gen, **kwargs_gen):
+            if quiet:
+                # Suprimir completamente los prints en modo quiet
+                import contextlib
+                import io
+                f = io.StringIO()
+                with contextlib.redirect_stdout(f), contextlib.redirect_stderr(f):
+                    return super().generar_imagenes(*args_gen, **kwargs_gen)
+            else:
+                # Capturar y filtrar emojis
+                import re
+                from io import StringIO
+                
+                old_stdout = sys.stdout
+                old_stderr = sys.stderr
+                stdout_buffer = StringIO()
+                stderr_buffer = StringIO()
+                
+                try:
+                    sys.stdout = stdout_buffer
+                    sys.stderr = stderr_buffer
+                    result = super().generar_imagenes(*args_gen, **kwargs_gen)
+                    
+                    # Filtrar emojis
+                    emoji_pattern = re.compile("["
+                        u"\U0001F600-\U0001F64F"
+                        u"\U0001F300-\U0001F5FF"
+                        u"\U0001F680-\U0001F6FF"
+                        u"\U0001F1E0-\U0001F1FF"
+                        u"\U00002700-\U000027BF"
+                        u"\U0001F900-\U0001F9FF"
+                        "]+", flags=re.UNICODE)
+                    
+                    clean_stdout = emoji_pattern.sub('', stdout_buffer.getvalue()).strip()
+                    clean_stderr = emoji_pattern.sub('', stderr_buffer.getvalue()).strip()
+                    
+                    if clean_stdout:
+                        print(clean_stdout, file=old_stderr)
+                    if clean_stderr:
+                        print(clean_stderr, file=old_stderr)
+                        
+                    return result
+                finally:
+                    sys.stdout = old_stdout
+                    sys.stderr = old_stderr
+        
+        def limpiar_memoria(self):
+            if quiet:
+                import contextlib
+                import io
+                f = io.StringIO()
+                with contextlib.redirect_stdout(f), contextlib.redirect_stderr(f):
+                    return super().limpiar_memoria()
+            else:
+                if self.device == "cuda":
+                    import torch
+                    torch.cuda.empty_cache()
+                import gc
+                gc.collect()
+                print("Memoria limpiada", file=sys.stderr)
+    
+    return GeneradorLimpio(**kwargs_generador)
+
+def guardar_metricas(generador, archivo):
+    """
+    Escribe las métricas del generador en un archivo sin interrumpir la generación si falla
+    
+    Args:
+        generador: Generador con sus métricas
+        archivo (str): Archivo de destino (None = no escribir)
+    """
+    if not archivo:
+        return
+    try:
+        generador.metricas.guardar(archivo)
+    except Exception as e:
+        print(f"WARNING: No se pudieron escribir las métricas en {archivo}: {e}", file=sys.stderr)
+
+def opciones_generador(args):
+    """
+    Traduce los argumentos del CLI a parámetros del constructor del generador
+    
+    Args:
+        args: Argumentos parseados
+        
+    Returns:
+        dict: Argumentos para GeneradorImagenesConsumibles
+    """
+    opciones = {
+        "persistir_embeddings": args.persistir_embeddings,
+        "presupuesto_modelos_mb": args.presupuesto_modelos_mb,
+        "inactividad_modelos": args.inactividad_modelos,
+        "backend": args.backend,
+        "cuantizacion": args.cuantizacion,
+        "precision_cpu": args.precision_cpu,
+        "compilar": args.compilar,
+        "politica_memoria": args.politica_memoria,
+        "politica_offload": args.politica_offload,
+        "max_blobs_mb": args.max_blobs_mb
+    }
+    if args.modelo:
+        opciones["modelo"] = args.modelo
+    return opciones
+
+def formatear_imagen(session_id, img_info, transporte=None):
+    """
+    Convierte la metadata de una imagen del generador al formato de respuesta para Node.js
+    
+    Args:
+        session_id (str): ID de la sesión de generación
+        img_info (dict): Metadata de la imagen devuelta por el generador
+        transporte (TransporteSalida): Transporte de salida, necesario para imágenes en bytes
+        
+    Returns:
+        dict: Imagen con id, datos o rutas y metadata
+    """
+    if img_info.get('formato') == 'bytes':
+        # Los bytes viajan fuera del JSON: como carga de la trama (binario) o en un archivo (ruta)
+        imagen_data = {
+            "id": f"{session_id}_{img_info['variacion']:02d}",
+            "variacion": img_info['variacion'],
+            "nombre_archivo": img_info['nombre_archivo'],
+            "mime_type": img_info['mime_type'],
+            "formato": transporte.modo,
+            "metadata": {
+                "hash_sha256": img_info['hash_sha256'],
+                "tamano_bytes": img_info['tamano_bytes'],
+                "dimensiones": img_info['dimensiones'],
+                "timestamp_generacion": img_info['timestamp_generacion'],
+                "codificacion": img_info.get('codificacion'),
+                "perfil_tiempos": img_info.get('perfil_tiempos'),
+                "almacenamiento": img_info.get('almacenamiento')
+            }
+        }
+        if transporte.modo == 'ruta':
+            # Escribir una sola vez aunque la imagen se formatee en el evento y en el resumen
+            if 'ruta_transporte' not in img_info:
+                img_info['ruta_transporte'] = str(transporte.escribir_archivo(img_info['nombre_archivo'], img_info.pop('datos')))
+            imagen_data["ruta_transporte"] = img_info['ruta_transporte']
+    elif img_info.get('formato') == 'base64':
+        # Imagen en base64
+        imagen_data = {
+            "id": f"{session_id}_{img_info['variacion']:02d}",
+            "variacion": img_info['variacion'],
+            "nombre_archivo": img_info['nombre_archivo'],
+            "base64_data": img_info.get('base64_data'),
+            "mime_type": img_info['mime_type'],
+            "formato": "base64",
+            "metadata": {
+                "hash_sha256": img_info['hash_sha256'],
+                "tamano_bytes": img_info['tamano_bytes'],
+                "dimensiones": img_info['dimensiones'],
+                "timestamp_generacion": img_info['timestamp_generacion'],
+                "codificacion": img_info.get('codificacion'),
+                "perfil_tiempos": img_info.get('perfil_tiempos'),
+                "almacenamiento": img_info.get('almacenamiento')
+            }
+        }
+    else:
+        # Imagen como archivo
+        imagen_data = {
+            "id": f"{session_id}_{img_info['variacion']:02d}",
+            "variacion": img_info['variacion'],
+            "nombre_archivo": img_info['nombre_archivo'],
+            "ruta_absoluta": img_info['ruta_completa'],
+            "ruta_relativa": img_info['ruta_relativa'],
+            "url_file": f"file://{img_info['ruta_completa']}",  # Para acceso directo
+            "formato": "archivo",
+            "metadata": {
+                "hash_sha256": img_info['hash_sha256'],
+                "tamano_bytes": img_info.get('tamano_archivo', img_info.get('tamano_bytes', 0)),
+                "dimensiones": img_info['dimensiones'],
+                "timestamp_generacion": img_info['timestamp_generacion'],
+                "codificacion": img_info.get('codificacion'),
+                "perfil_tiempos": img_info.get('perfil_tiempos'),
+                "almacenamiento": img_info.get('almacenamiento')
+            }
+        }
+    
+    # Versiones reducidas (siempre como archivos en el directorio de imágenes)
+    imagen_data["derivados"] = [
+        {
+            "nombre": derivado['nombre'],
+            "nombre_archivo": derivado['nombre_archivo'],
+            "ruta_absoluta": derivado['ruta_completa'],
+            "dimensiones": derivado['dimensiones'],
+            "tamano_bytes": derivado['tamano_bytes'],
+            "hash_sha256": derivado['hash_sha256']
+        }
+        for derivado in img_info.get('derivados', [])
+    ]
+    
+    return imagen_data
+
+def generar_respuesta(generador, args, emitir=None, transporte=None, cancelar=None):
+    """
+    Ejecuta una generación y construye la respuesta JSON que consume Node.js
+    
+    Args:
+        generador: Instancia de GeneradorImagenesConsumibles ya inicializada
+        args: Parámetros de la solicitud (argumentos del CLI o línea del worker)
+        emitir (callable): Recibe cada evento (y los bytes adjuntos, si los hay) apenas ocurre
+        transporte (TransporteSalida): Transporte de salida (None = json)
+        cancelar (callable): Devuelve True si la solicitud se canceló (ver generar_imagenes)
+        
+    Returns:
+        dict: Respuesta con el mismo formato que imprime el modo de una sola ejecución
+              (en modo stream, el registro "resumen" sin los datos de imagen ya emitidos)
+    """
+    # Generar imágenes
+    # Determinar si usar base64, bytes crudos o archivos
+    use_base64 = args.base64 and not args.save_files
+    modo_transporte = transporte.modo if transporte else "json"
+    use_bytes = use_base64 and modo_transporte != "json"
+    
+    if not args.quiet:
+        print(f"Modo: {'Archivos' if not use_base64 else 'Base64' if not use_bytes else modo_transporte.capitalize()}", file=sys.stderr)
+    
+    # En modo binario las imágenes no caben en el JSON: cada una sale en su propia trama
+    emitir_imagenes = use_bytes and modo_transporte == "binario"
+    
+    def emitir_evento(evento):
+        # Sin --stream solo salen las tramas de imágenes del modo binario
+        if not args.stream and not (evento["tipo"] == "imagen" and evento["imagen"].get("exito", False)):
+            return
+        
+        if evento["tipo"] == "imagen":
+            img_info = evento["imagen"]
+            if not img_info.get("exito", False):
+                emitir({
+                    "tipo": "imagen_fallida",
+                    "session_id": evento["session_id"],
+                    "variacion": img_info["variacion"],
+                    "error": img_info.get("error"),
+                    "timestamp": datetime.now().isoformat()
+                })
+                return
+            emitir({
+                "tipo": "imagen",
+                "session_id": evento["session_id"],
+                "imagen": formatear_imagen(evento["session_id"], img_info, transporte),
+                "timestamp": datetime.now().isoformat()
+            }, img_info.get("datos") if emitir_imagenes else None)
+            # La imagen ya salió: no retenerla en memoria hasta el resumen
+            img_info.pop("base64_data", None)
+            img_info.pop("datos", None)
+        else:
+            emitir({**evento, "timestamp": datetime.now().isoformat()})
+    
+    resultado = generador.generar_imagenes(
+        nombre_producto=args.producto,
+        descripcion=args.descripcion,
+        estilo=args.estilo,
+        num_variaciones=args.variaciones,
+        width=args.width,
+        height=args.height,
+        pasos_inferencia=args.pasos,
+        guidance_scale=args.guidance,
+        return_base64=use_base64,
+        tamano_lote=args.tamano_lote,
+        semillas=[(args.semilla + i) % 2**32 for i in range(args.variaciones)] if args.semilla is not None else None,
+        usar_cache=not args.sin_cache,
+        modelo=args.modelo,
+        callback_evento=emitir_evento if args.stream or emitir_imagenes else None,
+        return_bytes=use_bytes,
+        formato_imagen=args.formato,
+        calidad=args.calidad,
+        derivados=parsear_derivados(args.derivados),
+        scheduler=args.scheduler,
+        preset_calidad=args.preset,
+        eventos_paso=args.eventos_paso,
+        cancelar=cancelar
+    )
+    
+    # Formatear respuesta para Node.js con rutas absolutas
+    respuesta_final = {
+        "exito": True,
+        "mensaje": f"Se generaron {resultado['resultados']['exitosas']} de {args.variaciones} imágenes solicitadas",
+        "timestamp": datetime.now().isoformat(),
+        "datos": {
+            "session_id": resultado['session_id'],
+            "producto": {
+                "nombre": args.producto,
+                "descripcion": args.descripcion,
+                "tipo": "consumible"
+            },
+            "configuracion": {
+                "estilo": args.estilo,
+                "variaciones_solicitadas": args.variaciones,
+                "dimensiones": resultado['parametros']['dimensiones'],
+                "pasos_inferencia": resultado['parametros']['pasos_inferencia'],
+                "scheduler": resultado['parametros']['scheduler'],
+                "preset_calidad": resultado['parametros']['preset_calidad'],
+                "guidance_scale": resultado['parametros']['guidance_scale'],
+                "tamano_lote": resultado['parametros']['tamano_lote'],
+                "formato_imagen": resultado['parametros']['formato_imagen'],
+                "calidad": resultado['parametros']['calidad'],
+                "derivados": resultado['parametros']['derivados'],
+                "modelo": resultado['modelo'],
+                "dispositivo": generador.device,
+                "backend": generador.backend,
+                "cuantizacion": generador.cuantizacion,
+                "precision": generador.precision
+            },
+            "estadisticas": {
+                "total_generadas": resultado['resultados']['exitosas'],
+                "total_fallidas": resultado['resultados']['fallidas'],
+                "tasa_exito": resultado['resultados']['tasa_exito'],
+                "cache": resultado.get('cache_resultados', {}),
+                "perfil_tiempos": resultado.get('perfil_tiempos')
+            },
+            "admision": resultado.get('admision'),
+            "offload": resultado.get('offload'),
+            "imagenes": [],
+            "archivos": {
+                "directorio_imagenes": str(generador.carpeta_imagenes.absolute()),
+                "archivo_metadata": resultado.get('archivo_metadata', '')
+            }
+        }
+    }
+    
+    # Procesar lista de imágenes generadas
+    for img_info in resultado['imagenes']:
+        if img_info.get('exito', False):
+            respuesta_final['datos']['imagenes'].append(formatear_imagen(resultado['session_id'], img_info, transporte))
+    
+    if args.stream:
+        return {"tipo": "resumen", **respuesta_final}
+    
+    return respuesta_final
+
+def comando_e_id(linea):
+    """
+    Retorna (comando, id) de una línea del worker ((None, None) si no es un objeto JSON)
+    """
+    try:
+        solicitud = json.loads(linea)
+    except json.JSONDecodeError:
+        return None, None
+    if not isinstance(solicitud, dict):
+        return None, None
+    return solicitud.get("comando"), solicitud.get("id")
+
+class RegistroCancelaciones:
+    """
+    Cancelaciones del worker, aceptadas solo para solicitudes en cola o en curso
+    
+    El hilo lector registra cada solicitud al leerla y el bucle principal la termina al
+    responderla. Una cancelación para un id desconocido (ya respondido o que nunca llegó)
+    se ignora: si no, un id reutilizado más adelante nacería cancelado. Solo se siguen ids
+    str o int, los que usa Node.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        # id -> cantidad de solicitudes con ese id en cola o en curso
+        self._activas = {}
+        self._canceladas = set()
+    
+    def recibir(self, id_solicitud):
+        """
+        Registra una solicitud leída (todavía en cola)
+        """
+        if not isinstance(id_solicitud, (str, int)):
+            return
+        with self._lock:
+            self._activas[id_solicitud] = self._activas.get(id_solicitud, 0) + 1
+    
+    def cancelar(self, id_solicitud):
+        """
+        Marca como cancelada una solicitud en cola o en curso
+        
+        Returns:
+            bool: True si la cancelación se aceptó (False si el id no está activo)
+        """
+        if not isinstance(id_solicitud, (str, int)):
+            return False
+        with self._lock:
+            if id_solicitud not in self._activas:
+                return False
+            self._canceladas.add(id_solicitud)
+            return True
+    
+    def cancelada(self, id_solicitud):
+        """
+        Indica si la solicitud con ese id fue cancelada
+        """
+        if not isinstance(id_solicitud, (str, int)):
+            return False
+        with self._lock:
+            return id_solicitud in self._canceladas
+    
+    def terminar(self, id_solicitud):
+        """
+        Olvida una solicitud respondida (y su cancelación, si no quedan otras con ese id)
+        """
+        if not isinstance(id_solicitud, (str, int)):
+            return
+        with self._lock:
+            restantes = self._activas.get(id_solicitud, 0) - 1
+            if restantes > 0:
+                self._activas[id_solicitud] = restantes
+            else:
+                self._activas.pop(id_solicitud, None)
+                self._canceladas.discard(id_solicitud)
+
+def servir(args):
+    """
+    Modo worker persistente: carga el pipeline una sola vez y atiende solicitudes
+    JSON desde stdin (una por línea), respondiendo cada una en una línea de stdout
+    (o en una trama con --transporte binario)
+    
+    Cada solicitud acepta los mismos campos que el CLI (producto, descripcion, estilo,
+    variaciones, width, height, pasos, guidance, base64, save_files, output_dir) y un
+    "id" opcional que se devuelve en la respuesta. {"comando": "salir"} termina el worker,
+    {"comando": "metricas"} devuelve las métricas en formato de texto de Prometheus y
+    {"comando": "cancelar", "id": ...} cancela esa solicitud: si todavía está en cola se
+    responde como cancelada sin generar, y si está en curso se corta en el paso siguiente.
+    
+    Args:
+        args: Argumentos parseados del CLI, usados como valores por defecto
+    """
+    if sys.platform.startswith('win'):
+        sys.stdin.reconfigure(encoding='utf-8')
+    
+    # stdout queda reservado para las respuestas, cualquier otro print va a stderr
+    transporte = TransporteSalida(sys.stdout, args.transporte, args.dir_transporte)
+    sys.stdout = sys.stderr
+    responder = transporte.enviar
+    
+    try:
+        resoluciones_calentamiento = parsear_resoluciones(args.calentar)
+        generador = crear_generador(args.quiet, **opciones_generador(args))
+        
+        # Compilar las resoluciones habituales antes de aceptar solicitudes
+        calentamiento = generador.calentar(resoluciones_calentamiento) if args.compilar else []
+        
+        # Métricas por HTTP (texto de Prometheus en /metrics)
+        servidor_metricas = None
+        if args.puerto_metricas is not None:
+            servidor_metricas = generador.metricas.servir_http(args.puerto_metricas, args.host_metricas)
+    except Exception as e:
+        responder({
+            "exito": False,
+            "error": type(e).__name__,
+            "mensaje": f"No se pudo inicializar el generador: {str(e)}",
+            "timestamp": datetime.now().isoformat()
+        })
+        sys.exit(1)
+    
+    carpeta_por_defecto = generador.carpeta_imagenes
+    
+    # Aviso de arranque: el proceso padre puede empezar a enviar solicitudes
+    responder({
+        "exito": True,
+        "estado": "listo",
+        "dispositivo": generador.device,
+        "backend": generador.backend,
+        "cuantizacion": generador.cuantizacion,
+        "precision": generador.precision,
+        "compilado": generador.compilar,
+        "calentamiento": calentamiento,
+        "modelo": generador.modelo_id,
+        "puerto_metricas": servidor_metricas.server_address[1] if servidor_metricas else None,
+        "timestamp": datetime.now().isoformat()
+    })
+    
+    # Leer stdin en un hilo para poder descargar modelos inactivos mientras no llegan solicitudes
+    cola_solicitudes = queue.Queue()
+    generador.metricas.cola.funcion = cola_solicitudes.qsize
+    
+    # Las cancelaciones no esperan en la cola: se marcan al leerlas, aunque haya una generación en curso
+    from image_generator import SolicitudCancelada
+    cancelaciones = RegistroCancelaciones()
+    
+    def leer_solicitudes():
+        for linea_entrada in sys.stdin:
+            comando, id_linea = comando_e_id(linea_entrada)
+            if comando == "cancelar":
+                cancelaciones.cancelar(id_linea)
+                continue
+            cancelaciones.recibir(id_linea)
+            cola_solicitudes.put(linea_entrada)
+        cola_solicitudes.put(None)
+    
+    threading.Thread(target=leer_solicitudes, daemon=True).start()
+    
+    while True:
+        try:
+            linea = cola_solicitudes.get(timeout=30)
+        except queue.Empty:
+            generador.registro_pipelines.descargar_inactivos()
+            guardar_metricas(generador, args.archivo_metricas)
+            continue
+        if linea is None:
+            break
+        
+        linea = linea.strip()
+        if not linea:
+            continue
+        
+        id_solicitud = None
+        try:
+            solicitud = json.loads(linea)
+            if not isinstance(solicitud, dict):
+                raise ValueError("La solicitud debe ser un objeto JSON")
+            id_solicitud = solicitud.get("id")
+            if cancelaciones.cancelada(id_solicitud):
+                raise SolicitudCancelada("Solicitud cancelada mientras esperaba en la cola")
+            
+            comando = solicitud.get("comando")
+            if comando == "salir":
+                responder({"id": id_solicitud, "exito": True, "estado": "terminado", "timestamp": datetime.now().isoformat()})
+                break
+            if comando == "ping":
+                responder({
+                    "id": id_solicitud,
+                    "exito": True,
+                    "estado": "listo",
+                    "modelos_residentes": generador.registro_pipelines.modelos_residentes(),
+                    "timestamp": datetime.now().isoformat()
+                })
+                cancelaciones.terminar(id_solicitud)
+                continue
+            if comando == "metricas":
+                responder({
+                    "id": id_solicitud,
+                    "exito": True,
+                    "formato": "prometheus",
+                    "metricas": generador.metricas.exponer(),
+                    "timestamp": datetime.now().isoformat()
+                })
+                cancelaciones.terminar(id_solicitud)
+                continue
+            
+            # Combinar la solicitud con los valores por defecto del CLI
+            parametros = argparse.Namespace(**vars(args))
+            for campo in CAMPOS_SOLICITUD:
+                if campo in solicitud:
+                    setattr(parametros, campo, solicitud[campo])
+            
+            errores = validar_argumentos(parametros)
+            if errores:
+                generador.metricas.solicitudes.incrementar(resultado="invalida")
+                respuesta = {
+                    "exito": False,
+                    "error": "ValidationError",
+                    "mensaje": "Errores en los argumentos de entrada",
+                    "errores": errores,
+                    "timestamp": datetime.now().isoformat()
+                }
+            else:
+                generador.carpeta_imagenes = Path(parametros.output_dir) if parametros.output_dir else carpeta_por_defecto
+                generador.carpeta_imagenes.mkdir(exist_ok=True, parents=True)
+                
+                respuesta = generar_respuesta(
+                    generador, parametros,
+                    emitir=lambda evento, carga=None: responder({**evento, "id": id_solicitud}, carga),
+                    transporte=transporte,
+                    cancelar=lambda: cancelaciones.cancelada(id_solicitud)
+                )
+                generador.limpiar_memoria()
+                
+        except json.JSONDecodeError as e:
+            generador.metricas.solicitudes.incrementar(resultado="invalida")
+            respuesta = {
+                "exito": False,
+                "error": "JSONDecodeError",
+                "mensaje": f"Solicitud JSON inválida: {str(e)}",
+                "timestamp": datetime.now().isoformat()
+            }
+        except SolicitudCancelada as e:
+            generador.metricas.solicitudes.incrementar(resultado="cancelada")
+            respuesta = {
+                "exito": False,
+                "error": "SolicitudCancelada",
+                "mensaje": str(e),
+                "timestamp": datetime.now().isoformat()
+            }
+        except Exception as e:
+            # Un error en una solicitud no debe tumbar el worker
+            generador.metricas.solicitudes.incrementar(resultado="error")
+            respuesta = {
+                "exito": False,
+                "error": type(e).__name__,
+                "mensaje": str(e),
+                "timestamp": datetime.now().isoformat(),
+                "traceback": traceback.format_exc() if not args.quiet else None
+            }
+        
+        respuesta["id"] = id_solicitud
+        responder(respuesta)
+        cancelaciones.terminar(id_solicitud)
+        guardar_metricas(generador, args.archivo_metricas)
+
+def obtener_estado_servicio(args):
+    """
+    Reporta el estado del servicio sin importar torch ni cargar pesos
+    
+    Args:
+        args: Argumentos parseados (usa --modelo si se indicó)
+        
+    Returns:
+        dict: Versión de Python, dependencias instaladas, modelos en cache y dispositivo
+    """
+    import importlib.util
+    import platform
+    import shutil
+    
+    # find_spec localiza los paquetes sin ejecutarlos
+    dependencias = {
+        nombre: importlib.util.find_spec(modulo) is not None
+        for nombre, modulo in [
+            ("torch", "torch"), ("diffusers", "diffusers"), ("transformers", "transformers"),
+            ("accelerate", "accelerate"), ("pillow", "PIL"), ("numpy", "numpy"), ("psutil", "psutil"),
+            ("optimum", "optimum"), ("onnxruntime", "onnxruntime"), ("openvino", "openvino")
+        ]
+    }
+    
+    # Snapshots descargados en el cache de Hugging Face (models--<org>--<nombre>/snapshots/<rev>)
+    cache_dir = Path(CACHE_DIR_POR_DEFECTO)
+    modelos_en_cache = []
+    for carpeta in sorted(cache_dir.glob("models--*")):
+        snapshots = carpeta / "snapshots"
+        if any((snapshot / "model_index.json").exists() for snapshot in snapshots.glob("*")):
+            modelos_en_cache.append(carpeta.name[len("models--"):].replace("--", "/"))
+    
+    modelo = args.modelo or MODELO_POR_DEFECTO
+    
+    # Detección de GPU por el driver, sin inicializar CUDA
+    gpu_nvidia = shutil.which("nvidia-smi") is not None or Path("/proc/driver/nvidia/version").exists()
+    cuda_visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+    
+    dispositivo = {
+        "gpu_nvidia_detectada": gpu_nvidia,
+        "cuda_visible_devices": cuda_visible,
+        "dispositivo_probable": "cuda" if gpu_nvidia and cuda_visible not in ("", "-1") else "cpu",
+        "cpus": os.cpu_count()
+    }
+    if dependencias["psutil"]:
+        import psutil
+        memoria = psutil.virtual_memory()
+        dispositivo["ram_total_mb"] = memoria.total // 1024**2
+        dispositivo["ram_disponible_mb"] = memoria.available // 1024**2
+    
+    return {
+        "exito": all(dependencias[nombre] for nombre in ("torch", "diffusers", "transformers", "pillow")),
+        "estado": {
+            "python": {
+                "version": platform.python_version(),
+                "ejecutable": sys.executable
+            },
+            "dependencias": dependencias,
+            "modelo": {
+                "id": modelo,
+                "cache_dir": str(cache_dir.absolute()),
+                "snapshot_presente": modelo in modelos_en_cache,
+                "modelos_en_cache": modelos_en_cache
+            },
+            "dispositivo": dispositivo
+        },
+        "timestamp": datetime.now().isoformat()
+    }
+
 def main():
     """Función principal del CLI"""
     
@@ -94,6 +983,34 @@ Ejemplos de uso:
     --width 1024 \\
     --height 768
 
+  # WebP con pérdida: archivos ~10 veces más chicos que PNG
+  python generar_cli.py --producto "..." --descripcion "..." --formato webp --calidad 80
+  
+  # Streaming: una línea JSON por evento ("inicio", "imagen", "progreso", "resumen")
+  python generar_cli.py --producto "..." --descripcion "..." --stream --quiet
+
+  # Imágenes como bytes crudos: cada trama es [long. JSON][long. carga] (uint32 big-endian) + JSON + bytes
+  python generar_cli.py --producto "..." --descripcion "..." --transporte binario --quiet
+  
+  # DPM++ 2M Karras con el preset rápido (12 pasos en lugar de 25)
+  python generar_cli.py --producto "Yogur" --descripcion "Yogur griego natural" --scheduler dpmpp_2m_karras --preset rapido
+  
+  # CPU con ONNX Runtime (requiere optimum[onnxruntime]; la primera vez exporta el modelo)
+  python generar_cli.py --producto "Galletas" --descripcion "Galletas de avena" --backend onnx
+  
+  # Importar sesiones anteriores al índice de metadata (SQLite)
+  python generar_cli.py --importar-metadata
+  
+  # Estado del servicio (rápido, no importa torch ni carga el modelo)
+  python generar_cli.py --status
+
+  # Worker persistente (una solicitud JSON por línea en stdin, una respuesta por línea en stdout)
+  python generar_cli.py --serve --quiet
+  {"id": "1", "producto": "Chocolate Premium", "descripcion": "Chocolate artesanal 70% cacao", "variaciones": 2}
+
+  # Worker compilado: compila y calienta 768x768 y 512x512 antes de anunciarse listo
+  python generar_cli.py --serve --quiet --compilar --calentar 768x768,512x512
+
   # Desde Node.js:
   const { exec } = require('child_process');
   exec('python generar_cli.py --producto "..." --descripcion "..."', (error, stdout) => {
@@ -108,15 +1025,15 @@ Estilos disponibles: profesional, artistico, minimalista, natural, premium, dive
     parser.add_argument(
         '--producto', 
         type=str, 
-        required=True,
-        help='Nombre del producto (requerido)'
+        default=None,
+        help='Nombre del producto (requerido salvo en modo --serve)'
     )
     
     parser.add_argument(
         '--descripcion',
         type=str, 
-        required=True,
-        help='Descripción detallada del producto (requerido)'
+        default=None,
+        help='Descripción detallada del producto (requerido salvo en modo --serve)'
     )
     
     # Argumentos opcionales
@@ -124,7 +1041,7 @@ Estilos disponibles: profesional, artistico, minimalista, natural, premium, dive
         '--estilo',
         type=str,
         default='profesional',
-        choices=['profesional', 'artistico', 'minimalista', 'natural', 'premium', 'divertido', 'promocional', 'banner', 'catalogo', 'instagram', 'editorial', 'ecommerce'],
+        choices=ESTILOS_DISPONIBLES,
         help='Estilo de la imagen (default: profesional)'
     )
     
@@ -156,6 +1073,20 @@ Estilos disponibles: profesional, artistico, minimalista, natural, premium, dive
         help='Pasos de inferencia - más pasos = mejor calidad (default: 25)'
     )
     
+    parser.add_argument(
+        '--scheduler',
+        type=str,
+        default=None,
+        help=f'Scheduler: {", ".join(SCHEDULERS)} (default: el del modelo); lcm necesita un modelo LCM o el adaptador LCM-LoRA'
+    )
+    
+    parser.add_argument(
+        '--preset',
+        type=str,
+        default=None,
+        help=f'Preset de calidad que fija los pasos según el scheduler: {", ".join(PRESETS_CALIDAD)} (reemplaza --pasos)'
+    )
+    
     parser.add_argument(
         '--guidance',
         type=float,
@@ -163,6 +1094,50 @@ Estilos disponibles: profesional, artistico, minimalista, natural, premium, dive
         help='Guidance scale - adherencia al prompt (default: 7.5)'
     )
     
+    parser.add_argument(
+        '--tamano-lote',
+        type=int,
+        default=None,
+        help='Variaciones generadas por llamada al pipeline (default: automático según memoria disponible)'
+    )
+    
+    parser.add_argument(
+        '--semilla',
+        type=int,
+        default=None,
+        help='Semilla base: la variación N usa semilla + N - 1 (default: aleatoria)'
+    )
+    
+    parser.add_argument(
+        '--sin-cache',
+        action='store_true',
+        help='No reutilizar ni guardar imágenes en la cache de resultados'
+    )
+    
+    parser.add_argument(
+        '--formato',
+        type=str,
+        default='png',
+        choices=FORMATOS_DISPONIBLES,
+        help='Formato de salida de las imágenes (default: png)'
+    )
+    
+    parser.add_argument(
+        '--calidad',
+        type=int,
+        default=None,
+        help='Calidad 1-100 para webp/jpeg/avif o nivel de compresión 0-9 para png (default: según el formato)'
+    )
+    
+    parser.add_argument(
+        '--derivados',
+        type=str,
+        nargs='?',
+        const=DERIVADOS_POR_DEFECTO,
+        default=None,
+        help=f'Genera versiones reducidas "nombre:lado,..." junto a cada imagen (sin valor: {DERIVADOS_POR_DEFECTO})'
+    )
+    
     parser.add_argument(
         '--output-dir',
         type=str,
@@ -189,6 +1164,160 @@ Estilos disponibles: profesional, artistico, minimalista, natural, premium, dive
         help='Guardar archivos en disco en lugar de devolver base64'
     )
     
+    parser.add_argument(
+        '--modelo',
+        type=str,
+        default=None,
+        help='Modelo de Stable Diffusion (ID de Hugging Face o alias: promocional, realista, artistico)'
+    )
+    
+    parser.add_argument(
+        '--backend',
+        choices=BACKENDS,
+        default='pytorch',
+        help='Runtime de inferencia en CPU: pytorch, onnx (ONNX Runtime) u openvino; el modelo se exporta una vez a ./modelos/<backend>/ (default: pytorch)'
+    )
+    
+    parser.add_argument(
+        '--cuantizacion',
+        choices=CUANTIZACIONES,
+        default=None,
+        help='Cuantiza UNet y text encoders a int8 en CPU (backend pytorch); se guardan en ./modelos/int8/ (default: float32)'
+    )
+    
+    parser.add_argument(
+        '--precision-cpu',
+        choices=PRECISIONES_CPU,
+        default='float32',
+        help='Precisión del pipeline en CPU: float32, bfloat16 o auto (bfloat16 si la CPU tiene AMX/AVX512-BF16) (default: float32)'
+    )
+    
+    parser.add_argument(
+        '--compilar',
+        action='store_true',
+        help='Compila UNet y VAE con torch.compile (channels-last, atención SDPA); la cache queda en ./modelos/compilacion/'
+    )
+    
+    parser.add_argument(
+        '--politica-memoria',
+        type=str,
+        default='ajustar',
+        choices=POLITICAS_MEMORIA,
+        help='Si la solicitud no cabe en memoria: ajustar (lotes más chicos y, si hace falta, menor resolución), '
+             'dividir (solo lotes más chicos, si no rechazar) o ninguna (sin control) (default: ajustar)'
+    )
+    
+    parser.add_argument(
+        '--politica-offload',
+        type=str,
+        default='auto',
+        choices=POLITICAS_OFFLOAD,
+        help='Estrategia de memoria del pipeline: auto (según la RAM/VRAM disponible, re-evaluada al cambiar '
+             'la resolución) o una fija: residente, vae_slicing, attention_slicing, modelo o secuencial (default: auto)'
+    )
+    
+    parser.add_argument(
+        '--calentar',
+        type=str,
+        default=None,
+        help='Resoluciones a compilar al iniciar --serve --compilar, ej: 768x768,512x512 (default: 768x768,512x512)'
+    )
+    
+    parser.add_argument(
+        '--presupuesto-modelos-mb',
+        type=int,
+        default=None,
+        help='Memoria para mantener varios modelos cargados en modo --serve (default: automático)'
+    )
+    
+    parser.add_argument(
+        '--max-blobs-mb',
+        type=int,
+        default=4096,
+        help='Tamaño máximo en disco del almacén de blobs (blobs/), donde quedan las imágenes entregadas '
+             'en base64 o bytes; al superarlo se borran las usadas hace más tiempo y su URL de /api/images/blob '
+             'pasa a responder 404 (0 = sin límite, default: 4096)'
+    )
+    
+    parser.add_argument(
+        '--inactividad-modelos',
+        type=float,
+        default=None,
+        help='Segundos sin uso tras los que se descarga un modelo en modo --serve (default: nunca)'
+    )
+    
+    parser.add_argument(
+        '--puerto-metricas',
+        type=int,
+        default=None,
+        help='Puerto HTTP donde exponer las métricas en formato Prometheus (/metrics) en modo --serve'
+    )
+    
+    parser.add_argument(
+        '--host-metricas',
+        type=str,
+        default='127.0.0.1',
+        help='Interfaz del servidor de métricas (default: 127.0.0.1)'
+    )
+    
+    parser.add_argument(
+        '--archivo-metricas',
+        type=str,
+        default=None,
+        help='Archivo donde escribir las métricas en formato Prometheus después de cada solicitud'
+    )
+    
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Emitir JSON Lines: inicio, cada imagen apenas termina, progreso y un resumen final'
+    )
+    
+    parser.add_argument(
+        '--eventos-paso',
+        action='store_true',
+        help='Con --stream, emitir también un evento "paso" por cada paso de denoising (con su duración)'
+    )
+    
+    parser.add_argument(
+        '--transporte',
+        type=str,
+        default='json',
+        choices=MODOS_TRANSPORTE,
+        help='Cómo entregar las imágenes: json (base64), binario (tramas con prefijo de longitud) o ruta (archivo en /dev/shm)'
+    )
+    
+    parser.add_argument(
+        '--dir-transporte',
+        type=str,
+        default=None,
+        help='Directorio para las imágenes de --transporte ruta (default: /dev/shm o el temporal del sistema)'
+    )
+    
+    parser.add_argument(
+        '--persistir-embeddings',
+        action='store_true',
+        help='Guardar en disco la cache de embeddings de prompts para reutilizarla entre ejecuciones'
+    )
+    
+    parser.add_argument(
+        '--status',
+        action='store_true',
+        help='Reporta Python, dependencias, modelos en cache y dispositivo sin cargar el modelo'
+    )
+    
+    parser.add_argument(
+        '--importar-metadata',
+        action='store_true',
+        help='Importa los metadata/sesion_*.json existentes al índice SQLite (metadata/metadata.db) y termina'
+    )
+    
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help='Modo worker: carga el modelo una vez y atiende solicitudes JSON (una por línea) desde stdin'
+    )
+    
     parser.add_argument(
         '--version',
         action='version',
@@ -199,6 +1328,29 @@ Estilos disponibles: profesional, artistico, minimalista, natural, premium, dive
         # Parsear argumentos
         args = parser.parse_args()
         
+        # El generador redirige sys.stdout mientras trabaja: las respuestas van al stdout real
+        transporte = TransporteSalida(sys.stdout, args.transporte, args.dir_transporte)
+        
+        if args.status:
+            print(json.dumps(obtener_estado_servicio(args), ensure_ascii=False, indent=2 if not args.quiet else None))
+            return
+        
+        if args.importar_metadata:
+            # Sin torch: solo lee los JSON y escribe el índice
+            from almacen_metadata import AlmacenMetadata
+            carpeta_metadata = Path("metadata")
+            resultado = AlmacenMetadata(carpeta_metadata / "metadata.db").importar_json(carpeta_metadata)
+            transporte.enviar({
+                "exito": not resultado["errores"],
+                **resultado,
+                "timestamp": datetime.now().isoformat()
+            }, indentar=not args.quiet)
+            return
+        
+        if args.serve:
+            servir(args)
+            return
+        
         # Validar argumentos
         errores = validar_argumentos(args)
         if errores:
@@ -209,7 +1361,7 @@ Estilos disponibles: profesional, artistico, minimalista, natural, premium, dive
                 "errores": errores,
                 "timestamp": datetime.now().isoformat()
             }
-            print(json.dumps(respuesta_error, ensure_ascii=False, indent=2 if not args.quiet else None))
+            transporte.enviar(respuesta_error, indentar=not args.quiet)
             sys.exit(1)
         
         # Mostrar info de inicio si no está en modo quiet
@@ -222,170 +1374,7 @@ Estilos disponibles: profesional, artistico, minimalista, natural, premium, dive
         if not args.quiet:
             print("Inicializando generador de imágenes...", file=sys.stderr)
         
-        # Crear una versión del generador que controle los emojis
-        class GeneradorLimpio(GeneradorImagenesConsumibles):
-            def __init__(self, *init_args, **init_kwargs):
-                # Redirigir completamente la inicialización para evitar prints en stdout
-                if args.quiet:
-                    import contextlib
-                    import io
-                    f = io.StringIO()
-                    with contextlib.redirect_stdout(f), contextlib.redirect_stderr(f):
-                        super().__init__(*init_args, **init_kwargs)
-                else:
-                    # Capturar y redirigir a stderr
-                    import contextlib
-                    import io
-                    
-                    old_stdout = sys.stdout
-                    stdout_buffer = io.StringIO()
-                    
-                    try:
-                        sys.stdout = stdout_buffer
-                        super().__init__(*init_args, **init_kwargs)
-                        
-                        # Todo lo capturado va a stderr
-                        captured_output = stdout_buffer.getvalue().strip()
-                        if captured_output:
-                            print(captured_output, file=sys.stderr)
-                            
-                    finally:
-                        sys.stdout = old_stdout
-            
-            def _detectar_dispositivo(self):
-                if hasattr(self, '_device_cached'):
-                    return self._device_cached
-                
-                import torch
-                if torch.cuda.is_available():
-                    self._device_cached = "cuda"
-                    if not args.quiet:
-                        gpu_name = torch.cuda.get_device_name(0)
-                        print(f"GPU detectada: {gpu_name}", file=sys.stderr)
-                        print(f"VRAM disponible: {torch.cuda.get_device_properties(0).total_memory // 1024**3} GB", file=sys.stderr)
-                else:
-                    self._device_cached = "cpu"
-                    if not args.quiet:
-                        print("GPU no disponible, usando CPU (sera mas lento)", file=sys.stderr)
-                return self._device_cached
-            
-            def _cargar_pipeline(self):
-                if not args.quiet:
-                    print(f"Cargando modelo: {self.modelo_id}", file=sys.stderr)
-                    print(f"Tipo: {'SDXL' if self.es_sdxl else 'SD 1.5/2.x'}", file=sys.stderr)
-                    
-                # Llamar al método padre pero redirigir prints
-                import contextlib
-                import io
-                
-                if args.quiet:
-                    # Suprimir completamente los prints en modo quiet
-                    f = io.StringIO()
-                    with contextlib.redirect_stdout(f), contextlib.redirect_stderr(f):
-                        super()._cargar_pipeline()
-                else:
-                    # Capturar y filtrar emojis
-                    import re
-                    from io import StringIO
-                    
-                    old_stdout = sys.stdout
-                    old_stderr = sys.stderr
-                    stdout_buffer = StringIO()
-                    stderr_buffer = StringIO()
-                    
-                    try:
-                        sys.stdout = stdout_buffer
-                        sys.stderr = stderr_buffer
-                        super()._cargar_pipeline()
-                        
-                        # Filtrar emojis y mostrar output limpio
-                        stdout_content = stdout_buffer.getvalue()
-                        stderr_content = stderr_buffer.getvalue()
-                        
-                        # Remover emojis usando regex
-                        emoji_pattern = re.compile("["
-                            u"\U0001F600-\U0001F64F"  # emoticons
-                            u"\U0001F300-\U0001F5FF"  # symbols & pictographs
-                            u"\U0001F680-\U0001F6FF"  # transport & map
-                            u"\U0001F1E0-\U0001F1FF"  # flags
-                            u"\U00002700-\U000027BF"  # dingbats
-                            u"\U0001F900-\U0001F9FF"  # supplemental symbols
-                            "]+", flags=re.UNICODE)
-                        
-                        clean_stdout = emoji_pattern.sub('', stdout_content).strip()
-                        clean_stderr = emoji_pattern.sub('', stderr_content).strip()
-                        
-                        if clean_stdout:
-                            print(clean_stdout, file=old_stderr)
-                        if clean_stderr:
-                            print(clean_stderr, file=old_stderr)
-                            
-                    finally:
-                        sys.stdout = old_stdout
-                        sys.stderr = old_stderr
-            
-            def generar_imagenes(self, *args_gen, **kwargs_gen):
-                if args.quiet:
-                    # Suprimir completamente los prints en modo quiet
-                    import contextlib
-                    import io
-                    f = io.StringIO()
-                    with contextlib.redirect_stdout(f), contextlib.redirect_stderr(f):
-                        return super().generar_imagenes(*args_gen, **kwargs_gen)
-                else:
-                    # Capturar y filtrar emojis
-                    import re
-                    from io import StringIO
-                    
-                    old_stdout = sys.stdout
-                    old_stderr = sys.stderr
-                    stdout_buffer = StringIO()
-                    stderr_buffer = StringIO()
-                    
-                    try:
-                        sys.stdout = stdout_buffer
-                        sys.stderr = stderr_buffer
-                        result = super().generar_imagenes(*args_gen, **kwargs_gen)
-                        
-                        # Filtrar emojis
-                        emoji_pattern = re.compile("["
-                            u"\U0001F600-\U0001F64F"
-                            u"\U0001F300-\U0001F5FF"
-                            u"\U0001F680-\U0001F6FF"
-                            u"\U0001F1E0-\U0001F1FF"
-                            u"\U00002700-\U000027BF"
-                            u"\U0001F900-\U0001F9FF"
-                            "]+", flags=re.UNICODE)
-                        
-                        clean_stdout = emoji_pattern.sub('', stdout_buffer.getvalue()).strip()
-                        clean_stderr = emoji_pattern.sub('', stderr_buffer.getvalue()).strip()
-                        
-                        if clean_stdout:
-                            print(clean_stdout, file=old_stderr)
-                        if clean_stderr:
-                            print(clean_stderr, file=old_stderr)
-                            
-                        return result
-                    finally:
-                        sys.stdout = old_stdout
-                        sys.stderr = old_stderr
-            
-            def limpiar_memoria(self):
-                if args.quiet:
-                    import contextlib
-                    import io
-                    f = io.StringIO()
-                    with contextlib.redirect_stdout(f), contextlib.redirect_stderr(f):
-                        return super().limpiar_memoria()
-                else:
-                    if self.device == "cuda":
-                        import torch
-                        torch.cuda.empty_cache()
-                    import gc
-                    gc.collect()
-                    print("Memoria limpiada", file=sys.stderr)
-        
-        generador = GeneradorLimpio()
+        generador = crear_generador(args.quiet, **opciones_generador(args))
         
         if not args.quiet:
             print(f"Generador inicializado - Dispositivo: {generador.device}", file=sys.stderr)
@@ -396,98 +1385,11 @@ Estilos disponibles: profesional, artistico, minimalista, natural, premium, dive
             generador.carpeta_imagenes = Path(args.output_dir)
             generador.carpeta_imagenes.mkdir(exist_ok=True, parents=True)
         
-        # Generar imágenes
-        # Determinar si usar base64 o archivos
-        use_base64 = args.base64 and not args.save_files
-        
-        if not args.quiet:
-            print(f"Modo: {'Base64' if use_base64 else 'Archivos'}", file=sys.stderr)
-        
-        resultado = generador.generar_imagenes(
-            nombre_producto=args.producto,
-            descripcion=args.descripcion,
-            estilo=args.estilo,
-            num_variaciones=args.variaciones,
-            width=args.width,
-            height=args.height,
-            pasos_inferencia=args.pasos,
-            guidance_scale=args.guidance,
-            return_base64=use_base64
-        )
-        
-        # Formatear respuesta para Node.js con rutas absolutas
-        respuesta_final = {
-            "exito": True,
-            "mensaje": f"Se generaron {resultado['resultados']['exitosas']} de {args.variaciones} imágenes solicitadas",
-            "timestamp": datetime.now().isoformat(),
-            "datos": {
-                "session_id": resultado['session_id'],
-                "producto": {
-                    "nombre": args.producto,
-                    "descripcion": args.descripcion,
-                    "tipo": "consumible"
-                },
-                "configuracion": {
-                    "estilo": args.estilo,
-                    "variaciones_solicitadas": args.variaciones,
-                    "dimensiones": {"width": args.width, "height": args.height},
-                    "pasos_inferencia": args.pasos,
-                    "guidance_scale": args.guidance,
-                    "dispositivo": generador.device
-                },
-                "estadisticas": {
-                    "total_generadas": resultado['resultados']['exitosas'],
-                    "total_fallidas": resultado['resultados']['fallidas'],
-                    "tasa_exito": resultado['resultados']['tasa_exito']
-                },
-                "imagenes": [],
-                "archivos": {
-                    "directorio_imagenes": str(generador.carpeta_imagenes.absolute()),
-                    "archivo_metadata": resultado.get('archivo_metadata', '')
-                }
-            }
-        }
-        
-        # Procesar lista de imágenes generadas
-        for img_info in resultado['imagenes']:
-            if img_info.get('exito', False):
-                if img_info.get('formato') == 'base64':
-                    # Imagen en base64
-                    imagen_data = {
-                        "id": f"{resultado['session_id']}_{img_info['variacion']:02d}",
-                        "variacion": img_info['variacion'],
-                        "nombre_archivo": img_info['nombre_archivo'],
-                        "base64_data": img_info['base64_data'],
-                        "mime_type": img_info['mime_type'],
-                        "formato": "base64",
-                        "metadata": {
-                            "hash_sha256": img_info['hash_sha256'],
-                            "tamano_bytes": img_info['tamano_bytes'],
-                            "dimensiones": img_info['dimensiones'],
-                            "timestamp_generacion": img_info['timestamp_generacion']
-                        }
-                    }
-                else:
-                    # Imagen como archivo
-                    imagen_data = {
-                        "id": f"{resultado['session_id']}_{img_info['variacion']:02d}",
-                        "variacion": img_info['variacion'],
-                        "nombre_archivo": img_info['nombre_archivo'],
-                        "ruta_absoluta": img_info['ruta_completa'],
-                        "ruta_relativa": img_info['ruta_relativa'],
-                        "url_file": f"file://{img_info['ruta_completa']}",  # Para acceso directo
-                        "formato": "archivo",
-                        "metadata": {
-                            "hash_sha256": img_info['hash_sha256'],
-                            "tamano_bytes": img_info.get('tamano_archivo', img_info.get('tamano_bytes', 0)),
-                            "dimensiones": img_info['dimensiones'],
-                            "timestamp_generacion": img_info['timestamp_generacion']
-                        }
-                    }
-                respuesta_final['datos']['imagenes'].append(imagen_data)
+        respuesta_final = generar_respuesta(generador, args, emitir=transporte.enviar, transporte=transporte)
+        guardar_metricas(generador, args.archivo_metricas)
         
         # Output del JSON resultado (esto es lo que captura Node.js)
-        print(json.dumps(respuesta_final, ensure_ascii=False, indent=2 if not args.quiet else None))
+        transporte.enviar(respuesta_final, indentar=not (args.quiet or args.stream))
         
         if not args.quiet:
             print(f"\nGeneración completada!", file=sys.stderr)
@@ -503,7 +1405,7 @@ Estilos disponibles: profesional, artistico, minimalista, natural, premium, dive
             "mensaje": "Generación interrumpida por el usuario",
             "timestamp": datetime.now().isoformat()
         }
-        print(json.dumps(respuesta_interrupcion, ensure_ascii=False))
+        transporte.enviar(respuesta_interrupcion)
         sys.exit(1)
         
     except Exception as e:
@@ -515,7 +1417,7 @@ Estilos disponibles: profesional, artistico, minimalista, natural, premium, dive
             "timestamp": datetime.now().isoformat(),
             "traceback": traceback.format_exc() if not args.quiet else None
         }
-        print(json.dumps(respuesta_error, ensure_ascii=False))
+        transporte.enviar(respuesta_error)
         sys.exit(1)
 
 if __name__ == "__main__":
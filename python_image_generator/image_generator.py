@@ -1,30 +1,95 @@
 import os
+# torch se importa con este módulo; generar_cli.py solo lo importa cuando necesita un pipeline
 import torch
 import json
 from datetime import datetime
 from PIL import Image
 import hashlib
 from pathlib import Path
-from diffusers import StableDiffusionPipeline, StableDiffusionXLPipeline, DPMSolverMultistepScheduler
 import gc
 import base64
+import random
+import time
 from io import BytesIO
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from cache_embeddings import CacheEmbeddings
+from cache_resultados import CacheResultados
+from almacen_blobs import AlmacenBlobs
+from almacen_metadata import AlmacenMetadata
+from registro_pipelines import RegistroPipelines
+from lote_paralelo import calcular_procesos, ejecutar_lote
+import backend_inferencia
+from cuantizacion import CUANTIZACIONES
+import cuantizacion as cuantizacion_int8
+import compilacion
+from metricas import MetricasGenerador
+import memoria
+from memoria import POLITICAS_MEMORIA, POLITICAS_OFFLOAD, RESOLUCION_CARGA, MemoriaInsuficienteError
+from schedulers import SCHEDULERS, GUIDANCE_MAXIMO_LCM, pasos_preset, es_modelo_lcm, activar_adaptador_lcm, aplicar_scheduler
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Formatos de salida: formato de Pillow, extensión, tipo MIME y calidad por defecto
+# (en PNG la "calidad" es el nivel de compresión zlib 0-9: menos = más rápido y más grande)
+FORMATOS_IMAGEN = {
+    "png": {"pil": "PNG", "extension": "png", "mime": "image/png", "calidad": 6},
+    "webp": {"pil": "WEBP", "extension": "webp", "mime": "image/webp", "calidad": 80},
+    "jpeg": {"pil": "JPEG", "extension": "jpg", "mime": "image/jpeg", "calidad": 90},
+    "avif": {"pil": "AVIF", "extension": "avif", "mime": "image/avif", "calidad": 60}
+}
+
+# Campos con los bytes de la imagen: nunca se escriben en los archivos de metadata
+CAMPOS_CARGA = ("base64_data", "datos")
+
+# Precisiones del pipeline en CPU ('auto' = bfloat16 si la CPU lo soporta de forma nativa)
+PRECISIONES_CPU = ["float32", "bfloat16", "auto"]
+
+# Derivados por defecto: nombre -> lado mayor en píxeles (la imagen completa siempre se conserva)
+DERIVADOS_POR_DEFECTO = {"miniatura": 256, "mediano": 768}
+
+
+class SolicitudCancelada(RuntimeError):
+    """
+    El llamador canceló la generación (por ejemplo, por timeout) antes de que terminara
+    """
+
 
 class GeneradorImagenesConsumibles:
-    def __init__(self, modelo="runwayml/stable-diffusion-v1-5", cache_dir="./modelos"):
+    def __init__(self, modelo="runwayml/stable-diffusion-v1-5", cache_dir="./modelos",
+                 persistir_embeddings=False, max_cache_resultados_mb=2048,
+                 presupuesto_modelos_mb=None, inactividad_modelos=None, backend="pytorch",
+                 cuantizacion=None, precision_cpu="float32", compilar=False, politica_memoria="ajustar",
+                 politica_offload="auto", max_blobs_mb=4096, indexar_metadata=True):
         """
         Inicializa el generador de imágenes promocionales para productos consumibles
         
         Args:
             modelo (str): Modelo de Stable Diffusion a usar
             cache_dir (str): Directorio donde guardar los modelos descargados
+            persistir_embeddings (bool): Si True, guarda en disco los embeddings de prompts
+            max_cache_resultados_mb (int): Tamaño máximo de la cache de imágenes generadas
+            presupuesto_modelos_mb (int): Memoria para modelos residentes (None = automático)
+            inactividad_modelos (float): Segundos sin uso tras los que se descarga un modelo (None = nunca)
+            backend (str): Runtime de inferencia en CPU: 'pytorch', 'onnx' (ONNX Runtime) u 'openvino'
+            cuantizacion (str): 'int8' cuantiza UNet y text encoders en CPU con PyTorch (None = float32)
+            precision_cpu (str): Precisión del pipeline en CPU: 'float32', 'bfloat16' o 'auto'
+                                 (bfloat16 si la CPU lo soporta de forma nativa)
+            compilar (bool): Si True, compila UNet y VAE con torch.compile y usa channels-last y SDPA
+                             (backend pytorch; ver calentar() para compilar antes de la primera solicitud)
+            politica_memoria (str): Control de admisión según la memoria libre: 'ajustar' (dividir en
+                                    lotes y, si hace falta, reducir la resolución), 'dividir' o 'ninguna'
+            politica_offload (str): Estrategia de memoria del pipeline: 'auto' (según la memoria disponible,
+                                    re-evaluada al cambiar la resolución) o una fija: 'residente',
+                                    'vae_slicing', 'attention_slicing', 'modelo' o 'secuencial'
+            max_blobs_mb (int): Tamaño máximo del almacén de blobs de las imágenes entregadas en
+                                base64/bytes; se expulsan las usadas hace más tiempo (None o 0 = sin límite)
+            indexar_metadata (bool): Si False, no abre el índice SQLite de metadata ni registra las
+                                     sesiones en él (procesos de un lote en paralelo: registra el padre)
         """
-        self.modelo_id = modelo
-        self.cache_dir = cache_dir
-        self.device = self._detectar_dispositivo()
-        self.pipeline = None
-        self.es_sdxl = "xl" in modelo.lower()
-        
         # Modelos recomendados para diferentes tipos de contenido
         self.modelos_recomendados = {
             "promocional": "stabilityai/stable-diffusion-xl-base-1.0",  # SDXL para calidad y composición
@@ -32,197 +97,1285 @@ class GeneradorImagenesConsumibles:
             "artistico": "stabilityai/stable-diffusion-2-1",            # SD 2.1 para arte
         }
         
+        self.modelo_id = self.modelos_recomendados.get(modelo, modelo)
+        self.cache_dir = cache_dir
+        
+        # Argumentos para recrear el generador en los procesos de un lote en paralelo
+        self.config_generador = {
+            "modelo": modelo,
+            "cache_dir": cache_dir,
+            "persistir_embeddings": persistir_embeddings,
+            "max_cache_resultados_mb": max_cache_resultados_mb,
+            "presupuesto_modelos_mb": presupuesto_modelos_mb,
+            "inactividad_modelos": inactividad_modelos,
+            "backend": backend,
+            "cuantizacion": cuantizacion,
+            "precision_cpu": precision_cpu,
+            "compilar": compilar,
+            "politica_memoria": politica_memoria,
+            "politica_offload": politica_offload,
+            "max_blobs_mb": max_blobs_mb
+        }
+        
+        self.device = self._detectar_dispositivo()
+        
+        # Los backends exportados solo aplican en CPU; en GPU se usa siempre PyTorch
+        if backend not in backend_inferencia.BACKENDS:
+            raise ValueError(f"Backend no soportado: {backend}. Opciones: {', '.join(backend_inferencia.BACKENDS)}")
+        if backend != "pytorch" and self.device == "cuda":
+            print(f"WARNING: El backend {backend} es solo para CPU, usando pytorch en GPU")
+            backend = "pytorch"
+        self.backend = backend
+        
+        # Cuantización int8: solo para el backend PyTorch en CPU
+        if cuantizacion is not None and cuantizacion not in CUANTIZACIONES:
+            raise ValueError(f"Cuantización no soportada: {cuantizacion}. Opciones: {', '.join(CUANTIZACIONES)}")
+        if cuantizacion and (self.device == "cuda" or backend != "pytorch"):
+            print(f"WARNING: La cuantización {cuantizacion} es solo para CPU con el backend pytorch, se desactiva")
+            cuantizacion = None
+        self.cuantizacion = cuantizacion
+        
+        # Precisión de los pesos y activaciones: float16 en GPU, float32 o bfloat16 en CPU
+        self.precision = "float16" if self.device == "cuda" else self._resolver_precision_cpu(precision_cpu)
+        
+        # Modo compilado: los artefactos de inductor persisten entre arranques
+        if compilar and backend != "pytorch":
+            print(f"WARNING: El modo compilado es solo para el backend pytorch, se desactiva con {backend}")
+            compilar = False
+        self.compilar = compilar
+        self.directorio_compilacion = Path(cache_dir) / "compilacion"
+        if self.compilar:
+            compilacion.configurar_cache(self.directorio_compilacion)
+        
+        self.pipeline = None
+        self.es_sdxl = "xl" in self.modelo_id.lower()
+        
+        # Registro de pipelines: varios modelos residentes dentro de un presupuesto de memoria
+        self.registro_pipelines = RegistroPipelines(
+            cargador=self._crear_pipeline,
+            dispositivo=self.device,
+            presupuesto_dispositivo=self._presupuesto_modelos(presupuesto_modelos_mb),
+            presupuesto_cpu=self._presupuesto_modelos(None, dispositivo="cpu") if self.device == "cuda" else None,
+            tiempo_inactividad=inactividad_modelos,
+            estimador=self._estimar_pesos_modelo
+        )
+        self.registro_pipelines.al_descargar = self._al_descargar_modelo
+        
+        # Métricas de operación (texto de Prometheus): se actualizan al terminar cada sesión
+        self.metricas = MetricasGenerador()
+        self.metricas.modelos_residentes.funcion = lambda: len(self.registro_pipelines.modelos_residentes())
+        if self.device == "cuda":
+            self.metricas.vram.funcion = torch.cuda.memory_reserved
+        
+        # Control de admisión: qué hacer con una solicitud que no cabe en la memoria libre
+        if politica_memoria not in POLITICAS_MEMORIA:
+            raise ValueError(f"Política de memoria no soportada: {politica_memoria}. Opciones: {', '.join(POLITICAS_MEMORIA)}")
+        self.politica_memoria = politica_memoria
+        
+        # Estrategia de memoria del pipeline (offload): se elige al cargar cada modelo
+        if politica_offload not in POLITICAS_OFFLOAD:
+            raise ValueError(f"Política de offload no soportada: {politica_offload}. Opciones: {', '.join(POLITICAS_OFFLOAD)}")
+        self.politica_offload = politica_offload
+        
+        # Generación por lotes: fracción de la memoria libre usable y límite de imágenes por llamada
+        self.fraccion_memoria_lote = 0.6
+        self.tamano_lote_maximo = 8
+        
+        # Cache de embeddings de prompts (los text encoders solo corren en un fallo de cache)
+        self.cache_embeddings = CacheEmbeddings(
+            max_entradas=64,
+            directorio=Path(cache_dir) / "embeddings" if persistir_embeddings else None
+        )
+        
         # Crear directorios necesarios
         self.carpeta_imagenes = Path("imagenes_consumibles")
         self.carpeta_imagenes.mkdir(exist_ok=True)
         self.carpeta_metadata = Path("metadata")
         self.carpeta_metadata.mkdir(exist_ok=True)
         
+        # Índice SQLite de sesiones e imágenes (al crearlo se importan los JSON existentes)
+        self.almacen_metadata = AlmacenMetadata(self.carpeta_metadata / "metadata.db") if indexar_metadata else None
+        if self.almacen_metadata is not None and self.almacen_metadata.nueva:
+            importacion = self.almacen_metadata.importar_json(self.carpeta_metadata)
+            if importacion["importadas"]:
+                print(f"Sesiones importadas al índice de metadata: {importacion['importadas']}")
+        
+        # Cache de imágenes direccionada por contenido (modelo, prompts, semilla y parámetros)
+        self.cache_resultados = CacheResultados(
+            directorio="cache_resultados",
+            max_bytes=max_cache_resultados_mb * 1024**2
+        )
+        
+        # Bytes de las imágenes entregadas en base64/bytes: una sola copia por contenido
+        self.almacen_blobs = AlmacenBlobs(
+            directorio="blobs",
+            max_bytes=max_blobs_mb * 1024**2 if max_blobs_mb else None
+        )
+        
+        # Post-proceso (PNG, hash, base64, escritura) en segundo plano mientras corre el siguiente lote
+        self.pool_postproceso = ThreadPoolExecutor(
+            max_workers=min(4, os.cpu_count() or 1),
+            thread_name_prefix="postproceso"
+        )
+        
         # Cargar el pipeline
         self._cargar_pipeline()
         
-        print(f"Generador inicializado usando: {self.device}")
+        print(f"Generador inicializado usando: {self.device}")
+
+    def _detectar_dispositivo(self):
+        """
+        Detecta automáticamente si usar GPU o CPU
+        
+        Returns:
+            str: 'cuda' si hay GPU disponible, 'cpu' en caso contrario
+        """
+        if torch.cuda.is_available():
+            gpu_name = torch.cuda.get_device_name(0)
+            print(f"GPU detectada: {gpu_name}")
+            print(f"VRAM disponible: {torch.cuda.get_device_properties(0).total_memory // 1024**3} GB")
+            return "cuda"
+        else:
+            print("GPU no disponible, usando CPU (sera mas lento)")
+            return "cpu"
+
+    def _cpu_soporta_bf16(self):
+        """
+        Detecta si la CPU tiene instrucciones bfloat16 nativas (AMX o AVX512-BF16)
+        
+        Returns:
+            bool: True si bfloat16 corre en hardware y no emulado
+        """
+        try:
+            with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+                for linea in f:
+                    if linea.startswith("flags"):
+                        flags = set(linea.split(":", 1)[1].split())
+                        return bool(flags & {"amx_bf16", "avx512_bf16"})
+        except OSError:
+            pass
+        
+        # Sin /proc/cpuinfo (Windows, macOS): preguntar a oneDNN
+        try:
+            return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+        except Exception:
+            return False
+
+    def _resolver_precision_cpu(self, precision_cpu):
+        """
+        Decide la precisión del pipeline en CPU
+        
+        Args:
+            precision_cpu (str): 'float32', 'bfloat16' o 'auto'
+            
+        Returns:
+            str: 'float32' o 'bfloat16'
+        """
+        if precision_cpu not in PRECISIONES_CPU:
+            raise ValueError(f"Precisión no soportada: {precision_cpu}. Opciones: {', '.join(PRECISIONES_CPU)}")
+        if precision_cpu == "float32":
+            return "float32"
+        
+        # bfloat16 no aplica a los runtimes exportados ni a los pesos cuantizados a int8
+        if self.backend != "pytorch" or self.cuantizacion:
+            if precision_cpu == "bfloat16":
+                print("WARNING: bfloat16 solo aplica al backend pytorch sin cuantización, usando float32")
+            return "float32"
+        
+        if self._cpu_soporta_bf16():
+            print("CPU con bfloat16 nativo (AMX/AVX512-BF16): usando bfloat16")
+            return "bfloat16"
+        
+        if precision_cpu == "bfloat16":
+            print("WARNING: La CPU no tiene bfloat16 nativo, usando float32")
+        return "float32"
+
+    def _contexto_precision(self):
+        """
+        Retorna el autocast con el que se llama al pipeline
+        """
+        # En CPU el autocast (bfloat16) solo se activa en modo bfloat16: con float32
+        # degradaría los matmuls a bfloat16 emulado en CPUs sin soporte nativo
+        return torch.autocast(self.device, enabled=self.device == "cuda" or self.precision == "bfloat16")
+
+    def _clave_modelo(self):
+        """
+        Identifica el modelo junto con lo que cambia sus salidas numéricas (cuantización, precisión)
+        """
+        clave = self.modelo_id
+        if self.cuantizacion:
+            clave += f"+{self.cuantizacion}"
+        if self.precision == "bfloat16":
+            clave += "+bfloat16"
+        return clave
+
+    def _presupuesto_modelos(self, presupuesto_mb, dispositivo=None):
+        """
+        Calcula la memoria disponible para modelos residentes
+        
+        Args:
+            presupuesto_mb (int): Presupuesto explícito en MB (None = automático)
+            dispositivo (str): Dispositivo a consultar (por defecto el de ejecución)
+            
+        Returns:
+            int: Presupuesto en bytes, o None si no se puede determinar
+        """
+        if presupuesto_mb is not None:
+            return presupuesto_mb * 1024**2
+        
+        dispositivo = dispositivo or self.device
+        try:
+            if dispositivo == "cuda":
+                return int(torch.cuda.get_device_properties(0).total_memory * 0.8)
+            if psutil is not None:
+                # Dejar margen para las activaciones de la generación
+                return int(psutil.virtual_memory().total * 0.5)
+        except Exception:
+            pass
+        return None
+
+    def _crear_pipeline(self, modelo_id):
+        """
+        Carga el pipeline de Stable Diffusion de un modelo optimizado para el dispositivo disponible
+        
+        Args:
+            modelo_id (str): Modelo de Stable Diffusion a cargar
+            
+        Returns:
+            Pipeline de diffusers listo para generar
+        """
+        # diffusers tarda segundos en importarse: solo se paga al cargar un modelo
+        from diffusers import StableDiffusionPipeline, StableDiffusionXLPipeline
+        
+        es_sdxl = "xl" in modelo_id.lower()
+        print(f"Cargando modelo: {modelo_id}")
+        print(f"Tipo: {'SDXL' if es_sdxl else 'SD 1.5/2.x'}")
+        
+        # Seleccionar clase de pipeline según el modelo
+        pipeline_class = StableDiffusionXLPipeline if es_sdxl else StableDiffusionPipeline
+        
+        # Memoria medida antes de cargar: la estrategia de memoria se elige para estos pesos
+        memoria_disponible = self._memoria_libre()
+        
+        # Configurar según dispositivo disponible
+        if self.device == "cuda":
+            print("Configurando para GPU...")
+            # Los pesos se cargan en RAM: la estrategia de memoria decide qué sube a la GPU y cuándo
+            pipeline = pipeline_class.from_pretrained(
+                modelo_id,
+                torch_dtype=torch.float16,  # Usar float16 para ahorrar VRAM
+                cache_dir=self.cache_dir,
+                safety_checker=None,
+                requires_safety_checker=False,
+                use_safetensors=True
+            )
+            
+            # Memory efficient attention
+            try:
+                if hasattr(pipeline, 'enable_memory_efficient_attention'):
+                    pipeline.enable_memory_efficient_attention()
+                    print("Memory efficient attention habilitado")
+            except Exception:
+                pass
+            
+        elif self.backend != "pytorch":
+            print(f"Configurando para CPU con {self.backend}...")
+            # Text encoder, UNet y VAE exportados al runtime (se exportan una sola vez por modelo)
+            pipeline = backend_inferencia.cargar_pipeline(self.backend, modelo_id, self.cache_dir)
+            
+        else:
+            print("Configurando para CPU...")
+            # Configuración para CPU: float32, o bfloat16 si la CPU lo soporta (mitad de memoria)
+            dtype = torch.bfloat16 if self.precision == "bfloat16" else torch.float32
+            
+            # Los componentes ya cuantizados se cargan de disco en lugar de los pesos float32
+            componentes_int8 = {}
+            if self.cuantizacion == "int8":
+                componentes_int8 = cuantizacion_int8.cargar_componentes(self.cache_dir, modelo_id, es_sdxl, dtype)
+            
+            pipeline = pipeline_class.from_pretrained(
+                modelo_id,
+                torch_dtype=dtype,
+                cache_dir=self.cache_dir,
+                safety_checker=None,
+                requires_safety_checker=False,
+                use_safetensors=True,
+                **componentes_int8
+            )
+            
+            if self.cuantizacion == "int8":
+                pipeline = cuantizacion_int8.cuantizar_pipeline(
+                    pipeline, self.cache_dir, modelo_id, es_sdxl, ya_cuantizados=componentes_int8
+                )
+            pipeline = pipeline.to(self.device)
+        
+        if self.backend == "pytorch":
+            # Residencia completa, slicing u offload según la memoria (se re-evalúa en cada solicitud)
+            self._aplicar_offload(pipeline, self._elegir_offload(es_sdxl, *RESOLUCION_CARGA, memoria_disponible))
+        
+        if self.compilar and self.backend == "pytorch":
+            # torch.compile no soporta las capas int8 dinámicas ni los hooks del CPU offloading
+            compilable = not self.cuantizacion and not hasattr(pipeline.unet, "_hf_hook")
+            if not compilable:
+                print("WARNING: UNet cuantizada o con offloading: solo channels-last y SDPA, sin torch.compile")
+            pipeline = compilacion.optimizar_pipeline(pipeline, compilar=compilable)
+        
+        return pipeline
+
+    def _elegir_offload(self, es_sdxl, width, height, memoria_disponible, memoria_modelo=None,
+                        margen=memoria.MARGEN_PROCESO, estrategias=None):
+        """
+        Elige la estrategia de memoria de un pipeline para una resolución (ver memoria.elegir_offload)
+        
+        Args:
+            es_sdxl (bool): Si el modelo es SDXL
+            width (int): Ancho de imagen
+            height (int): Alto de imagen
+            memoria_disponible (float): Bytes para el modelo y sus activaciones (None = no se pudo medir)
+            memoria_modelo (float): Memoria medida del pipeline (None = estimarla)
+            margen (float): Bytes reservados para el proceso (0 con el modelo ya cargado)
+            estrategias (list): Estrategias candidatas (None = las que aplican al dispositivo)
+            
+        Returns:
+            dict: Estrategia elegida
+        """
+        return memoria.elegir_offload(
+            es_sdxl, self.precision, width, height, memoria_disponible,
+            estrategias=estrategias or memoria.estrategias_disponibles(self.device, self.compilar),
+            politica=self.politica_offload,
+            cuantizacion=self.cuantizacion,
+            memoria_modelo=memoria_modelo,
+            margen=margen
+        )
+
+    def _aplicar_offload(self, pipeline, eleccion):
+        """
+        Aplica al pipeline la estrategia de memoria elegida para su resolución
+        
+        Args:
+            pipeline: Pipeline de diffusers con PyTorch
+            eleccion (dict): Estrategia devuelta por _elegir_offload (se actualiza si hay que usar un respaldo)
+            
+        Returns:
+            dict: Estrategia aplicada
+        """
+        width, height = eleccion["width"], eleccion["height"]
+        anterior = getattr(pipeline, "_offload", None)
+        if anterior is None and eleccion["decision"] == "fija" and eleccion["estrategia"] != self.politica_offload:
+            print(f"WARNING: La estrategia {self.politica_offload} no aplica en {self.device}"
+                  f"{' con compilación' if self.compilar else ''}, usando {eleccion['estrategia']}")
+        
+        try:
+            memoria.aplicar_offload(pipeline, eleccion["estrategia"], self.device, width, height)
+        except Exception as e:
+            # El offload necesita accelerate: sin él, el recorte más ahorrativo sin mover pesos
+            respaldo = memoria.estrategias_disponibles(self.device, self.compilar)[:3][-1]
+            print(f"WARNING: No se pudo aplicar la estrategia {eleccion['estrategia']}: {e}. Usando {respaldo}")
+            memoria.aplicar_offload(pipeline, respaldo, self.device, width, height)
+            eleccion.update({"estrategia": respaldo, "decision": "respaldo"})
+        
+        if anterior is None or anterior["estrategia"] != eleccion["estrategia"]:
+            disponible = eleccion["memoria_disponible_mb"]
+            print(f"Estrategia de memoria: {eleccion['estrategia']} para {width}x{height} "
+                  f"(~{eleccion['estimacion_mb']['total']} MB"
+                  f"{f' de {disponible} MB disponibles' if disponible is not None else ''})")
+            self.metricas.offload.incrementar(estrategia=eleccion["estrategia"])
+        if eleccion["decision"] == "insuficiente":
+            print(f"WARNING: Ni con {eleccion['estrategia']} cabe una imagen de {width}x{height} en la memoria disponible")
+        
+        pipeline._offload = eleccion
+        return eleccion
+
+    def _estrategias_offload(self):
+        """
+        Retorna las estrategias de memoria candidatas para el pipeline activo, de la más rápida a la más ahorrativa
+        """
+        if self.backend != "pytorch":
+            return ["residente"]
+        disponibles = memoria.estrategias_disponibles(self.device, self.compilar)
+        if self.politica_offload == "auto":
+            return disponibles
+        return [self.politica_offload if self.politica_offload in disponibles else disponibles[-1]]
+
+    def _estrategia_offload(self):
+        """
+        Retorna la estrategia de memoria del pipeline activo ('residente' si no tiene)
+        """
+        return getattr(self.pipeline, "_offload", {}).get("estrategia", "residente")
+
+    def _cargar_pipeline(self):
+        """
+        Carga el pipeline del modelo actual a través del registro de pipelines
+        """
+        try:
+            self.pipeline = self.registro_pipelines.obtener(self.modelo_id)
+            print("Modelo cargado exitosamente")
+            
+        except Exception as e:
+            print(f"ERROR: Error cargando el modelo: {str(e)}")
+            print("Intentando cargar modelo por defecto (SD 1.5)...")
+            
+            # Fallback a SD 1.5 si falla SDXL
+            try:
+                self.modelo_id = "runwayml/stable-diffusion-v1-5"
+                self.es_sdxl = False
+                self.pipeline = self.registro_pipelines.obtener(self.modelo_id)
+                
+                print("Modelo SD 1.5 cargado como fallback")
+                
+            except Exception as fallback_error:
+                print(f"ERROR CRITICO: Error cargando fallback: {str(fallback_error)}")
+                raise
+
+    def _seleccionar_modelo(self, modelo):
+        """
+        Activa el modelo pedido para una solicitud (se carga solo si no está en el registro)
+        
+        Args:
+            modelo (str): ID del modelo o alias de modelos_recomendados
+        """
+        modelo_id = self.modelos_recomendados.get(modelo, modelo)
+        if modelo_id == self.modelo_id and self.pipeline is not None:
+            return
+        
+        # A diferencia de la carga inicial, aquí no hay fallback: la solicitud pidió este modelo
+        self.pipeline = self.registro_pipelines.obtener(modelo_id)
+        self.modelo_id = modelo_id
+        self.es_sdxl = "xl" in modelo_id.lower()
+
+    def _configurar_scheduler(self, scheduler):
+        """
+        Aplica el scheduler pedido al pipeline activo (y el adaptador LCM si hace falta)
+        
+        Args:
+            scheduler (str): Nombre del scheduler (None = el del modelo)
+        """
+        if self.backend == "pytorch":
+            usar_adaptador = scheduler == "lcm" and not es_modelo_lcm(self.pipeline)
+            if usar_adaptador and (self.cuantizacion or self.compilar):
+                raise ValueError("El adaptador LCM-LoRA no se puede aplicar a una UNet cuantizada o compilada")
+            activar_adaptador_lcm(self.pipeline, self.es_sdxl, self.cache_dir, usar_adaptador)
+        elif scheduler == "lcm" and not es_modelo_lcm(self.pipeline):
+            raise ValueError(f"Con el backend {self.backend} LCM requiere un modelo LCM exportado")
+        
+        aplicar_scheduler(self.pipeline, scheduler)
+
+    def _clase_scheduler_por_defecto(self, modelo_id):
+        """
+        Retorna la clase del scheduler por defecto de un modelo sin cargar su pipeline
+        
+        Args:
+            modelo_id (str): ID del modelo en Hugging Face o ruta local
+            
+        Returns:
+            str: Nombre de la clase del scheduler, o None si no se pudo leer model_index.json
+        """
+        if modelo_id == self.modelo_id and self.pipeline is not None:
+            return type(getattr(self.pipeline, "_scheduler_original", self.pipeline.scheduler)).__name__
+        
+        try:
+            from diffusers import DiffusionPipeline
+            
+            # model_index.json: componente -> [biblioteca, clase]
+            return DiffusionPipeline.load_config(modelo_id, cache_dir=self.cache_dir)["scheduler"][1]
+        except Exception as e:
+            print(f"WARNING: No se pudo leer el scheduler por defecto de {modelo_id}: {e}")
+            return None
+
+    def _al_descargar_modelo(self, modelo_id):
+        """
+        Suelta la referencia al pipeline activo cuando el registro lo descarga
+        """
+        if modelo_id == self.modelo_id:
+            self.pipeline = None
+
+    def _construir_prompt_promocional(self, nombre_producto, descripcion, estilo="promocional"):
+        """
+        Construye prompts optimizados para imágenes promocionales de marketing
+        
+        Args:
+            nombre_producto (str): Nombre del producto
+            descripcion (str): Descripción del producto  
+            estilo (str): Estilo de imagen promocional deseado
+            
+        Returns:
+            tuple: (prompt_positivo, prompt_negativo)
+        """
+        # Estilos promocionales con configuración específica
+        estilos_promocionales = {
+            "promocional": "advertising photo, commercial product photography, studio lighting",
+            "banner": "social media banner, web advertisement, marketing visual", 
+            "catalogo": "catalog photography, retail product photo, clean background, commercial style",
+            "instagram": "Instagram post, social media content, trendy photography",
+            "editorial": "magazine photography, editorial style, artistic composition",
+            "ecommerce": "e-commerce photo, white background, product listing, clean presentation",
+            "premium": "luxury product photography, premium brand, elegant presentation",
+            "natural": "natural product photography, organic style, soft lighting",
+            "profesional": "professional product photography, studio lighting, commercial quality",
+            "artistico": "artistic product photography, creative composition, dramatic lighting",
+            "minimalista": "minimalist product photography, clean composition, simple background",
+            "divertido": "playful product photography, vibrant colors, fun presentation"
+        }
+        
+        # Usar 'promocional' como fallback si el estilo no existe
+        estilo_config = estilos_promocionales.get(estilo.lower(), estilos_promocionales["promocional"])
+        
+        # Construir prompt más detallado y específico
+        # Priorizar la descripción del producto para mayor fidelidad
+        prompt_positivo = f"{descripcion}, {nombre_producto}, {estilo_config}, professional photography, high quality, sharp focus, detailed, realistic".strip()
+        
+        # Construir prompt positivo más específico y detallado
+        # Enfatizar características específicas del producto
+        prompt_detallado = f"{nombre_producto}, {descripcion}"
+        
+        # Añadir términos que refuercen las características específicas
+        if "blanco" in nombre_producto.lower() or "white" in nombre_producto.lower():
+            prompt_detallado += ", white color, creamy white texture, pale appearance"
+        elif "oscuro" in nombre_producto.lower() or "dark" in nombre_producto.lower() or "negro" in nombre_producto.lower():
+            prompt_detallado += ", dark brown color, rich chocolate appearance, deep cocoa color"
+        elif "leche" in nombre_producto.lower() or "milk" in nombre_producto.lower():
+            prompt_detallado += ", milk chocolate color, light brown appearance, creamy texture"
+            
+        # Reconstruir el prompt completo
+        prompt_positivo = f"{prompt_detallado}, {estilo_config}, professional photography, high quality, sharp focus, detailed, realistic, accurate colors".strip()
+        
+        # Prompt negativo general (sin filtros específicos)
+        prompt_negativo = "blurry, low quality, distorted, ugly, bad composition, poor lighting, unprofessional, pixelated, cartoon, anime, drawing, watermark, wrong colors, inaccurate appearance, multiple items, duplicate, deformed, unrealistic"
+        
+        return prompt_positivo, prompt_negativo
+    
+    # Mantener compatibilidad con el método anterior
+    def _construir_prompt_consumible(self, nombre_producto, descripcion, estilo="promocional"):
+        """
+        Método de compatibilidad que redirige al nuevo método promocional
+        """
+        return self._construir_prompt_promocional(nombre_producto, descripcion, estilo)
+
+    def _codificar_prompt(self, prompt):
+        """
+        Obtiene los embeddings de un prompt usando la cache de embeddings
+        
+        Args:
+            prompt (str): Texto del prompt
+            
+        Returns:
+            dict: Tensores de embeddings en el dispositivo de ejecución
+        """
+        dispositivo = self.pipeline._execution_device
+        # Un text encoder cuantizado o en bfloat16 produce embeddings distintos
+        clave_modelo = self._clave_modelo()
+        embeddings = self.cache_embeddings.obtener(clave_modelo, prompt)
+        
+        if embeddings is None:
+            with torch.no_grad():
+                if self.es_sdxl:
+                    # SDXL: dos text encoders, el segundo aporta además el embedding agrupado
+                    prompt_embeds, _, pooled_prompt_embeds, _ = self.pipeline.encode_prompt(
+                        prompt=prompt,
+                        device=dispositivo,
+                        num_images_per_prompt=1,
+                        do_classifier_free_guidance=False
+                    )
+                    embeddings = {
+                        "prompt_embeds": prompt_embeds,
+                        "pooled_prompt_embeds": pooled_prompt_embeds
+                    }
+                else:
+                    prompt_embeds, _ = self.pipeline.encode_prompt(
+                        prompt=prompt,
+                        device=dispositivo,
+                        num_images_per_prompt=1,
+                        do_classifier_free_guidance=False
+                    )
+                    embeddings = {"prompt_embeds": prompt_embeds}
+            
+            self.cache_embeddings.guardar(clave_modelo, prompt, embeddings)
+        
+        return {nombre: tensor.to(dispositivo) for nombre, tensor in embeddings.items()}
+
+    def _argumentos_prompt(self, prompt_pos, prompt_neg):
+        """
+        Construye los argumentos de prompt del pipeline a partir de embeddings precalculados
+        
+        Args:
+            prompt_pos (str): Prompt positivo
+            prompt_neg (str): Prompt negativo
+            
+        Returns:
+            dict: Argumentos prompt_embeds/negative_prompt_embeds (o los textos si falla la codificación)
+        """
+        # Con un backend exportado el text encoder corre dentro del runtime
+        if self.backend != "pytorch":
+            return {"prompt": prompt_pos, "negative_prompt": prompt_neg}
+        
+        try:
+            positivo = self._codificar_prompt(prompt_pos)
+            negativo = self._codificar_prompt(prompt_neg)
+        except Exception as e:
+            print(f"WARNING: No se pudieron precalcular embeddings, usando prompts de texto: {e}")
+            return {"prompt": prompt_pos, "negative_prompt": prompt_neg}
+        
+        argumentos = {
+            "prompt_embeds": positivo["prompt_embeds"],
+            "negative_prompt_embeds": negativo["prompt_embeds"]
+        }
+        if self.es_sdxl:
+            argumentos["pooled_prompt_embeds"] = positivo["pooled_prompt_embeds"]
+            argumentos["negative_pooled_prompt_embeds"] = negativo["pooled_prompt_embeds"]
+        
+        return argumentos
+
+    def _formato_soportado(self, formato_imagen):
+        """
+        Indica si la instalación de Pillow puede codificar un formato de salida
+        
+        Args:
+            formato_imagen (str): Clave de FORMATOS_IMAGEN
+            
+        Returns:
+            bool: True si Pillow tiene un encoder para el formato
+        """
+        if formato_imagen == "avif":
+            try:
+                import pillow_avif  # noqa: F401 - registra AVIF en Pillow < 11.2
+            except ImportError:
+                pass
+        
+        Image.init()
+        return FORMATOS_IMAGEN[formato_imagen]["pil"] in Image.SAVE
+
+    def _codificar_imagen(self, imagen, formato_imagen="png", calidad=None):
+        """
+        Codifica una imagen generada en el formato de salida pedido
+        
+        Args:
+            imagen (PIL.Image): Imagen generada por el pipeline
+            formato_imagen (str): Clave de FORMATOS_IMAGEN
+            calidad (int): Calidad 1-100 (formatos con pérdida) o compresión 0-9 (PNG); None = por defecto
+            
+        Returns:
+            bytes: Imagen codificada
+        """
+        formato = FORMATOS_IMAGEN[formato_imagen]
+        if calidad is None:
+            calidad = formato["calidad"]
+        
+        buffer = BytesIO()
+        if formato_imagen == "png":
+            imagen.save(buffer, format="PNG", compress_level=calidad)
+        else:
+            if formato_imagen == "jpeg" and imagen.mode != "RGB":
+                imagen = imagen.convert("RGB")
+            imagen.save(buffer, format=formato["pil"], quality=calidad)
+        return buffer.getvalue()
+
+    def _guardar_imagen(self, img_bytes, i, nombre_producto, estilo, session_id, width, height, return_base64,
+                        return_bytes=False, formato_imagen="png"):
+        """
+        Entrega una imagen codificada (base64, bytes o archivo) y construye su metadata
+        
+        Args:
+            img_bytes (bytes): Imagen codificada
+            i (int): Índice de la variación (desde 0)
+            nombre_producto (str): Nombre del producto
+            estilo (str): Estilo de la imagen
+            session_id (str): ID de la sesión de generación
+            width (int): Ancho de imagen
+            height (int): Alto de imagen
+            return_base64 (bool): Si True, devuelve la imagen en base64 en lugar de guardar archivo
+            return_bytes (bool): Si True, devuelve los bytes crudos en "datos" (sin base64 ni archivo)
+            formato_imagen (str): Formato en que está codificada la imagen (clave de FORMATOS_IMAGEN)
+            
+        Returns:
+            dict: Metadata de la imagen individual
+        """
+        formato = FORMATOS_IMAGEN[formato_imagen]
+        
+        # Crear nombre de archivo único
+        nombre_archivo = f"{nombre_producto.replace(' ', '_')}_{estilo}_{session_id}_{i+1:02d}.{formato['extension']}"
+        
+        # Calcular hash de la imagen para verificación
+        hash_completo = hashlib.sha256(img_bytes).hexdigest()
+        hash_imagen = hash_completo[:16]
+        
+        # Sin archivo propio, los bytes se conservan en el almacén de blobs
+        if return_bytes or return_base64:
+            almacenamiento = self.almacen_blobs.guardar(img_bytes, formato["extension"], clave=hash_completo)
+        
+        if return_bytes:
+            # Bytes crudos: el llamador decide cómo transportarlos
+            metadata_imagen = {
+                "variacion": i + 1,
+                "nombre_archivo": nombre_archivo,
+                "datos": img_bytes,
+                "mime_type": formato["mime"],
+                "tamano_bytes": len(img_bytes),
+                "hash_sha256": hash_imagen,
+                "dimensiones": {"width": width, "height": height},
+                "timestamp_generacion": datetime.now().isoformat(),
+                "exito": True,
+                "formato": "bytes",
+                "almacenamiento": almacenamiento
+            }
+        elif return_base64:
+            # Convertir imagen a base64
+            img_base64 = base64.b64encode(img_bytes).decode('utf-8')
+            
+            # Metadata de la imagen individual (modo base64)
+            metadata_imagen = {
+                "variacion": i + 1,
+                "nombre_archivo": nombre_archivo,
+                "base64_data": img_base64,
+                "mime_type": formato["mime"],
+                "tamano_bytes": len(img_bytes),
+                "hash_sha256": hash_imagen,
+                "dimensiones": {"width": width, "height": height},
+                "timestamp_generacion": datetime.now().isoformat(),
+                "exito": True,
+                "formato": "base64",
+                "almacenamiento": almacenamiento
+            }
+        else:
+            # Modo tradicional: guardar archivo
+            ruta_archivo = self.carpeta_imagenes / nombre_archivo
+            ruta_archivo.write_bytes(img_bytes)
+            
+            # Metadata de la imagen individual (modo archivo)
+            metadata_imagen = {
+                "variacion": i + 1,
+                "nombre_archivo": nombre_archivo,
+                "ruta_completa": str(ruta_archivo.absolute()),
+                "ruta_relativa": str(ruta_archivo),
+                "tamano_archivo": len(img_bytes),
+                "hash_sha256": hash_imagen,
+                "dimensiones": {"width": width, "height": height},
+                "timestamp_generacion": datetime.now().isoformat(),
+                "exito": True,
+                "formato": "archivo",
+                "almacenamiento": {
+                    "tipo": "archivo",
+                    "ruta": str(ruta_archivo.absolute()),
+                    "tamano_bytes": len(img_bytes)
+                }
+            }
+        
+        return metadata_imagen
+
+    def _generar_derivados(self, imagen, nombre_archivo, derivados, formato_imagen, calidad):
+        """
+        Genera versiones reducidas de una imagen y las guarda junto a las imágenes completas
+        
+        Los derivados siempre se escriben en carpeta_imagenes (también en modo base64) para
+        que los listados y el frontend puedan pedir la versión chica por URL.
+        
+        Args:
+            imagen (PIL.Image): Imagen completa decodificada
+            nombre_archivo (str): Nombre de archivo de la imagen completa
+            derivados (dict): Nombre del derivado -> lado mayor en píxeles
+            formato_imagen (str): Formato de salida (clave de FORMATOS_IMAGEN)
+            calidad (int): Calidad o nivel de compresión del formato
+            
+        Returns:
+            list: Metadata de cada derivado (los que no reducen la imagen se omiten)
+        """
+        base = nombre_archivo.rsplit(".", 1)[0]
+        extension = FORMATOS_IMAGEN[formato_imagen]["extension"]
+        resultado = []
+        
+        for nombre, lado in sorted(derivados.items(), key=lambda derivado: derivado[1]):
+            if lado >= max(imagen.size):
+                continue
+            
+            try:
+                inicio = time.perf_counter()
+                
+                # reducing_gap reduce primero por bloques enteros y luego remuestrea: mucho más rápido
+                derivado = imagen.copy()
+                derivado.thumbnail((lado, lado), Image.Resampling.BICUBIC, reducing_gap=2.0)
+                derivado_bytes = self._codificar_imagen(derivado, formato_imagen, calidad)
+                
+                ruta_archivo = self.carpeta_imagenes / f"{base}_{nombre}.{extension}"
+                ruta_archivo.write_bytes(derivado_bytes)
+                
+                resultado.append({
+                    "nombre": nombre,
+                    "nombre_archivo": ruta_archivo.name,
+                    "ruta_completa": str(ruta_archivo.absolute()),
+                    "dimensiones": {"width": derivado.width, "height": derivado.height},
+                    "tamano_bytes": len(derivado_bytes),
+                    "hash_sha256": hashlib.sha256(derivado_bytes).hexdigest()[:16],
+                    "tiempo_ms": round((time.perf_counter() - inicio) * 1000, 1)
+                })
+            except Exception as e:
+                print(f"WARNING: No se pudo generar el derivado '{nombre}' de {nombre_archivo}: {e}")
+        
+        return resultado
+
+    def _postprocesar_imagen(self, imagen, img_bytes, i, clave_cache, calidad, derivados=None, **entrega):
+        """
+        Codifica una variación, la guarda en la cache y la entrega (corre en pool_postproceso)
+        
+        Args:
+            imagen (PIL.Image): Imagen generada (None si img_bytes ya viene codificada)
+            img_bytes (bytes): Imagen ya codificada, por ejemplo desde la cache (None = codificar)
+            i (int): Índice de la variación (desde 0)
+            clave_cache (str): Clave de la cache de resultados donde guardarla (None = no guardar)
+            calidad (int): Calidad o nivel de compresión del formato de salida
+            derivados (dict): Versiones reducidas a generar (nombre -> lado mayor); None = ninguna
+            **entrega: Resto de argumentos de _guardar_imagen
+            
+        Returns:
+            dict: Metadata de la imagen individual, con tamaño y tiempos de codificación y guardado
+        """
+        tiempo_codificacion = 0.0
+        if img_bytes is None:
+            inicio = time.perf_counter()
+            img_bytes = self._codificar_imagen(imagen, entrega["formato_imagen"], calidad)
+            tiempo_codificacion = time.perf_counter() - inicio
+            if clave_cache is not None:
+                self.cache_resultados.guardar(clave_cache, img_bytes)
+        
+        inicio = time.perf_counter()
+        metadata_imagen = self._guardar_imagen(img_bytes, i, **entrega)
+        tiempo_guardado = time.perf_counter() - inicio
+        metadata_imagen["codificacion"] = {
+            "formato": entrega["formato_imagen"],
+            "calidad": calidad,
+            "tamano_bytes": len(img_bytes),
+            "tiempo_ms": round(tiempo_codificacion * 1000, 1)
+        }
+        
+        if derivados:
+            # Las imágenes de la cache llegan codificadas: decodificar una sola vez
+            if imagen is None:
+                imagen = Image.open(BytesIO(img_bytes))
+            metadata_imagen["derivados"] = self._generar_derivados(
+                imagen, metadata_imagen["nombre_archivo"], derivados, entrega["formato_imagen"], calidad
+            )
+        
+        # Tiempos del post-proceso; generar_imagenes agrega los de la llamada al pipeline
+        metadata_imagen["perfil_tiempos"] = {
+            "codificacion_ms": round(tiempo_codificacion * 1000, 1),
+            "guardado_ms": round(tiempo_guardado * 1000, 1),
+            "derivados_ms": round(sum(derivado["tiempo_ms"] for derivado in metadata_imagen.get("derivados", [])), 1)
+        }
+        
+        return metadata_imagen
+
+    def _descartar_postproceso(self, en_proceso):
+        """
+        Cancela los post-procesos que no se registraron y borra los archivos que dejaron
+        
+        Los pendientes se cancelan y los que ya corren se esperan, para que ningún hilo de
+        pool_postproceso siga escribiendo después de que generar_imagenes haya terminado.
+        
+        Args:
+            en_proceso (deque): Tuplas (índice, desde_cache, futuro) sin registrar; se vacía
+        """
+        for _, _, futuro in en_proceso:
+            futuro.cancel()
+        
+        for _, _, futuro in en_proceso:
+            if futuro.cancelled():
+                continue
+            try:
+                metadata_imagen = futuro.result()
+            except Exception:
+                continue
+            
+            # Archivos propios de la imagen (el almacén de blobs y la cache se comparten)
+            rutas = [metadata_imagen.get("ruta_transporte")]
+            if metadata_imagen.get("formato") == "archivo":
+                rutas.append(metadata_imagen.get("ruta_completa"))
+            rutas.extend(derivado.get("ruta_completa") for derivado in metadata_imagen.get("derivados", []))
+            for ruta in rutas:
+                if ruta:
+                    try:
+                        Path(ruta).unlink(missing_ok=True)
+                    except OSError as e:
+                        print(f"WARNING: No se pudo borrar {ruta}: {e}")
+        
+        en_proceso.clear()
+
+    def _metadata_sin_cargas(self, metadata_sesion):
+        """
+        Copia la metadata de una sesión sin los bytes de las imágenes (base64 o crudos)
+        
+        Args:
+            metadata_sesion (dict): Metadata de la sesión
+            
+        Returns:
+            dict: Metadata con solo los descriptores de cada imagen
+        """
+        return {
+            **metadata_sesion,
+            "imagenes": [
+                {campo: valor for campo, valor in img.items() if campo not in CAMPOS_CARGA}
+                for img in metadata_sesion["imagenes"]
+            ]
+        }
+
+    def _notificar(self, callback_evento, evento):
+        """
+        Envía un evento al callback del llamador sin interrumpir la generación si falla
+        
+        Args:
+            callback_evento (callable): Callback recibido en generar_imagenes (puede ser None)
+            evento (dict): Evento a enviar
+        """
+        if callback_evento is None:
+            return
+        try:
+            callback_evento(evento)
+        except Exception as e:
+            print(f"WARNING: Error en callback de evento '{evento.get('tipo')}': {e}")
+
+    def _registrar_imagen(self, metadata_sesion, metadata_imagen, callback_evento):
+        """
+        Agrega el resultado de una variación a la sesión y lo notifica de inmediato
+        
+        Args:
+            metadata_sesion (dict): Metadata de la sesión en curso
+            metadata_imagen (dict): Metadata de la imagen (o del error) de la variación
+            callback_evento (callable): Callback de eventos (puede ser None)
+        """
+        metadata_sesion["imagenes"].append(metadata_imagen)
+        
+        self._notificar(callback_evento, {
+            "tipo": "imagen",
+            "session_id": metadata_sesion["session_id"],
+            "imagen": metadata_imagen
+        })
+        self._notificar(callback_evento, {
+            "tipo": "progreso",
+            "session_id": metadata_sesion["session_id"],
+            "completadas": len(metadata_sesion["imagenes"]),
+            "total": metadata_sesion["parametros"]["num_variaciones"]
+        })
+
+    def _monitor_pasos(self, callback_evento=None, session_id=None, variaciones=None, total_pasos=None,
+                       cancelar=None):
+        """
+        Crea el callback por paso que mide cada paso de denoising y detecta latentes con NaN/Inf
+        
+        Debe crearse justo antes de llamar al pipeline: la primera marca de tiempo es la de la llamada.
+        
+        Args:
+            callback_evento (callable): Si se indica, recibe un evento "paso" al terminar cada paso
+            session_id (str): ID de la sesión (para los eventos)
+            variaciones (list): Variaciones (desde 1) que genera esta llamada (para los eventos)
+            total_pasos (int): Pasos de inferencia de la llamada (para los eventos)
+            cancelar (callable): Si devuelve True, el denoising se corta al terminar el paso en curso
+        
+        Returns:
+            tuple: (argumentos para la llamada al pipeline,
+                    monitor con "rotos" (posición en el lote -> primer paso roto) y "marcas" de tiempo)
+        """
+        monitor = {"rotos": {}, "marcas": [time.perf_counter()]}
+        rotos = monitor["rotos"]
+        
+        # Los runtimes exportados no exponen los latentes por paso
+        if self.backend != "pytorch":
+            return {}, monitor
+        
+        def revisar(pipeline, paso, timestep, tensores):
+            monitor["marcas"].append(time.perf_counter())
+            if callback_evento is not None:
+                self._notificar(callback_evento, {
+                    "tipo": "paso",
+                    "session_id": session_id,
+                    "variaciones": variaciones,
+                    "paso": paso + 1,
+                    # Algunos schedulers (PNDM) hacen un timestep más que los pasos pedidos
+                    "total_pasos": getattr(pipeline, "num_timesteps", None) or total_pasos,
+                    "tiempo_ms": round((monitor["marcas"][-1] - monitor["marcas"][-2]) * 1000, 1)
+                })
+            
+            latentes = tensores["latents"]
+            finitos = torch.isfinite(latentes.flatten(1)).all(dim=1)
+            if not finitos.all():
+                for posicion in (~finitos).nonzero().flatten().tolist():
+                    rotos.setdefault(posicion, paso)
+                # Con todo el lote roto no tiene sentido seguir: se corta el denoising
+                if len(rotos) == latentes.shape[0]:
+                    pipeline._interrupt = True
+            if cancelar is not None and cancelar():
+                pipeline._interrupt = True
+            return tensores
+        
+        return {"callback_on_step_end": revisar, "callback_on_step_end_tensor_inputs": ["latents"]}, monitor
+
+    def _perfil_llamada(self, monitor, fin, tamano_lote):
+        """
+        Resume los tiempos de una llamada al pipeline a partir de las marcas del monitor de pasos
+        
+        Args:
+            monitor (dict): Monitor creado por _monitor_pasos para la llamada
+            fin (float): time.perf_counter() al volver el pipeline
+            tamano_lote (int): Imágenes generadas en la llamada
+            
+        Returns:
+            dict: Tiempos en milisegundos (denoising, por paso y decodificación del VAE)
+        """
+        marcas = monitor["marcas"]
+        perfil = {
+            "tamano_lote": tamano_lote,
+            "pipeline_ms": round((fin - marcas[0]) * 1000, 1)
+        }
+        
+        # Sin callback por paso (backends exportados) solo se conoce el total de la llamada
+        if len(marcas) < 2:
+            return perfil
+        
+        pasos_ms = [(b - a) * 1000 for a, b in zip(marcas, marcas[1:])]
+        perfil.update({
+            "pasos": len(pasos_ms),
+            # El primer paso incluye la preparación de latentes y timesteps
+            "denoising_ms": round((marcas[-1] - marcas[0]) * 1000, 1),
+            "paso_ms": {
+                "media": round(sum(pasos_ms) / len(pasos_ms), 1),
+                "min": round(min(pasos_ms), 1),
+                "max": round(max(pasos_ms), 1)
+            },
+            # Lo que corre después del último paso: VAE, safety checker y conversión a PIL
+            "decodificacion_vae_ms": round((fin - marcas[-1]) * 1000, 1)
+        })
+        return perfil
+
+    def _admite_cambio_precision(self):
+        """
+        Indica si el pipeline compartido puede pasar a float32 durante un reintento
+        
+        Con CPU offloading los hooks de accelerate gestionan los pesos, un UNet compilado se
+        recompilaría para el nuevo dtype y los módulos int8 no se pueden convertir.
+        """
+        offload = getattr(self.pipeline, "_offload", None) or {}
+        return not (self.compilar or self.cuantizacion or offload.get("estrategia") in ("modelo", "secuencial"))
+
+    def _reintentar_variacion(self, argumentos_prompt, semilla, width, height, pasos_inferencia,
+                              guidance_scale, scheduler, paso_detectado):
+        """
+        Vuelve a generar una sola variación con precisión y scheduler de respaldo
+        
+        Args:
+            argumentos_prompt (dict): Embeddings o textos del prompt de la solicitud
+            semilla (int): Semilla de la variación
+            width (int): Ancho de imagen
+            height (int): Alto de imagen
+            pasos_inferencia (int): Pasos de diffusión
+            guidance_scale (float): Adherencia al prompt
+            scheduler (str): Scheduler de la solicitud (None = el del modelo)
+            paso_detectado (int): Paso en el que aparecieron los NaN/Inf
+            
+        Returns:
+            tuple: (imagen o None si el reintento también se rompió, detalle del reintento)
+        """
+        # Respaldo: float32 si se generaba en precisión reducida y un scheduler más estable
+        # (el del modelo si se pidió otro; Euler ancestral si ya era el del modelo; LCM se mantiene)
+        precision_respaldo = "float32" if self.precision != "float32" else None
+        if precision_respaldo and not self._admite_cambio_precision():
+            print(f"WARNING: El reintento se hace en {self.precision}: el pipeline usa CPU offloading, "
+                  f"compilación o cuantización y no se le puede cambiar el dtype")
+            precision_respaldo = None
+        scheduler_respaldo = scheduler if scheduler == "lcm" else (None if scheduler else "euler_a")
+        detalle = {
+            "motivo": "latentes_no_finitos",
+            "paso_detectado": paso_detectado,
+            "precision": precision_respaldo or self.precision,
+            "scheduler": scheduler_respaldo or "por_defecto"
+        }
+        
+        dtype_original = self.pipeline.unet.dtype
+        try:
+            if precision_respaldo:
+                self.pipeline.to(dtype=torch.float32)
+                argumentos_prompt = {
+                    nombre: valor.to(torch.float32) if torch.is_tensor(valor) else valor
+                    for nombre, valor in argumentos_prompt.items()
+                }
+            self._configurar_scheduler(scheduler_respaldo)
+            
+            argumentos_monitor, monitor = self._monitor_pasos()
+            with torch.autocast(self.device, enabled=False) if precision_respaldo else self._contexto_precision():
+                result = self.pipeline(
+                    **argumentos_prompt,
+                    width=width,
+                    height=height,
+                    num_inference_steps=pasos_inferencia,
+                    guidance_scale=guidance_scale,
+                    num_images_per_prompt=1,
+                    **backend_inferencia.argumentos_aleatorios(self.pipeline, self.backend, [semilla], width, height),
+                    **argumentos_monitor
+                )
+            detalle["perfil_tiempos"] = self._perfil_llamada(monitor, time.perf_counter(), 1)
+        finally:
+            # Dejar el pipeline como estaba para las variaciones siguientes (el scheduler aunque
+            # falle la vuelta al dtype original)
+            try:
+                if precision_respaldo:
+                    self.pipeline.to(dtype=dtype_original)
+            finally:
+                self._configurar_scheduler(scheduler)
+        
+        detalle["exito"] = not monitor["rotos"]
+        return (None if monitor["rotos"] else result.images[0]), detalle
 
-    def _detectar_dispositivo(self):
+    def _memoria_por_imagen(self, width, height):
         """
-        Detecta automáticamente si usar GPU o CPU
+        Estima la memoria de activaciones de una imagen durante la generación
         
+        Args:
+            width (int): Ancho de imagen
+            height (int): Alto de imagen
+            
         Returns:
-            str: 'cuda' si hay GPU disponible, 'cpu' en caso contrario
+            float: Bytes aproximados por imagen
         """
-        if torch.cuda.is_available():
-            gpu_name = torch.cuda.get_device_name(0)
-            print(f"GPU detectada: {gpu_name}")
-            print(f"VRAM disponible: {torch.cuda.get_device_properties(0).total_memory // 1024**3} GB")
-            return "cuda"
-        else:
-            print("GPU no disponible, usando CPU (sera mas lento)")
-            return "cpu"
+        return memoria.memoria_activaciones(self.es_sdxl, self.precision, width, height, self._estrategia_offload())
 
-    def _cargar_pipeline(self):
+    def _memoria_libre(self):
         """
-        Carga el pipeline de Stable Diffusion optimizado para el dispositivo disponible
+        Retorna la memoria libre del dispositivo de generación, o None si no se puede medir
         """
-        print(f"Cargando modelo: {self.modelo_id}")
-        print(f"Tipo: {'SDXL' if self.es_sdxl else 'SD 1.5/2.x'}")
-        
         try:
-            # Seleccionar clase de pipeline según el modelo
-            pipeline_class = StableDiffusionXLPipeline if self.es_sdxl else StableDiffusionPipeline
-            
-            # Configurar según dispositivo disponible
             if self.device == "cuda":
-                print("Configurando para GPU...")
-                # Configuración básica y estable para GPU
-                self.pipeline = pipeline_class.from_pretrained(
-                    self.modelo_id,
-                    torch_dtype=torch.float16,  # Usar float16 para ahorrar VRAM
-                    cache_dir=self.cache_dir,
-                    safety_checker=None,
-                    requires_safety_checker=False,
-                    use_safetensors=True
-                )
-                
-                # Mover a GPU
-                self.pipeline = self.pipeline.to(self.device)
-                
-                # Aplicar optimizaciones según el tipo de modelo
-                try:
-                    self.pipeline.enable_attention_slicing()
-                    print("Attention slicing habilitado")
-                except Exception as e:
-                    print(f"WARNING: Attention slicing no disponible: {e}")
-                
-                # Memory efficient attention
-                try:
-                    if hasattr(self.pipeline, 'enable_memory_efficient_attention'):
-                        self.pipeline.enable_memory_efficient_attention()
-                        print("Memory efficient attention habilitado")
-                except Exception:
-                    pass
-                
-                # CPU offloading para modelos grandes como SDXL
-                if self.es_sdxl:
-                    try:
-                        self.pipeline.enable_model_cpu_offload()
-                        print("Model CPU offloading habilitado")
-                    except Exception:
-                        pass
-                
+                # Lo reservado por el asignador de PyTorch y sin usar también está disponible
+                memoria_libre = torch.cuda.mem_get_info()[0]
+                memoria_libre += torch.cuda.memory_reserved() - torch.cuda.memory_allocated()
+            elif psutil is not None:
+                memoria_libre = psutil.virtual_memory().available
             else:
-                print("Configurando para CPU...")
-                # Configuración para CPU
-                self.pipeline = pipeline_class.from_pretrained(
-                    self.modelo_id,
-                    torch_dtype=torch.float32,  # CPU requiere float32
-                    cache_dir=self.cache_dir,
-                    safety_checker=None,
-                    requires_safety_checker=False,
-                    use_safetensors=True
-                )
-                self.pipeline = self.pipeline.to(self.device)
-            
-            print("Modelo cargado exitosamente")
-            
-        except Exception as e:
-            print(f"ERROR: Error cargando el modelo: {str(e)}")
-            print("Intentando cargar modelo por defecto (SD 1.5)...")
-            
-            # Fallback a SD 1.5 si falla SDXL
-            try:
-                self.modelo_id = "runwayml/stable-diffusion-v1-5"
-                self.es_sdxl = False
-                
-                if self.device == "cuda":
-                    self.pipeline = StableDiffusionPipeline.from_pretrained(
-                        self.modelo_id,
-                        torch_dtype=torch.float16,
-                        cache_dir=self.cache_dir,
-                        safety_checker=None,
-                        requires_safety_checker=False
-                    )
-                    self.pipeline = self.pipeline.to(self.device)
-                else:
-                    self.pipeline = StableDiffusionPipeline.from_pretrained(
-                        self.modelo_id,
-                        torch_dtype=torch.float32,
-                        cache_dir=self.cache_dir,
-                        safety_checker=None,
-                        requires_safety_checker=False
-                    )
-                    self.pipeline = self.pipeline.to(self.device)
-                
-                print("Modelo SD 1.5 cargado como fallback")
-                
-            except Exception as fallback_error:
-                print(f"ERROR CRITICO: Error cargando fallback: {str(fallback_error)}")
-                raise
+                return None
+        except Exception:
+            return None
+        return memoria_libre
 
-    def _construir_prompt_promocional(self, nombre_producto, descripcion, estilo="promocional"):
+    def _estimar_pesos_modelo(self, modelo_id):
         """
-        Construye prompts optimizados para imágenes promocionales de marketing
+        Estima los bytes de los pesos de un modelo antes de cargarlo (el registro le hace lugar primero)
+        """
+        return memoria.memoria_pesos("xl" in modelo_id.lower(), self.precision, self.cuantizacion)
+
+    def _memoria_modelo(self):
+        """
+        Retorna la memoria medida del pipeline activo en el registro (None si no está registrado)
+        """
+        return sum(
+            modelo["memoria_mb"] for modelo in self.registro_pipelines.modelos_residentes()
+            if modelo["modelo"] == self.modelo_id
+        ) * 1024**2 or None
+
+    def _calcular_tamano_lote(self, width, height, num_variaciones):
+        """
+        Calcula cuántas variaciones generar por llamada al pipeline según la memoria disponible
         
         Args:
-            nombre_producto (str): Nombre del producto
-            descripcion (str): Descripción del producto  
-            estilo (str): Estilo de imagen promocional deseado
+            width (int): Ancho de imagen
+            height (int): Alto de imagen
+            num_variaciones (int): Número total de imágenes a generar
             
         Returns:
-            tuple: (prompt_positivo, prompt_negativo)
+            int: Tamaño de lote (mínimo 1)
         """
-        # Estilos promocionales con configuración específica
-        estilos_promocionales = {
-            "promocional": "advertising photo, commercial product photography, studio lighting",
-            "banner": "social media banner, web advertisement, marketing visual", 
-            "catalogo": "catalog photography, retail product photo, clean background, commercial style",
-            "instagram": "Instagram post, social media content, trendy photography",
-            "editorial": "magazine photography, editorial style, artistic composition",
-            "ecommerce": "e-commerce photo, white background, product listing, clean presentation",
-            "premium": "luxury product photography, premium brand, elegant presentation",
-            "natural": "natural product photography, organic style, soft lighting",
-            "profesional": "professional product photography, studio lighting, commercial quality",
-            "artistico": "artistic product photography, creative composition, dramatic lighting",
-            "minimalista": "minimalist product photography, clean composition, simple background",
-            "divertido": "playful product photography, vibrant colors, fun presentation"
-        }
+        memoria_libre = self._memoria_libre()
+        if memoria_libre is None:
+            return 1
+        presupuesto = memoria_libre * self.fraccion_memoria_lote
         
-        # Usar 'promocional' como fallback si el estilo no existe
-        estilo_config = estilos_promocionales.get(estilo.lower(), estilos_promocionales["promocional"])
+        tamano = int(presupuesto // self._memoria_por_imagen(width, height))
         
-        # Construir prompt más detallado y específico
-        # Priorizar la descripción del producto para mayor fidelidad
-        prompt_positivo = f"{descripcion}, {nombre_producto}, {estilo_config}, professional photography, high quality, sharp focus, detailed, realistic".strip()
+        return max(1, min(tamano, num_variaciones, self.tamano_lote_maximo))
+
+    def _admitir_solicitud(self, width, height, num_variaciones, tamano_lote):
+        """
+        Aplica el control de admisión por memoria a una solicitud y ajusta la estrategia de memoria
+        del pipeline a la resolución admitida (ver memoria.decidir_admision y memoria.elegir_offload)
         
-        # Construir prompt positivo más específico y detallado
-        # Enfatizar características específicas del producto
-        prompt_detallado = f"{nombre_producto}, {descripcion}"
+        La admisión se decide primero con la estrategia más ahorrativa: si ni con ella cabe, la
+        solicitud no cabe. Después se elige la estrategia más rápida para la resolución admitida y,
+        si es otra, la admisión se recalcula con ella: con el mismo criterio de memoria la
+        resolución admitida se mantiene y solo puede cambiar el tamaño de lote.
         
-        # Añadir términos que refuercen las características específicas
-        if "blanco" in nombre_producto.lower() or "white" in nombre_producto.lower():
-            prompt_detallado += ", white color, creamy white texture, pale appearance"
-        elif "oscuro" in nombre_producto.lower() or "dark" in nombre_producto.lower() or "negro" in nombre_producto.lower():
-            prompt_detallado += ", dark brown color, rich chocolate appearance, deep cocoa color"
-        elif "leche" in nombre_producto.lower() or "milk" in nombre_producto.lower():
-            prompt_detallado += ", milk chocolate color, light brown appearance, creamy texture"
+        Args:
+            width (int): Ancho pedido
+            height (int): Alto pedido
+            num_variaciones (int): Imágenes a generar
+            tamano_lote (int): Tamaño de lote pedido (None = automático)
             
-        # Reconstruir el prompt completo
-        prompt_positivo = f"{prompt_detallado}, {estilo_config}, professional photography, high quality, sharp focus, detailed, realistic, accurate colors".strip()
+        Returns:
+            tuple: (decisión con la resolución y el tamaño de lote a usar,
+                    estrategia de memoria aplicada o None con los backends exportados)
+            
+        Raises:
+            MemoriaInsuficienteError: Si la solicitud no cabe con la política del generador
+        """
+        memoria_modelo = self._memoria_modelo()
+        pesos = memoria_modelo or memoria.memoria_pesos(self.es_sdxl, self.precision, self.cuantizacion)
         
-        # Prompt negativo general (sin filtros específicos)
-        prompt_negativo = "blurry, low quality, distorted, ugly, bad composition, poor lighting, unprofessional, pixelated, cartoon, anime, drawing, watermark, wrong colors, inaccurate appearance, multiple items, duplicate, deformed, unrealistic"
+        # Memoria para el modelo y sus activaciones: la libre más lo que sus pesos ocupan entre llamadas
+        memoria_disponible = self._memoria_libre()
+        if memoria_disponible is not None:
+            memoria_disponible += memoria.pesos_entre_llamadas(pesos, self._estrategia_offload())
         
-        return prompt_positivo, prompt_negativo
-    
-    # Mantener compatibilidad con el método anterior
-    def _construir_prompt_consumible(self, nombre_producto, descripcion, estilo="promocional"):
-        """
-        Método de compatibilidad que redirige al nuevo método promocional
-        """
-        return self._construir_prompt_promocional(nombre_producto, descripcion, estilo)
+        def admitir(estrategia):
+            # La memoria libre que quedaría con el pipeline configurado con esa estrategia
+            memoria_libre = None
+            if memoria_disponible is not None and self.politica_memoria != "ninguna":
+                memoria_libre = memoria_disponible - memoria.pesos_entre_llamadas(pesos, estrategia)
+            return memoria.decidir_admision(
+                self.es_sdxl, self.precision, width, height, num_variaciones,
+                memoria_libre=memoria_libre,
+                tamano_lote=tamano_lote,
+                tamano_lote_maximo=self.tamano_lote_maximo,
+                fraccion_lote=self.fraccion_memoria_lote,
+                politica=self.politica_memoria,
+                cuantizacion=self.cuantizacion,
+                memoria_modelo=memoria_modelo,
+                estrategia=estrategia
+            )
+        
+        estrategias = self._estrategias_offload()
+        try:
+            admision = admitir(estrategias[-1])
+        except MemoriaInsuficienteError:
+            self.metricas.admisiones.incrementar(decision="rechazar")
+            raise
+        
+        offload = None
+        if self.backend == "pytorch":
+            # El modelo ya está cargado: la memoria medida descuenta el proceso (margen 0)
+            offload = self._elegir_offload(
+                self.es_sdxl, admision["width"], admision["height"], memoria_disponible, memoria_modelo,
+                margen=0, estrategias=estrategias
+            )
+            if offload["estrategia"] != estrategias[-1]:
+                try:
+                    admision = admitir(offload["estrategia"])
+                except MemoriaInsuficienteError:
+                    # No debería ocurrir (mismo criterio); se conserva la estrategia con la que se admitió
+                    offload = self._elegir_offload(
+                        self.es_sdxl, admision["width"], admision["height"], memoria_disponible, memoria_modelo,
+                        margen=0, estrategias=estrategias[-1:]
+                    )
+            anterior = self._estrategia_offload()
+            self._aplicar_offload(self.pipeline, offload)
+            if offload["estrategia"] != anterior:
+                self.registro_pipelines.actualizar_offload(self.modelo_id)
+        
+        self.metricas.admisiones.incrementar(decision=admision["decision"])
+        if admision["decision"] == "reducir":
+            print(f"WARNING: Memoria insuficiente para {width}x{height}, generando a {admision['width']}x{admision['height']}")
+        elif admision["decision"] == "dividir":
+            print(f"WARNING: Memoria insuficiente para lotes más grandes, generando en {admision['lotes']} lotes de {admision['tamano_lote']}")
+        return admision, offload
 
     def generar_imagenes(self, nombre_producto, descripcion, estilo="profesional", 
                         num_variaciones=3, width=768, height=768, 
-                        pasos_inferencia=25, guidance_scale=7.5, return_base64=False):
+                        pasos_inferencia=25, guidance_scale=7.5, return_base64=False,
+                        tamano_lote=None, semillas=None, usar_cache=True, modelo=None,
+                        callback_evento=None, return_bytes=False, formato_imagen="png", calidad=None,
+                        derivados=None, scheduler=None, preset_calidad=None, eventos_paso=False,
+                        cancelar=None):
         """
         Genera múltiples imágenes del producto consumible
         
@@ -236,13 +1389,53 @@ class GeneradorImagenesConsumibles:
             pasos_inferencia (int): Pasos de diffusión (más = mejor calidad)
             guidance_scale (float): Adherencia al prompt (7-15 recomendado)
             return_base64 (bool): Si True, devuelve imágenes en base64 en lugar de guardar archivos
+            tamano_lote (int): Variaciones por llamada al pipeline (None = automático según memoria)
+            semillas (list): Semilla explícita por variación (las que falten se eligen al azar)
+            usar_cache (bool): Si True, reutiliza imágenes ya generadas con los mismos parámetros
+            modelo (str): Modelo (ID o alias de modelos_recomendados) para esta solicitud (None = actual)
+            callback_evento (callable): Recibe eventos ("inicio", "imagen", "progreso" y, con eventos_paso, "paso") a medida que ocurren
+            return_bytes (bool): Si True, devuelve los bytes codificados crudos en lugar de base64 o archivos
+            formato_imagen (str): Formato de salida: png, webp, jpeg o avif
+            calidad (int): Calidad 1-100 (webp, jpeg, avif) o compresión 0-9 (png); None = por defecto del formato
+            derivados (dict): Versiones reducidas por imagen, nombre -> lado mayor en píxeles
+                              (por ejemplo DERIVADOS_POR_DEFECTO); None = solo la imagen completa
+            scheduler (str): dpmpp_2m_karras, euler_a, unipc o lcm (None = el del modelo)
+            preset_calidad (str): borrador, rapido, equilibrado o alta; reemplaza pasos_inferencia
+                                  por el mínimo de pasos razonable para el scheduler (None = usar pasos_inferencia)
+            eventos_paso (bool): Si True, callback_evento también recibe un evento "paso" por cada paso
+                                 de denoising (con su duración)
+            cancelar (callable): Se consulta en cada paso y entre lotes; si devuelve True la generación
+                                 se interrumpe (None = no cancelable)
             
         Returns:
-            dict: Metadata completa de las imágenes generadas
+            dict: Metadata completa de las imágenes generadas, con el perfil de tiempos de la
+                  sesión ("perfil_tiempos") y de cada variación
+        
+        Raises:
+            SolicitudCancelada: Si cancelar() devolvió True antes de terminar
         """
+        inicio_sesion = time.perf_counter()
         print(f"Generando {num_variaciones} imágenes de: {nombre_producto}")
         print(f"Estilo: {estilo}")
         
+        modelo_id = self.modelos_recomendados.get(modelo or self.modelo_id, modelo or self.modelo_id)
+        
+        # Un preset de calidad fija los pasos para el scheduler de la solicitud
+        if preset_calidad is not None:
+            pasos_inferencia = pasos_preset(preset_calidad, scheduler)
+        if scheduler == "lcm" and guidance_scale > GUIDANCE_MAXIMO_LCM:
+            print(f"WARNING: LCM funciona con guidance bajo, usando {GUIDANCE_MAXIMO_LCM} en lugar de {guidance_scale}")
+            guidance_scale = GUIDANCE_MAXIMO_LCM
+        
+        formato_imagen = formato_imagen.lower()
+        if formato_imagen not in FORMATOS_IMAGEN:
+            raise ValueError(f"Formato de imagen no soportado: {formato_imagen}. Opciones: {', '.join(FORMATOS_IMAGEN)}")
+        if not self._formato_soportado(formato_imagen):
+            print(f"WARNING: Pillow no puede codificar {formato_imagen} en esta instalación, usando png")
+            formato_imagen, calidad = "png", None
+        if calidad is None:
+            calidad = FORMATOS_IMAGEN[formato_imagen]["calidad"]
+        
         # Construir prompts
         prompt_pos, prompt_neg = self._construir_prompt_consumible(
             nombre_producto, descripcion, estilo
@@ -250,6 +1443,67 @@ class GeneradorImagenesConsumibles:
         
         print(f"Prompt: {prompt_pos[:100]}...")
         
+        # Una semilla por variación para que cada imagen sea reproducible aunque se genere en lote
+        semillas = list(semillas or [])[:num_variaciones]
+        semillas += [random.randint(0, 2**32 - 1) for _ in range(num_variaciones - len(semillas))]
+        
+        # La cache se consulta antes de cargar el modelo y de la admisión: una solicitud que está
+        # entera en cache no carga (ni expulsa) modelos y no puede rechazarse por memoria
+        clase_scheduler = SCHEDULERS[scheduler][0] if scheduler in SCHEDULERS else scheduler
+        if scheduler is None:
+            clase_scheduler = self._clase_scheduler_por_defecto(modelo_id)
+            if clase_scheduler is None:
+                # Sin model_index.json legible la clase sale del pipeline cargado
+                self._seleccionar_modelo(modelo_id)
+                self._configurar_scheduler(None)
+                clase_scheduler = type(self.pipeline.scheduler).__name__
+        
+        def clave_cache(i, width, height):
+            return self.cache_resultados.clave(
+                modelo_id=modelo_id,
+                prompt_positivo=prompt_pos,
+                prompt_negativo=prompt_neg,
+                semilla=semillas[i],
+                width=width,
+                height=height,
+                pasos_inferencia=pasos_inferencia,
+                guidance_scale=guidance_scale,
+                scheduler=scheduler or clase_scheduler,
+                formato_imagen=formato_imagen,
+                calidad=calidad,
+                # Los runtimes exportados no dan exactamente los mismos píxeles que PyTorch
+                **({"backend": self.backend} if self.backend != "pytorch" else {}),
+                **({"cuantizacion": self.cuantizacion} if self.cuantizacion else {}),
+                **({"precision": self.precision} if self.precision == "bfloat16" else {})
+            )
+        
+        # Buscar en la cache de resultados las variaciones ya generadas con los mismos parámetros
+        claves_cache = [clave_cache(i, width, height) for i in range(num_variaciones)]
+        resultados_cache = {}
+        if usar_cache:
+            for i, clave in enumerate(claves_cache):
+                img_bytes = self.cache_resultados.obtener(clave)
+                if img_bytes is not None:
+                    resultados_cache[i] = img_bytes
+        pendientes = [i for i in range(num_variaciones) if i not in resultados_cache]
+        
+        dimensiones_solicitadas = {"width": width, "height": height}
+        admision, offload = None, None
+        if pendientes:
+            # Activar el modelo pedido (o recargar el actual si el registro lo descargó) y su scheduler
+            self._seleccionar_modelo(modelo_id)
+            self._configurar_scheduler(scheduler)
+            
+            # Control de admisión (dividir en lotes más chicos o bajar la resolución si no cabe en memoria)
+            # y estrategia de memoria del pipeline para la resolución admitida
+            admision, offload = self._admitir_solicitud(width, height, len(pendientes), tamano_lote)
+            tamano_lote = admision["tamano_lote"]
+            if (admision["width"], admision["height"]) != (width, height):
+                # Las imágenes a menor resolución no corresponden a la clave de la pedida
+                width, height = admision["width"], admision["height"]
+                for i in pendientes:
+                    claves_cache[i] = clave_cache(i, width, height)
+        
         # Generar ID único para esta sesión
         session_id = hashlib.md5(
             f"{nombre_producto}_{datetime.now().isoformat()}".encode()
@@ -269,124 +1523,227 @@ class GeneradorImagenesConsumibles:
                 "num_variaciones": num_variaciones,
                 "dimensiones": {"width": width, "height": height},
                 "pasos_inferencia": pasos_inferencia,
-                "guidance_scale": guidance_scale
+                "guidance_scale": guidance_scale,
+                "scheduler": scheduler,
+                "clase_scheduler": clase_scheduler,
+                "preset_calidad": preset_calidad,
+                "formato_imagen": formato_imagen,
+                "calidad": calidad,
+                "derivados": derivados or {}
             },
             "prompts": {
                 "positivo": prompt_pos,
                 "negativo": prompt_neg
             },
+            "modelo": modelo_id,
             "dispositivo": self.device,
+            "backend": self.backend,
+            "cuantizacion": self.cuantizacion,
+            "precision": self.precision,
+            "compilado": self.compilar,
+            "admision": {**admision, "dimensiones_solicitadas": dimensiones_solicitadas} if admision else None,
+            "offload": dict(offload) if offload else None,
             "imagenes": []
         }
         
-        # Generar imágenes
+        self._notificar(callback_evento, {
+            "tipo": "inicio",
+            "session_id": session_id,
+            "modelo": modelo_id,
+            "total": num_variaciones
+        })
+        
+        # Generar imágenes por lotes: cada lote es una sola llamada al pipeline
         imagenes_exitosas = 0
         
-        for i in range(num_variaciones):
-            try:
-                print(f"Generando variación {i+1}/{num_variaciones}...")
+        metadata_sesion["cache_resultados"] = {
+            "aciertos": len(resultados_cache),
+            "fallos": len(pendientes) if usar_cache else 0,
+            "habilitada": usar_cache
+        }
+        
+        # El post-proceso de cada variación corre en pool_postproceso; los resultados se
+        # registran en el hilo principal y en el orden en que se enviaron
+        entrega = {
+            "nombre_producto": nombre_producto,
+            "estilo": estilo,
+            "session_id": session_id,
+            "width": width,
+            "height": height,
+            "return_base64": return_base64,
+            "return_bytes": return_bytes,
+            "formato_imagen": formato_imagen,
+            "derivados": derivados
+        }
+        en_proceso = deque()
+        
+        # Variaciones reintentadas por latentes con NaN/Inf: índice -> detalle del reintento
+        reintentos = {}
+        
+        # Tiempos de la llamada al pipeline en la que se generó cada variación
+        perfiles_generacion = {}
+        
+        def registrar_terminadas(esperar=False):
+            nonlocal imagenes_exitosas
+            while en_proceso and (esperar or en_proceso[0][2].done()):
+                i, desde_cache, futuro = en_proceso.popleft()
+                try:
+                    metadata_imagen = futuro.result()
+                except Exception as e:
+                    print(f"ERROR: Error procesando imagen {i+1}: {str(e)}")
+                    self._registrar_imagen(metadata_sesion, {
+                        "variacion": i + 1,
+                        "semilla": semillas[i],
+                        "error": str(e),
+                        "timestamp_error": datetime.now().isoformat(),
+                        "exito": False
+                    }, callback_evento)
+                    continue
                 
-                # Generar imagen usando el pipeline
-                with torch.autocast(self.device if self.device == "cuda" else "cpu"):
-                    result = self.pipeline(
-                        prompt=prompt_pos,
-                        negative_prompt=prompt_neg,
-                        width=width,
-                        height=height,
-                        num_inference_steps=pasos_inferencia,
-                        guidance_scale=guidance_scale,
-                        num_images_per_prompt=1
-                    )
-                    imagen = result.images[0]
-                    
-                    # Verificar si la imagen tiene valores válidos
-                    import numpy as np
-                    img_array = np.array(imagen)
-                    if np.isnan(img_array).any() or np.isinf(img_array).any():
-                        print(f"WARNING: Imagen {i+1} contiene valores NaN/Inf, regenerando con parámetros más conservadores...")
-                        
-                        # Intentar regenerar con parámetros más conservadores
-                        result = self.pipeline(
-                            prompt=f"{nombre_producto}, {descripcion}, photography",
-                            negative_prompt="blurry, low quality",
-                            width=512,
-                            height=512,
-                            num_inference_steps=10,
-                            guidance_scale=2.0,
-                            num_images_per_prompt=1
-                        )
-                        imagen = result.images[0]
+                metadata_imagen["semilla"] = semillas[i]
+                metadata_imagen["desde_cache"] = desde_cache
+                if i in perfiles_generacion:
+                    metadata_imagen["perfil_tiempos"] = {**perfiles_generacion[i], **metadata_imagen["perfil_tiempos"]}
+                if i in reintentos:
+                    metadata_imagen["reintento"] = reintentos[i]
+                self._registrar_imagen(metadata_sesion, metadata_imagen, callback_evento)
+                imagenes_exitosas += 1
+                
+                if desde_cache:
+                    print(f"Imagen {i+1} recuperada de cache: {metadata_imagen['nombre_archivo']}")
+                else:
+                    print(f"Imagen {i+1} guardada: {metadata_imagen['nombre_archivo']}")
+        
+        try:
+            # Las imágenes de la cache tienen la resolución pedida aunque la admisión la haya reducido
+            for i, img_bytes in resultados_cache.items():
+                en_proceso.append((i, True, self.pool_postproceso.submit(
+                    self._postprocesar_imagen, None, img_bytes, i, None, calidad, **{**entrega, **dimensiones_solicitadas}
+                )))
+            
+            if tamano_lote is None:
+                tamano_lote = self._calcular_tamano_lote(width, height, max(1, len(pendientes)))
+            tamano_lote = max(1, min(tamano_lote, num_variaciones))
+            metadata_sesion["parametros"]["tamano_lote"] = tamano_lote
+            
+            # Los prompts son iguales para todas las variaciones: se codifican una sola vez
+            estadisticas_previas = self.cache_embeddings.estadisticas()
+            inicio_prompt = time.perf_counter()
+            argumentos_prompt = self._argumentos_prompt(prompt_pos, prompt_neg) if pendientes else {}
+            tiempo_prompt = time.perf_counter() - inicio_prompt
+            estadisticas_cache = self.cache_embeddings.estadisticas()
+            metadata_sesion["cache_embeddings"] = {
+                "aciertos": estadisticas_cache["aciertos"] - estadisticas_previas["aciertos"],
+                "fallos": estadisticas_cache["fallos"] - estadisticas_previas["fallos"]
+            }
+            
+            for inicio in range(0, len(pendientes), tamano_lote):
+                indices = pendientes[inicio:inicio + tamano_lote]
                 
-                # Crear nombre de archivo único
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                nombre_archivo = f"{nombre_producto.replace(' ', '_')}_{estilo}_{session_id}_{i+1:02d}.png"
+                if cancelar is not None and cancelar():
+                    raise SolicitudCancelada(f"Generación cancelada antes de la variación {indices[0] + 1}/{num_variaciones}")
                 
-                if return_base64:
-                    # Convertir imagen a base64
-                    buffer = BytesIO()
-                    imagen.save(buffer, format='PNG')
-                    img_bytes = buffer.getvalue()
-                    img_base64 = base64.b64encode(img_bytes).decode('utf-8')
+                try:
+                    print(f"Generando variaciones {', '.join(str(i+1) for i in indices)}/{num_variaciones} en un lote de {len(indices)}...")
                     
-                    # Calcular hash de la imagen para verificación
-                    hash_imagen = hashlib.sha256(img_bytes).hexdigest()[:16]
+                    # Un generador (o sus latentes, con optimum) por variación
+                    aleatoriedad = backend_inferencia.argumentos_aleatorios(
+                        self.pipeline, self.backend, [semillas[i] for i in indices], width, height
+                    )
                     
-                    # Metadata de la imagen individual (modo base64)
-                    metadata_imagen = {
-                        "variacion": i + 1,
-                        "nombre_archivo": nombre_archivo,
-                        "base64_data": img_base64,
-                        "mime_type": "image/png",
-                        "tamano_bytes": len(img_bytes),
-                        "hash_sha256": hash_imagen,
-                        "dimensiones": {"width": width, "height": height},
-                        "timestamp_generacion": datetime.now().isoformat(),
-                        "exito": True,
-                        "formato": "base64"
-                    }
-                else:
-                    # Modo tradicional: guardar archivo
-                    ruta_archivo = self.carpeta_imagenes / nombre_archivo
-                    imagen.save(ruta_archivo, "PNG", quality=95)
+                    # Medir cada paso y revisar sus latentes: una variación rota se detecta al momento
+                    argumentos_monitor, monitor = self._monitor_pasos(
+                        callback_evento if eventos_paso else None, session_id, [i + 1 for i in indices], pasos_inferencia,
+                        cancelar
+                    )
                     
-                    # Calcular hash de la imagen para verificación
-                    with open(ruta_archivo, 'rb') as f:
-                        hash_imagen = hashlib.sha256(f.read()).hexdigest()[:16]
+                    # Generar el lote usando el pipeline
+                    with self._contexto_precision():
+                        result = self.pipeline(
+                            **argumentos_prompt,
+                            width=width,
+                            height=height,
+                            num_inference_steps=pasos_inferencia,
+                            guidance_scale=guidance_scale,
+                            num_images_per_prompt=len(indices),
+                            **aleatoriedad,
+                            **argumentos_monitor
+                        )
+                    imagenes_lote = result.images
+                    perfil_lote = self._perfil_llamada(monitor, time.perf_counter(), len(indices))
                     
-                    # Metadata de la imagen individual (modo archivo)
-                    metadata_imagen = {
-                        "variacion": i + 1,
-                        "nombre_archivo": nombre_archivo,
-                        "ruta_completa": str(ruta_archivo.absolute()),
-                        "ruta_relativa": str(ruta_archivo),
-                        "tamano_archivo": ruta_archivo.stat().st_size,
-                        "hash_sha256": hash_imagen,
-                        "dimensiones": {"width": width, "height": height},
-                        "timestamp_generacion": datetime.now().isoformat(),
-                        "exito": True,
-                        "formato": "archivo"
-                    }
+                except Exception as e:
+                    print(f"ERROR: Error generando el lote de variaciones {', '.join(str(i+1) for i in indices)}: {str(e)}")
+                    
+                    # Todas las variaciones del lote fallan juntas
+                    for i in indices:
+                        self._registrar_imagen(metadata_sesion, {
+                            "variacion": i + 1,
+                            "semilla": semillas[i],
+                            "error": str(e),
+                            "timestamp_error": datetime.now().isoformat(),
+                            "exito": False
+                        }, callback_evento)
+                    continue
                 
-                metadata_sesion["imagenes"].append(metadata_imagen)
-                imagenes_exitosas += 1
+                # El denoising se cortó a mitad: las imágenes del lote no sirven
+                if cancelar is not None and cancelar():
+                    raise SolicitudCancelada(f"Generación cancelada durante las variaciones {', '.join(str(i+1) for i in indices)}")
+                
+                latentes_rotos = monitor["rotos"]
+                for posicion, (i, imagen) in enumerate(zip(indices, imagenes_lote)):
+                    perfiles_generacion[i] = perfil_lote
+                    try:
+                        regenerada = False
+                        
+                        # Latentes con NaN/Inf: reintentar solo esta variación con precisión/scheduler de respaldo
+                        if posicion in latentes_rotos:
+                            print(f"WARNING: Variación {i+1} con latentes NaN/Inf desde el paso {latentes_rotos[posicion]}, reintentando solo esa variación...")
+                            imagen, reintentos[i] = self._reintentar_variacion(
+                                argumentos_prompt, semillas[i], width, height, pasos_inferencia, guidance_scale,
+                                scheduler, latentes_rotos[posicion]
+                            )
+                            if imagen is None:
+                                raise RuntimeError("Los latentes siguen con NaN/Inf después del reintento")
+                            regenerada = True
+                        
+                        # Una imagen regenerada no corresponde a los parámetros de la clave
+                        clave_cache = claves_cache[i] if usar_cache and not regenerada else None
+                        
+                        # Codificar y guardar en segundo plano mientras el pipeline genera el siguiente lote
+                        en_proceso.append((i, False, self.pool_postproceso.submit(
+                            self._postprocesar_imagen, imagen, None, i, clave_cache, calidad, **entrega
+                        )))
+                        
+                    except Exception as e:
+                        print(f"ERROR: Error generando imagen {i+1}: {str(e)}")
+                        
+                        # Agregar error a metadata
+                        metadata_error = {
+                            "variacion": i + 1,
+                            "semilla": semillas[i],
+                            "error": str(e),
+                            "timestamp_error": datetime.now().isoformat(),
+                            "exito": False
+                        }
+                        if i in reintentos:
+                            metadata_error["reintento"] = reintentos[i]
+                        self._registrar_imagen(metadata_sesion, metadata_error, callback_evento)
                 
-                print(f"Imagen {i+1} guardada: {nombre_archivo}")
+                # Entregar las variaciones cuyo post-proceso ya terminó
+                registrar_terminadas()
                 
-                # Limpiar memoria GPU si es necesario
+                # Limpiar memoria GPU entre lotes
                 if self.device == "cuda":
                     torch.cuda.empty_cache()
-                    
-            except Exception as e:
-                print(f"ERROR: Error generando imagen {i+1}: {str(e)}")
-                
-                # Agregar error a metadata
-                metadata_error = {
-                    "variacion": i + 1,
-                    "error": str(e),
-                    "timestamp_error": datetime.now().isoformat(),
-                    "exito": False
-                }
-                metadata_sesion["imagenes"].append(metadata_error)
+            
+            registrar_terminadas(esperar=True)
+        finally:
+            # Una excepción (p. ej. SolicitudCancelada) deja post-procesos sin registrar
+            self._descartar_postproceso(en_proceso)
+        
+        # Mantener el orden de variaciones aunque algunas vengan de la cache
+        metadata_sesion["imagenes"].sort(key=lambda img: img["variacion"])
         
         # Estadísticas finales
         metadata_sesion["resultados"] = {
@@ -396,24 +1753,109 @@ class GeneradorImagenesConsumibles:
             "tasa_exito": (imagenes_exitosas / num_variaciones) * 100
         }
         
-        # Guardar metadata en archivo JSON
+        metadata_sesion["perfil_tiempos"] = {
+            "codificacion_prompt_ms": round(tiempo_prompt * 1000, 1),
+            "generacion_ms": round((time.perf_counter() - inicio_sesion) * 1000, 1)
+        }
+        
+        # Guardar metadata en archivo JSON (solo descriptores: los bytes quedan en el almacén de blobs)
+        inicio_escritura = time.perf_counter()
         archivo_metadata = self.carpeta_metadata / f"sesion_{session_id}.json"
+        metadata_archivo = self._metadata_sin_cargas(metadata_sesion)
         with open(archivo_metadata, 'w', encoding='utf-8') as f:
-            json.dump(metadata_sesion, f, indent=2, ensure_ascii=False)
+            json.dump(metadata_archivo, f, indent=2, ensure_ascii=False)
+        
+        # Registrar en el índice que usan los listados y búsquedas
+        if self.almacen_metadata is not None:
+            try:
+                self.almacen_metadata.registrar_sesion(metadata_archivo)
+            except Exception as e:
+                print(f"WARNING: No se pudo registrar la sesión en el índice de metadata: {e}")
+        
+        # La escritura de la metadata no puede quedar en su propio archivo: solo en la respuesta
+        metadata_sesion["perfil_tiempos"]["escritura_metadata_ms"] = round((time.perf_counter() - inicio_escritura) * 1000, 1)
+        metadata_sesion["perfil_tiempos"]["total_ms"] = round((time.perf_counter() - inicio_sesion) * 1000, 1)
         
         metadata_sesion["archivo_metadata"] = str(archivo_metadata.absolute())
         
+        try:
+            self.metricas.registrar_sesion(metadata_sesion)
+        except Exception as e:
+            print(f"WARNING: No se pudieron actualizar las métricas: {e}")
+        
         print(f"Generación completada: {imagenes_exitosas}/{num_variaciones} exitosas")
         print(f"Metadata guardada en: {archivo_metadata}")
         
         return metadata_sesion
 
-    def generar_lote_productos(self, lista_productos):
+    def generar_producto_lote(self, producto):
+        """
+        Genera las imágenes de un producto de un lote
+        
+        Args:
+            producto (dict): Parámetros del producto (nombre, descripcion y opcionales de generar_imagenes)
+            
+        Returns:
+            dict: Metadata de la sesión generada
+        """
+        return self.generar_imagenes(
+            nombre_producto=producto['nombre'],
+            descripcion=producto['descripcion'],
+            estilo=producto.get('estilo', 'profesional'),
+            num_variaciones=producto.get('num_variaciones', 3),
+            width=producto.get('width', 768),
+            height=producto.get('height', 768),
+            pasos_inferencia=producto.get('pasos_inferencia', 25),
+            guidance_scale=producto.get('guidance_scale', 7.5),
+            modelo=producto.get('modelo'),
+            formato_imagen=producto.get('formato_imagen', 'png'),
+            calidad=producto.get('calidad'),
+            derivados=producto.get('derivados'),
+            scheduler=producto.get('scheduler'),
+            preset_calidad=producto.get('preset_calidad')
+        )
+
+    def _procesos_lote(self, lista_productos, max_procesos=None):
+        """
+        Decide cuántos procesos usar para un lote según núcleos y memoria libre
+        
+        Args:
+            lista_productos (list): Productos del lote
+            max_procesos (int): Límite explícito (None = automático)
+            
+        Returns:
+            tuple: (procesos, hilos por proceso)
+        """
+        # Cada proceso carga su propio pipeline y genera de a una imagen del tamaño más grande del lote
+        memoria_residente = sum(
+            modelo["memoria_mb"] for modelo in self.registro_pipelines.modelos_residentes()
+        ) * 1024**2
+        memoria_pipeline = self._memoria_modelo() or memoria.memoria_pesos(self.es_sdxl, self.precision, self.cuantizacion)
+        memoria_activaciones = max(
+            self._memoria_por_imagen(producto.get('width', 768), producto.get('height', 768))
+            for producto in lista_productos
+        )
+        # Margen para el intérprete, torch y el post-proceso de cada proceso
+        memoria_por_proceso = memoria_pipeline + memoria_activaciones + 1024**3
+        
+        # Los modelos del proceso principal se descargan antes de lanzar los procesos
+        memoria_disponible = None
+        if psutil is not None:
+            memoria_disponible = (psutil.virtual_memory().available + memoria_residente) * 0.9
+        
+        return calcular_procesos(
+            len(lista_productos), memoria_disponible, memoria_por_proceso, max_procesos=max_procesos
+        )
+
+    def generar_lote_productos(self, lista_productos, procesos=1):
         """
         Genera imágenes para múltiples productos
         
         Args:
             lista_productos (list): Lista de diccionarios con parámetros para cada producto
+            procesos (int): Procesos en paralelo, cada uno con su pipeline y una parte de los
+                            núcleos (1 = secuencial en este proceso, None = automático según
+                            núcleos y memoria libre). Solo se usa en CPU
             
         Returns:
             dict: Resultados consolidados de todos los productos
@@ -431,40 +1873,66 @@ class GeneradorImagenesConsumibles:
             }
         }
         
-        for i, producto in enumerate(lista_productos, 1):
-            print(f"\n--- Procesando producto {i}/{len(lista_productos)}: {producto.get('nombre', 'Sin nombre')} ---")
+        hilos = None
+        if procesos != 1 and self.device == "cuda":
+            # Varios procesos compitiendo por la misma GPU solo agregan copias del modelo en VRAM
+            print("WARNING: El lote en paralelo es solo para CPU, procesando en secuencia")
+            procesos = 1
+        elif procesos != 1 and len(lista_productos) > 1:
+            procesos, hilos = self._procesos_lote(lista_productos, procesos)
+        else:
+            procesos = 1
+        
+        if procesos > 1:
+            print(f"Lote en paralelo: {procesos} procesos con {hilos} hilos cada uno")
+            # Liberar la RAM de los modelos de este proceso para los procesos del lote
+            for modelo in self.registro_pipelines.modelos_residentes():
+                self.registro_pipelines.descargar(modelo["modelo"])
+            gc.collect()
             
-            try:
-                resultado = self.generar_imagenes(
-                    nombre_producto=producto['nombre'],
-                    descripcion=producto['descripcion'],
-                    estilo=producto.get('estilo', 'profesional'),
-                    num_variaciones=producto.get('num_variaciones', 3),
-                    width=producto.get('width', 768),
-                    height=producto.get('height', 768),
-                    pasos_inferencia=producto.get('pasos_inferencia', 25),
-                    guidance_scale=producto.get('guidance_scale', 7.5)
-                )
-                
-                resultados_lote["productos"].append(resultado)
-                
-                # Actualizar estadísticas
-                if resultado["resultados"]["exitosas"] > 0:
-                    resultados_lote["estadisticas_globales"]["productos_exitosos"] += 1
-                
-                resultados_lote["estadisticas_globales"]["total_imagenes_generadas"] += resultado["resultados"]["exitosas"]
-                resultados_lote["estadisticas_globales"]["total_imagenes_fallidas"] += resultado["resultados"]["fallidas"]
-                
-            except Exception as e:
-                print(f"ERROR: Error procesando {producto.get('nombre', 'producto')}: {str(e)}")
+            resultados = ejecutar_lote(lista_productos, self.config_generador, procesos, hilos, carpetas={
+                "carpeta_imagenes": str(self.carpeta_imagenes.absolute()),
+                "carpeta_metadata": str(self.carpeta_metadata.absolute())
+            })
+            
+            # Los procesos no abren el índice (escrituras concurrentes en SQLite): se registra aquí
+            sesiones = [self._metadata_sin_cargas(resultado) for resultado in resultados if "imagenes" in resultado]
+            if sesiones and self.almacen_metadata is not None:
+                try:
+                    self.almacen_metadata.registrar_sesiones(sesiones)
+                except Exception as e:
+                    print(f"WARNING: No se pudieron registrar las sesiones del lote en el índice de metadata: {e}")
+        else:
+            resultados = []
+            for i, producto in enumerate(lista_productos, 1):
+                print(f"\n--- Procesando producto {i}/{len(lista_productos)}: {producto.get('nombre', 'Sin nombre')} ---")
                 
-                error_info = {
-                    "producto": producto,
-                    "error": str(e),
-                    "timestamp_error": datetime.now().isoformat(),
-                    "exito": False
-                }
-                resultados_lote["productos"].append(error_info)
+                try:
+                    resultados.append(self.generar_producto_lote(producto))
+                    
+                except Exception as e:
+                    print(f"ERROR: Error procesando {producto.get('nombre', 'producto')}: {str(e)}")
+                    
+                    resultados.append({
+                        "producto": producto,
+                        "error": str(e),
+                        "timestamp_error": datetime.now().isoformat(),
+                        "exito": False
+                    })
+        
+        for resultado in resultados:
+            resultados_lote["productos"].append(resultado)
+            
+            # Actualizar estadísticas
+            if "resultados" not in resultado:
+                continue
+            if resultado["resultados"]["exitosas"] > 0:
+                resultados_lote["estadisticas_globales"]["productos_exitosos"] += 1
+            
+            resultados_lote["estadisticas_globales"]["total_imagenes_generadas"] += resultado["resultados"]["exitosas"]
+            resultados_lote["estadisticas_globales"]["total_imagenes_fallidas"] += resultado["resultados"]["fallidas"]
+        
+        resultados_lote["procesos"] = procesos
         
         # Finalizar metadata del lote
         resultados_lote["timestamp_fin"] = datetime.now().isoformat()
@@ -474,7 +1942,13 @@ class GeneradorImagenesConsumibles:
         archivo_lote = self.carpeta_metadata / f"lote_{timestamp_lote}.json"
         
         with open(archivo_lote, 'w', encoding='utf-8') as f:
-            json.dump(resultados_lote, f, indent=2, ensure_ascii=False)
+            json.dump({
+                **resultados_lote,
+                "productos": [
+                    self._metadata_sin_cargas(producto) if "imagenes" in producto else producto
+                    for producto in resultados_lote["productos"]
+                ]
+            }, f, indent=2, ensure_ascii=False)
         
         resultados_lote["archivo_metadata_lote"] = str(archivo_lote.absolute())
         
@@ -485,6 +1959,49 @@ class GeneradorImagenesConsumibles:
         
         return resultados_lote
 
+    def calentar(self, resoluciones=None, pasos=2):
+        """
+        Ejecuta el pipeline una vez por resolución para que la compilación (y la
+        inicialización de kernels del runtime) no recaiga en la primera solicitud
+        
+        Args:
+            resoluciones (list): Pares (width, height) a calentar (None = RESOLUCIONES_CALENTAMIENTO)
+            pasos (int): Pasos de denoising por llamada
+            
+        Returns:
+            list: Segundos de cada resolución calentada
+        """
+        self._seleccionar_modelo(self.modelo_id)
+        resoluciones = resoluciones or compilacion.RESOLUCIONES_CALENTAMIENTO
+        
+        # Mismos argumentos que una solicitud real (embeddings y guidance > 1) para compilar los mismos grafos
+        argumentos_prompt = self._argumentos_prompt("product photography", "blurry, low quality")
+        
+        tiempos = []
+        for width, height in resoluciones:
+            inicio = time.perf_counter()
+            try:
+                with self._contexto_precision():
+                    self.pipeline(
+                        **argumentos_prompt,
+                        width=width,
+                        height=height,
+                        num_inference_steps=pasos,
+                        guidance_scale=7.5,
+                        num_images_per_prompt=1
+                    )
+            except Exception as e:
+                print(f"WARNING: Falló el calentamiento a {width}x{height}: {e}")
+                continue
+            segundos = round(time.perf_counter() - inicio, 2)
+            print(f"Calentamiento {width}x{height}: {segundos} s")
+            tiempos.append({"width": width, "height": height, "segundos": segundos})
+        
+        if self.compilar:
+            compilacion.guardar_artefactos(self.directorio_compilacion)
+        
+        return tiempos
+
     def limpiar_memoria(self):
         """
         Libera memoria GPU/CPU manualmente
@@ -527,15 +2044,22 @@ class GeneradorImagenesConsumibles:
             print("\nOPTIMIZACIONES ACTIVAS:")
             print("   - PyTorch CUDA habilitado")
             print("   - Float16 precision (ahorra VRAM)")
-            print("   - Attention slicing")
+            print(f"   - Estrategia de memoria: {self._estrategia_offload()} (política {self.politica_offload})")
             print("   - Memory efficient attention")
-            print("   - Model CPU offloading")
             print("   - Automatic VRAM cleanup")
-            print("   - UNet compilation desactivada (requiere Triton)")
+            print(f"   - UNet compilation {'activada (torch.compile + channels-last)' if self.compilar else 'desactivada'}")
         else:
             print("\nMODO CPU:")
             print("   - Sin aceleración GPU")
-            print("   - Float32 precision")
+            print(f"   - Backend de inferencia: {self.backend}")
+            if self.cuantizacion == "int8":
+                print("   - Int8 dinámico (UNet y text encoders)")
+            else:
+                print(f"   - {self.precision.capitalize()} precision")
+            if self.backend == "pytorch":
+                print(f"   - Estrategia de memoria: {self._estrategia_offload()} (política {self.politica_offload})")
+            if self.compilar:
+                print("   - UNet y VAE compilados (torch.compile + channels-last + SDPA)")
 
 
 def main():
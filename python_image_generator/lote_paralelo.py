@@ -0,0 +1,158 @@
+"""
+Ejecución en paralelo de lotes de productos en varios procesos (hosts solo CPU)
+
+Un único proceso de torch no escala linealmente más allá de unos pocos núcleos.
+Con varios procesos, cada uno carga su propio pipeline, usa una porción de los
+hilos intra-op del host y toma productos de la cola a medida que termina los
+anteriores. El número de procesos se limita por núcleos y por memoria para que
+el host no tenga que usar swap.
+
+Este módulo no importa torch a nivel de módulo: los procesos hijos (spawn) deben
+fijar OMP_NUM_THREADS/MKL_NUM_THREADS antes de que torch se cargue.
+
+Los procesos hijos escriben imágenes y JSON de sesión en las carpetas del proceso
+padre, pero no abren el índice SQLite de metadata: varias conexiones escribiendo a
+la vez provocarían "database is locked". El padre registra las sesiones que le
+devuelven.
+"""
+
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+# Generador del proceso hijo (uno por proceso, creado en el inicializador)
+_generador = None
+
+
+def nucleos_disponibles():
+    """
+    Retorna los núcleos que este proceso puede usar (respeta la afinidad de CPU del contenedor)
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def calcular_procesos(num_productos, memoria_disponible, memoria_por_proceso, nucleos=None,
+                      hilos_minimos=2, max_procesos=None):
+    """
+    Calcula cuántos procesos ejecutar en paralelo
+
+    Args:
+        num_productos (int): Productos del lote
+        memoria_disponible (int): Bytes de RAM libres para los procesos (None = sin límite conocido)
+        memoria_por_proceso (int): Bytes estimados por proceso (pipeline + activaciones)
+        nucleos (int): Núcleos disponibles (None = detectar)
+        hilos_minimos (int): Hilos intra-op mínimos por proceso
+        max_procesos (int): Límite explícito (None = sin límite)
+
+    Returns:
+        tuple: (procesos, hilos por proceso)
+    """
+    nucleos = nucleos or nucleos_disponibles()
+    procesos = min(num_productos, max(1, nucleos // hilos_minimos))
+    if max_procesos is not None:
+        procesos = min(procesos, max_procesos)
+    if memoria_disponible is not None and memoria_por_proceso:
+        procesos = min(procesos, int(memoria_disponible // memoria_por_proceso))
+
+    procesos = max(1, procesos)
+    return procesos, max(1, nucleos // procesos)
+
+
+def _inicializar_proceso(hilos, config_generador, carpetas=None):
+    """
+    Inicializador de cada proceso hijo: fija los hilos y carga su propio generador
+
+    Args:
+        hilos (int): Hilos intra-op de torch del proceso
+        config_generador (dict): Argumentos para crear GeneradorImagenesConsumibles
+        carpetas (dict): carpeta_imagenes y carpeta_metadata del proceso padre (None = las por defecto)
+    """
+    global _generador
+
+    # Antes de importar torch, para que OpenMP/MKL no creen un hilo por núcleo del host
+    os.environ["OMP_NUM_THREADS"] = str(hilos)
+    os.environ["MKL_NUM_THREADS"] = str(hilos)
+
+    import torch
+    from image_generator import GeneradorImagenesConsumibles
+
+    torch.set_num_threads(hilos)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+    _generador = GeneradorImagenesConsumibles(**config_generador, indexar_metadata=False)
+    for atributo, carpeta in (carpetas or {}).items():
+        setattr(_generador, atributo, Path(carpeta))
+
+
+def _procesar_producto(indice, producto):
+    """
+    Genera las imágenes de un producto en el proceso hijo
+
+    Returns:
+        dict: Resultado del producto o información del error
+    """
+    print(f"\n--- [pid {os.getpid()}] Procesando producto {indice + 1}: {producto.get('nombre', 'Sin nombre')} ---")
+    try:
+        return _generador.generar_producto_lote(producto)
+    except Exception as e:
+        print(f"ERROR: Error procesando {producto.get('nombre', 'producto')}: {str(e)}")
+        return {
+            "producto": producto,
+            "error": str(e),
+            "timestamp_error": datetime.now().isoformat(),
+            "exito": False
+        }
+
+
+def ejecutar_lote(lista_productos, config_generador, procesos, hilos, carpetas=None):
+    """
+    Reparte los productos entre `procesos` procesos y retorna los resultados en el orden del lote
+
+    Args:
+        lista_productos (list): Diccionarios con los parámetros de cada producto
+        config_generador (dict): Argumentos para crear GeneradorImagenesConsumibles en cada proceso
+        procesos (int): Procesos en paralelo
+        hilos (int): Hilos intra-op de torch por proceso
+        carpetas (dict): carpeta_imagenes y carpeta_metadata donde escriben los procesos
+
+    Returns:
+        list: Resultado (o información del error) de cada producto (las sesiones sin registrar
+              en el índice de metadata)
+    """
+    resultados = [None] * len(lista_productos)
+
+    # spawn: hacer fork de un proceso con torch y sus hilos ya iniciados no es seguro
+    with ProcessPoolExecutor(
+        max_workers=procesos,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_inicializar_proceso,
+        initargs=(hilos, config_generador, carpetas)
+    ) as pool:
+        futuros = {
+            pool.submit(_procesar_producto, indice, producto): indice
+            for indice, producto in enumerate(lista_productos)
+        }
+        for futuro, indice in futuros.items():
+            try:
+                resultados[indice] = futuro.result()
+            except Exception as e:
+                # El proceso hijo murió (por ejemplo, sin memoria) antes de responder
+                producto = lista_productos[indice]
+                print(f"ERROR: Error procesando {producto.get('nombre', 'producto')}: {str(e)}")
+                resultados[indice] = {
+                    "producto": producto,
+                    "error": str(e),
+                    "timestamp_error": datetime.now().isoformat(),
+                    "exito": False
+                }
+
+    return resultados
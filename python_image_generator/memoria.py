@@ -0,0 +1,412 @@
+"""
+Estimación de memoria de una generación y control de admisión de solicitudes
+
+El pico de memoria de una llamada al pipeline es la suma de los pesos del modelo
+(según familia, precisión y cuantización) y de las activaciones de cada imagen del
+lote, que crecen más rápido que lineal con la resolución por la atención. Antes de
+generar, el generador compara esa estimación con la memoria libre y decide:
+
+- aceptar: todas las variaciones caben en lotes del tamaño pedido
+- dividir: las variaciones se generan en lotes secuenciales más chicos
+- reducir: ni una imagen cabe a la resolución pedida; se baja la resolución
+  (manteniendo la proporción) hasta que cabe
+- rechazar: ni una imagen cabe a la resolución mínima (o la política no permite reducir)
+
+Los pasos de inferencia no cambian el pico de memoria (solo el tiempo).
+
+La estrategia de memoria del pipeline (offload) se elige con la misma estimación:
+la más rápida con la que una imagen a la resolución pedida cabe en la memoria
+disponible. Cada estrategia suma los ahorros de las anteriores:
+
+- residente: pesos y activaciones en el dispositivo, sin recortes
+- vae_slicing: el VAE decodifica de a una imagen (y por mosaicos en resoluciones grandes)
+- attention_slicing: la atención se calcula por partes
+- modelo: cada componente (text encoder, UNet, VAE) sube a la GPU solo mientras se usa
+- secuencial: los pesos suben a la GPU capa por capa (mínima VRAM, mucho más lento)
+"""
+
+GB = 1024**3
+
+# Pesos del pipeline completo en float32: UNet + text encoder(s) + VAE
+# (SD 1.5/2.x ~1.07 mil millones de parámetros, SDXL ~3.5 mil millones)
+PESOS_FLOAT32 = {"sd": 4.3 * GB, "sdxl": 13.9 * GB}
+
+# Activaciones aproximadas por imagen en float32 a la resolución nativa de cada familia
+# (incluye el batch duplicado del classifier-free guidance): lado en píxeles y bytes.
+# SDXL se mide a 1024: escalarlo desde 512 sobrestima el término cuadrático de la atención.
+ACTIVACIONES_REFERENCIA = {"sd": (512, 1.5 * GB), "sdxl": (1024, 10.0 * GB)}
+
+BYTES_POR_ELEMENTO = {"float32": 4, "float16": 2, "bfloat16": 2}
+
+# int8 dinámico pasa a 1 byte las capas lineales (~80% de los pesos de UNet y text encoders)
+FRACCION_PESOS_INT8 = 0.4
+
+# Intérprete, torch, buffers de post-proceso y fragmentación del asignador
+MARGEN_PROCESO = 1 * GB
+
+# Políticas de admisión: ajustar (dividir y, si hace falta, reducir la resolución),
+# dividir (solo dividir en lotes; si no cabe una imagen se rechaza) o ninguna (sin control)
+POLITICAS_MEMORIA = ["ajustar", "dividir", "ninguna"]
+
+# Estrategias de memoria del pipeline, de la más rápida a la que menos memoria usa
+ESTRATEGIAS_OFFLOAD = ["residente", "vae_slicing", "attention_slicing", "modelo", "secuencial"]
+
+# auto elige la estrategia según la memoria disponible; las demás la fijan
+POLITICAS_OFFLOAD = ["auto"] + ESTRATEGIAS_OFFLOAD
+
+# Fracción de las activaciones por imagen que queda con cada estrategia
+FRACCION_ACTIVACIONES = {
+    "residente": 1.0, "vae_slicing": 0.8, "attention_slicing": 0.5, "modelo": 0.5, "secuencial": 0.5
+}
+
+# Fracción de los pesos en el dispositivo durante una llamada: con offload de modelos solo
+# la UNet (el componente más grande), con offload secuencial solo las capas en curso.
+# Entre llamadas los pesos con offload vuelven a la RAM.
+FRACCION_PESOS_LLAMADA = {"modelo": 0.8, "secuencial": 0.05}
+
+# Lado a partir del cual el VAE decodifica por mosaicos (con vae_slicing o más)
+LADO_MOSAICO_VAE = 1024
+
+# Resolución con la que se elige la estrategia al cargar un modelo (la por defecto de generar_imagenes)
+RESOLUCION_CARGA = (768, 768)
+
+# Lado mínimo al reducir la resolución y múltiplo requerido por el VAE
+LADO_MINIMO = 256
+MULTIPLO_LADO = 8
+
+
+class MemoriaInsuficienteError(RuntimeError):
+    """
+    La solicitud no cabe en la memoria disponible ni reduciéndola
+    """
+
+
+def familia(es_sdxl):
+    return "sdxl" if es_sdxl else "sd"
+
+
+def memoria_pesos(es_sdxl, precision="float32", cuantizacion=None):
+    """
+    Estima la memoria de los pesos de un pipeline
+
+    Args:
+        es_sdxl (bool): Si el modelo es SDXL
+        precision (str): float32, float16 o bfloat16
+        cuantizacion (str): 'int8' o None
+
+    Returns:
+        float: Bytes aproximados
+    """
+    pesos = PESOS_FLOAT32[familia(es_sdxl)] * BYTES_POR_ELEMENTO.get(precision, 4) / 4
+    if cuantizacion == "int8":
+        pesos *= FRACCION_PESOS_INT8
+    return pesos
+
+
+def memoria_activaciones(es_sdxl, precision, width, height, estrategia="residente"):
+    """
+    Estima la memoria de activaciones de una imagen durante la generación
+
+    Args:
+        es_sdxl (bool): Si el modelo es SDXL
+        precision (str): float32, float16 o bfloat16
+        width (int): Ancho de imagen
+        height (int): Alto de imagen
+        estrategia (str): Estrategia de memoria del pipeline (ver ESTRATEGIAS_OFFLOAD)
+
+    Returns:
+        float: Bytes aproximados por imagen
+    """
+    lado_referencia, bytes_referencia = ACTIVACIONES_REFERENCIA[familia(es_sdxl)]
+    escala_pixeles = (width * height) / (lado_referencia * lado_referencia)
+    # La atención crece más rápido que lineal con la resolución
+    bytes_por_imagen = bytes_referencia * escala_pixeles * (1 + escala_pixeles) / 2
+    return bytes_por_imagen * BYTES_POR_ELEMENTO.get(precision, 4) / 4 * FRACCION_ACTIVACIONES[estrategia]
+
+
+def pesos_en_llamada(pesos, estrategia):
+    """
+    Bytes de pesos que ocupan el dispositivo durante una llamada al pipeline
+    """
+    return pesos * FRACCION_PESOS_LLAMADA.get(estrategia, 1.0)
+
+
+def pesos_entre_llamadas(pesos, estrategia):
+    """
+    Bytes de pesos que quedan en el dispositivo entre llamadas (con offload vuelven a la RAM)
+    """
+    return 0 if estrategia in FRACCION_PESOS_LLAMADA else pesos
+
+
+def estimar_memoria(es_sdxl, precision, width, height, tamano_lote, cuantizacion=None, memoria_modelo=None,
+                    estrategia="residente", margen=MARGEN_PROCESO):
+    """
+    Predice el pico de memoria de una llamada al pipeline
+
+    Args:
+        es_sdxl (bool): Si el modelo es SDXL
+        precision (str): float32, float16 o bfloat16
+        width (int): Ancho de imagen
+        height (int): Alto de imagen
+        tamano_lote (int): Imágenes por llamada
+        cuantizacion (str): 'int8' o None
+        memoria_modelo (float): Memoria medida del pipeline cargado (None = estimarla)
+        estrategia (str): Estrategia de memoria del pipeline (ver ESTRATEGIAS_OFFLOAD)
+        margen (float): Bytes reservados para el proceso (0 si la memoria medida ya los descuenta)
+
+    Returns:
+        dict: Bytes de pesos (los que ocupan el dispositivo durante la llamada), activaciones, margen y total
+    """
+    pesos = memoria_modelo if memoria_modelo else memoria_pesos(es_sdxl, precision, cuantizacion)
+    pesos = pesos_en_llamada(pesos, estrategia)
+    activaciones = memoria_activaciones(es_sdxl, precision, width, height, estrategia) * tamano_lote
+    return {
+        "pesos": int(pesos),
+        "activaciones": int(activaciones),
+        "margen": int(margen),
+        "total": int(pesos + activaciones + margen)
+    }
+
+
+def _reducir_resolucion(width, height, factor):
+    """
+    Escala una resolución manteniendo la proporción, a múltiplos de MULTIPLO_LADO
+    """
+    return (
+        max(MULTIPLO_LADO, int(width * factor) // MULTIPLO_LADO * MULTIPLO_LADO),
+        max(MULTIPLO_LADO, int(height * factor) // MULTIPLO_LADO * MULTIPLO_LADO)
+    )
+
+
+def decidir_admision(es_sdxl, precision, width, height, num_variaciones, memoria_libre,
+                     tamano_lote=None, tamano_lote_maximo=8, fraccion_lote=0.6, politica="ajustar",
+                     cuantizacion=None, memoria_modelo=None, estrategia="residente"):
+    """
+    Decide si una solicitud se acepta, se divide en lotes, se reduce o se rechaza
+
+    La memoria libre se mide con el modelo ya cargado: solo las activaciones (y, con
+    offload, los pesos que suben al dispositivo durante la llamada) tienen que caber en
+    ella. Una imagen puede usar toda la memoria libre; los lotes de varias imágenes solo
+    una fracción, para dejar margen al resto del proceso y del host.
+
+    Args:
+        es_sdxl (bool): Si el modelo es SDXL
+        precision (str): float32, float16 o bfloat16
+        width (int): Ancho pedido
+        height (int): Alto pedido
+        num_variaciones (int): Imágenes a generar
+        memoria_libre (float): Bytes libres con el modelo cargado con la estrategia indicada
+                               (None = no se pudo medir)
+        tamano_lote (int): Tamaño de lote pedido (None = el máximo que quepa)
+        tamano_lote_maximo (int): Límite de imágenes por llamada
+        fraccion_lote (float): Fracción de la memoria libre que pueden usar los lotes
+        politica (str): ajustar, dividir o ninguna (ver POLITICAS_MEMORIA)
+        cuantizacion (str): 'int8' o None
+        memoria_modelo (float): Memoria medida del pipeline cargado (None = estimarla)
+        estrategia (str): Estrategia de memoria del pipeline (ver ESTRATEGIAS_OFFLOAD)
+
+    Returns:
+        dict: decision, width, height, tamano_lote, lotes y la estimación de memoria
+              (con decision sin_control o sin_medicion, tamano_lote es el pedido, None = automático)
+
+    Raises:
+        MemoriaInsuficienteError: Si ni una imagen cabe con la política indicada
+    """
+    if politica not in POLITICAS_MEMORIA:
+        raise ValueError(f"Política de memoria no soportada: {politica}. Opciones: {', '.join(POLITICAS_MEMORIA)}")
+
+    pedido = max(1, min(tamano_lote or tamano_lote_maximo, num_variaciones, tamano_lote_maximo))
+    admision = {
+        "decision": "aceptar",
+        "politica": politica,
+        "width": width,
+        "height": height,
+        "tamano_lote": pedido,
+        "memoria_libre_mb": int(memoria_libre // 1024**2) if memoria_libre is not None else None
+    }
+
+    # Sin control o sin medición: se genera como se pidió (el lote lo decide el generador)
+    if politica == "ninguna" or memoria_libre is None:
+        admision["decision"] = "sin_control" if politica == "ninguna" else "sin_medicion"
+        admision["tamano_lote"] = tamano_lote
+    else:
+        # Los pesos que el offload sube durante la llamada no figuran en la memoria medida
+        pesos = memoria_modelo if memoria_modelo else memoria_pesos(es_sdxl, precision, cuantizacion)
+        memoria_libre -= pesos_en_llamada(pesos, estrategia) - pesos_entre_llamadas(pesos, estrategia)
+        por_imagen = memoria_activaciones(es_sdxl, precision, width, height, estrategia)
+
+        if por_imagen > memoria_libre:
+            if politica != "ajustar":
+                raise MemoriaInsuficienteError(
+                    f"Una imagen de {width}x{height} necesita ~{por_imagen / 1024**2:.0f} MB y hay "
+                    f"~{max(memoria_libre, 0) / 1024**2:.0f} MB libres"
+                )
+            # Bajar la resolución de a 10% hasta que quepa una imagen
+            reducido = (width, height)
+            while por_imagen > memoria_libre:
+                reducido = _reducir_resolucion(*reducido, 0.9)
+                if min(reducido) < LADO_MINIMO:
+                    raise MemoriaInsuficienteError(
+                        f"No hay memoria para generar ni a {LADO_MINIMO} px de lado "
+                        f"(~{max(memoria_libre, 0) / 1024**2:.0f} MB libres)"
+                    )
+                por_imagen = memoria_activaciones(es_sdxl, precision, *reducido, estrategia)
+            admision.update({"decision": "reducir", "width": reducido[0], "height": reducido[1]})
+
+        cabe = max(1, int(memoria_libre * fraccion_lote // por_imagen))
+        if cabe < admision["tamano_lote"]:
+            admision["tamano_lote"] = cabe
+            if admision["decision"] == "aceptar":
+                admision["decision"] = "dividir"
+
+    admision["lotes"] = -(-num_variaciones // admision["tamano_lote"]) if admision["tamano_lote"] else None
+    estimacion = estimar_memoria(
+        es_sdxl, precision, admision["width"], admision["height"], admision["tamano_lote"] or 1,
+        cuantizacion, memoria_modelo, estrategia
+    )
+    admision["estimacion_mb"] = {campo: valor // 1024**2 for campo, valor in estimacion.items()}
+    return admision
+
+
+def estrategias_disponibles(dispositivo, compilado=False):
+    """
+    Retorna las estrategias de memoria aplicables, de la más rápida a la que menos memoria usa
+
+    Args:
+        dispositivo (str): 'cuda' o 'cpu'
+        compilado (bool): Si la UNet se compila con torch.compile
+
+    Returns:
+        list: Subconjunto ordenado de ESTRATEGIAS_OFFLOAD
+    """
+    # La UNet compilada no admite hooks de offload ni cambiar sus procesadores de atención
+    if compilado:
+        return ESTRATEGIAS_OFFLOAD[:2]
+    # El offload mueve pesos entre RAM y GPU: en CPU solo aplican los recortes de activaciones
+    if dispositivo != "cuda":
+        return ESTRATEGIAS_OFFLOAD[:3]
+    return list(ESTRATEGIAS_OFFLOAD)
+
+
+def elegir_offload(es_sdxl, precision, width, height, memoria_disponible, estrategias=None,
+                   politica="auto", tamano_lote=1, cuantizacion=None, memoria_modelo=None, margen=MARGEN_PROCESO):
+    """
+    Elige la estrategia de memoria más rápida con la que una llamada cabe en la memoria disponible
+
+    La estrategia se elige para una imagen por llamada: con ella fijada, el control de
+    admisión decide cuántas imágenes caben por lote. Con margen=0 el criterio es el mismo
+    que el de decidir_admision, así que una estrategia elegida para una resolución siempre
+    admite esa resolución.
+
+    Args:
+        es_sdxl (bool): Si el modelo es SDXL
+        precision (str): float32, float16 o bfloat16
+        width (int): Ancho de imagen
+        height (int): Alto de imagen
+        memoria_disponible (float): Bytes para el modelo y sus activaciones: la memoria libre más
+                                    lo que el modelo ya ocupa en el dispositivo (None = no se pudo medir)
+        estrategias (list): Estrategias aplicables (None = todas; ver estrategias_disponibles)
+        politica (str): auto o una estrategia fija (ver POLITICAS_OFFLOAD)
+        tamano_lote (int): Imágenes por llamada
+        cuantizacion (str): 'int8' o None
+        memoria_modelo (float): Memoria medida del pipeline cargado (None = estimarla)
+        margen (float): Bytes reservados para el proceso: MARGEN_PROCESO antes de cargar el modelo,
+                        0 con el modelo cargado (la memoria medida ya descuenta el proceso)
+
+    Returns:
+        dict: estrategia, politica, decision (auto, insuficiente, fija o sin_medicion), resolución
+              evaluada y estimación de memoria de la estrategia elegida
+    """
+    if politica not in POLITICAS_OFFLOAD:
+        raise ValueError(f"Política de offload no soportada: {politica}. Opciones: {', '.join(POLITICAS_OFFLOAD)}")
+    estrategias = estrategias or ESTRATEGIAS_OFFLOAD
+
+    def estimar(estrategia):
+        return estimar_memoria(
+            es_sdxl, precision, width, height, tamano_lote, cuantizacion, memoria_modelo, estrategia, margen
+        )
+
+    if politica != "auto":
+        # Una estrategia fija que no aplica se reemplaza por la más ahorrativa de las aplicables
+        estrategia = politica if politica in estrategias else estrategias[-1]
+        decision = "fija"
+    elif memoria_disponible is None:
+        # Sin medición: offload de modelos solo para SDXL, attention slicing para el resto
+        preferida = "modelo" if es_sdxl else "attention_slicing"
+        estrategia = preferida if preferida in estrategias else estrategias[-1]
+        decision = "sin_medicion"
+    else:
+        estrategia = next((e for e in estrategias if estimar(e)["total"] <= memoria_disponible), None)
+        decision = "auto"
+        if estrategia is None:
+            # Ni la más ahorrativa alcanza: el control de admisión reducirá la resolución o rechazará
+            estrategia, decision = estrategias[-1], "insuficiente"
+
+    return {
+        "estrategia": estrategia,
+        "politica": politica,
+        "decision": decision,
+        "width": width,
+        "height": height,
+        "memoria_disponible_mb": int(memoria_disponible // 1024**2) if memoria_disponible is not None else None,
+        "estimacion_mb": {campo: valor // 1024**2 for campo, valor in estimar(estrategia).items()}
+    }
+
+
+def aplicar_offload(pipeline, estrategia, dispositivo, width=None, height=None):
+    """
+    Configura el pipeline con una estrategia de memoria, deshaciendo lo que la anterior activó
+
+    Solo se tocan las opciones que cambian: repetir la estrategia actual no cuesta nada, y
+    volver a residente desde un offload mueve los pesos de nuevo al dispositivo.
+
+    Args:
+        pipeline: Pipeline de diffusers con PyTorch
+        estrategia (str): Estrategia de ESTRATEGIAS_OFFLOAD
+        dispositivo (str): Dispositivo de ejecución ('cuda' o 'cpu')
+        width (int): Ancho de la solicitud (decide el VAE por mosaicos)
+        height (int): Alto de la solicitud
+
+    Returns:
+        list: Opciones que cambiaron (vacía si el pipeline ya estaba configurado así)
+    """
+    nivel = ESTRATEGIAS_OFFLOAD.index(estrategia)
+    anterior = getattr(pipeline, "_configuracion_memoria", None)
+    nueva = {
+        "vae_slicing": nivel >= 1,
+        "vae_tiling": nivel >= 1 and max(width or 0, height or 0) >= LADO_MOSAICO_VAE,
+        "attention_slicing": nivel >= 2,
+        "offload": estrategia if nivel >= 3 else None
+    }
+    actual = anterior or {"vae_slicing": False, "vae_tiling": False, "attention_slicing": False, "offload": None}
+    cambios = [opcion for opcion in nueva if nueva[opcion] != actual[opcion]]
+
+    if "vae_slicing" in cambios:
+        if nueva["vae_slicing"]:
+            pipeline.vae.enable_slicing()
+        else:
+            pipeline.vae.disable_slicing()
+    if "vae_tiling" in cambios:
+        if nueva["vae_tiling"]:
+            pipeline.vae.enable_tiling()
+        else:
+            pipeline.vae.disable_tiling()
+    if "attention_slicing" in cambios:
+        if nueva["attention_slicing"]:
+            pipeline.enable_attention_slicing()
+        else:
+            pipeline.disable_attention_slicing()
+
+    # La primera configuración también ubica los pesos (el pipeline recién cargado está en CPU)
+    if "offload" in cambios or anterior is None:
+        if actual["offload"]:
+            pipeline.remove_all_hooks()
+        if nueva["offload"] == "modelo":
+            pipeline.enable_model_cpu_offload(device=dispositivo)
+        elif nueva["offload"] == "secuencial":
+            pipeline.enable_sequential_cpu_offload(device=dispositivo)
+        else:
+            pipeline.to(dispositivo)
+
+    pipeline._configuracion_memoria = nueva
+    return cambios
@@ -0,0 +1,353 @@
+"""
+Métricas de operación del generador en el formato de texto de Prometheus
+
+Contadores, indicadores e histogramas mínimos (sin depender de prometheus_client)
+que el generador actualiza al terminar cada sesión: solicitudes, imágenes exitosas y
+fallidas por estilo y resolución, reintentos, aciertos de cache y la latencia total y
+por etapa. Los indicadores de memoria, modelos residentes y cola se calculan en el
+momento de exponerlos.
+
+La exposición es texto plano (formato 0.0.4): se puede escribir a un archivo (para
+el textfile collector de node_exporter) o servir por HTTP en /metrics.
+"""
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Límites de los histogramas de latencia, en segundos
+BUCKETS_SESION = (1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+BUCKETS_ETAPA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BUCKETS_PASO = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+
+# Etapas del perfil de tiempos de cada imagen (ver generar_imagenes) -> etiqueta de la métrica
+ETAPAS_IMAGEN = {
+    "denoising_ms": "denoising",
+    "decodificacion_vae_ms": "decodificacion_vae",
+    "codificacion_ms": "codificacion",
+    "guardado_ms": "guardado",
+    "derivados_ms": "derivados"
+}
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _formatear_etiquetas(nombres, valores, extra=None):
+    pares = list(zip(nombres, valores)) + (list(extra.items()) if extra else [])
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares) + "}"
+
+
+def _formatear_numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        """
+        Inicializa una métrica
+
+        Args:
+            nombre (str): Nombre de la métrica (sin espacios, por ejemplo generador_imagenes_total)
+            ayuda (str): Descripción para la línea HELP
+            etiquetas (tuple): Nombres de las etiquetas que acepta
+        """
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _clave(self, etiquetas):
+        return tuple(str(etiquetas.get(nombre, "")) for nombre in self.etiquetas)
+
+    def _muestras(self):
+        """
+        Retorna las líneas de muestras de la métrica (sin HELP ni TYPE)
+        """
+        with self._lock:
+            return [
+                f"{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_formatear_numero(valor)}"
+                for clave, valor in sorted(self._valores.items())
+            ]
+
+    def exponer(self):
+        """
+        Retorna la métrica en formato de texto de Prometheus
+        """
+        return "\n".join([
+            f"# HELP {self.nombre} {self.ayuda}",
+            f"# TYPE {self.nombre} {self.tipo}",
+            *self._muestras()
+        ])
+
+
+class Contador(Metrica):
+    tipo = "counter"
+
+    def incrementar(self, valor=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+
+class Indicador(Metrica):
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), funcion=None):
+        """
+        Inicializa un indicador
+
+        Args:
+            funcion (callable): Si se indica, el valor (sin etiquetas) se calcula al exponer
+        """
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+
+    def fijar(self, valor, **etiquetas):
+        with self._lock:
+            self._valores[self._clave(etiquetas)] = valor
+
+    def _muestras(self):
+        if self.funcion is not None:
+            try:
+                valor = self.funcion()
+            except Exception:
+                valor = None
+            # Un valor que no se puede medir no se expone (mejor que un 0 engañoso)
+            if valor is not None:
+                self.fijar(valor)
+        return super()._muestras()
+
+
+class Histograma(Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_ETAPA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            conteos, suma = self._valores.get(clave, ([0] * len(self.buckets), 0.0))
+            for posicion, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    conteos[posicion] += 1
+            self._valores[clave] = (conteos, suma + valor)
+
+    def _muestras(self):
+        lineas = []
+        with self._lock:
+            for clave, (conteos, suma) in sorted(self._valores.items()):
+                for limite, conteo in zip(self.buckets, conteos):
+                    etiquetas = _formatear_etiquetas(self.etiquetas, clave, {"le": _formatear_numero(limite)})
+                    lineas.append(f"{self.nombre}_bucket{etiquetas} {conteo}")
+                etiquetas = _formatear_etiquetas(self.etiquetas, clave)
+                lineas.append(f"{self.nombre}_sum{etiquetas} {_formatear_numero(suma)}")
+                lineas.append(f"{self.nombre}_count{etiquetas} {conteos[-1]}")
+        return lineas
+
+
+class RegistroMetricas:
+    def __init__(self):
+        """
+        Inicializa un registro vacío de métricas
+        """
+        self.metricas = []
+
+    def registrar(self, metrica):
+        """
+        Agrega una métrica al registro y la retorna
+        """
+        self.metricas.append(metrica)
+        return metrica
+
+    def exponer(self):
+        """
+        Retorna todas las métricas en formato de texto de Prometheus
+
+        Returns:
+            str: Exposición completa (termina en salto de línea)
+        """
+        return "\n".join(metrica.exponer() for metrica in self.metricas) + "\n"
+
+    def guardar(self, ruta):
+        """
+        Escribe la exposición en un archivo de forma atómica (un lector nunca ve un archivo a medias)
+
+        Args:
+            ruta (str): Archivo de destino, por ejemplo para el textfile collector de node_exporter
+        """
+        ruta = Path(ruta)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        temporal = ruta.with_name(f".{ruta.name}.{os.getpid()}.tmp")
+        temporal.write_text(self.exponer(), encoding="utf-8")
+        os.replace(temporal, ruta)
+
+    def servir_http(self, puerto, host="127.0.0.1"):
+        """
+        Expone las métricas por HTTP en /metrics desde un hilo en segundo plano
+
+        Args:
+            puerto (int): Puerto TCP (0 = uno libre)
+            host (str): Interfaz donde escuchar
+
+        Returns:
+            ThreadingHTTPServer: Servidor iniciado (server_address tiene el puerto real)
+        """
+        registro = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                cuerpo = registro.exponer().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", TIPO_CONTENIDO)
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, formato, *args):
+                # stdout/stderr del worker son del protocolo y de los logs de generación
+                pass
+
+        servidor = ThreadingHTTPServer((host, puerto), Manejador)
+        threading.Thread(target=servidor.serve_forever, daemon=True, name="metricas").start()
+        return servidor
+
+
+def memoria_residente():
+    """
+    Retorna la memoria residente (RSS) del proceso en bytes, o None sin psutil
+    """
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+class MetricasGenerador(RegistroMetricas):
+    def __init__(self, prefijo="generador_imagenes"):
+        """
+        Crea las métricas del generador de imágenes
+
+        Los indicadores de modelos residentes, VRAM y cola no tienen función hasta que el
+        generador (o el worker) les asigna una.
+
+        Args:
+            prefijo (str): Prefijo de los nombres de las métricas
+        """
+        super().__init__()
+        self.solicitudes = self.registrar(Contador(
+            f"{prefijo}_solicitudes_total", "Solicitudes de generación por resultado", ("resultado",)
+        ))
+        self.imagenes = self.registrar(Contador(
+            f"{prefijo}_imagenes_total", "Imágenes por resultado, estilo y resolución",
+            ("resultado", "estilo", "resolucion")
+        ))
+        self.reintentos = self.registrar(Contador(
+            f"{prefijo}_reintentos_total", "Variaciones regeneradas por motivo y resultado del reintento",
+            ("motivo", "resultado")
+        ))
+        self.admisiones = self.registrar(Contador(
+            f"{prefijo}_admisiones_total", "Decisiones del control de admisión por memoria",
+            ("decision",)
+        ))
+        self.offload = self.registrar(Contador(
+            f"{prefijo}_offload_total", "Estrategias de memoria aplicadas al cargar un modelo o al cambiar de resolución",
+            ("estrategia",)
+        ))
+        self.cache = self.registrar(Contador(
+            f"{prefijo}_cache_total", "Consultas a las caches de resultados y embeddings",
+            ("cache", "resultado")
+        ))
+        self.latencia_sesion = self.registrar(Histograma(
+            f"{prefijo}_sesion_segundos", "Duración de cada sesión de generación de principio a fin",
+            ("resolucion",), BUCKETS_SESION
+        ))
+        self.latencia_etapa = self.registrar(Histograma(
+            f"{prefijo}_etapa_segundos", "Duración de cada etapa (por imagen, o por sesión en prompt y metadata)",
+            ("etapa",), BUCKETS_ETAPA
+        ))
+        self.latencia_paso = self.registrar(Histograma(
+            f"{prefijo}_paso_segundos", "Duración media de un paso de denoising de cada imagen generada",
+            ("resolucion", "tamano_lote"), BUCKETS_PASO
+        ))
+        self.memoria = self.registrar(Indicador(
+            f"{prefijo}_memoria_residente_bytes", "Memoria residente (RSS) del proceso", funcion=memoria_residente
+        ))
+        self.vram = self.registrar(Indicador(
+            f"{prefijo}_vram_bytes", "Memoria de GPU reservada por PyTorch"
+        ))
+        self.modelos_residentes = self.registrar(Indicador(
+            f"{prefijo}_modelos_residentes", "Pipelines cargados en el registro de modelos"
+        ))
+        self.cola = self.registrar(Indicador(
+            f"{prefijo}_cola_solicitudes", "Solicitudes esperando en la cola del worker"
+        ))
+
+    def registrar_sesion(self, metadata_sesion):
+        """
+        Actualiza las métricas con el resultado y el perfil de tiempos de una sesión terminada
+
+        Args:
+            metadata_sesion (dict): Metadata devuelta por generar_imagenes
+        """
+        parametros = metadata_sesion["parametros"]
+        resolucion = f"{parametros['dimensiones']['width']}x{parametros['dimensiones']['height']}"
+        resultados = metadata_sesion["resultados"]
+
+        self.solicitudes.incrementar(resultado="exito" if resultados["exitosas"] else "fallo")
+        for resultado, cantidad in (("exito", resultados["exitosas"]), ("fallo", resultados["fallidas"])):
+            if cantidad:
+                self.imagenes.incrementar(cantidad, resultado=resultado, estilo=parametros["estilo"], resolucion=resolucion)
+
+        for cache, estadisticas in (("resultados", metadata_sesion.get("cache_resultados", {})),
+                                    ("embeddings", metadata_sesion.get("cache_embeddings", {}))):
+            for resultado in ("aciertos", "fallos"):
+                if estadisticas.get(resultado):
+                    self.cache.incrementar(estadisticas[resultado], cache=cache, resultado=resultado)
+
+        perfil_sesion = metadata_sesion.get("perfil_tiempos", {})
+        if "total_ms" in perfil_sesion:
+            self.latencia_sesion.observar(perfil_sesion["total_ms"] / 1000, resolucion=resolucion)
+        if "codificacion_prompt_ms" in perfil_sesion:
+            self.latencia_etapa.observar(perfil_sesion["codificacion_prompt_ms"] / 1000, etapa="prompt")
+        if "escritura_metadata_ms" in perfil_sesion:
+            self.latencia_etapa.observar(perfil_sesion["escritura_metadata_ms"] / 1000, etapa="metadata")
+
+        for imagen in metadata_sesion["imagenes"]:
+            reintento = imagen.get("reintento")
+            if reintento:
+                self.reintentos.incrementar(
+                    motivo=reintento["motivo"], resultado="exito" if reintento.get("exito") else "fallo"
+                )
+
+            # Las imágenes de la cache no pasaron por el pipeline: no aportan latencias
+            perfil = imagen.get("perfil_tiempos")
+            if not perfil or imagen.get("desde_cache"):
+                continue
+            for campo, etapa in ETAPAS_IMAGEN.items():
+                if perfil.get(campo):
+                    self.latencia_etapa.observar(perfil[campo] / 1000, etapa=etapa)
+            if "paso_ms" in perfil:
+                self.latencia_paso.observar(
+                    perfil["paso_ms"]["media"] / 1000, resolucion=resolucion, tamano_lote=perfil["tamano_lote"]
+                )
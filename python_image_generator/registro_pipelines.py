@@ -0,0 +1,226 @@
+"""
+Registro de pipelines para el Generador de Imágenes con IA
+
+Mantiene varios modelos cargados a la vez dentro de un presupuesto de memoria:
+los pipelines se cargan la primera vez que se piden, los usados hace más tiempo se
+degradan a CPU (si el dispositivo es GPU) o se descargan cuando no hay espacio, y
+los que llevan demasiado tiempo sin usarse se descargan con descargar_inactivos().
+"""
+
+import gc
+import time
+
+
+class RegistroPipelines:
+    def __init__(self, cargador, dispositivo, presupuesto_dispositivo=None, presupuesto_cpu=None,
+                 tiempo_inactividad=None, degradar_a_cpu=True, estimador=None):
+        """
+        Inicializa el registro de pipelines
+
+        Args:
+            cargador (callable): Función que recibe un modelo_id y devuelve el pipeline cargado
+            dispositivo (str): Dispositivo de ejecución ('cuda' o 'cpu')
+            presupuesto_dispositivo (int): Bytes disponibles para modelos en el dispositivo (None = sin límite)
+            presupuesto_cpu (int): Bytes para modelos degradados a RAM cuando el dispositivo es GPU
+            tiempo_inactividad (float): Segundos sin uso tras los que un modelo se descarga (None = nunca)
+            degradar_a_cpu (bool): Si True, mueve a CPU los modelos expulsados de la GPU antes de descargarlos
+            estimador (callable): Función que recibe un modelo_id y estima los bytes de sus pesos antes de
+                                  cargarlo, para hacerle lugar primero (None = se libera después de cargar)
+        """
+        self.cargador = cargador
+        self.dispositivo = dispositivo
+        self.presupuesto_dispositivo = presupuesto_dispositivo
+        self.presupuesto_cpu = presupuesto_cpu
+        self.tiempo_inactividad = tiempo_inactividad
+        self.degradar_a_cpu = degradar_a_cpu and dispositivo == "cuda"
+        self.estimador = estimador
+
+        # modelo_id -> {"pipeline", "bytes", "ultimo_uso", "en_dispositivo", "offload"}
+        self.entradas = {}
+
+        # Callback opcional que recibe el modelo_id de cada modelo descargado
+        self.al_descargar = None
+
+    def _memoria_pipeline(self, pipeline):
+        """
+        Calcula la memoria ocupada por los pesos de un pipeline
+
+        Returns:
+            int: Bytes de parámetros y buffers de todos sus componentes, más los pesos empaquetados
+                 de las capas int8 dinámicas (que no son parámetros ni buffers)
+        """
+        import torch
+
+        total = 0
+        for componente in getattr(pipeline, "components", {}).values():
+            if isinstance(componente, torch.nn.Module):
+                total += sum(p.numel() * p.element_size() for p in componente.parameters())
+                total += sum(b.numel() * b.element_size() for b in componente.buffers())
+                for modulo in componente.modules():
+                    # LinearPackedParams guarda los pesos; el Linear que lo contiene solo los expone
+                    empaquetado = getattr(modulo, "_packed_params", None)
+                    if hasattr(modulo, "_weight_bias") and not isinstance(empaquetado, torch.nn.Module):
+                        total += sum(
+                            tensor.numel() * tensor.element_size()
+                            for tensor in modulo._weight_bias() if tensor is not None
+                        )
+        return total
+
+    def _usa_offload(self, pipeline):
+        """
+        Indica si el pipeline tiene CPU offloading activo (accelerate gestiona su ubicación)
+        """
+        return any(
+            hasattr(componente, "_hf_hook")
+            for componente in getattr(pipeline, "components", {}).values()
+        )
+
+    def _ocupado(self, en_dispositivo):
+        """
+        Suma la memoria de los modelos en el dispositivo o degradados a CPU
+        """
+        return sum(
+            entrada["bytes"] for entrada in self.entradas.values()
+            if entrada["en_dispositivo"] == en_dispositivo and not entrada["offload"]
+        )
+
+    def _liberar(self, necesario, excepto=None):
+        """
+        Expulsa modelos menos usados hasta que quepan `necesario` bytes en el dispositivo
+        """
+        if self.presupuesto_dispositivo is not None:
+            candidatos = sorted(
+                (e for m, e in self.entradas.items()
+                 if m != excepto and e["en_dispositivo"] and not e["offload"]),
+                key=lambda entrada: entrada["ultimo_uso"]
+            )
+            for entrada in candidatos:
+                if self._ocupado(True) + necesario <= self.presupuesto_dispositivo:
+                    break
+                modelo_id = entrada["modelo_id"]
+                if self.degradar_a_cpu:
+                    print(f"Degradando modelo a CPU: {modelo_id}")
+                    entrada["pipeline"].to("cpu")
+                    entrada["en_dispositivo"] = False
+                else:
+                    self.descargar(modelo_id)
+
+        # Los modelos degradados también tienen un límite en RAM
+        if self.presupuesto_cpu is not None:
+            degradados = sorted(
+                (e for m, e in self.entradas.items()
+                 if m != excepto and not e["en_dispositivo"]),
+                key=lambda entrada: entrada["ultimo_uso"]
+            )
+            for entrada in degradados:
+                if self._ocupado(False) <= self.presupuesto_cpu:
+                    break
+                self.descargar(entrada["modelo_id"])
+
+    def obtener(self, modelo_id):
+        """
+        Devuelve el pipeline de un modelo, cargándolo o reubicándolo si hace falta
+
+        Args:
+            modelo_id (str): Identificador del modelo en Hugging Face
+
+        Returns:
+            Pipeline de diffusers listo para usar en el dispositivo
+        """
+        self.descargar_inactivos(excepto=modelo_id)
+
+        entrada = self.entradas.get(modelo_id)
+        if entrada is None:
+            # Hacer lugar antes de cargar: si no, el pico es todos los residentes más el modelo nuevo
+            if self.estimador is not None:
+                self._liberar(self.estimador(modelo_id))
+            pipeline = self.cargador(modelo_id)
+            entrada = {
+                "modelo_id": modelo_id,
+                "pipeline": pipeline,
+                "bytes": self._memoria_pipeline(pipeline),
+                "ultimo_uso": time.monotonic(),
+                "en_dispositivo": True,
+                "offload": self._usa_offload(pipeline)
+            }
+            self.entradas[modelo_id] = entrada
+            # La estimación puede quedarse corta: con el tamaño medido se vuelve a ajustar
+            if not entrada["offload"]:
+                self._liberar(0, excepto=modelo_id)
+        elif not entrada["en_dispositivo"]:
+            self._liberar(entrada["bytes"], excepto=modelo_id)
+            print(f"Restaurando modelo al dispositivo: {modelo_id}")
+            entrada["pipeline"].to(self.dispositivo)
+            entrada["en_dispositivo"] = True
+
+        entrada["ultimo_uso"] = time.monotonic()
+        return entrada["pipeline"]
+
+    def actualizar_offload(self, modelo_id):
+        """
+        Vuelve a detectar si un modelo usa CPU offloading (tras cambiar su estrategia de memoria)
+
+        Args:
+            modelo_id (str): Identificador del modelo
+        """
+        entrada = self.entradas.get(modelo_id)
+        if entrada is not None:
+            entrada["offload"] = self._usa_offload(entrada["pipeline"])
+
+    def descargar(self, modelo_id):
+        """
+        Descarga un modelo y libera su memoria
+
+        Args:
+            modelo_id (str): Identificador del modelo
+        """
+        entrada = self.entradas.pop(modelo_id, None)
+        if entrada is None:
+            return
+
+        print(f"Descargando modelo: {modelo_id}")
+        if self.al_descargar is not None:
+            self.al_descargar(modelo_id)
+        del entrada
+
+        gc.collect()
+        if self.dispositivo == "cuda":
+            import torch
+
+            torch.cuda.empty_cache()
+
+    def descargar_inactivos(self, excepto=None):
+        """
+        Descarga los modelos que llevan más de tiempo_inactividad segundos sin usarse
+
+        Args:
+            excepto (str): Modelo que se conserva aunque esté inactivo (el que se va a usar)
+        """
+        if self.tiempo_inactividad is None:
+            return
+
+        ahora = time.monotonic()
+        inactivos = [
+            modelo_id for modelo_id, entrada in self.entradas.items()
+            if modelo_id != excepto and ahora - entrada["ultimo_uso"] > self.tiempo_inactividad
+        ]
+        for modelo_id in inactivos:
+            self.descargar(modelo_id)
+
+    def modelos_residentes(self):
+        """
+        Retorna el estado de los modelos cargados
+
+        Returns:
+            list: Un diccionario por modelo con ubicación, memoria y segundos sin uso
+        """
+        ahora = time.monotonic()
+        return [
+            {
+                "modelo": modelo_id,
+                "ubicacion": "offload" if entrada["offload"] else (self.dispositivo if entrada["en_dispositivo"] else "cpu"),
+                "memoria_mb": entrada["bytes"] // 1024**2,
+                "inactivo_segundos": round(ahora - entrada["ultimo_uso"], 1)
+            }
+            for modelo_id, entrada in self.entradas.items()
+        ]
@@ -0,0 +1,128 @@
+"""
+Schedulers rápidos intercambiables y presets de calidad por número de pasos
+
+Con el scheduler por defecto de cada modelo (PNDM/DDIM/Euler) hacen falta 25-30
+pasos para una imagen limpia. Los solvers multipaso (DPM++ 2M Karras, UniPC)
+logran imágenes comparables en 12-15 pasos, y LCM (modelo destilado o adaptador
+LCM-LoRA) en 4-8: el tiempo por imagen es proporcional a los pasos.
+
+Los presets de calidad traducen un nivel (borrador, rapido, equilibrado, alta) al
+mínimo de pasos razonable para cada scheduler.
+
+diffusers se importa solo al cambiar de scheduler: el CLI usa las constantes sin
+pagar esa importación.
+"""
+
+# Nombre -> (clase de diffusers, opciones sobre la configuración del modelo)
+SCHEDULERS = {
+    "dpmpp_2m_karras": ("DPMSolverMultistepScheduler", {
+        "algorithm_type": "dpmsolver++", "solver_order": 2, "use_karras_sigmas": True
+    }),
+    "euler_a": ("EulerAncestralDiscreteScheduler", {}),
+    "unipc": ("UniPCMultistepScheduler", {}),
+    "lcm": ("LCMScheduler", {})
+}
+
+# Preset -> pasos por scheduler (None = el scheduler por defecto del modelo)
+PRESETS_CALIDAD = {
+    "borrador": {None: 15, "dpmpp_2m_karras": 8, "euler_a": 12, "unipc": 8, "lcm": 4},
+    "rapido": {None: 20, "dpmpp_2m_karras": 12, "euler_a": 18, "unipc": 12, "lcm": 6},
+    "equilibrado": {None: 25, "dpmpp_2m_karras": 15, "euler_a": 25, "unipc": 15, "lcm": 8},
+    "alta": {None: 40, "dpmpp_2m_karras": 25, "euler_a": 35, "unipc": 25, "lcm": 8}
+}
+
+# Adaptadores LCM-LoRA oficiales por familia de modelo
+ADAPTADORES_LCM = {
+    "sd": "latent-consistency/lcm-lora-sdv1-5",
+    "sdxl": "latent-consistency/lcm-lora-sdxl"
+}
+
+# LCM se entrena sin classifier-free guidance: valores altos queman la imagen
+GUIDANCE_MAXIMO_LCM = 2.0
+
+
+def pasos_preset(preset, scheduler=None):
+    """
+    Retorna los pasos de un preset de calidad para un scheduler
+
+    Args:
+        preset (str): borrador, rapido, equilibrado o alta
+        scheduler (str): Nombre del scheduler (None = el del modelo)
+
+    Returns:
+        int: Pasos de inferencia
+    """
+    if preset not in PRESETS_CALIDAD:
+        raise ValueError(f"Preset de calidad no soportado: {preset}. Opciones: {', '.join(PRESETS_CALIDAD)}")
+    return PRESETS_CALIDAD[preset][scheduler]
+
+
+def es_modelo_lcm(pipeline):
+    """
+    Indica si la UNet del pipeline ya es un modelo LCM destilado (condicionada en el guidance)
+    """
+    config = getattr(getattr(pipeline, "unet", None), "config", None)
+    if isinstance(config, dict):
+        return config.get("time_cond_proj_dim") is not None
+    return getattr(config, "time_cond_proj_dim", None) is not None
+
+
+def activar_adaptador_lcm(pipeline, es_sdxl, cache_dir, activar):
+    """
+    Carga (la primera vez) y activa o desactiva el adaptador LCM-LoRA del pipeline
+
+    Args:
+        pipeline: Pipeline de diffusers
+        es_sdxl (bool): Si el pipeline es SDXL
+        cache_dir (str): Directorio de modelos
+        activar (bool): True para usar LCM, False para volver a los pesos originales
+
+    Raises:
+        ValueError: Si se pide LCM y el adaptador no se puede cargar
+    """
+    cargado = getattr(pipeline, "_adaptador_lcm", False)
+    if not activar:
+        if cargado:
+            pipeline.disable_lora()
+        return
+
+    if not cargado:
+        adaptador = ADAPTADORES_LCM["sdxl" if es_sdxl else "sd"]
+        try:
+            print(f"Cargando adaptador LCM: {adaptador}")
+            pipeline.load_lora_weights(adaptador, adapter_name="lcm", cache_dir=cache_dir)
+        except Exception as e:
+            raise ValueError(f"LCM requiere un modelo LCM o el adaptador {adaptador} (peft instalado): {e}") from e
+        pipeline._adaptador_lcm = True
+
+    pipeline.enable_lora()
+
+
+def aplicar_scheduler(pipeline, scheduler):
+    """
+    Cambia el scheduler del pipeline conservando la configuración original del modelo
+
+    Args:
+        pipeline: Pipeline de diffusers (u optimum)
+        scheduler (str): Nombre en SCHEDULERS, o None para el scheduler por defecto del modelo
+    """
+    import diffusers
+
+    # La configuración original se guarda la primera vez: los cambios siguientes parten de ella
+    if not hasattr(pipeline, "_scheduler_original"):
+        pipeline._scheduler_original = pipeline.scheduler
+
+    if scheduler is None:
+        pipeline.scheduler = pipeline._scheduler_original
+        return
+
+    if scheduler not in SCHEDULERS:
+        raise ValueError(f"Scheduler no soportado: {scheduler}. Opciones: {', '.join(SCHEDULERS)}")
+
+    nombre_clase, opciones = SCHEDULERS[scheduler]
+    actual = pipeline.scheduler
+    if type(actual).__name__ == nombre_clase and all(actual.config.get(k) == v for k, v in opciones.items()):
+        return
+
+    clase = getattr(diffusers, nombre_clase)
+    pipeline.scheduler = clase.from_config(pipeline._scheduler_original.config, **opciones)
@@ -0,0 +1,9 @@
+"""
+Configuración común de las pruebas: los módulos del generador se importan por nombre
+(igual que los importan generar_cli.py y el worker), desde la carpeta padre
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,57 @@
+"""
+Dobles de prueba compartidos: objetos con la interfaz mínima de diffusers que usan los módulos
+"""
+
+
+class VaeFalso:
+    def __init__(self):
+        self.use_slicing = False
+        self.use_tiling = False
+
+    def enable_slicing(self):
+        self.use_slicing = True
+
+    def disable_slicing(self):
+        self.use_slicing = False
+
+    def enable_tiling(self):
+        self.use_tiling = True
+
+    def disable_tiling(self):
+        self.use_tiling = False
+
+
+class PipelineFalso:
+    """
+    Registra las llamadas de configuración de memoria de un pipeline de diffusers
+    """
+
+    def __init__(self):
+        self.vae = VaeFalso()
+        self.attention_slicing = False
+        self.hooks = None
+        self.dispositivo = "cpu"
+        self.llamadas = []
+
+    def enable_attention_slicing(self):
+        self.attention_slicing = True
+
+    def disable_attention_slicing(self):
+        self.attention_slicing = False
+
+    def enable_model_cpu_offload(self, device=None):
+        self.hooks, self.dispositivo = "modelo", "cpu"
+        self.llamadas.append("enable_model_cpu_offload")
+
+    def enable_sequential_cpu_offload(self, device=None):
+        self.hooks, self.dispositivo = "secuencial", "cpu"
+        self.llamadas.append("enable_sequential_cpu_offload")
+
+    def remove_all_hooks(self):
+        self.hooks = None
+        self.llamadas.append("remove_all_hooks")
+
+    def to(self, dispositivo):
+        self.dispositivo = dispositivo
+        self.llamadas.append(f"to:{dispositivo}")
+        return self
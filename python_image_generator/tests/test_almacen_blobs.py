@@ -0,0 +1,75 @@
+"""
+Pruebas del almacén de blobs: deduplicación y límite de tamaño con expulsión LRU
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from almacen_blobs import AlmacenBlobs
+
+
+def envejecer(descriptor, segundos):
+    # La expulsión ordena por mtime: se fija a mano para no depender de la resolución del reloj
+    ruta = descriptor["ruta"]
+    marca = os.stat(ruta).st_mtime - segundos
+    os.utime(ruta, (marca, marca))
+
+
+def test_guardar_deduplica_por_contenido(tmp_path):
+    almacen = AlmacenBlobs(tmp_path)
+    primero = almacen.guardar(b"imagen", "png")
+    segundo = almacen.guardar(b"imagen", "png")
+    assert primero == segundo
+    assert almacen.obtener(primero["clave"], "png") == b"imagen"
+    assert len(list(tmp_path.glob("*/*.png"))) == 1
+
+
+def test_sin_limite_no_expulsa(tmp_path):
+    almacen = AlmacenBlobs(tmp_path)
+    for i in range(5):
+        almacen.guardar(bytes([i]) * 100, "png")
+    assert len(list(tmp_path.glob("*/*.png"))) == 5
+
+
+def test_limite_expulsa_los_usados_hace_mas_tiempo(tmp_path):
+    almacen = AlmacenBlobs(tmp_path, max_bytes=250)
+    viejo = almacen.guardar(b"a" * 100, "png")
+    usado = almacen.guardar(b"b" * 100, "png")
+    envejecer(viejo, 20)
+    envejecer(usado, 10)
+
+    # Leer un blob lo marca como usado: el expulsado es el otro
+    assert almacen.obtener(usado["clave"], "png") is not None
+    nuevo = almacen.guardar(b"c" * 100, "png")
+
+    assert almacen.obtener(viejo["clave"], "png") is None
+    assert almacen.obtener(usado["clave"], "png") is not None
+    assert almacen.obtener(nuevo["clave"], "png") is not None
+    assert almacen.ocupado == 200
+
+
+def test_el_blob_recien_guardado_nunca_se_expulsa(tmp_path):
+    almacen = AlmacenBlobs(tmp_path, max_bytes=50)
+    descriptor = almacen.guardar(b"x" * 100, "png")
+    assert almacen.obtener(descriptor["clave"], "png") == b"x" * 100
+
+
+def test_el_total_se_calcula_al_abrir_un_almacen_existente(tmp_path):
+    AlmacenBlobs(tmp_path).guardar(b"a" * 100, "png")
+    almacen = AlmacenBlobs(tmp_path, max_bytes=150)
+    assert almacen.ocupado == 100
+    almacen.guardar(b"b" * 100, "png")
+    assert almacen.ocupado == 100
+
+
+def test_guardar_desde_varios_hilos_lleva_bien_el_total(tmp_path):
+    almacen = AlmacenBlobs(tmp_path, max_bytes=2000)
+    # Contenidos repetidos (deduplicación) y distintos (expulsión) a la vez
+    contenidos = [bytes([i % 40]) * 100 for i in range(200)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda datos: almacen.guardar(datos, "png"), contenidos))
+
+    en_disco = sum(ruta.stat().st_size for ruta in tmp_path.glob("*/*.png"))
+    assert almacen.ocupado == en_disco
+    assert en_disco <= 2000
+    assert not list(tmp_path.glob("*/*.tmp"))
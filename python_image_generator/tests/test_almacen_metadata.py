@@ -0,0 +1,101 @@
+"""
+Pruebas del índice SQLite de metadata: filtros, paginación e importación de los JSON
+"""
+
+import json
+
+from almacen_metadata import AlmacenMetadata
+
+
+def sesion(session_id, producto, estilo, hora, variaciones=2, fallidas=()):
+    return {
+        "session_id": session_id,
+        "timestamp": f"2026-01-01T{hora}:00:00",
+        "modelo": "modelo",
+        "producto": {"nombre": producto},
+        "parametros": {"estilo": estilo},
+        "imagenes": [
+            {
+                "variacion": variacion,
+                "exito": variacion not in fallidas,
+                "timestamp_generacion": f"2026-01-01T{hora}:{variacion:02d}:00",
+                "nombre_archivo": f"{session_id}_{variacion}.png"
+            }
+            for variacion in range(1, variaciones + 1)
+        ]
+    }
+
+
+def crear_almacen(tmp_path):
+    almacen = AlmacenMetadata(tmp_path / "metadata.db")
+    almacen.registrar_sesiones([
+        sesion("s1", "cafe", "profesional", "10", fallidas=(2,)),
+        sesion("s2", "te", "minimalista", "11"),
+        sesion("s3", "cafe", "minimalista", "12", variaciones=3)
+    ])
+    return almacen
+
+
+def ids(listado):
+    return [imagen["id"] for imagen in listado["imagenes"]]
+
+
+def test_listado_solo_exitosas_mas_recientes_primero(tmp_path):
+    listado = crear_almacen(tmp_path).listar_imagenes(por_pagina=10)
+    assert listado["total"] == 6
+    assert ids(listado) == ["s3_03", "s3_02", "s3_01", "s2_02", "s2_01", "s1_01"]
+    assert listado["imagenes"][0]["producto"] == "cafe"
+    assert listado["imagenes"][0]["nombre_archivo"] == "s3_3.png"
+
+
+def test_filtros_por_sesion_producto_y_estilo(tmp_path):
+    almacen = crear_almacen(tmp_path)
+    assert ids(almacen.listar_imagenes(session_id="s2")) == ["s2_02", "s2_01"]
+    assert ids(almacen.listar_imagenes(producto="cafe")) == ["s3_03", "s3_02", "s3_01", "s1_01"]
+    assert ids(almacen.listar_imagenes(estilo="minimalista", producto="te")) == ["s2_02", "s2_01"]
+    assert almacen.listar_imagenes(producto="agua") == {"imagenes": [], "total": 0}
+
+
+def test_paginacion_mantiene_el_total(tmp_path):
+    almacen = crear_almacen(tmp_path)
+    paginas = [almacen.listar_imagenes(pagina=pagina, por_pagina=4) for pagina in (1, 2, 3)]
+    assert [pagina["total"] for pagina in paginas] == [6, 6, 6]
+    assert ids(paginas[0]) == ["s3_03", "s3_02", "s3_01", "s2_02"]
+    assert ids(paginas[1]) == ["s2_01", "s1_01"]
+    assert ids(paginas[2]) == []
+
+
+def test_registrar_de_nuevo_reemplaza_las_imagenes(tmp_path):
+    almacen = crear_almacen(tmp_path)
+    almacen.registrar_sesion(sesion("s3", "cafe", "minimalista", "12", variaciones=1))
+    assert ids(almacen.listar_imagenes(session_id="s3")) == ["s3_01"]
+    assert almacen.obtener_imagen("s3_02") is None
+
+
+def test_obtener_imagen_con_su_sesion(tmp_path):
+    resultado = crear_almacen(tmp_path).obtener_imagen("s1_02")
+    assert resultado["imagen"]["exito"] is False
+    assert resultado["sesion"]["session_id"] == "s1"
+    assert "imagenes" not in resultado["sesion"]
+
+
+def test_importar_json_descarta_los_bytes_de_las_imagenes(tmp_path):
+    directorio = tmp_path / "metadata"
+    directorio.mkdir()
+    antigua = sesion("s1", "cafe", "profesional", "10")
+    antigua["imagenes"][0]["base64_data"] = "iVBORw0KGgo="
+    antigua["imagenes"][1]["datos"] = "AAAA"
+    (directorio / "sesion_s1.json").write_text(json.dumps(antigua), encoding="utf-8")
+    (directorio / "sesion_rota.json").write_text("{", encoding="utf-8")
+    (directorio / "otro.json").write_text("{}", encoding="utf-8")
+
+    almacen = AlmacenMetadata(tmp_path / "metadata.db")
+    resumen = almacen.importar_json(directorio)
+
+    assert resumen["importadas"] == 1
+    assert [error["archivo"] for error in resumen["errores"]] == ["sesion_rota.json"]
+    listado = almacen.listar_imagenes()
+    assert ids(listado) == ["s1_02", "s1_01"]
+    for imagen in listado["imagenes"]:
+        assert "base64_data" not in imagen and "datos" not in imagen
+    assert "base64_data" not in almacen.obtener_imagen("s1_01")["imagen"]
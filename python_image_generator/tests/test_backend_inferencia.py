@@ -0,0 +1,55 @@
+"""
+Pruebas de la aleatoriedad por backend: generadores con PyTorch y latentes con optimum
+"""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("diffusers")
+
+from diffusers import DiffusionPipeline
+from diffusers.utils.torch_utils import randn_tensor
+
+from backend_inferencia import argumentos_aleatorios
+
+
+class UnetFalsa:
+    config = {"in_channels": 4}
+
+
+class PipelineOptimumAntiguo:
+    # Pipelines de optimum anteriores a la reescritura sobre diffusers (numpy)
+    unet = UnetFalsa()
+    vae_scale_factor = 8
+
+
+class PipelineOptimum(DiffusionPipeline):
+    # Pipelines de optimum que heredan de diffusers (tensores de torch)
+    def __init__(self):
+        self.unet = UnetFalsa()
+
+
+def test_pytorch_usa_un_generador_por_semilla():
+    argumentos = argumentos_aleatorios(None, "pytorch", [1, 2], 512, 512)
+    assert list(argumentos) == ["generator"]
+    assert [generador.initial_seed() for generador in argumentos["generator"]] == [1, 2]
+
+
+def test_latentes_iguales_al_ruido_de_diffusers():
+    argumentos = argumentos_aleatorios(PipelineOptimum(), "onnx", [7, 8], 512, 384)
+    generadores = [torch.Generator(device="cpu").manual_seed(semilla) for semilla in (7, 8)]
+    esperado = randn_tensor((2, 4, 48, 64), generator=generadores)
+    assert list(argumentos) == ["latents"]
+    assert torch.equal(argumentos["latents"], esperado)
+
+
+def test_cada_variacion_no_depende_del_lote():
+    lote = argumentos_aleatorios(PipelineOptimum(), "openvino", [3, 4], 256, 256)["latents"]
+    sola = argumentos_aleatorios(PipelineOptimum(), "openvino", [4], 256, 256)["latents"]
+    assert torch.equal(lote[1:], sola)
+
+
+def test_optimum_antiguo_recibe_numpy():
+    latentes = argumentos_aleatorios(PipelineOptimumAntiguo(), "onnx", [1], 256, 256)["latents"]
+    assert type(latentes).__module__ == "numpy"
+    assert latentes.shape == (1, 4, 32, 32)
@@ -0,0 +1,96 @@
+"""
+Pruebas de la cache de resultados: clave de contenido, aciertos y expulsión LRU
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_resultados import CacheResultados
+
+PARAMETROS = {
+    "modelo_id": "modelo",
+    "prompt_positivo": "café",
+    "prompt_negativo": "borroso",
+    "semilla": 7,
+    "width": 512,
+    "height": 512,
+    "pasos_inferencia": 20,
+    "guidance_scale": 7.5,
+    "scheduler": "euler_a"
+}
+
+
+def envejecer(cache, clave, segundos):
+    # La expulsión ordena por mtime: se fija a mano para no depender de la resolución del reloj
+    ruta = cache._ruta(clave)
+    marca = os.stat(ruta).st_mtime - segundos
+    os.utime(ruta, (marca, marca))
+
+
+def test_clave_canonica_y_sensible_a_cada_parametro(tmp_path):
+    cache = CacheResultados(tmp_path)
+    clave = cache.clave(**PARAMETROS)
+    assert cache.clave(**dict(reversed(list(PARAMETROS.items())))) == clave
+    for nombre, valor in [("semilla", 8), ("scheduler", "unipc"), ("width", 768), ("prompt_positivo", "te")]:
+        assert cache.clave(**{**PARAMETROS, nombre: valor}) != clave
+    assert cache.clave(**PARAMETROS, backend="onnx") != clave
+
+
+def test_aciertos_y_fallos(tmp_path):
+    cache = CacheResultados(tmp_path)
+    clave = cache.clave(**PARAMETROS)
+    assert cache.obtener(clave) is None
+    cache.guardar(clave, b"png")
+    assert cache.obtener(clave) == b"png"
+    assert cache.estadisticas() == {"aciertos": 1, "fallos": 1}
+
+
+def test_limite_expulsa_las_usadas_hace_mas_tiempo(tmp_path):
+    cache = CacheResultados(tmp_path, max_bytes=250)
+    cache.guardar("vieja", b"a" * 100)
+    cache.guardar("usada", b"b" * 100)
+    envejecer(cache, "vieja", 20)
+    envejecer(cache, "usada", 10)
+
+    # Leer una entrada la marca como usada: la expulsada es la otra
+    assert cache.obtener("usada") is not None
+    cache.guardar("nueva", b"c" * 100)
+
+    assert cache.obtener("vieja") is None
+    assert cache.obtener("usada") is not None
+    assert cache.obtener("nueva") is not None
+    assert cache.ocupado == 200
+
+
+def test_el_total_se_lleva_sin_recorrer_el_directorio(tmp_path, monkeypatch):
+    CacheResultados(tmp_path).guardar("previa", b"a" * 100)
+    cache = CacheResultados(tmp_path, max_bytes=1000)
+    assert cache.ocupado == 100
+
+    def recorrer():
+        raise AssertionError("no debería recorrer la cache por debajo del límite")
+
+    monkeypatch.setattr(cache, "_entradas", recorrer)
+    cache.guardar("otra", b"b" * 300)
+    # Reemplazar una clave cuenta solo la diferencia
+    cache.guardar("previa", b"c" * 50)
+    assert cache.ocupado == 350
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_guardar_y_obtener_desde_varios_hilos(tmp_path):
+    cache = CacheResultados(tmp_path, max_bytes=2000)
+
+    def usar(i):
+        clave = f"clave{i % 40}"
+        cache.guardar(clave, bytes([i % 40]) * 100)
+        cache.obtener(clave)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(usar, range(200)))
+
+    en_disco = sum(ruta.stat().st_size for ruta in tmp_path.glob("*.bin"))
+    assert cache.ocupado == en_disco
+    assert en_disco <= 2000
+    assert sum(cache.estadisticas().values()) == 200
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,55 @@
+"""
+Pruebas del registro de cancelaciones del worker (generar_cli.py --serve)
+"""
+
+from generar_cli import RegistroCancelaciones, comando_e_id
+
+
+def test_cancelacion_de_un_id_desconocido_se_ignora():
+    cancelaciones = RegistroCancelaciones()
+    assert not cancelaciones.cancelar("7")
+
+    # El id llega más tarde (p. ej. reutilizado): no nace cancelado
+    cancelaciones.recibir("7")
+    assert not cancelaciones.cancelada("7")
+
+
+def test_cancelacion_se_olvida_al_terminar_la_solicitud():
+    cancelaciones = RegistroCancelaciones()
+    cancelaciones.recibir("1")
+    assert cancelaciones.cancelar("1")
+    assert cancelaciones.cancelada("1")
+
+    cancelaciones.terminar("1")
+    assert not cancelaciones.cancelada("1")
+    assert not cancelaciones.cancelar("1")
+
+    cancelaciones.recibir("1")
+    assert not cancelaciones.cancelada("1")
+
+
+def test_id_repetido_sigue_cancelado_hasta_la_ultima_solicitud():
+    cancelaciones = RegistroCancelaciones()
+    cancelaciones.recibir("1")
+    cancelaciones.recibir("1")
+    cancelaciones.cancelar("1")
+
+    cancelaciones.terminar("1")
+    assert cancelaciones.cancelada("1")
+    cancelaciones.terminar("1")
+    assert not cancelaciones.cancelada("1")
+
+
+def test_ids_no_escalares_no_se_siguen():
+    cancelaciones = RegistroCancelaciones()
+    cancelaciones.recibir(["1"])
+    assert not cancelaciones.cancelar(["1"])
+    assert not cancelaciones.cancelada(["1"])
+    cancelaciones.terminar(None)
+
+
+def test_comando_e_id():
+    assert comando_e_id('{"comando": "cancelar", "id": "3"}\n') == ("cancelar", "3")
+    assert comando_e_id('{"producto": "café", "id": "4"}') == (None, "4")
+    assert comando_e_id("[1, 2]") == (None, None)
+    assert comando_e_id("no es json") == (None, None)
@@ -0,0 +1,81 @@
+"""
+Pruebas de la cache de componentes int8 con un modelo diminuto guardado en disco
+"""
+
+import json
+
+import pytest
+
+torch = pytest.importorskip("torch")
+diffusers = pytest.importorskip("diffusers")
+transformers = pytest.importorskip("transformers")
+
+import cuantizacion
+
+
+class PipelineComponentes:
+    def __init__(self, **componentes):
+        for nombre, modulo in componentes.items():
+            setattr(self, nombre, modulo)
+
+
+@pytest.fixture
+def modelo(tmp_path):
+    unet = diffusers.UNet2DConditionModel(
+        block_out_channels=(8, 16), layers_per_block=1, sample_size=8, in_channels=4, out_channels=4,
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+        up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+        cross_attention_dim=16, attention_head_dim=2, norm_num_groups=4
+    )
+    text_encoder = transformers.CLIPTextModel(transformers.CLIPTextConfig(
+        hidden_size=16, intermediate_size=32, num_hidden_layers=1, num_attention_heads=2, vocab_size=100
+    ))
+    unet.save_pretrained(tmp_path / "modelo" / "unet")
+    text_encoder.save_pretrained(tmp_path / "modelo" / "text_encoder")
+    (tmp_path / "modelo" / "model_index.json").write_text(json.dumps({
+        "_class_name": "StableDiffusionPipeline",
+        "unet": ["diffusers", "UNet2DConditionModel"],
+        "text_encoder": ["transformers", "CLIPTextModel"]
+    }))
+    return str(tmp_path / "modelo"), unet.eval(), text_encoder.eval()
+
+
+def iguales(a, b):
+    if isinstance(a, (tuple, list)):
+        return len(a) == len(b) and all(iguales(x, y) for x, y in zip(a, b))
+    if torch.is_tensor(a):
+        return torch.equal(a.dequantize() if a.is_quantized else a, b.dequantize() if b.is_quantized else b)
+    return a == b
+
+
+def test_cache_int8_se_recupera_con_weights_only(tmp_path, modelo):
+    modelo_id, unet, text_encoder = modelo
+    pipeline = PipelineComponentes(unet=unet, text_encoder=text_encoder)
+    cuantizacion.cuantizar_pipeline(pipeline, tmp_path / "cache", modelo_id, es_sdxl=False)
+
+    for componente in ("unet", "text_encoder"):
+        ruta = cuantizacion.ruta_componente(tmp_path / "cache", modelo_id, componente)
+        # Solo tensores y tipos básicos: se puede leer sin el unpickler completo
+        torch.load(ruta, weights_only=True)
+
+    cargados = cuantizacion.cargar_componentes(tmp_path / "cache", modelo_id, False, torch.float32)
+    assert set(cargados) == {"unet", "text_encoder"}
+    for componente, modulo in cargados.items():
+        original = getattr(pipeline, componente)
+        assert type(modulo) is type(original)
+        assert not modulo.training
+        esperado, obtenido = original.state_dict(), modulo.state_dict()
+        assert esperado.keys() == obtenido.keys()
+        assert all(iguales(esperado[nombre], obtenido[nombre]) for nombre in esperado)
+
+    entrada = torch.randint(0, 100, (1, 5))
+    assert torch.equal(cargados["text_encoder"](entrada)[0], pipeline.text_encoder(entrada)[0])
+
+
+def test_modulo_serializado_completo_no_se_carga(tmp_path, modelo):
+    modelo_id, unet, _ = modelo
+    ruta = cuantizacion.ruta_componente(tmp_path / "cache", modelo_id, "unet")
+    ruta.parent.mkdir(parents=True)
+    # Formato anterior (pickle del módulo entero): se rechaza y se vuelve a cuantizar
+    torch.save(cuantizacion.cuantizar_modulo(unet), ruta)
+    assert cuantizacion.cargar_componentes(tmp_path / "cache", modelo_id, False, torch.float32) == {}
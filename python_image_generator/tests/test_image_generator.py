@@ -0,0 +1,343 @@
+"""
+Pruebas del generador sin cargar modelos: admisión y estrategia de memoria por solicitud
+
+El generador se construye sin __init__ (que descarga y carga el pipeline) con un pipeline
+falso y la memoria libre simulada.
+"""
+
+import contextlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("torch")
+
+import image_generator
+import memoria
+from almacen_blobs import AlmacenBlobs
+from almacen_metadata import AlmacenMetadata
+from cache_embeddings import CacheEmbeddings
+from cache_resultados import CacheResultados
+from falsos import PipelineFalso
+from image_generator import GeneradorImagenesConsumibles
+from memoria import GB, MemoriaInsuficienteError
+from metricas import MetricasGenerador
+
+
+class RegistroFalso:
+    def __init__(self):
+        self.actualizados = []
+
+    def modelos_residentes(self):
+        return []
+
+    def actualizar_offload(self, modelo_id):
+        self.actualizados.append(modelo_id)
+
+
+def crear_generador(memoria_libre, dispositivo="cpu", politica_offload="auto"):
+    generador = GeneradorImagenesConsumibles.__new__(GeneradorImagenesConsumibles)
+    generador.device = dispositivo
+    generador.backend = "pytorch"
+    generador.compilar = False
+    generador.cuantizacion = None
+    generador.es_sdxl = False
+    generador.precision = "float32" if dispositivo == "cpu" else "float16"
+    generador.politica_memoria = "ajustar"
+    generador.politica_offload = politica_offload
+    generador.tamano_lote_maximo = 8
+    generador.fraccion_memoria_lote = 0.6
+    generador.metricas = MetricasGenerador()
+    generador.registro_pipelines = RegistroFalso()
+    generador.modelo_id = "modelo"
+    generador.pipeline = PipelineFalso()
+    generador._memoria_libre = lambda: memoria_libre
+    return generador
+
+
+def test_offload_se_elige_para_la_resolucion_admitida():
+    # 6 GB libres con el modelo float32 cargado: 1024x1024 no cabe y se reduce
+    generador = crear_generador(6 * GB)
+    admision, offload = generador._admitir_solicitud(1024, 1024, 1, None)
+    assert admision["decision"] == "reducir"
+    assert admision["width"] < 1024
+    assert (offload["width"], offload["height"]) == (admision["width"], admision["height"])
+    assert generador.pipeline._offload is offload
+    # Por debajo de 1024 px el VAE no decodifica por mosaicos
+    assert not generador.pipeline.vae.use_tiling
+
+
+def test_admision_se_recalcula_con_la_estrategia_elegida():
+    # Con attention slicing caben lotes de 4, pero la estrategia elegida (residente) solo admite 2
+    generador = crear_generador(6 * GB)
+    admision, offload = generador._admitir_solicitud(512, 512, 8, None)
+    assert offload["estrategia"] == "residente"
+    assert admision["tamano_lote"] == 2
+    por_imagen = memoria.memoria_activaciones(False, "float32", 512, 512, "residente")
+    assert admision["estimacion_mb"]["activaciones"] == int(por_imagen * 2) // 1024**2
+
+
+def test_offload_se_reevalua_al_cambiar_la_resolucion():
+    generador = crear_generador(6 * GB)
+    _, offload = generador._admitir_solicitud(1024, 1024, 1, None)
+    assert offload["estrategia"] == "attention_slicing"
+    assert generador.pipeline.attention_slicing
+
+    _, offload = generador._admitir_solicitud(512, 512, 1, None)
+    assert offload["estrategia"] == "residente"
+    assert not generador.pipeline.attention_slicing
+    assert generador.registro_pipelines.actualizados == ["modelo", "modelo"]
+
+
+def test_politica_offload_fija():
+    generador = crear_generador(64 * GB, politica_offload="vae_slicing")
+    admision, offload = generador._admitir_solicitud(512, 512, 2, None)
+    assert offload["estrategia"] == "vae_slicing"
+    assert admision["decision"] == "aceptar"
+    assert generador.pipeline.vae.use_slicing
+
+
+def test_cancelar_interrumpe_el_denoising():
+    import torch
+
+    generador = crear_generador(6 * GB)
+    cancelada = []
+    argumentos, _ = generador._monitor_pasos(cancelar=lambda: bool(cancelada))
+    revisar = argumentos["callback_on_step_end"]
+    pipeline = PipelineFalso()
+
+    revisar(pipeline, 0, 999, {"latents": torch.zeros(1, 4, 8, 8)})
+    assert not getattr(pipeline, "_interrupt", False)
+
+    cancelada.append(True)
+    revisar(pipeline, 1, 998, {"latents": torch.zeros(1, 4, 8, 8)})
+    assert pipeline._interrupt
+
+
+def test_lote_en_paralelo_registra_las_sesiones_en_el_padre(tmp_path, monkeypatch):
+    generador = crear_generador(6 * GB)
+    generador.carpeta_imagenes = tmp_path / "imagenes"
+    generador.carpeta_metadata = tmp_path
+    generador.almacen_metadata = AlmacenMetadata(tmp_path / "metadata.db")
+    generador.config_generador = {"modelo": "modelo"}
+    generador._procesos_lote = lambda lista_productos, procesos: (2, 1)
+
+    llamadas = []
+
+    def ejecutar_lote(lista_productos, config_generador, procesos, hilos, carpetas=None):
+        llamadas.append(carpetas)
+        return [
+            {
+                "session_id": f"s{i}",
+                "timestamp": "2026-01-01T00:00:00",
+                "producto": {"nombre": producto["nombre"]},
+                "parametros": {"estilo": "profesional"},
+                "imagenes": [{"variacion": 1, "exito": True, "base64_data": "AAAA"}],
+                "resultados": {"exitosas": 1, "fallidas": 0}
+            }
+            for i, producto in enumerate(lista_productos)
+        ] + [{"producto": {"nombre": "roto"}, "error": "sin memoria", "exito": False}]
+
+    monkeypatch.setattr(image_generator, "ejecutar_lote", ejecutar_lote)
+    productos = [{"nombre": "a", "descripcion": "x"}, {"nombre": "b", "descripcion": "y"}]
+    generador.generar_lote_productos(productos, procesos=2)
+
+    assert llamadas == [{
+        "carpeta_imagenes": str((tmp_path / "imagenes").absolute()),
+        "carpeta_metadata": str(tmp_path.absolute())
+    }]
+    listado = generador.almacen_metadata.listar_imagenes(por_pagina=10)
+    assert sorted(imagen["session_id"] for imagen in listado["imagenes"]) == ["s0", "s1"]
+    assert all("base64_data" not in imagen for imagen in listado["imagenes"])
+
+
+class PipelineReintento(PipelineFalso):
+    def __init__(self, fallar_restauracion=False):
+        super().__init__()
+        import torch
+        self.unet = type("Unet", (), {"dtype": torch.float16})()
+        self.fallar_restauracion = fallar_restauracion
+
+    def to(self, dispositivo=None, dtype=None):
+        if dtype is None:
+            return super().to(dispositivo)
+        if self.fallar_restauracion and self.llamadas:
+            raise RuntimeError("no se pudo restaurar")
+        self.llamadas.append(f"dtype:{str(dtype).split('.')[-1]}")
+        return self
+
+    def __call__(self, **kwargs):
+        return type("Resultado", (), {"images": ["imagen"]})()
+
+
+def crear_generador_reintento(pipeline, **atributos):
+    generador = crear_generador(6 * GB, dispositivo="cuda")
+    generador.pipeline = pipeline
+    generador.schedulers = []
+    generador._configurar_scheduler = generador.schedulers.append
+    generador._contexto_precision = contextlib.nullcontext
+    for nombre, valor in atributos.items():
+        setattr(generador, nombre, valor)
+    return generador
+
+
+@pytest.mark.parametrize("atributos", [
+    {"compilar": True},
+    {"cuantizacion": "int8"},
+    {"pipeline_offload": {"estrategia": "modelo"}},
+    {"pipeline_offload": {"estrategia": "secuencial"}},
+])
+def test_reintento_no_cambia_el_dtype_del_pipeline_compartido(atributos):
+    pipeline = PipelineReintento()
+    pipeline._offload = atributos.pop("pipeline_offload", None)
+    generador = crear_generador_reintento(pipeline, **atributos)
+    imagen, detalle = generador._reintentar_variacion({}, 1, 512, 512, 10, 7.5, None, 3)
+    assert imagen == "imagen"
+    assert detalle["precision"] == "float16"
+    assert pipeline.llamadas == []
+    assert generador.schedulers == ["euler_a", None]
+
+
+def test_reintento_en_float32_restaura_dtype_y_scheduler():
+    pipeline = PipelineReintento()
+    generador = crear_generador_reintento(pipeline)
+    imagen, detalle = generador._reintentar_variacion({}, 1, 512, 512, 10, 7.5, None, 3)
+    assert detalle["precision"] == "float32"
+    assert pipeline.llamadas == ["dtype:float32", "dtype:float16"]
+    assert generador.schedulers == ["euler_a", None]
+
+
+def test_reintento_restaura_el_scheduler_aunque_falle_el_dtype():
+    pipeline = PipelineReintento(fallar_restauracion=True)
+    generador = crear_generador_reintento(pipeline)
+    with pytest.raises(RuntimeError):
+        generador._reintentar_variacion({}, 1, 512, 512, 10, 7.5, None, 3)
+    assert generador.schedulers == ["euler_a", None]
+
+
+class PNDMScheduler:
+    pass
+
+
+class PipelineImagenes(PipelineFalso):
+    def __init__(self):
+        super().__init__()
+        self.scheduler = PNDMScheduler()
+        self.generadas = 0
+
+    def __call__(self, width, height, num_images_per_prompt, **kwargs):
+        from PIL import Image
+
+        self.generadas += num_images_per_prompt
+        imagenes = [Image.new("RGB", (width, height), "white") for _ in range(num_images_per_prompt)]
+        return type("Resultado", (), {"images": imagenes})()
+
+
+def crear_generador_sesion(tmp_path):
+    generador = crear_generador(64 * GB)
+    generador.pipeline = PipelineImagenes()
+    generador.cache_dir = str(tmp_path / "modelos")
+    generador.modelos_recomendados = {}
+    generador.carpeta_imagenes = tmp_path / "imagenes"
+    generador.carpeta_imagenes.mkdir()
+    generador.carpeta_metadata = tmp_path
+    generador.almacen_metadata = None
+    generador.cache_resultados = CacheResultados(tmp_path / "cache")
+    generador.almacen_blobs = AlmacenBlobs(tmp_path / "blobs")
+    generador.cache_embeddings = CacheEmbeddings(max_entradas=4)
+    generador.pool_postproceso = ThreadPoolExecutor(max_workers=2)
+    generador._configurar_scheduler = lambda scheduler: None
+    generador._argumentos_prompt = lambda positivo, negativo: {}
+    return generador
+
+
+def generar(generador, semillas, width=256, **kwargs):
+    return generador.generar_imagenes(
+        "café", "grano", num_variaciones=len(semillas), width=width, height=width, pasos_inferencia=2,
+        semillas=semillas, return_bytes=True, **kwargs
+    )
+
+
+def test_solicitud_en_cache_no_carga_el_modelo_ni_pasa_por_admision(tmp_path):
+    generador = crear_generador_sesion(tmp_path)
+    generar(generador, [1, 2])
+    assert generador.pipeline.generadas == 2
+
+    def no_llamar(*args, **kwargs):
+        raise MemoriaInsuficienteError("no debería admitirse una solicitud que está en cache")
+
+    generador._seleccionar_modelo = no_llamar
+    generador._admitir_solicitud = no_llamar
+    resultado = generar(generador, [1, 2])
+
+    assert resultado["resultados"]["exitosas"] == 2
+    assert all(imagen["desde_cache"] for imagen in resultado["imagenes"])
+    assert resultado["admision"] is None
+    assert resultado["parametros"]["clase_scheduler"] == "PNDMScheduler"
+    assert generador.pipeline.generadas == 2
+
+
+def test_scheduler_por_defecto_de_un_modelo_sin_cargar(tmp_path):
+    generador = crear_generador_sesion(tmp_path)
+    modelo = tmp_path / "otro"
+    modelo.mkdir()
+    (modelo / "model_index.json").write_text(
+        '{"_class_name": "StableDiffusionPipeline", "scheduler": ["diffusers", "DDIMScheduler"]}'
+    )
+    assert generador._clase_scheduler_por_defecto(str(modelo)) == "DDIMScheduler"
+    assert generador._clase_scheduler_por_defecto("modelo") == "PNDMScheduler"
+
+
+def test_admision_cuenta_solo_las_variaciones_pendientes(tmp_path):
+    generador = crear_generador_sesion(tmp_path)
+    generar(generador, [1, 2])
+
+    admitidas = []
+    admitir = generador._admitir_solicitud
+
+    def registrar(width, height, num_variaciones, tamano_lote):
+        admitidas.append(num_variaciones)
+        return admitir(width, height, num_variaciones, tamano_lote)
+
+    generador._admitir_solicitud = registrar
+    resultado = generar(generador, [1, 2, 3])
+
+    assert admitidas == [1]
+    assert [imagen["desde_cache"] for imagen in resultado["imagenes"]] == [True, True, False]
+    assert generador.pipeline.generadas == 3
+
+
+def test_resolucion_reducida_se_guarda_con_su_propia_clave(tmp_path):
+    generador = crear_generador_sesion(tmp_path)
+    generador._admitir_solicitud = lambda width, height, num_variaciones, tamano_lote: ({
+        "decision": "reducir", "width": 128, "height": 128, "tamano_lote": 1, "lotes": num_variaciones
+    }, None)
+
+    resultado = generar(generador, [1])
+    assert resultado["imagenes"][0]["dimensiones"] == {"width": 128, "height": 128}
+
+    # La imagen reducida no responde a la solicitud de 256x256, sí a la de 128x128
+    assert not generar(generador, [1])["imagenes"][0]["desde_cache"]
+    assert generar(generador, [1], width=128)["imagenes"][0]["desde_cache"]
+
+
+def test_cancelacion_descarta_los_post_procesos_sin_registrar(tmp_path):
+    generador = crear_generador_sesion(tmp_path)
+    postprocesar = generador._postprocesar_imagen
+
+    def postprocesar_lento(*args, **kwargs):
+        time.sleep(0.2)
+        return postprocesar(*args, **kwargs)
+
+    generador._postprocesar_imagen = postprocesar_lento
+
+    # Se cancela después del segundo lote, con el post-proceso del primero aún corriendo
+    with pytest.raises(image_generator.SolicitudCancelada):
+        generador.generar_imagenes(
+            "café", "grano", num_variaciones=3, width=64, height=64, pasos_inferencia=2, semillas=[1, 2, 3],
+            tamano_lote=1, cancelar=lambda: generador.pipeline.generadas >= 2
+        )
+
+    generador.pool_postproceso.shutdown(wait=True)
+    assert not list(generador.carpeta_imagenes.iterdir())
@@ -0,0 +1,28 @@
+"""
+El CLI y los módulos auxiliares se importan sin torch ni diffusers (--help, --version,
+--status y la validación de argumentos no pagan esa importación)
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+MODULOS_SIN_TORCH = [
+    "generar_cli", "cuantizacion", "compilacion", "cache_embeddings", "registro_pipelines",
+    "lote_paralelo", "memoria", "schedulers", "transporte", "backend_inferencia"
+]
+
+
+@pytest.mark.parametrize("modulo", MODULOS_SIN_TORCH)
+def test_modulo_no_importa_torch(modulo):
+    codigo = (
+        f"import sys, {modulo}; "
+        "print(','.join(m for m in ('torch', 'diffusers') if m in sys.modules))"
+    )
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo], cwd=Path(__file__).parent.parent,
+        capture_output=True, text=True, check=True
+    )
+    assert salida.stdout.strip() == ""
@@ -0,0 +1,35 @@
+"""
+Pruebas del lote en paralelo sin lanzar procesos: inicializador de los procesos hijos
+"""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import image_generator
+import lote_paralelo
+
+
+class GeneradorFalso:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+
+def test_los_hijos_usan_las_carpetas_del_padre_sin_abrir_el_indice(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_generator, "GeneradorImagenesConsumibles", GeneradorFalso)
+    monkeypatch.setattr(lote_paralelo, "_generador", None)
+    monkeypatch.setenv("OMP_NUM_THREADS", "")
+    monkeypatch.setenv("MKL_NUM_THREADS", "")
+    hilos = torch.get_num_threads()
+    try:
+        lote_paralelo._inicializar_proceso(1, {"modelo": "x"}, {
+            "carpeta_imagenes": str(tmp_path / "imagenes"),
+            "carpeta_metadata": str(tmp_path / "metadata")
+        })
+    finally:
+        torch.set_num_threads(hilos)
+
+    generador = lote_paralelo._generador
+    assert generador.kwargs == {"modelo": "x", "indexar_metadata": False}
+    assert generador.carpeta_imagenes == tmp_path / "imagenes"
+    assert generador.carpeta_metadata == tmp_path / "metadata"
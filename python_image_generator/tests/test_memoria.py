@@ -0,0 +1,287 @@
+"""
+Pruebas de la estimación de memoria, el control de admisión y la elección de offload
+
+Los valores de RAM/VRAM son simulados: las funciones de memoria.py son puras y reciben
+la memoria medida como argumento.
+"""
+
+import pytest
+
+import memoria
+from falsos import PipelineFalso
+from memoria import ESTRATEGIAS_OFFLOAD, GB, LADO_MINIMO, MULTIPLO_LADO, MemoriaInsuficienteError
+
+# Una memoria libre que sobra para cualquier solicitud
+MEMORIA_AMPLIA = 512 * GB
+
+
+# --- Control de admisión ---
+
+def por_imagen(lado, es_sdxl=False, precision="float16"):
+    return memoria.memoria_activaciones(es_sdxl, precision, lado, lado)
+
+
+def test_admision_acepta_con_memoria_amplia():
+    admision = memoria.decidir_admision(False, "float16", 768, 768, 3, MEMORIA_AMPLIA)
+    assert admision["decision"] == "aceptar"
+    assert (admision["width"], admision["height"]) == (768, 768)
+    assert admision["tamano_lote"] == 3
+    assert admision["lotes"] == 1
+
+
+def test_admision_respeta_el_lote_pedido():
+    admision = memoria.decidir_admision(False, "float16", 512, 512, 5, MEMORIA_AMPLIA, tamano_lote=2)
+    assert admision["decision"] == "aceptar"
+    assert admision["tamano_lote"] == 2
+    assert admision["lotes"] == 3
+
+
+@pytest.mark.parametrize("politica", ["ajustar", "dividir"])
+def test_admision_divide_en_lotes_sin_reducir(politica):
+    # Cabe una imagen (y dos en la fracción de lotes), pero no las cuatro juntas
+    libre = por_imagen(768) * 2 / 0.6 + 1
+    admision = memoria.decidir_admision(False, "float16", 768, 768, 4, libre, politica=politica)
+    assert admision["decision"] == "dividir"
+    assert (admision["width"], admision["height"]) == (768, 768)
+    assert admision["tamano_lote"] == 2
+    assert admision["lotes"] == 2
+
+
+def test_admision_dividir_rechaza_en_lugar_de_reducir():
+    with pytest.raises(MemoriaInsuficienteError):
+        memoria.decidir_admision(False, "float16", 2048, 2048, 1, por_imagen(1024), politica="dividir")
+
+
+def test_admision_ajustar_reduce_la_resolucion():
+    admision = memoria.decidir_admision(False, "float16", 2048, 2048, 2, por_imagen(1024))
+    assert admision["decision"] == "reducir"
+    assert LADO_MINIMO <= admision["width"] < 2048
+    assert admision["width"] == admision["height"]
+    assert por_imagen(admision["width"]) <= por_imagen(1024)
+    assert admision["tamano_lote"] == 1
+    assert admision["lotes"] == 2
+
+
+@pytest.mark.parametrize("width, height", [(2048, 2048), (2000, 1496), (1368, 768), (1032, 2040)])
+def test_admision_reducida_en_multiplos_de_8_y_con_la_proporcion(width, height):
+    admision = memoria.decidir_admision(False, "float16", width, height, 1, por_imagen(640))
+    assert admision["decision"] == "reducir"
+    assert admision["width"] % MULTIPLO_LADO == 0
+    assert admision["height"] % MULTIPLO_LADO == 0
+    assert admision["width"] / admision["height"] == pytest.approx(width / height, rel=0.05)
+
+
+def test_admision_rechaza_por_debajo_del_lado_minimo():
+    with pytest.raises(MemoriaInsuficienteError):
+        memoria.decidir_admision(False, "float16", 1024, 1024, 1, por_imagen(LADO_MINIMO) / 2)
+
+
+def test_admision_sin_control_genera_lo_pedido():
+    admision = memoria.decidir_admision(False, "float16", 2048, 2048, 3, 1 * GB, tamano_lote=3, politica="ninguna")
+    assert admision["decision"] == "sin_control"
+    assert (admision["width"], admision["tamano_lote"], admision["lotes"]) == (2048, 3, 1)
+
+
+def test_admision_sin_medicion_deja_el_lote_al_generador():
+    admision = memoria.decidir_admision(False, "float16", 2048, 2048, 3, None)
+    assert admision["decision"] == "sin_medicion"
+    assert admision["tamano_lote"] is None
+    assert admision["lotes"] is None
+    assert admision["memoria_libre_mb"] is None
+
+
+def test_admision_politica_invalida():
+    with pytest.raises(ValueError):
+        memoria.decidir_admision(False, "float16", 512, 512, 1, MEMORIA_AMPLIA, politica="reducir")
+
+
+def test_admision_estimacion_en_mb():
+    admision = memoria.decidir_admision(True, "float16", 1024, 1024, 1, MEMORIA_AMPLIA)
+    estimacion = admision["estimacion_mb"]
+    assert estimacion["total"] == pytest.approx(estimacion["pesos"] + estimacion["activaciones"] + estimacion["margen"], abs=2)
+
+
+@pytest.mark.parametrize("factor", [0.9, 0.5, 0.1, 0.001])
+def test_reducir_resolucion_en_multiplos_de_8(factor):
+    width, height = memoria._reducir_resolucion(1001, 777, factor)
+    assert width % MULTIPLO_LADO == 0 and height % MULTIPLO_LADO == 0
+    assert width >= MULTIPLO_LADO and height >= MULTIPLO_LADO
+    assert width <= 1001 * factor or width == MULTIPLO_LADO
+
+
+def test_memoria_pesos_segun_precision_y_cuantizacion():
+    float32 = memoria.memoria_pesos(False)
+    assert memoria.memoria_pesos(False, "float16") == pytest.approx(float32 / 2)
+    assert memoria.memoria_pesos(False, cuantizacion="int8") < float32
+    assert memoria.memoria_pesos(True) > float32
+
+
+def test_activaciones_crecen_mas_que_lineal():
+    assert por_imagen(1024) > 4 * por_imagen(512)
+
+
+# --- Elección de la estrategia de memoria (offload) ---
+
+def test_elegir_offload_residente_con_memoria_amplia():
+    eleccion = memoria.elegir_offload(True, "float16", 1024, 1024, MEMORIA_AMPLIA)
+    assert eleccion["estrategia"] == "residente"
+    assert eleccion["decision"] == "auto"
+    assert eleccion["memoria_disponible_mb"] == MEMORIA_AMPLIA // 1024**2
+
+
+@pytest.mark.parametrize("vram_gb, esperada", [
+    (24, "residente"),
+    (12, "vae_slicing"),
+    (10, "modelo"),
+    (8, "secuencial")
+])
+def test_elegir_offload_sdxl_segun_vram(vram_gb, esperada):
+    eleccion = memoria.elegir_offload(True, "float16", 1024, 1024, vram_gb * GB)
+    assert eleccion["estrategia"] == esperada
+
+
+def test_elegir_offload_mas_ahorrativa_con_menos_memoria():
+    niveles = [
+        ESTRATEGIAS_OFFLOAD.index(memoria.elegir_offload(False, "float16", 1024, 1024, gb * GB)["estrategia"])
+        for gb in (64, 16, 12, 10, 8, 7, 6, 5)
+    ]
+    assert niveles == sorted(niveles)
+
+
+def test_elegir_offload_mas_ahorrativa_a_mayor_resolucion():
+    niveles = [
+        ESTRATEGIAS_OFFLOAD.index(memoria.elegir_offload(True, "float16", lado, lado, 12 * GB)["estrategia"])
+        for lado in (512, 768, 1024, 1280, 1536)
+    ]
+    assert niveles == sorted(niveles)
+    assert niveles[0] < niveles[-1]
+
+
+def test_elegir_offload_la_estimacion_cabe_en_la_memoria():
+    eleccion = memoria.elegir_offload(True, "float16", 1024, 1024, 10 * GB)
+    assert eleccion["estimacion_mb"]["total"] <= 10 * 1024
+
+
+def test_elegir_offload_insuficiente_usa_la_mas_ahorrativa():
+    eleccion = memoria.elegir_offload(True, "float16", 2048, 2048, 2 * GB)
+    assert eleccion["estrategia"] == "secuencial"
+    assert eleccion["decision"] == "insuficiente"
+
+
+def test_elegir_offload_en_cpu_nunca_mueve_pesos():
+    estrategias = memoria.estrategias_disponibles("cpu")
+    assert estrategias == ["residente", "vae_slicing", "attention_slicing"]
+    for gb in (64, 16, 8, 4, 1):
+        eleccion = memoria.elegir_offload(False, "float32", 768, 768, gb * GB, estrategias=estrategias)
+        assert eleccion["estrategia"] in estrategias
+
+
+def test_estrategias_compilado_no_tocan_la_unet():
+    assert memoria.estrategias_disponibles("cuda", compilado=True) == ["residente", "vae_slicing"]
+    assert memoria.estrategias_disponibles("cuda") == ESTRATEGIAS_OFFLOAD
+
+
+@pytest.mark.parametrize("es_sdxl, esperada", [(True, "modelo"), (False, "attention_slicing")])
+def test_elegir_offload_sin_medicion(es_sdxl, esperada):
+    eleccion = memoria.elegir_offload(es_sdxl, "float16", 768, 768, None)
+    assert eleccion["estrategia"] == esperada
+    assert eleccion["decision"] == "sin_medicion"
+    assert eleccion["memoria_disponible_mb"] is None
+
+
+def test_elegir_offload_politica_fija():
+    eleccion = memoria.elegir_offload(False, "float16", 512, 512, MEMORIA_AMPLIA, politica="secuencial")
+    assert eleccion["estrategia"] == "secuencial"
+    assert eleccion["decision"] == "fija"
+
+
+def test_elegir_offload_politica_fija_que_no_aplica():
+    eleccion = memoria.elegir_offload(
+        False, "float32", 512, 512, MEMORIA_AMPLIA,
+        estrategias=memoria.estrategias_disponibles("cpu"), politica="modelo"
+    )
+    assert eleccion["estrategia"] == "attention_slicing"
+
+
+def test_elegir_offload_politica_invalida():
+    with pytest.raises(ValueError):
+        memoria.elegir_offload(False, "float16", 512, 512, MEMORIA_AMPLIA, politica="todo")
+
+
+def test_elegir_offload_sin_margen_con_el_modelo_cargado():
+    con_margen = memoria.elegir_offload(False, "float16", 1024, 1024, 6 * GB)
+    sin_margen = memoria.elegir_offload(False, "float16", 1024, 1024, 6 * GB, margen=0)
+    assert sin_margen["estimacion_mb"]["margen"] == 0
+    assert ESTRATEGIAS_OFFLOAD.index(sin_margen["estrategia"]) <= ESTRATEGIAS_OFFLOAD.index(con_margen["estrategia"])
+
+
+@pytest.mark.parametrize("disponible_gb", [3, 4, 5, 6, 8, 10, 12, 16])
+@pytest.mark.parametrize("lado", [512, 768, 1024])
+def test_estrategia_elegida_admite_su_resolucion(disponible_gb, lado):
+    # Mismo criterio que el generador: la admisión recibe la memoria libre con la estrategia aplicada
+    disponible = disponible_gb * GB
+    pesos = memoria.memoria_pesos(True, "float16")
+    eleccion = memoria.elegir_offload(True, "float16", lado, lado, disponible, margen=0)
+    if eleccion["decision"] != "auto":
+        return
+    admision = memoria.decidir_admision(
+        True, "float16", lado, lado, 1,
+        memoria_libre=disponible - memoria.pesos_entre_llamadas(pesos, eleccion["estrategia"]),
+        estrategia=eleccion["estrategia"]
+    )
+    assert (admision["width"], admision["height"]) == (lado, lado)
+
+
+def test_pesos_con_offload():
+    pesos = 10 * GB
+    assert memoria.pesos_en_llamada(pesos, "residente") == pesos
+    assert memoria.pesos_en_llamada(pesos, "modelo") < pesos
+    assert memoria.pesos_en_llamada(pesos, "secuencial") < memoria.pesos_en_llamada(pesos, "modelo")
+    assert memoria.pesos_entre_llamadas(pesos, "attention_slicing") == pesos
+    assert memoria.pesos_entre_llamadas(pesos, "modelo") == 0
+
+
+# --- Aplicación de la estrategia al pipeline ---
+
+def test_aplicar_offload_primera_configuracion_ubica_los_pesos():
+    pipeline = PipelineFalso()
+    assert memoria.aplicar_offload(pipeline, "residente", "cuda", 512, 512) == []
+    assert pipeline.llamadas == ["to:cuda"]
+    assert not pipeline.vae.use_slicing and not pipeline.attention_slicing
+
+
+def test_aplicar_offload_niveles_acumulativos():
+    pipeline = PipelineFalso()
+    cambios = memoria.aplicar_offload(pipeline, "modelo", "cuda", 512, 512)
+    assert cambios == ["vae_slicing", "attention_slicing", "offload"]
+    assert pipeline.vae.use_slicing and pipeline.attention_slicing
+    assert pipeline.hooks == "modelo"
+    assert not pipeline.vae.use_tiling
+
+
+def test_aplicar_offload_mosaicos_segun_resolucion():
+    pipeline = PipelineFalso()
+    memoria.aplicar_offload(pipeline, "vae_slicing", "cuda", 768, 768)
+    assert not pipeline.vae.use_tiling
+    assert memoria.aplicar_offload(pipeline, "vae_slicing", "cuda", 1024, 768) == ["vae_tiling"]
+    assert pipeline.vae.use_tiling
+    assert memoria.aplicar_offload(pipeline, "vae_slicing", "cuda", 512, 512) == ["vae_tiling"]
+    assert not pipeline.vae.use_tiling
+
+
+def test_aplicar_offload_repetir_no_cambia_nada():
+    pipeline = PipelineFalso()
+    memoria.aplicar_offload(pipeline, "secuencial", "cuda", 512, 512)
+    llamadas = list(pipeline.llamadas)
+    assert memoria.aplicar_offload(pipeline, "secuencial", "cuda", 512, 512) == []
+    assert pipeline.llamadas == llamadas
+
+
+def test_aplicar_offload_volver_a_residente_quita_los_hooks():
+    pipeline = PipelineFalso()
+    memoria.aplicar_offload(pipeline, "secuencial", "cuda", 1024, 1024)
+    memoria.aplicar_offload(pipeline, "residente", "cuda", 1024, 1024)
+    assert pipeline.hooks is None
+    assert pipeline.dispositivo == "cuda"
+    assert pipeline.llamadas[-2:] == ["remove_all_hooks", "to:cuda"]
+    assert not (pipeline.vae.use_slicing or pipeline.vae.use_tiling or pipeline.attention_slicing)
@@ -0,0 +1,73 @@
+"""
+Pruebas del registro de pipelines con pipelines falsos de módulos torch diminutos
+"""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from registro_pipelines import RegistroPipelines
+
+
+class PipelineModulos:
+    def __init__(self, **componentes):
+        self.components = componentes
+        self.ubicaciones = []
+
+    def to(self, dispositivo):
+        self.ubicaciones.append(dispositivo)
+        return self
+
+
+def bytes_lineal(entradas, salidas):
+    # float32: pesos + bias
+    return (entradas * salidas + salidas) * 4
+
+
+def test_libera_lugar_antes_de_cargar():
+    tamano = bytes_lineal(32, 32)
+    ocupado_al_cargar = []
+
+    def cargador(modelo_id):
+        ocupado_al_cargar.append(registro._ocupado(True))
+        return PipelineModulos(unet=torch.nn.Linear(32, 32))
+
+    registro = RegistroPipelines(
+        cargador, "cuda", presupuesto_dispositivo=2 * tamano, estimador=lambda modelo_id: tamano
+    )
+    registro.obtener("a")
+    registro.obtener("b")
+    registro.obtener("c")
+
+    # Al cargar "c" el modelo menos usado ya estaba degradado: nunca hubo tres en el dispositivo
+    assert ocupado_al_cargar == [0, tamano, tamano]
+    assert not registro.entradas["a"]["en_dispositivo"]
+    assert registro.entradas["a"]["pipeline"].ubicaciones == ["cpu"]
+
+
+def test_sin_estimador_libera_despues_de_cargar():
+    tamano = bytes_lineal(32, 32)
+    ocupado_al_cargar = []
+
+    def cargador(modelo_id):
+        ocupado_al_cargar.append(registro._ocupado(True))
+        return PipelineModulos(unet=torch.nn.Linear(32, 32))
+
+    registro = RegistroPipelines(cargador, "cpu", presupuesto_dispositivo=tamano)
+    registro.obtener("a")
+    registro.obtener("b")
+
+    assert ocupado_al_cargar == [0, tamano]
+    assert list(registro.entradas) == ["b"]
+
+
+def test_memoria_cuenta_pesos_int8_empaquetados():
+    modulo = torch.nn.Sequential(torch.nn.Linear(64, 64), torch.nn.Linear(64, 64))
+    cuantizado = torch.ao.quantization.quantize_dynamic(modulo, {torch.nn.Linear}, dtype=torch.qint8)
+    # Las capas dinámicas no tienen parámetros: el peso vive en _packed_params
+    assert sum(p.numel() for p in cuantizado.parameters()) == 0
+
+    registro = RegistroPipelines(lambda modelo_id: None, "cpu")
+    memoria = registro._memoria_pipeline(PipelineModulos(unet=cuantizado))
+    # 1 byte por peso int8 más el bias en float32
+    assert memoria == 2 * (64 * 64 + 64 * 4)
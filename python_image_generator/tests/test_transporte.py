@@ -0,0 +1,83 @@
+"""
+Pruebas del transporte de salida: ida y vuelta de las tramas binarias, líneas JSON y archivos del modo ruta
+"""
+
+import io
+import json
+
+from transporte import CABECERA_TRAMA, TransporteSalida
+
+
+def crear_salida():
+    return io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+
+
+def leer_tramas(datos):
+    """
+    Decodifica las tramas igual que el parser de Node: (mensaje, carga) por trama
+    """
+    tramas = []
+    posicion = 0
+    while posicion < len(datos):
+        largo_json, largo_carga = CABECERA_TRAMA.unpack_from(datos, posicion)
+        inicio = posicion + CABECERA_TRAMA.size
+        mensaje = json.loads(datos[inicio:inicio + largo_json].decode("utf-8"))
+        carga = datos[inicio + largo_json:inicio + largo_json + largo_carga]
+        tramas.append((mensaje, carga))
+        posicion = inicio + largo_json + largo_carga
+    assert posicion == len(datos)
+    return tramas
+
+
+def test_binario_ida_y_vuelta():
+    salida = crear_salida()
+    transporte = TransporteSalida(salida, "binario")
+    imagen = bytes(range(256)) * 3
+    transporte.enviar({"tipo": "imagen", "producto": "café ☕"}, imagen)
+    transporte.enviar({"tipo": "resumen", "exito": True})
+    transporte.enviar({"tipo": "vacia"}, b"")
+
+    tramas = leer_tramas(salida.buffer.getvalue())
+    assert tramas == [
+        ({"tipo": "imagen", "producto": "café ☕"}, imagen),
+        ({"tipo": "resumen", "exito": True}, b""),
+        ({"tipo": "vacia"}, b"")
+    ]
+
+
+def test_binario_cabecera_big_endian_con_longitudes_en_bytes():
+    salida = crear_salida()
+    TransporteSalida(salida, "binario").enviar({"n": "ñ"}, b"\x00\x01")
+    datos = salida.buffer.getvalue()
+    # {"n":"ñ"} ocupa 10 bytes en UTF-8 aunque tenga 9 caracteres
+    assert datos[:8] == b"\x00\x00\x00\x0a\x00\x00\x00\x02"
+    assert datos[8:18] == '{"n":"ñ"}'.encode("utf-8")
+    assert datos[18:] == b"\x00\x01"
+
+
+def test_binario_vacia_el_texto_pendiente_antes_de_la_trama():
+    salida = crear_salida()
+    salida.write("texto previo\n")
+    TransporteSalida(salida, "binario").enviar({"id": 1})
+    datos = salida.buffer.getvalue()
+    assert datos.startswith(b"texto previo\n")
+    assert leer_tramas(datos[len(b"texto previo\n"):]) == [({"id": 1}, b"")]
+
+
+def test_json_una_linea_por_mensaje_sin_carga():
+    salida = crear_salida()
+    transporte = TransporteSalida(salida, "json")
+    transporte.enviar({"id": 1, "texto": "línea\nsalto"}, b"ignorada")
+    transporte.enviar({"id": 2})
+    salida.flush()
+    lineas = salida.buffer.getvalue().decode("utf-8").splitlines()
+    assert [json.loads(linea) for linea in lineas] == [{"id": 1, "texto": "línea\nsalto"}, {"id": 2}]
+
+
+def test_ruta_escribe_el_archivo_sin_temporales(tmp_path):
+    transporte = TransporteSalida(crear_salida(), "ruta", directorio=tmp_path / "shm")
+    ruta = transporte.escribir_archivo("producto_01.png", b"png")
+    assert ruta.is_absolute()
+    assert ruta.read_bytes() == b"png"
+    assert ruta.name.endswith("_producto_01.png")
+    assert [archivo.name for archivo in (tmp_path / "shm").iterdir()] == [ruta.name]
@@ -0,0 +1,92 @@
+"""
+Transporte de la salida del CLI hacia Node.js
+
+- json: una respuesta JSON por línea (las imágenes viajan en base64 dentro del JSON)
+- binario: tramas con prefijo de longitud. Cada trama lleva 8 bytes de cabecera
+  (longitud del JSON y longitud de la carga, enteros sin signo big-endian), el JSON
+  de metadata en UTF-8 y los bytes crudos de la imagen, si los hay
+- ruta: respuestas JSON, pero cada imagen se escribe en un archivo de un directorio
+  en memoria (/dev/shm si existe) y el JSON lleva solo su ruta
+
+Los modos binario y ruta evitan codificar en base64 (+33%), serializar y volver a
+parsear cadenas de cientos de MB cuando se piden muchas imágenes grandes.
+"""
+
+import os
+import json
+import struct
+import tempfile
+import uuid
+from pathlib import Path
+
+MODOS_TRANSPORTE = ["json", "binario", "ruta"]
+
+# Longitud del JSON de metadata y longitud de la carga binaria
+CABECERA_TRAMA = struct.Struct(">II")
+
+
+def directorio_transporte_por_defecto():
+    """
+    Retorna el directorio para el modo ruta: /dev/shm (tmpfs) si es escribible,
+    o el directorio temporal del sistema
+    """
+    shm = Path("/dev/shm")
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return shm
+    return Path(tempfile.gettempdir())
+
+
+class TransporteSalida:
+    def __init__(self, salida, modo="json", directorio=None):
+        """
+        Inicializa el transporte
+
+        Args:
+            salida: Stream de texto donde se escriben las respuestas (el stdout real)
+            modo (str): 'json', 'binario' o 'ruta'
+            directorio (str): Carpeta para las imágenes del modo ruta (None = automático)
+        """
+        self.salida = salida
+        self.modo = modo
+        self.directorio = Path(directorio) if directorio else directorio_transporte_por_defecto()
+
+    def enviar(self, mensaje, carga=None, indentar=False):
+        """
+        Escribe un mensaje completo en la salida
+
+        Args:
+            mensaje (dict): Respuesta o evento serializable a JSON
+            carga (bytes): Bytes crudos adjuntos (solo se transmiten en modo binario)
+            indentar (bool): Si True, el JSON se escribe indentado (solo modo json/ruta)
+        """
+        if self.modo == "binario":
+            cabecera = json.dumps(mensaje, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            carga = carga or b""
+            # Vaciar el texto pendiente antes de escribir directamente en el buffer binario
+            self.salida.flush()
+            buffer = self.salida.buffer
+            buffer.write(CABECERA_TRAMA.pack(len(cabecera), len(carga)))
+            buffer.write(cabecera)
+            buffer.write(carga)
+            buffer.flush()
+        else:
+            self.salida.write(json.dumps(mensaje, ensure_ascii=False, indent=2 if indentar else None) + "\n")
+            self.salida.flush()
+
+    def escribir_archivo(self, nombre_archivo, datos):
+        """
+        Escribe una imagen para el modo ruta; el proceso que la lee se encarga de borrarla
+
+        Args:
+            nombre_archivo (str): Nombre base de la imagen
+            datos (bytes): Imagen codificada
+
+        Returns:
+            Path: Ruta absoluta del archivo escrito
+        """
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        ruta = self.directorio / f"{uuid.uuid4().hex[:8]}_{nombre_archivo}"
+        temporal = ruta.with_suffix(".tmp")
+        temporal.write_bytes(datos)
+        os.replace(temporal, ruta)
+        return ruta.absolute()
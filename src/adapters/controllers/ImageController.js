@@ -1,4 +1,5 @@
 import { generateProductImages, getAvailableStyles, checkImageGenerationService } from "../../usecases/images/GenerateProductImages.js";
+import { imageMetadataStore } from "../../infrastructure/services/imageMetadataStore.js";
 import path from 'path';
 import fs from 'fs/promises';
 import { fileURLToPath } from 'url';
@@ -19,7 +20,9 @@ export async function controllerGenerateProductImages(req, res) {
         // Check if there was an error in the response
         if (!result.success) {
             const statusCode = result.error === 'ValidationError' ? 400 : 
-                             result.error === 'ServiceNotReady' ? 503 : 500;
+                             result.error === 'ServiceNotReady' ? 503 :
+                             // El worker no tiene memoria para la solicitud ni reduciéndola: reintentar más tarde
+                             result.error === 'MemoriaInsuficienteError' ? 503 : 500;
             return res.status(statusCode).json({ 
                 success: false,
                 error: result.error,
@@ -126,7 +129,8 @@ export async function controllerServeImage(req, res) {
             '.jpg': 'image/jpeg',
             '.jpeg': 'image/jpeg',
             '.gif': 'image/gif',
-            '.webp': 'image/webp'
+            '.webp': 'image/webp',
+            '.avif': 'image/avif'
         };
         
         const mimeType = mimeTypes[extension] || 'application/octet-stream';
@@ -165,6 +169,61 @@ export async function controllerServeImage(req, res) {
     }
 }
 
+/**
+ * Controller para servir imágenes del almacén de blobs (direccionado por contenido)
+ */
+export async function controllerServeBlob(req, res) {
+    try {
+        const { blobName } = req.params;
+        
+        // Solo nombres con la forma <sha256>.<extensión>: no hay forma de salir del almacén
+        const match = /^([0-9a-f]{64})\.(png|webp|jpg|avif)$/.exec(blobName);
+        if (!match) {
+            return res.status(400).json({
+                success: false,
+                error: 'InvalidBlobName',
+                message: 'Nombre de blob inválido'
+            });
+        }
+        
+        const blobDirectory = path.join(__dirname, '../../../python_image_generator/blobs');
+        const blobPath = path.join(blobDirectory, match[1].slice(0, 2), blobName);
+        
+        const mimeTypes = {
+            png: 'image/png',
+            webp: 'image/webp',
+            jpg: 'image/jpeg',
+            avif: 'image/avif'
+        };
+        
+        res.set({
+            'Content-Type': mimeTypes[match[2]],
+            'Cache-Control': 'public, max-age=31536000, immutable',
+            'ETag': `"${match[1]}"`
+        });
+        
+        res.sendFile(blobPath, (error) => {
+            if (error && !res.headersSent) {
+                res.status(404).json({
+                    success: false,
+                    error: 'ImageNotFound',
+                    message: 'La imagen solicitada no fue encontrada'
+                });
+            }
+        });
+        
+    } catch (error) {
+        console.error('Controller error serving blob:', error.message);
+        if (!res.headersSent) {
+            res.status(500).json({ 
+                success: false,
+                error: 'InternalServerError',
+                message: 'Error interno sirviendo la imagen' 
+            });
+        }
+    }
+}
+
 /**
  * Controller para descargar imagen
  */
@@ -251,6 +310,22 @@ export async function controllerGetImageMetadata(req, res) {
             });
         }
         
+        // Buscar primero en el índice de metadata
+        const indexed = await imageMetadataStore.getImage(imageId);
+        if (indexed) {
+            return res.status(200).json({
+                success: true,
+                data: {
+                    image_id: imageId,
+                    session_id: sessionId,
+                    product: indexed.session.producto,
+                    generation_config: indexed.session.parametros,
+                    image_details: indexed.image,
+                    generation_timestamp: indexed.session.timestamp
+                }
+            });
+        }
+        
         // Buscar archivo de metadata
         const metadataDirectory = path.join(__dirname, '../../../python_image_generator/metadata');
         const metadataPath = path.join(metadataDirectory, `sesion_${sessionId}.json`);
@@ -303,13 +378,81 @@ export async function controllerGetImageMetadata(req, res) {
     }
 }
 
+/**
+ * Convierte la metadata de una imagen al formato del listado
+ */
+function toListedImage(sessionId, productName, style, img) {
+    const imageId = `${sessionId}_${img.variacion.toString().padStart(2, '0')}`;
+    return {
+        id: imageId,
+        session_id: sessionId,
+        product_name: productName,
+        variation: img.variacion,
+        filename: img.nombre_archivo,
+        generation_timestamp: img.timestamp_generacion,
+        style,
+        dimensions: img.dimensiones,
+        file_size: img.tamano_archivo ?? img.tamano_bytes,
+        urls: {
+            // Las imágenes entregadas en base64 viven en el almacén de blobs
+            serve: img.almacenamiento?.tipo === 'blob'
+                ? `/api/images/blob/${path.basename(img.almacenamiento.ruta)}`
+                : `/api/images/serve/${img.nombre_archivo}`,
+            download: `/api/images/download/${img.nombre_archivo}`,
+            metadata: `/api/images/metadata/${imageId}`
+        },
+        // Versiones reducidas generadas junto a la imagen: nombre -> URL (miniatura, mediano, ...)
+        derivatives: Object.fromEntries((img.derivados || []).map(derivative => [
+            derivative.nombre,
+            `/api/images/serve/${derivative.nombre_archivo}`
+        ]))
+    };
+}
+
+/**
+ * Respuesta paginada del listado de imágenes
+ */
+function listResponse(images, totalItems, page, limit, filters) {
+    const startIndex = (page - 1) * limit;
+    return {
+        success: true,
+        data: {
+            images,
+            pagination: {
+                current_page: page,
+                per_page: limit,
+                total_items: totalItems,
+                total_pages: Math.ceil(totalItems / limit),
+                has_next: startIndex + limit < totalItems,
+                has_prev: startIndex > 0
+            },
+            filters
+        }
+    };
+}
+
 /**
  * Controller para listar todas las imágenes generadas
  */
 export async function controllerListGeneratedImages(req, res) {
     try {
-        const { page = 1, limit = 10, sessionId } = req.query;
+        const { sessionId, productName, style } = req.query;
+        const page = Math.max(parseInt(req.query.page ?? 1) || 1, 1);
+        const limit = Math.min(Math.max(parseInt(req.query.limit ?? 10) || 10, 1), 50);
+        const filters = {
+            session_id: sessionId || null,
+            product_name: productName || null,
+            style: style || null
+        };
+        
+        // Índice SQLite: una consulta por página, sin importar cuántas sesiones existan
+        const indexed = await imageMetadataStore.listImages({ page, limit, sessionId, productName, style });
+        if (indexed) {
+            const images = indexed.images.map(row => toListedImage(row.sessionId, row.productName, row.style, row.image));
+            return res.status(200).json(listResponse(images, indexed.total, page, limit, filters));
+        }
         
+        // Sin índice: leer todos los archivos de metadata
         const metadataDirectory = path.join(__dirname, '../../../python_image_generator/metadata');
         
         // Leer todos los archivos de metadata
@@ -326,30 +469,17 @@ export async function controllerListGeneratedImages(req, res) {
                 const metadataContent = await fs.readFile(metadataPath, 'utf-8');
                 const metadata = JSON.parse(metadataContent);
                 
-                // Filtrar por sessionId si se proporciona
-                if (sessionId && metadata.session_id !== sessionId) {
+                // Filtrar por sessionId, producto y estilo si se proporcionan
+                if ((sessionId && metadata.session_id !== sessionId) ||
+                    (productName && metadata.producto.nombre !== productName) ||
+                    (style && metadata.parametros.estilo !== style)) {
                     continue;
                 }
                 
                 // Agregar imágenes exitosas
                 const successfulImages = metadata.imagenes
                     .filter(img => img.exito)
-                    .map(img => ({
-                        id: `${metadata.session_id}_${img.variacion.toString().padStart(2, '0')}`,
-                        session_id: metadata.session_id,
-                        product_name: metadata.producto.nombre,
-                        variation: img.variacion,
-                        filename: img.nombre_archivo,
-                        generation_timestamp: img.timestamp_generacion,
-                        style: metadata.parametros.estilo,
-                        dimensions: img.dimensiones,
-                        file_size: img.tamano_archivo,
-                        urls: {
-                            serve: `/api/images/serve/${img.nombre_archivo}`,
-                            download: `/api/images/download/${img.nombre_archivo}`,
-                            metadata: `/api/images/metadata/${metadata.session_id}_${img.variacion.toString().padStart(2, '0')}`
-                        }
-                    }));
+                    .map(img => toListedImage(metadata.session_id, metadata.producto.nombre, metadata.parametros.estilo, img));
                 
                 allImages.push(...successfulImages);
                 
@@ -363,26 +493,9 @@ export async function controllerListGeneratedImages(req, res) {
         
         // Paginación
         const startIndex = (page - 1) * limit;
-        const endIndex = startIndex + parseInt(limit);
-        const paginatedImages = allImages.slice(startIndex, endIndex);
+        const paginatedImages = allImages.slice(startIndex, startIndex + limit);
         
-        res.status(200).json({
-            success: true,
-            data: {
-                images: paginatedImages,
-                pagination: {
-                    current_page: parseInt(page),
-                    per_page: parseInt(limit),
-                    total_items: allImages.length,
-                    total_pages: Math.ceil(allImages.length / limit),
-                    has_next: endIndex < allImages.length,
-                    has_prev: startIndex > 0
-                },
-                filters: {
-                    session_id: sessionId || null
-                }
-            }
-        });
+        res.status(200).json(listResponse(paginatedImages, allImages.length, page, limit, filters));
         
     } catch (error) {
         console.error('Error listing generated images:', error.message);
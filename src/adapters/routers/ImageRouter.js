@@ -5,6 +5,7 @@ import {
     controllerCheckImageGenerationService,
     controllerServeImage,
     controllerDownloadImage,
+    controllerServeBlob,
     controllerGetImageMetadata,
     controllerListGeneratedImages
 } from "../controllers/ImageController.js";
@@ -26,6 +27,8 @@ export const imageRouter = Router();
  *   "width": "number (opcional, default: 768)",
  *   "height": "number (opcional, default: 768)",
  *   "inferenceSteps": "number (opcional, default: 25)",
+ *   "scheduler": "string (opcional: dpmpp_2m_karras, euler_a, unipc, lcm)",
+ *   "qualityPreset": "string (opcional: borrador, rapido, equilibrado, alta; reemplaza inferenceSteps)",
  *   "guidanceScale": "number (opcional, default: 7.5)"
  * }
  */
@@ -54,6 +57,8 @@ imageRouter.get("/service/status", controllerCheckImageGenerationService);
  * - page: number (opcional, default: 1)
  * - limit: number (opcional, default: 10, max: 50)
  * - sessionId: string (opcional, filtrar por session_id específico)
+ * - productName: string (opcional, filtrar por nombre exacto de producto)
+ * - style: string (opcional, filtrar por estilo)
  */
 imageRouter.get("/list", controllerListGeneratedImages);
 
@@ -88,6 +93,16 @@ imageRouter.get("/serve/:filename", controllerServeImage);
  */
 imageRouter.get("/download/:filename", controllerDownloadImage);
 
+/**
+ * GET /api/images/blob/:blobName
+ * Sirve una imagen del almacén de blobs (imágenes entregadas en base64, sin archivo propio)
+ * El contenido nunca cambia para un mismo nombre, así que se cachea como inmutable
+ * 
+ * Params:
+ * - blobName: string (hash SHA-256 + extensión, ej: "ab12...ef.png")
+ */
+imageRouter.get("/blob/:blobName", controllerServeBlob);
+
 // === DOCUMENTACIÓN DE ENDPOINTS ===
 
 /**
@@ -107,7 +122,7 @@ imageRouter.get("/endpoints", (req, res) => {
                     path: "/api/images/generate",
                     description: "Genera imágenes para un producto",
                     required_body: ["productName", "productDescription"],
-                    optional_body: ["style", "variations", "width", "height", "inferenceSteps", "guidanceScale"],
+                    optional_body: ["style", "variations", "width", "height", "inferenceSteps", "guidanceScale", "scheduler", "qualityPreset"],
                     example_body: {
                         productName: "Chocolate Premium",
                         productDescription: "Chocolate artesanal 70% cacao con textura suave",
@@ -5,6 +5,12 @@ const availableStyles = [
     'promocional', 'banner', 'catalogo', 'instagram', 'editorial', 'ecommerce'
 ];
 
+const availableFormats = ['png', 'webp', 'jpeg', 'avif'];
+
+// Schedulers y presets de calidad (ver schedulers.py)
+const availableSchedulers = ['dpmpp_2m_karras', 'euler_a', 'unipc', 'lcm'];
+const availableQualityPresets = ['borrador', 'rapido', 'equilibrado', 'alta'];
+
 export const generateImageSchema = z.object({
     productName: z
         .string({ required_error: "El nombre del producto es requerido" })
@@ -53,7 +59,7 @@ export const generateImageSchema = z.object({
     inferenceSteps: z
         .number()
         .int()
-        .min(10, { message: "Mínimo 10 pasos de inferencia" })
+        .min(1, { message: "Mínimo 1 paso de inferencia" })
         .max(100, { message: "Máximo 100 pasos de inferencia" })
         .default(25)
         .optional(),
@@ -63,7 +69,61 @@ export const generateImageSchema = z.object({
         .min(1.0, { message: "El guidance scale mínimo es 1.0" })
         .max(20.0, { message: "El guidance scale máximo es 20.0" })
         .default(7.5)
+        .optional(),
+
+    // Scheduler del modelo (sin valor = el por defecto); lcm necesita un modelo o adaptador LCM
+    scheduler: z
+        .enum(availableSchedulers, {
+            errorMap: () => ({ message: `El scheduler debe ser uno de: ${availableSchedulers.join(', ')}` })
+        })
+        .optional(),
+
+    // Preset de calidad: fija los pasos mínimos para el scheduler y reemplaza inferenceSteps
+    qualityPreset: z
+        .enum(availableQualityPresets, {
+            errorMap: () => ({ message: `El preset de calidad debe ser uno de: ${availableQualityPresets.join(', ')}` })
+        })
+        .optional(),
+
+    seed: z
+        .number()
+        .int()
+        .min(0, { message: "La semilla mínima es 0" })
+        .max(4294967295, { message: "La semilla máxima es 4294967295" })
+        .optional(),
+
+    format: z
+        .enum(availableFormats, {
+            errorMap: () => ({ message: `El formato debe ser uno de: ${availableFormats.join(', ')}` })
+        })
+        .default('png')
+        .optional(),
+
+    // Calidad 1-100 para webp/jpeg/avif; en png es el nivel de compresión 0-9
+    quality: z
+        .number()
+        .int()
+        .min(0, { message: "La calidad mínima es 0" })
+        .max(100, { message: "La calidad máxima es 100" })
+        .optional(),
+
+    // Versiones reducidas por imagen: nombre -> lado mayor en píxeles (p. ej. { miniatura: 256 })
+    derivatives: z
+        .record(
+            z.string().regex(/^[A-Za-z0-9_-]+$/, { message: "El nombre del derivado solo puede tener letras, números, '_' y '-'" }),
+            z.number().int()
+                .min(16, { message: "El lado mínimo de un derivado es 16 píxeles" })
+                .max(2048, { message: "El lado máximo de un derivado es 2048 píxeles" })
+        )
         .optional()
+}).refine(data => data.quality === undefined || ((data.format ?? 'png') === 'png'
+    ? data.quality <= 9
+    : data.quality >= 1), {
+    message: "En png la calidad es el nivel de compresión (0-9); en webp, jpeg y avif va de 1 a 100",
+    path: ['quality']
+}).refine(data => data.inferenceSteps === undefined || data.scheduler === 'lcm' || data.inferenceSteps >= 10, {
+    message: "Mínimo 10 pasos de inferencia (solo lcm admite menos)",
+    path: ['inferenceSteps']
 });
 
 // Schema simple para validar parámetros de consulta de imágenes
@@ -0,0 +1,132 @@
+import path from 'path';
+import { existsSync } from 'fs';
+import { fileURLToPath } from 'url';
+
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = path.dirname(__filename);
+
+/**
+ * Lectura del índice SQLite de metadata que escribe el generador Python
+ * (python_image_generator/metadata/metadata.db). Listar y buscar imágenes usa los
+ * índices por sesión, producto, estilo y fecha en lugar de leer todos los
+ * sesion_<id>.json en cada solicitud.
+ */
+export class ImageMetadataStore {
+    constructor() {
+        this.databasePath = path.join(__dirname, '../../../python_image_generator/metadata/metadata.db');
+        this.database = null;
+        // Error de import('node:sqlite'): no cambia durante el proceso, no se reintenta
+        this.sqliteError = null;
+        this.warnedFallbacks = new Set();
+    }
+
+    /**
+     * Avisa una sola vez por motivo que se usa la lectura de los JSON en lugar del índice
+     * @param {string} reason - Clave del motivo
+     * @param {string} message - Detalle para el log
+     */
+    warnFallback(reason, message) {
+        if (!this.warnedFallbacks.has(reason)) {
+            this.warnedFallbacks.add(reason);
+            console.warn(`Índice de metadata no disponible, se leerán los archivos JSON (más lento): ${message}`);
+        }
+    }
+
+    /**
+     * Abre la base en modo solo lectura la primera vez que se necesita
+     * @returns {Promise<Object|null>} Conexión, o null si no hay índice o node:sqlite no está disponible
+     */
+    async open() {
+        if (this.database) {
+            return this.database;
+        }
+        if (this.sqliteError) {
+            return null;
+        }
+        // El generador lo crea al registrar la primera sesión: se vuelve a comprobar en cada solicitud
+        if (!existsSync(this.databasePath)) {
+            this.warnFallback('missing', `no existe ${this.databasePath}`);
+            return null;
+        }
+
+        let DatabaseSync;
+        try {
+            ({ DatabaseSync } = await import('node:sqlite'));
+        } catch (error) {
+            this.sqliteError = error;
+            this.warnFallback(
+                'sqlite',
+                `node:sqlite requiere Node 22.13+ (o 22.5+ con --experimental-sqlite), ` +
+                `este proceso usa ${process.version}: ${error.message}`
+            );
+            return null;
+        }
+
+        try {
+            this.database = new DatabaseSync(this.databasePath, { readOnly: true });
+            return this.database;
+        } catch (error) {
+            this.warnFallback('open', error.message);
+            return null;
+        }
+    }
+
+    /**
+     * Lista las imágenes exitosas más recientes primero
+     * @param {Object} params - page, limit y filtros opcionales sessionId, productName, style
+     * @returns {Promise<Object|null>} { images, total } o null si el índice no está disponible
+     */
+    async listImages({ page = 1, limit = 10, sessionId, productName, style }) {
+        const database = await this.open();
+        if (!database) {
+            return null;
+        }
+
+        const conditions = ['exito = 1'];
+        const values = [];
+        for (const [column, value] of [['session_id', sessionId], ['producto', productName], ['estilo', style]]) {
+            if (value) {
+                conditions.push(`${column} = ?`);
+                values.push(value);
+            }
+        }
+        const where = conditions.join(' AND ');
+
+        const { total } = database.prepare(`SELECT COUNT(*) AS total FROM imagenes WHERE ${where}`).get(...values);
+        const rows = database.prepare(
+            `SELECT session_id, producto, estilo, metadata FROM imagenes WHERE ${where} ` +
+            'ORDER BY timestamp DESC LIMIT ? OFFSET ?'
+        ).all(...values, limit, (page - 1) * limit);
+
+        return {
+            images: rows.map(row => ({
+                sessionId: row.session_id,
+                productName: row.producto,
+                style: row.estilo,
+                image: JSON.parse(row.metadata)
+            })),
+            total
+        };
+    }
+
+    /**
+     * Busca una imagen por su id (<session_id>_<variacion>)
+     * @param {string} imageId - Identificador de la imagen
+     * @returns {Promise<Object|null>} { image, session }, o null si no está en el índice o el índice no está disponible
+     */
+    async getImage(imageId) {
+        const database = await this.open();
+        if (!database) {
+            return null;
+        }
+
+        const row = database.prepare(
+            'SELECT i.metadata AS image, s.metadata AS session FROM imagenes i ' +
+            'JOIN sesiones s ON s.session_id = i.session_id WHERE i.id = ?'
+        ).get(imageId);
+
+        return row ? { image: JSON.parse(row.image), session: JSON.parse(row.session) } : null;
+    }
+}
+
+export const imageMetadataStore = new ImageMetadataStore();
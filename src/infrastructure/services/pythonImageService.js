@@ -6,6 +6,9 @@ import { fileURLToPath } from 'url';
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
+// Eventos de stream que se entregan a onProgress (las imágenes van a onImage)
+const PROGRESS_EVENTS = ['inicio', 'paso', 'progreso', 'imagen_fallida'];
+
 export class PythonImageService {
     constructor() {
         // Ruta al script Python (versión segura para Windows)
@@ -17,11 +20,49 @@ export class PythonImageService {
         // Directorio donde se guardan las imágenes (relativo al script Python)
         this.imageDirectory = path.join(__dirname, '../../../python_image_generator/imagenes_consumibles');
         this.metadataDirectory = path.join(__dirname, '../../../python_image_generator/metadata');
+
+        // Worker persistente (generar_cli.py --serve): evita recargar el modelo en cada solicitud
+        this.useWorker = process.env.PYTHON_IMAGE_WORKER === 'true';
+        this.worker = null;
+        this.workerReady = null;
+        this.pendingRequests = new Map();
+        this.nextRequestId = 1;
+
+        // Transporte de imágenes: 'json' (base64 en el JSON), 'binario' (tramas con
+        // prefijo de longitud) o 'ruta' (archivo en /dev/shm, solo la ruta en el JSON)
+        this.transport = process.env.PYTHON_IMAGE_TRANSPORT || 'json';
+
+        // Runtime de inferencia en CPU: 'pytorch' (default), 'onnx' u 'openvino'
+        this.backend = process.env.PYTHON_IMAGE_BACKEND;
+
+        // 'int8' cuantiza UNet y text encoders en CPU (menos memoria por worker, pasos más rápidos)
+        this.quantization = process.env.PYTHON_IMAGE_QUANTIZATION;
+
+        // Precisión en CPU: 'float32' (default), 'bfloat16' o 'auto' (bfloat16 si la CPU lo soporta)
+        this.cpuPrecision = process.env.PYTHON_IMAGE_CPU_PRECISION;
+
+        // Modo compilado del worker (torch.compile + calentamiento al iniciar)
+        this.compile = process.env.PYTHON_IMAGE_COMPILE === 'true';
+        this.warmupResolutions = process.env.PYTHON_IMAGE_WARMUP;
+
+        // Si una solicitud no cabe en memoria: 'ajustar' (default), 'dividir' o 'ninguna'
+        this.memoryPolicy = process.env.PYTHON_IMAGE_MEMORY_POLICY;
+
+        // Estrategia de memoria del pipeline: 'auto' (default, según RAM/VRAM) o una fija
+        this.offloadPolicy = process.env.PYTHON_IMAGE_OFFLOAD_POLICY;
+
+        // Métricas del worker en formato Prometheus (http://127.0.0.1:<puerto>/metrics)
+        this.metricsPort = process.env.PYTHON_IMAGE_METRICS_PORT;
+
+        // Tiempo máximo de una generación en segundos (en el worker, contado desde que empieza)
+        this.timeoutMs = (Number(process.env.PYTHON_IMAGE_TIMEOUT) || 5 * 60) * 1000;
     }
 
     /**
      * Ejecuta el script de Python para generar imágenes
      * @param {Object} params - Parámetros para la generación de imágenes
+     * @param {Function} [params.onImage] - Recibe cada imagen procesada apenas Python la termina
+     * @param {Function} [params.onProgress] - Recibe los eventos de inicio, progreso y de cada paso de denoising
      * @returns {Promise<Object>} Resultado de la generación
      */
     async generateImages(params) {
@@ -33,9 +74,39 @@ export class PythonImageService {
             width = 768,
             height = 768,
             inferenceSteps = 25,
-            guidanceScale = 7.5
+            guidanceScale = 7.5,
+            scheduler,
+            qualityPreset,
+            seed,
+            format = 'png',
+            quality,
+            derivatives,
+            onImage,
+            onProgress
         } = params;
 
+        if (this.useWorker) {
+            return this.generateImagesWithWorker({
+                producto: productName,
+                descripcion: productDescription,
+                estilo: style,
+                variaciones: variations,
+                width,
+                height,
+                pasos: inferenceSteps,
+                guidance: guidanceScale,
+                formato: format,
+                ...(scheduler ? { scheduler } : {}),
+                ...(qualityPreset ? { preset: qualityPreset } : {}),
+                ...(seed !== undefined ? { semilla: seed } : {}),
+                ...(quality !== undefined ? { calidad: quality } : {}),
+                ...(derivatives ? { derivados: derivatives } : {}),
+                // Un mensaje por evento, igual que con el CLI (--stream / --eventos-paso)
+                stream: true,
+                ...(onProgress ? { eventos_paso: true } : {})
+            }, { onImage, onProgress });
+        }
+
         // Construir argumentos para el script Python
         const args = [
             this.pythonScriptPath,
@@ -47,14 +118,86 @@ export class PythonImageService {
             '--height', height.toString(),
             '--pasos', inferenceSteps.toString(),
             '--guidance', guidanceScale.toString(),
-            '--quiet' // Modo silencioso para mejor parsing del JSON
+            '--formato', format,
+            '--quiet', // Modo silencioso para mejor parsing del JSON
+            '--stream', // Un mensaje por evento: cada imagen llega apenas termina
+            '--transporte', this.transport
         ];
 
+        if (this.backend) {
+            args.push('--backend', this.backend);
+        }
+
+        if (this.quantization) {
+            args.push('--cuantizacion', this.quantization);
+        }
+
+        if (this.cpuPrecision) {
+            args.push('--precision-cpu', this.cpuPrecision);
+        }
+
+        if (this.memoryPolicy) {
+            args.push('--politica-memoria', this.memoryPolicy);
+        }
+
+        if (this.offloadPolicy) {
+            args.push('--politica-offload', this.offloadPolicy);
+        }
+
+        if (scheduler) {
+            args.push('--scheduler', scheduler);
+        }
+
+        if (qualityPreset) {
+            args.push('--preset', qualityPreset);
+        }
+
+        // Un evento por paso de denoising (con su duración) solo si alguien los escucha
+        if (onProgress) {
+            args.push('--eventos-paso');
+        }
+
+        // Con semilla explícita, una solicitud repetida se sirve desde la cache de resultados
+        if (seed !== undefined) {
+            args.push('--semilla', seed.toString());
+        }
+
+        if (quality !== undefined) {
+            args.push('--calidad', quality.toString());
+        }
+
+        // Versiones reducidas (p. ej. { miniatura: 256 }) para listados y tarjetas
+        if (derivatives) {
+            args.push('--derivados', Object.entries(derivatives).map(([name, size]) => `${name}:${size}`).join(','));
+        }
+
         console.log('🐍 Ejecutando script Python:', this.pythonCommand, args.join(' '));
 
         return new Promise((resolve, reject) => {
-            let stdout = '';
             let stderr = '';
+            let invalidOutput = '';
+            let finalMessage = null;
+            const images = [];
+            // Las imágenes se procesan en orden aunque leer su archivo temporal sea asíncrono
+            let processing = Promise.resolve();
+
+            // Procesar cada mensaje a medida que llega (no se acumula todo el stdout)
+            const parseOutput = this.createOutputParser((message, payload) => {
+                if (message.tipo === 'imagen') {
+                    processing = processing.then(async () => {
+                        const image = await this.processImage(message.imagen, payload);
+                        images.push(image);
+                        if (onImage) onImage(image);
+                    });
+                } else if (PROGRESS_EVENTS.includes(message.tipo)) {
+                    if (onProgress) onProgress(message);
+                } else {
+                    // Resumen final o respuesta de error
+                    finalMessage = message;
+                }
+            }, (text) => {
+                invalidOutput += text + '\n';
+            });
 
             // Spawn del proceso Python
             const pythonProcess = spawn(this.pythonCommand, args, {
@@ -62,10 +205,8 @@ export class PythonImageService {
                 stdio: ['pipe', 'pipe', 'pipe']
             });
 
-            // Capturar stdout (JSON response)
-            pythonProcess.stdout.on('data', (data) => {
-                stdout += data.toString();
-            });
+            // Capturar stdout (JSON Lines o tramas binarias)
+            pythonProcess.stdout.on('data', parseOutput);
 
             // Capturar stderr (logs y errores)
             pythonProcess.stderr.on('data', (data) => {
@@ -88,10 +229,13 @@ export class PythonImageService {
             });
 
             // Proceso completado
-            pythonProcess.on('close', (code) => {
+            pythonProcess.on('close', async (code) => {
                 console.log(`🐍 Proceso Python terminado con código: ${code}`);
+                parseOutput.end();
+                const processingError = await processing.then(() => null, (error) => error);
 
                 if (code !== 0) {
+                    if (finalMessage) this.discardTransportFiles(finalMessage);
                     reject({
                         success: false,
                         error: 'PythonScriptError',
@@ -99,45 +243,48 @@ export class PythonImageService {
                         details: {
                             exitCode: code,
                             stderr: stderr,
-                            stdout: stdout
+                            stdout: finalMessage ? JSON.stringify(finalMessage) : invalidOutput
                         }
                     });
                     return;
                 }
 
-                // Parsear la respuesta JSON
-                try {
-                    const result = JSON.parse(stdout);
-
-                if (result.exito) {
-                    // Procesar respuesta con imágenes base64
-                    const processedResult = this.processImageResponse(result);
-                    resolve(processedResult);
-                } else {
-                        reject({
-                            success: false,
-                            error: result.error || 'UnknownPythonError',
-                            message: result.mensaje || 'Error desconocido en el script Python',
-                            details: result
-                        });
-                    }
-                } catch (parseError) {
-                    console.error('❌ Error parseando JSON de Python:', parseError);
-                    console.log('Raw stdout:', stdout);
+                if (!finalMessage) {
+                    console.error('❌ Python no devolvió una respuesta JSON');
+                    console.log('Raw stdout:', invalidOutput);
                     reject({
                         success: false,
                         error: 'JSONParseError',
                         message: 'No se pudo parsear la respuesta del script Python',
                         details: {
-                            parseError: parseError.message,
-                            rawOutput: stdout,
+                            rawOutput: invalidOutput,
                             stderr: stderr
                         }
                     });
+                    return;
+                }
+
+                if (finalMessage.exito) {
+                    if (processingError) {
+                        reject(this.imageProcessingError(processingError));
+                    } else if (images.length > 0) {
+                        // Las imágenes ya llegaron procesadas una a una; el resumen no repite sus datos
+                        finalMessage.datos.imagenes = images;
+                        resolve(finalMessage);
+                    } else {
+                        this.processImageResponse(finalMessage).then(resolve, (error) => reject(this.imageProcessingError(error)));
+                    }
+                } else {
+                    reject({
+                        success: false,
+                        error: finalMessage.error || 'UnknownPythonError',
+                        message: finalMessage.mensaje || 'Error desconocido en el script Python',
+                        details: finalMessage
+                    });
                 }
             });
 
-            // Timeout de seguridad (5 minutos)
+            // Timeout de seguridad
             setTimeout(() => {
                 if (!pythonProcess.killed) {
                     console.log('⏰ Timeout: Terminando proceso Python...');
@@ -145,58 +292,402 @@ export class PythonImageService {
                     reject({
                         success: false,
                         error: 'TimeoutError',
-                        message: 'La generación de imágenes tomó demasiado tiempo (timeout: 5 minutos)'
+                        message: `La generación de imágenes tomó demasiado tiempo (timeout: ${this.timeoutMs / 1000} segundos)`
                     });
                 }
-            }, 5 * 60 * 1000); // 5 minutos
+            }, this.timeoutMs);
+        });
+    }
+
+    /**
+     * Inicia (una sola vez) el worker Python persistente y espera a que cargue el modelo
+     * @returns {Promise<void>} Se resuelve cuando el worker reporta estado "listo"
+     */
+    startWorker() {
+        if (this.workerReady) {
+            return this.workerReady;
+        }
+
+        this.workerReady = new Promise((resolveReady, rejectReady) => {
+            const workerArgs = [this.pythonScriptPath, '--serve', '--quiet', '--transporte', this.transport];
+            if (this.backend) {
+                workerArgs.push('--backend', this.backend);
+            }
+            if (this.quantization) {
+                workerArgs.push('--cuantizacion', this.quantization);
+            }
+            if (this.cpuPrecision) {
+                workerArgs.push('--precision-cpu', this.cpuPrecision);
+            }
+            if (this.compile) {
+                // Solo en el worker: la compilación se amortiza entre solicitudes
+                workerArgs.push('--compilar');
+                if (this.warmupResolutions) {
+                    workerArgs.push('--calentar', this.warmupResolutions);
+                }
+            }
+            if (this.memoryPolicy) {
+                workerArgs.push('--politica-memoria', this.memoryPolicy);
+            }
+            if (this.offloadPolicy) {
+                workerArgs.push('--politica-offload', this.offloadPolicy);
+            }
+            if (this.metricsPort) {
+                workerArgs.push('--puerto-metricas', this.metricsPort);
+            }
+            const workerProcess = spawn(this.pythonCommand, workerArgs, {
+                cwd: path.dirname(this.pythonScriptPath),
+                stdio: ['pipe', 'pipe', 'pipe']
+            });
+            this.worker = workerProcess;
+
+            let ready = false;
+
+            // Cada línea (o trama) de stdout es una respuesta completa
+            workerProcess.stdout.on('data', this.createOutputParser((message, payload) => {
+                if (!ready) {
+                    ready = true;
+                    if (message.exito && message.estado === 'listo') {
+                        console.log(`🐍 Worker Python listo (${message.dispositivo}, ${message.modelo})`);
+                        resolveReady();
+                    } else {
+                        rejectReady({
+                            success: false,
+                            error: message.error || 'PythonWorkerError',
+                            message: message.mensaje || 'El worker Python no pudo iniciar',
+                            details: message
+                        });
+                    }
+                    return;
+                }
+
+                const pending = this.pendingRequests.get(message.id);
+                if (!pending) {
+                    // Solicitud vencida o cancelada: nadie va a leer sus archivos temporales
+                    this.discardTransportFiles(message);
+                    return;
+                }
+
+                // Con stream cada imagen llega en su propio mensaje (o trama) antes del resumen
+                if (message.tipo === 'imagen') {
+                    pending.processing = pending.processing.then(async () => {
+                        const image = await this.processImage(message.imagen, payload);
+                        pending.images.push(image);
+                        if (pending.onImage) pending.onImage(image);
+                    });
+                    return;
+                }
+
+                if (PROGRESS_EVENTS.includes(message.tipo)) {
+                    if (message.tipo === 'inicio') pending.start();
+                    if (pending.onProgress) pending.onProgress(message);
+                    return;
+                }
+
+                // Solo las respuestas finales cierran una solicitud (no los eventos de stream)
+                if (message.tipo && message.tipo !== 'resumen') return;
+
+                this.pendingRequests.delete(message.id);
+                pending.finish(message);
+            }, (text) => {
+                console.error('❌ Línea inválida del worker Python:', text);
+            }));
+
+            workerProcess.stderr.on('data', (data) => {
+                console.log('Python worker stderr:', data.toString());
+            });
+
+            const failWorker = (reason) => {
+                const error = {
+                    success: false,
+                    error: 'PythonWorkerError',
+                    message: `El worker Python se detuvo: ${reason}`
+                };
+                if (!ready) {
+                    ready = true;
+                    rejectReady(error);
+                }
+                for (const pending of this.pendingRequests.values()) {
+                    pending.finish({ exito: false, error: error.error, mensaje: error.message });
+                }
+                this.pendingRequests.clear();
+                this.worker = null;
+                this.workerReady = null;
+            };
+
+            workerProcess.on('error', (error) => failWorker(error.message));
+            workerProcess.on('close', (code) => failWorker(`código ${code}`));
+        });
+
+        return this.workerReady;
+    }
+
+    /**
+     * Envía una solicitud de generación al worker persistente
+     *
+     * El worker atiende las solicitudes de a una: mientras la solicitud espera en su cola el
+     * plazo es timeoutMs por cada solicitud que tiene delante (más la propia), y desde el
+     * evento "inicio" es timeoutMs. Si vence, se le pide al worker que la cancele.
+     * @param {Object} request - Solicitud con los mismos campos que los argumentos del CLI
+     * @param {Object} [callbacks] - onImage y onProgress, con el mismo uso que en generateImages
+     * @returns {Promise<Object>} Resultado de la generación
+     */
+    async generateImagesWithWorker(request, { onImage, onProgress } = {}) {
+        await this.startWorker();
+
+        const id = String(this.nextRequestId++);
+        const queuePosition = this.pendingRequests.size;
+
+        return new Promise((resolve, reject) => {
+            const expire = (message) => () => {
+                this.pendingRequests.delete(id);
+                // Sin la cancelación el worker seguiría generando para nadie
+                if (this.worker) {
+                    this.worker.stdin.write(JSON.stringify({ comando: 'cancelar', id }) + '\n');
+                }
+                reject({ success: false, error: 'TimeoutError', message });
+            };
+
+            let timeout = setTimeout(
+                expire(`La solicitud no empezó a tiempo en la cola del worker (posición ${queuePosition + 1})`),
+                this.timeoutMs * (queuePosition + 1)
+            );
+
+            const pending = {
+                images: [],
+                // Las imágenes se procesan en orden aunque leer su archivo temporal sea asíncrono
+                processing: Promise.resolve(),
+                onImage,
+                onProgress,
+                start: () => {
+                    clearTimeout(timeout);
+                    timeout = setTimeout(
+                        expire(`La generación de imágenes tomó demasiado tiempo (timeout: ${this.timeoutMs / 1000} segundos)`),
+                        this.timeoutMs
+                    );
+                },
+                finish: async (result) => {
+                    clearTimeout(timeout);
+                    const processingError = await pending.processing.then(() => null, (error) => error);
+                    if (result.exito) {
+                        if (processingError) {
+                            reject(this.imageProcessingError(processingError));
+                        } else if (pending.images.length > 0) {
+                            result.datos.imagenes = pending.images;
+                            resolve(result);
+                        } else {
+                            this.processImageResponse(result).then(resolve, (error) => reject(this.imageProcessingError(error)));
+                        }
+                    } else {
+                        reject({
+                            success: false,
+                            error: result.error || 'UnknownPythonError',
+                            message: result.mensaje || 'Error desconocido en el worker Python',
+                            details: result
+                        });
+                    }
+                }
+            };
+            this.pendingRequests.set(id, pending);
+
+            this.worker.stdin.write(JSON.stringify({ id, ...request }) + '\n');
         });
     }
 
     /**
      * Procesa el resultado del script Python con soporte para imágenes base64
      * @param {Object} result - Resultado del script Python
-     * @returns {Object} Resultado procesado
+     * @returns {Promise<Object>} Resultado procesado
      */
-    processImageResponse(result) {
+    async processImageResponse(result) {
         if (!result.datos || !result.datos.imagenes) {
             return result;
         }
 
         // Procesar cada imagen según su formato
-        result.datos.imagenes = result.datos.imagenes.map(image => {
-            if (image.formato === 'base64') {
-                // Imagen en formato base64 - agregar data URL
-                return {
-                    ...image,
-                    data_url: `data:${image.mime_type};base64,${image.base64_data}`,
-                    // Mantener información útil para el frontend
-                    display_ready: true,
-                    size_mb: (image.metadata.tamano_bytes / (1024 * 1024)).toFixed(2)
-                };
+        result.datos.imagenes = await Promise.all(result.datos.imagenes.map(image => this.processImage(image)));
+
+        return result;
+    }
+
+    /**
+     * Construye el error de una generación exitosa cuyas imágenes no se pudieron leer
+     * @param {Error} error - Error al procesar una imagen (p. ej. al leer su archivo temporal)
+     * @returns {Object} Error en el mismo formato que los del script Python
+     */
+    imageProcessingError(error) {
+        return {
+            success: false,
+            error: 'ImageProcessingError',
+            message: `No se pudieron leer las imágenes generadas: ${error.message}`
+        };
+    }
+
+    /**
+     * Crea un parser incremental para el stdout de Python según el transporte configurado
+     * - json/ruta: un mensaje JSON por línea
+     * - binario: tramas [longitud JSON][longitud carga] (uint32 big-endian) + JSON + carga
+     * @param {Function} onMessage - Recibe (mensaje, carga) por cada mensaje completo
+     * @param {Function} onInvalid - Recibe el texto de cada línea que no es JSON válido
+     * @returns {Function} Función para el evento 'data' (con .end() para la última línea)
+     */
+    createOutputParser(onMessage, onInvalid) {
+        const binary = this.transport === 'binario';
+        let chunks = [];
+        let length = 0;
+        let needed = 0;
+
+        const handle = (text, payload) => {
+            if (!text.trim()) return;
+
+            let message;
+            try {
+                message = JSON.parse(text);
+            } catch (parseError) {
+                onInvalid(text);
+                return;
+            }
+            onMessage(message, payload);
+        };
+
+        const parse = (data) => {
+            chunks.push(data);
+            length += data.length;
+
+            // Concatenar solo cuando puede haber un mensaje completo (evita copias cuadráticas)
+            if (length < needed || (!binary && !data.includes(10))) return;
+
+            let pending = Buffer.concat(chunks, length);
+            needed = 0;
+
+            if (binary) {
+                while (pending.length >= 8) {
+                    const headerLength = pending.readUInt32BE(0);
+                    const frameLength = 8 + headerLength + pending.readUInt32BE(4);
+                    if (pending.length < frameLength) {
+                        needed = frameLength;
+                        break;
+                    }
+                    const header = pending.toString('utf8', 8, 8 + headerLength);
+                    const payload = pending.subarray(8 + headerLength, frameLength);
+                    pending = pending.subarray(frameLength);
+                    handle(header, payload);
+                }
             } else {
-                // Imagen en formato archivo - agregar URLs de servicio (compatibilidad)
-                return {
-                    ...image,
-                    urls: {
-                        serve: `/api/images/serve/${image.nombre_archivo}`,
-                        download: `/api/images/download/${image.nombre_archivo}`,
-                        metadata: `/api/images/metadata/${image.id}`
-                    },
-                    display_ready: false
-                };
+                let newlineIndex;
+                while ((newlineIndex = pending.indexOf(10)) >= 0) {
+                    const line = pending.toString('utf8', 0, newlineIndex);
+                    pending = pending.subarray(newlineIndex + 1);
+                    handle(line, null);
+                }
             }
-        });
 
-        return result;
+            chunks = pending.length > 0 ? [pending] : [];
+            length = pending.length;
+        };
+
+        parse.end = () => {
+            if (!binary && length > 0) {
+                handle(Buffer.concat(chunks, length).toString('utf8'), null);
+            }
+            chunks = [];
+            length = 0;
+        };
+
+        return parse;
+    }
+
+    /**
+     * Borra los archivos del transporte 'ruta' de un mensaje que no se va a procesar
+     * @param {Object} message - Evento de imagen o respuesta final de Python
+     * @returns {Promise<void>} Se resuelve cuando se borraron (los errores solo se registran)
+     */
+    async discardTransportFiles(message) {
+        const images = message.imagen ? [message.imagen] : (message.datos?.imagenes || []);
+        await Promise.all(images.filter(image => image.ruta_transporte).map(image =>
+            fs.rm(image.ruta_transporte, { force: true }).catch((error) => {
+                console.error('❌ No se pudo borrar el archivo temporal de Python:', error.message);
+            })
+        ));
     }
 
     /**
-     * Verifica si Python está disponible
+     * Procesa una imagen individual devuelta por Python
+     * @param {Object} image - Imagen en formato base64, binario, ruta o archivo
+     * @param {Buffer} [payload] - Bytes de la imagen (transporte binario)
+     * @returns {Promise<Object>} Imagen con data URL (base64), bytes crudos (binario/ruta) o URLs de servicio
+     */
+    async processImage(image, payload) {
+        // Las versiones reducidas siempre se sirven como archivos
+        if (image.derivados) {
+            image = {
+                ...image,
+                derivados: image.derivados.map(derivative => ({
+                    ...derivative,
+                    url: `/api/images/serve/${derivative.nombre_archivo}`
+                }))
+            };
+        }
+
+        if (image.formato === 'binario' || image.formato === 'ruta') {
+            // Bytes crudos: desde la trama o desde el archivo temporal (que se borra al leerlo)
+            let data = payload;
+            if (image.formato === 'ruta') {
+                try {
+                    data = await fs.readFile(image.ruta_transporte);
+                } finally {
+                    await fs.rm(image.ruta_transporte, { force: true });
+                }
+            }
+
+            // Sin volver a base64: el Buffer para quien use los bytes y la URL del blob para el frontend
+            const { ruta_transporte, ...imageInfo } = image;
+            const storage = image.metadata.almacenamiento;
+            return {
+                ...imageInfo,
+                formato: 'bytes',
+                data,
+                urls: storage?.tipo === 'blob' ? {
+                    serve: `/api/images/blob/${path.basename(storage.ruta)}`,
+                    metadata: `/api/images/metadata/${image.id}`
+                } : undefined,
+                display_ready: storage?.tipo === 'blob',
+                size_mb: (image.metadata.tamano_bytes / (1024 * 1024)).toFixed(2)
+            };
+        }
+
+        if (image.formato === 'base64') {
+            // Imagen en formato base64 - agregar data URL
+            return {
+                ...image,
+                data_url: `data:${image.mime_type};base64,${image.base64_data}`,
+                // Mantener información útil para el frontend
+                display_ready: true,
+                size_mb: (image.metadata.tamano_bytes / (1024 * 1024)).toFixed(2)
+            };
+        }
+
+        // Imagen en formato archivo - agregar URLs de servicio (compatibilidad)
+        return {
+            ...image,
+            urls: {
+                serve: `/api/images/serve/${image.nombre_archivo}`,
+                download: `/api/images/download/${image.nombre_archivo}`,
+                metadata: `/api/images/metadata/${image.id}`
+            },
+            display_ready: false
+        };
+    }
+
+    /**
+     * Verifica si Python está disponible usando el modo --status del script
+     * (no importa torch ni carga el modelo, por lo que responde en milisegundos)
      * @returns {Promise<Object>} Estado de Python
      */
     async checkPythonAvailability() {
         return new Promise((resolve) => {
-            const pythonProcess = spawn(this.pythonCommand, ['--version'], {
+            const pythonProcess = spawn(this.pythonCommand, [this.pythonScriptPath, '--status', '--quiet'], {
+                cwd: path.dirname(this.pythonScriptPath),
                 stdio: ['pipe', 'pipe', 'pipe']
             });
 
@@ -210,10 +701,23 @@ export class PythonImageService {
             });
 
             pythonProcess.on('close', (code) => {
+                let status = null;
+                try {
+                    status = JSON.parse(output);
+                } catch (parseError) {
+                    // Salida no JSON: Python existe pero el script no pudo ejecutarse
+                }
+
                 resolve({
-                    available: code === 0,
-                    version: output.trim(),
-                    command: this.pythonCommand
+                    available: code === 0 && status !== null,
+                    version: status ? `Python ${status.estado.python.version}` : output.trim(),
+                    command: this.pythonCommand,
+                    ...(status ? {
+                        dependenciesInstalled: status.exito,
+                        dependencies: status.estado.dependencias,
+                        model: status.estado.modelo,
+                        device: status.estado.dispositivo
+                    } : {})
                 });
             });
 
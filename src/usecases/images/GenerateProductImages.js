@@ -1,6 +1,7 @@
 import { ZodError } from "zod";
 import { generateImageSchema } from "../../adapters/web/validators/imageValidators.js";
 import { pythonImageService } from "../../infrastructure/services/pythonImageService.js";
+import { buildMemoryWarnings } from "./memoryWarnings.js";
 
 export const generateProductImages = async (data) => {
     try {
@@ -71,17 +72,29 @@ export const generateProductImages = async (data) => {
             width: validatedData.width,
             height: validatedData.height,
             inferenceSteps: validatedData.inferenceSteps,
-            guidanceScale: validatedData.guidanceScale
+            guidanceScale: validatedData.guidanceScale,
+            scheduler: validatedData.scheduler,
+            qualityPreset: validatedData.qualityPreset,
+            seed: validatedData.seed,
+            format: validatedData.format,
+            quality: validatedData.quality,
+            derivatives: validatedData.derivatives
         });
 
         console.log('✅ Generación completada exitosamente');
 
+        const requestedDimensions = { width: validatedData.width, height: validatedData.height };
+        const warnings = buildMemoryWarnings(imageGenerationResult.datos.admision, requestedDimensions);
+        warnings.forEach(warning => console.warn(`⚠️ ${warning.message}`));
+
         // Return structured response
         return {
             success: true,
             message: `Se generaron ${imageGenerationResult.datos.estadisticas.total_generadas} imágenes exitosamente`,
             data: {
                 session_id: imageGenerationResult.datos.session_id,
+                // Cambios que el control de admisión hizo a la solicitud (resolución reducida, lotes divididos)
+                warnings,
                 product: {
                     name: validatedData.productName,
                     description: validatedData.productDescription,
@@ -90,18 +103,24 @@ export const generateProductImages = async (data) => {
                 generation_config: {
                     style: validatedData.style,
                     variations_requested: validatedData.variations,
-                    dimensions: {
-                        width: validatedData.width,
-                        height: validatedData.height
-                    },
-                    inference_steps: validatedData.inferenceSteps,
-                    guidance_scale: validatedData.guidanceScale,
+                    // Puede ser menor a la pedida si el control de admisión redujo la resolución
+                    dimensions: imageGenerationResult.datos.configuracion.dimensiones,
+                    requested_dimensions: requestedDimensions,
+                    memory_admission: imageGenerationResult.datos.admision,
+                    memory_offload: imageGenerationResult.datos.offload,
+                    inference_steps: imageGenerationResult.datos.configuracion.pasos_inferencia,
+                    guidance_scale: imageGenerationResult.datos.configuracion.guidance_scale,
+                    scheduler: imageGenerationResult.datos.configuracion.scheduler,
+                    quality_preset: imageGenerationResult.datos.configuracion.preset_calidad,
+                    image_format: imageGenerationResult.datos.configuracion.formato_imagen,
+                    quality: imageGenerationResult.datos.configuracion.calidad,
                     device: imageGenerationResult.datos.configuracion.dispositivo
                 },
                 statistics: {
                     total_generated: imageGenerationResult.datos.estadisticas.total_generadas,
                     total_failed: imageGenerationResult.datos.estadisticas.total_fallidas,
-                    success_rate: imageGenerationResult.datos.estadisticas.tasa_exito
+                    success_rate: imageGenerationResult.datos.estadisticas.tasa_exito,
+                    cache: imageGenerationResult.datos.estadisticas.cache
                 },
                 images: imageGenerationResult.datos.imagenes.map(img => ({
                     id: img.id,
@@ -115,7 +134,7 @@ export const generateProductImages = async (data) => {
                         display_ready: img.display_ready,
                         size_mb: img.size_mb
                     } : {
-                        // Si es archivo, incluir las URLs de servicio
+                        // Si es archivo o bytes crudos, incluir las URLs de servicio (el Buffer no va en el JSON)
                         urls: img.urls,
                         display_ready: img.display_ready
                     }),
@@ -123,8 +142,17 @@ export const generateProductImages = async (data) => {
                         hash: img.metadata.hash_sha256,
                         size_bytes: img.metadata.tamano_bytes,
                         dimensions: img.metadata.dimensiones,
-                        timestamp: img.metadata.timestamp_generacion
-                    }
+                        timestamp: img.metadata.timestamp_generacion,
+                        encoding: img.metadata.codificacion
+                    },
+                    derivatives: (img.derivados || []).map(derivative => ({
+                        name: derivative.nombre,
+                        filename: derivative.nombre_archivo,
+                        url: derivative.url,
+                        dimensions: derivative.dimensiones,
+                        size_bytes: derivative.tamano_bytes,
+                        hash: derivative.hash_sha256
+                    }))
                 })),
                 metadata: {
                     generation_timestamp: imageGenerationResult.timestamp,
@@ -0,0 +1,29 @@
+// Avisos para el cliente cuando el control de admisión por memoria cambió la solicitud:
+// con la política 'ajustar' una solicitud que no cabe se genera a menor resolución o en
+// lotes más chicos en lugar de fallar, y eso no debe pasar desapercibido
+export const buildMemoryWarnings = (admission, requestedDimensions) => {
+    const warnings = [];
+    if (!admission) {
+        return warnings;
+    }
+
+    if (admission.decision === 'reducir') {
+        warnings.push({
+            code: 'RESOLUTION_REDUCED',
+            message: `Memoria insuficiente para ${requestedDimensions.width}x${requestedDimensions.height}: ` +
+                `las imágenes se generaron a ${admission.width}x${admission.height}`,
+            requested_dimensions: requestedDimensions,
+            generated_dimensions: { width: admission.width, height: admission.height }
+        });
+    } else if (admission.decision === 'dividir') {
+        warnings.push({
+            code: 'BATCH_SPLIT',
+            message: `Memoria insuficiente para lotes más grandes: se generó en ${admission.lotes} ` +
+                `lotes de ${admission.tamano_lote} imágenes (más lento)`,
+            batch_size: admission.tamano_lote,
+            batches: admission.lotes
+        });
+    }
+
+    return warnings;
+};
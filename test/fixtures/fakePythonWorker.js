@@ -0,0 +1,63 @@
+// Imita el protocolo de generar_cli.py --serve (transporte json) sin cargar modelos:
+// anuncia "listo", atiende las solicitudes de a una (con sus eventos de stream y el
+// resumen) y respeta {"comando": "cancelar"}. "duracion_ms" simula el tiempo de generación
+// e "ignorar_cancelacion" entrega la imagen aunque se haya cancelado. Con --transporte ruta
+// las imágenes se escriben en FAKE_WORKER_DIR (o el temporal del sistema)
+import { writeFileSync } from 'node:fs';
+import { tmpdir } from 'node:os';
+import path from 'node:path';
+import readline from 'node:readline';
+
+const send = (message) => process.stdout.write(JSON.stringify(message) + '\n');
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+const cancelled = new Set();
+const pathTransport = process.argv[process.argv.indexOf('--transporte') + 1] === 'ruta';
+
+const createImage = (session_id) => {
+    const image = { id: `${session_id}_01`, mime_type: 'image/png', metadata: { tamano_bytes: 3 } };
+    if (!pathTransport) {
+        return { ...image, formato: 'base64', base64_data: Buffer.from('png').toString('base64') };
+    }
+    const ruta_transporte = path.join(process.env.FAKE_WORKER_DIR || tmpdir(), `${session_id}_01.png`);
+    writeFileSync(ruta_transporte, 'png');
+    const almacenamiento = { tipo: 'blob', ruta: path.join('blobs', 'ab', `ab12_${session_id}.png`), tamano_bytes: 3 };
+    return { ...image, formato: 'ruta', ruta_transporte, metadata: { ...image.metadata, almacenamiento } };
+};
+
+const handle = async (request) => {
+    const { id } = request;
+    const session_id = `sesion_${id}`;
+    const cancel = () => send({ id, exito: false, error: 'SolicitudCancelada', mensaje: 'cancelada' });
+
+    if (cancelled.has(id)) return cancel();
+
+    if (request.stream) {
+        send({ id, tipo: 'inicio', session_id, total: request.variaciones });
+    }
+    await sleep(request.duracion_ms || 0);
+    if (cancelled.has(id) && !request.ignorar_cancelacion) return cancel();
+
+    if (request.stream) {
+        if (request.eventos_paso) {
+            send({ id, tipo: 'paso', session_id, paso: 1, total_pasos: request.pasos });
+        }
+        send({ id, tipo: 'imagen', session_id, imagen: createImage(session_id) });
+        send({ id, tipo: 'progreso', session_id, completadas: 1, total: 1 });
+    }
+
+    send({ id, ...(request.stream ? { tipo: 'resumen' } : {}), exito: true, datos: { session_id, imagenes: [] } });
+};
+
+send({ exito: true, estado: 'listo', dispositivo: 'cpu', modelo: 'falso' });
+
+let queue = Promise.resolve();
+const lines = readline.createInterface({ input: process.stdin });
+lines.on('line', (line) => {
+    const request = JSON.parse(line);
+    if (request.comando === 'cancelar') {
+        cancelled.add(request.id);
+        return;
+    }
+    queue = queue.then(() => handle(request));
+});
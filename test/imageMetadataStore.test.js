@@ -0,0 +1,46 @@
+import { test } from 'node:test';
+import assert from 'node:assert/strict';
+import { mkdtempSync, writeFileSync } from 'fs';
+import { tmpdir } from 'os';
+import path from 'path';
+import { ImageMetadataStore } from '../src/infrastructure/services/imageMetadataStore.js';
+
+const sqliteAvailable = await import('node:sqlite').then(() => true, () => false);
+
+const createStore = (databasePath) => {
+    const store = new ImageMetadataStore();
+    store.databasePath = databasePath;
+    return store;
+};
+
+const captureWarnings = async (t, run) => {
+    const warnings = [];
+    t.mock.method(console, 'warn', (...args) => warnings.push(args.join(' ')));
+    await run();
+    return warnings;
+};
+
+test('sin índice se avisa una sola vez y se usan los JSON', async (t) => {
+    const store = createStore(path.join(mkdtempSync(path.join(tmpdir(), 'metadata-')), 'metadata.db'));
+    const warnings = await captureWarnings(t, async () => {
+        assert.equal(await store.listImages({ page: 1, limit: 10 }), null);
+        assert.equal(await store.getImage('abc_01'), null);
+        assert.equal(await store.listImages({ page: 2, limit: 10 }), null);
+    });
+    assert.equal(warnings.length, 1);
+    assert.match(warnings[0], /no existe/);
+});
+
+test('sin node:sqlite se avisa una sola vez con la versión requerida', { skip: sqliteAvailable }, async (t) => {
+    const databasePath = path.join(mkdtempSync(path.join(tmpdir(), 'metadata-')), 'metadata.db');
+    writeFileSync(databasePath, '');
+    const store = createStore(databasePath);
+    const warnings = await captureWarnings(t, async () => {
+        for (let page = 1; page <= 3; page++) {
+            assert.equal(await store.listImages({ page, limit: 10 }), null);
+        }
+    });
+    assert.equal(warnings.length, 1);
+    assert.match(warnings[0], /22\.13\+/);
+    assert.ok(store.sqliteError);
+});
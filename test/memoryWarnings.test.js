@@ -0,0 +1,40 @@
+import { test } from 'node:test';
+import assert from 'node:assert/strict';
+import { buildMemoryWarnings } from '../src/usecases/images/memoryWarnings.js';
+
+const requested = { width: 2048, height: 2048 };
+
+test('sin admisión no hay avisos', () => {
+    assert.deepEqual(buildMemoryWarnings(undefined, requested), []);
+});
+
+test('una solicitud aceptada no genera avisos', () => {
+    const admission = { decision: 'aceptar', width: 2048, height: 2048, tamano_lote: 2, lotes: 1 };
+    assert.deepEqual(buildMemoryWarnings(admission, requested), []);
+});
+
+test('la resolución reducida se informa con ambas dimensiones', () => {
+    const admission = { decision: 'reducir', width: 1200, height: 1200, tamano_lote: 1, lotes: 3 };
+    const [warning, ...rest] = buildMemoryWarnings(admission, requested);
+    assert.equal(rest.length, 0);
+    assert.equal(warning.code, 'RESOLUTION_REDUCED');
+    assert.deepEqual(warning.requested_dimensions, requested);
+    assert.deepEqual(warning.generated_dimensions, { width: 1200, height: 1200 });
+    assert.match(warning.message, /2048x2048/);
+    assert.match(warning.message, /1200x1200/);
+});
+
+test('los lotes divididos se informan con su tamaño', () => {
+    const admission = { decision: 'dividir', width: 2048, height: 2048, tamano_lote: 1, lotes: 4 };
+    const [warning] = buildMemoryWarnings(admission, requested);
+    assert.equal(warning.code, 'BATCH_SPLIT');
+    assert.equal(warning.batch_size, 1);
+    assert.equal(warning.batches, 4);
+});
+
+test('sin control o sin medición no hay avisos', () => {
+    for (const decision of ['sin_control', 'sin_medicion']) {
+        const admission = { decision, width: 2048, height: 2048, tamano_lote: null, lotes: null };
+        assert.deepEqual(buildMemoryWarnings(admission, requested), []);
+    }
+});
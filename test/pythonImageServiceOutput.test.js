@@ -0,0 +1,129 @@
+import { test } from 'node:test';
+import assert from 'node:assert/strict';
+import { existsSync, mkdtempSync, writeFileSync } from 'node:fs';
+import { tmpdir } from 'node:os';
+import path from 'node:path';
+import { PythonImageService } from '../src/infrastructure/services/pythonImageService.js';
+
+// Misma trama que transporte.TransporteSalida.enviar: [len JSON][len carga] (>II) + JSON + carga
+const frame = (message, payload = Buffer.alloc(0)) => {
+    const header = Buffer.from(JSON.stringify(message));
+    const lengths = Buffer.alloc(8);
+    lengths.writeUInt32BE(header.length, 0);
+    lengths.writeUInt32BE(payload.length, 4);
+    return Buffer.concat([lengths, header, payload]);
+};
+
+const createParser = (transport) => {
+    const service = new PythonImageService();
+    service.transport = transport;
+    const messages = [];
+    const invalid = [];
+    const parse = service.createOutputParser(
+        (message, payload) => messages.push({ message, payload }),
+        (text) => invalid.push(text)
+    );
+    return { service, parse, messages, invalid };
+};
+
+const feed = (parse, data, cuts) => {
+    let start = 0;
+    for (const cut of [...cuts, data.length]) {
+        parse(data.subarray(start, cut));
+        start = cut;
+    }
+};
+
+test('binario: cabecera y carga partidas en varios chunks', () => {
+    const payload = Buffer.from([0, 1, 2, 10, 255, 254]);
+    const data = Buffer.concat([frame({ tipo: 'imagen', nombre: 'café' }, payload), frame({ tipo: 'resumen' })]);
+    const headerLength = data.readUInt32BE(0);
+
+    // Cortes dentro de los 8 bytes de longitudes, dentro del JSON y dentro de la carga
+    for (const cuts of [[3], [5, 11], [8 + headerLength + 2], [1, 2, 3, 4, 5, 6, 7, 8, 9]]) {
+        const { parse, messages } = createParser('binario');
+        feed(parse, data, cuts);
+        assert.equal(messages.length, 2);
+        assert.deepEqual(messages[0].message, { tipo: 'imagen', nombre: 'café' });
+        assert.deepEqual(messages[0].payload, payload);
+        assert.deepEqual(messages[1].message, { tipo: 'resumen' });
+    }
+});
+
+test('binario: byte a byte y tramas con carga vacía', () => {
+    const data = Buffer.concat([frame({ id: 1 }), frame({ id: 2 }, Buffer.from('x')), frame({ id: 3 })]);
+    const { parse, messages } = createParser('binario');
+    feed(parse, data, Array.from({ length: data.length - 1 }, (_, i) => i + 1));
+
+    assert.deepEqual(messages.map(({ message }) => message.id), [1, 2, 3]);
+    assert.equal(messages[0].payload.length, 0);
+    assert.equal(messages[1].payload.toString(), 'x');
+    assert.equal(messages[2].payload.length, 0);
+});
+
+test('json: líneas partidas, UTF-8 partido y la última línea sin salto', () => {
+    const data = Buffer.from('{"a":"ñandú"}\nno es json\n{"b":2}\n{"c":3}');
+    const { parse, messages, invalid } = createParser('json');
+    // El corte en 7 parte la "ñ" (dos bytes)
+    feed(parse, data, [7, 15, 20]);
+    assert.deepEqual(messages.map(({ message }) => message), [{ a: 'ñandú' }, { b: 2 }]);
+    parse.end();
+    assert.deepEqual(messages.at(-1).message, { c: 3 });
+    assert.deepEqual(invalid, ['no es json']);
+});
+
+test('ruta: la imagen se lee del archivo temporal y el archivo se borra', async () => {
+    const directory = mkdtempSync(path.join(tmpdir(), 'transporte-'));
+    const file = path.join(directory, 'a_01.png');
+    writeFileSync(file, 'png');
+    const { service, parse, messages } = createParser('ruta');
+
+    const line = JSON.stringify({
+        tipo: 'imagen',
+        imagen: { formato: 'ruta', ruta_transporte: file, mime_type: 'image/png', metadata: { tamano_bytes: 3 } }
+    }) + '\n';
+    feed(parse, Buffer.from(line), [10]);
+    const image = await service.processImage(messages[0].message.imagen, messages[0].payload);
+
+    assert.deepEqual(image.data, Buffer.from('png'));
+    assert.equal(image.formato, 'bytes');
+    assert.equal(image.display_ready, false);
+    assert.equal('ruta_transporte' in image, false);
+    assert.equal(existsSync(file), false);
+});
+
+test('binario: los bytes de la trama se entregan sin pasar por base64', async () => {
+    const payload = Buffer.from([0, 1, 2, 255]);
+    const { service, parse, messages } = createParser('binario');
+    const blob = `${'ab'.repeat(32)}.png`;
+
+    parse(frame({
+        tipo: 'imagen',
+        imagen: {
+            id: 's_01',
+            formato: 'binario',
+            mime_type: 'image/png',
+            metadata: { tamano_bytes: 4, almacenamiento: { tipo: 'blob', ruta: `/blobs/ab/${blob}` } }
+        }
+    }, payload));
+    const image = await service.processImage(messages[0].message.imagen, messages[0].payload);
+
+    assert.deepEqual(image.data, payload);
+    assert.equal(image.formato, 'bytes');
+    assert.equal('data_url' in image, false);
+    assert.equal(image.urls.serve, `/api/images/blob/${blob}`);
+    assert.equal(image.display_ready, true);
+});
+
+test('ruta: los archivos de un mensaje descartado se borran', async () => {
+    const directory = mkdtempSync(path.join(tmpdir(), 'transporte-'));
+    const files = ['a_01.png', 'a_02.png'].map((name) => path.join(directory, name));
+    files.forEach((file) => writeFileSync(file, 'png'));
+    const service = new PythonImageService();
+
+    await service.discardTransportFiles({ exito: false, datos: { imagenes: files.map((ruta_transporte) => ({ ruta_transporte })) } });
+    // Un archivo que ya no existe no es un error
+    await service.discardTransportFiles({ tipo: 'imagen', imagen: { ruta_transporte: files[0] } });
+
+    assert.ok(files.every((file) => !existsSync(file)));
+});
@@ -0,0 +1,110 @@
+import { test } from 'node:test';
+import assert from 'node:assert/strict';
+import { existsSync, mkdtempSync, readdirSync } from 'node:fs';
+import { tmpdir } from 'node:os';
+import path from 'node:path';
+import { fileURLToPath } from 'node:url';
+import { PythonImageService } from '../src/infrastructure/services/pythonImageService.js';
+
+const fakeWorker = path.join(path.dirname(fileURLToPath(import.meta.url)), 'fixtures/fakePythonWorker.js');
+
+const createService = (transport = 'json') => {
+    const service = new PythonImageService();
+    service.useWorker = true;
+    service.transport = transport;
+    service.pythonCommand = process.execPath;
+    service.pythonScriptPath = fakeWorker;
+    return service;
+};
+
+const request = { productName: 'Café', productDescription: 'Café de especialidad', variations: 1 };
+
+test('el worker entrega imágenes y progreso a los callbacks de la solicitud', async (t) => {
+    const service = createService();
+    t.after(() => service.worker?.kill());
+
+    const images = [];
+    const events = [];
+    const result = await service.generateImages({
+        ...request,
+        onImage: (image) => images.push(image),
+        onProgress: (event) => events.push(event.tipo)
+    });
+
+    assert.deepEqual(events, ['inicio', 'paso', 'progreso']);
+    assert.equal(images.length, 1);
+    assert.equal(images[0].data_url, `data:image/png;base64,${Buffer.from('png').toString('base64')}`);
+    assert.deepEqual(result.datos.imagenes, images);
+});
+
+test('sin onProgress el worker no emite eventos por paso', async (t) => {
+    const service = createService();
+    t.after(() => service.worker?.kill());
+
+    const images = [];
+    const result = await service.generateImages({ ...request, onImage: (image) => images.push(image) });
+
+    assert.equal(images.length, 1);
+    assert.equal(result.datos.imagenes.length, 1);
+});
+
+test('el plazo de una solicitud en cola crece con su posición y se reinicia al empezar', async (t) => {
+    const service = createService();
+    service.timeoutMs = 300;
+    t.after(() => service.worker?.kill());
+
+    // La segunda termina ~400 ms después de enviarse: con un plazo fijo desde el envío vencería
+    const results = await Promise.all([
+        service.generateImagesWithWorker({ producto: 'a', stream: true, duracion_ms: 200 }),
+        service.generateImagesWithWorker({ producto: 'b', stream: true, duracion_ms: 200 })
+    ]);
+
+    assert.ok(results.every((result) => result.exito));
+});
+
+test('al vencer el plazo se cancela la solicitud en el worker', async (t) => {
+    const service = createService();
+    service.timeoutMs = 100;
+    t.after(() => service.worker?.kill());
+
+    await service.startWorker();
+    const sent = [];
+    const write = service.worker.stdin.write.bind(service.worker.stdin);
+    service.worker.stdin.write = (line) => {
+        sent.push(JSON.parse(line));
+        return write(line);
+    };
+
+    await assert.rejects(
+        service.generateImagesWithWorker({ producto: 'lento', stream: true, duracion_ms: 1000 }),
+        { error: 'TimeoutError' }
+    );
+    assert.deepEqual(sent.at(-1), { comando: 'cancelar', id: sent[0].id });
+    assert.equal(service.pendingRequests.size, 0);
+});
+
+test('con transporte ruta se borran los archivos de una solicitud vencida', async (t) => {
+    const directory = mkdtempSync(path.join(tmpdir(), 'transporte-'));
+    process.env.FAKE_WORKER_DIR = directory;
+    const service = createService('ruta');
+    service.timeoutMs = 100;
+    t.after(() => {
+        delete process.env.FAKE_WORKER_DIR;
+        service.worker?.kill();
+    });
+
+    await assert.rejects(
+        service.generateImagesWithWorker({ producto: 'lenta', stream: true, duracion_ms: 300, ignorar_cancelacion: true }),
+        { error: 'TimeoutError' }
+    );
+    // El worker atiende de a una: cuando responde la siguiente ya entregó la imagen huérfana
+    service.timeoutMs = 5000;
+    const images = [];
+    await service.generateImagesWithWorker({ producto: 'rapida', stream: true }, { onImage: (image) => images.push(image) });
+
+    assert.equal(images.length, 1);
+    assert.deepEqual(images[0].data, Buffer.from('png'));
+    assert.equal(images[0].urls.serve, '/api/images/blob/ab12_sesion_2.png');
+    assert.equal(existsSync(path.join(directory, 'sesion_1_01.png')), false);
+    assert.deepEqual(readdirSync(directory), []);
+});